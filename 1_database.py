@@ -2,21 +2,149 @@
 数据库管理模块
 负责SQLite数据库的初始化、连接和基本操作
 """
+import csv
+import json
 import sqlite3
-from datetime import datetime
+from pathlib import Path
+from datetime import datetime, timedelta
+import query_builder
+import recurrence
+import date_index
+from batch_writer import BatchedWriter
+import perf_metrics
+import ai_call_metrics
+
+# 项目汇总表：每个项目一行，由todos上的触发器增量维护
+UNCATEGORIZED_PROJECT = '未分类'
+
+# 四象限优先级 -> (重要性, 紧急性)
+PRIORITY_FLAGS = {1: (1, 1), 2: (1, 0), 3: (0, 1), 4: (0, 0)}
+
+# 数据版本分组 -> 组内的表；写入其中任一表都会使该组的缓存（内存任务索引、AI提示词片段）失效
+DATA_VERSION_GROUPS = {
+    'todos': ('todos', 'recurring_tasks', 'recurrence_exceptions'),
+    'memory': ('ai_conversations', 'user_preferences', 'ai_memory_keywords', 'task_templates'),
+}
+
+# 项目汇总的各列及其对单条任务的取值（{row} 为 NEW/OLD 或表名）
+PROJECT_STATS_COLUMNS = [
+    ('total', "1"),
+    ('completed', "CASE WHEN {row}.status = 'completed' THEN 1 ELSE 0 END"),
+    ('pending', "CASE WHEN {row}.status = 'pending' THEN 1 ELSE 0 END"),
+    ('important_total', "CASE WHEN {row}.priority IN (1, 2) THEN 1 ELSE 0 END"),
+    ('important_completed', "CASE WHEN {row}.priority IN (1, 2) AND {row}.status = 'completed' THEN 1 ELSE 0 END"),
+    ('urgent_total', "CASE WHEN {row}.priority IN (1, 3) THEN 1 ELSE 0 END"),
+    ('urgent_completed', "CASE WHEN {row}.priority IN (1, 3) AND {row}.status = 'completed' THEN 1 ELSE 0 END"),
+]
+
+
+def _project_key_sql(row):
+    """项目名归一化：NULL和空字符串都归入未分类"""
+    return f"CASE WHEN {row}.project IS NULL OR {row}.project = '' THEN '{UNCATEGORIZED_PROJECT}' ELSE {row}.project END"
+
+
+def _project_stats_delta_sql(row, sign):
+    """把一条任务（NEW或OLD）计入（sign=1）或移出（sign=-1）项目汇总"""
+    names = ", ".join(name for name, _ in PROJECT_STATS_COLUMNS)
+    values = ", ".join(f"{sign} * ({expr.format(row=row)})" for _, expr in PROJECT_STATS_COLUMNS)
+    updates = ", ".join(f"{name} = {name} + excluded.{name}" for name, _ in PROJECT_STATS_COLUMNS)
+    key = _project_key_sql(row)
+    sql = f"""
+                INSERT INTO project_stats (project, {names}) VALUES ({key}, {values})
+                ON CONFLICT(project) DO UPDATE SET {updates};"""
+    if sign < 0:
+        sql += f"""
+                DELETE FROM project_stats WHERE project = {key} AND total <= 0;"""
+    return sql
+
+
+def _project_stats_aggregate_sql():
+    """从todos全量聚合项目汇总（重建和校验使用）"""
+    sums = ", ".join(f"SUM({expr.format(row='todos')}) AS {name}" for name, expr in PROJECT_STATS_COLUMNS)
+    key = _project_key_sql('todos')
+    return f"SELECT {key} AS project, {sums} FROM todos GROUP BY {key}"
+
+
+# 每日汇总表：按 (日期, 项目) 记录各项指标，由todos上的触发器增量维护
+# 每项指标: (计入的日期, 计入条件, {列: 取值})
+DAILY_ROLLUP_METRICS = [
+    # 新建任务数（按创建日期）
+    ("date({row}.created_at)", "1", {'created': "1"}),
+    # 完成任务数及完成周期（按完成日期）
+    ("date({row}.completed_at)", "{row}.status = 'completed'", {
+        'completed': "1",
+        'cycle_days': "julianday({row}.completed_at) - julianday({row}.created_at)",
+    }),
+    # 到期任务数（按截止日期，已取消的任务不计入逾期）
+    ("date({row}.due_date)", "{row}.status IS NOT 'cancelled'", {'due': "1"}),
+    # 已解决的到期任务（按截止日期和完成日期中较晚的一天）
+    ("max(date({row}.due_date), date({row}.completed_at))", "{row}.status = 'completed'", {'due_resolved': "1"}),
+]
+DAILY_ROLLUP_COLUMNS = ['created', 'completed', 'cycle_days', 'due', 'due_resolved']
+
+
+def _daily_rollup_delta_sql(row, sign):
+    """把一条任务（NEW或OLD）的各项指标计入（sign=1）或移出（sign=-1）每日汇总"""
+    key = _project_key_sql(row)
+    statements = []
+    for day_expr, condition, values in DAILY_ROLLUP_METRICS:
+        day = day_expr.format(row=row)
+        names = ", ".join(values)
+        exprs = ", ".join(f"{sign} * ({expr.format(row=row)})" for expr in values.values())
+        updates = ", ".join(f"{name} = {name} + excluded.{name}" for name in values)
+        statements.append(f"""
+                INSERT INTO daily_rollup (day, project, {names})
+                SELECT {day}, {key}, {exprs} WHERE {day} IS NOT NULL AND {condition.format(row=row)}
+                ON CONFLICT(day, project) DO UPDATE SET {updates};""")
+    return "".join(statements)
+
+
+def _daily_rollup_aggregate_sql():
+    """从todos全量聚合每日汇总（重建和校验使用），每项指标一条语句"""
+    key = _project_key_sql('todos')
+    statements = []
+    for day_expr, condition, values in DAILY_ROLLUP_METRICS:
+        day = day_expr.format(row='todos')
+        sums = ", ".join(f"SUM({expr.format(row='todos')}) AS {name}" for name, expr in values.items())
+        statements.append((list(values), f"""
+            SELECT {day} AS day, {key} AS project, {sums} FROM todos
+            WHERE {day} IS NOT NULL AND {condition.format(row='todos')}
+            GROUP BY 1, 2"""))
+    return statements
+
 
 class DatabaseManager:
-    def __init__(self, db_name='todo.db'):
+    def __init__(self, db_name='todo.db', statement_cache_size=query_builder.DEFAULT_STATEMENT_CACHE_SIZE):
         """初始化数据库管理器"""
         self.db_name = db_name
         self.conn = None
         self.cursor = None
+        self.statement_cache_size = statement_cache_size
+        self.statement_cache = None
+        self.batch_writer = None
         self.init_database()
     
+    @classmethod
+    def open_readonly(cls, db_name='todo.db', statement_cache_size=query_builder.DEFAULT_STATEMENT_CACHE_SIZE):
+        """打开只读实例：独立的只读连接，不建表，只能调用查询方法（供后台读取线程使用）"""
+        manager = cls.__new__(cls)
+        manager.db_name = db_name
+        manager.statement_cache_size = statement_cache_size
+        manager.batch_writer = None
+        uri = Path(db_name).resolve().as_uri() + "?mode=ro"
+        manager.conn, manager.statement_cache = query_builder.connect(
+            uri, statement_cache_size, uri=True, check_same_thread=False
+        )
+        manager.conn.row_factory = sqlite3.Row
+        manager.cursor = manager.conn.cursor()
+        return manager
+    
     def init_database(self):
         """初始化SQLite数据库"""
         # 设置check_same_thread=False以支持多线程访问
-        self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        self.conn, self.statement_cache = query_builder.connect(
+            self.db_name, self.statement_cache_size, check_same_thread=False
+        )
         self.conn.row_factory = sqlite3.Row  # 使结果可以按列名访问
         self.cursor = self.conn.cursor()
         
@@ -109,8 +237,355 @@ class DatabaseManager:
         if 'responsibility' not in columns:
             self.cursor.execute('ALTER TABLE todos ADD COLUMN responsibility TEXT DEFAULT "owner"')
         
+        # 重复任务：实例被完成或修改时才写入todos，记录所属模板和实例日期
+        if 'recurrence_id' not in columns:
+            self.cursor.execute('ALTER TABLE todos ADD COLUMN recurrence_id INTEGER')
+        if 'occurrence_date' not in columns:
+            self.cursor.execute('ALTER TABLE todos ADD COLUMN occurrence_date TEXT')
+        
+        # 日期列的整数形式（生成列，随原列自动更新），范围查询和排序直接比较整数
+        # 生成列不出现在 table_info 中，需用 table_xinfo 检查
+        self.cursor.execute("PRAGMA table_xinfo(todos)")
+        all_columns = [column[1] for column in self.cursor.fetchall()]
+        for name, expression in date_index.TODO_DATE_COLUMNS:
+            if name not in all_columns:
+                self.cursor.execute(f'ALTER TABLE todos ADD COLUMN {name} INTEGER GENERATED ALWAYS AS ({expression}) VIRTUAL')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_todos_status_due_day
+            ON todos (status, due_day, priority)
+        ''')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_todos_reminder_minute
+            ON todos (reminder_minute) WHERE reminder_minute IS NOT NULL
+        ''')
+        self.cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_todos_recurrence_occurrence
+            ON todos (recurrence_id, occurrence_date) WHERE recurrence_id IS NOT NULL
+        ''')
+    
+        # 重复任务模板：规则文本见 recurrence.RecurrenceRule，reminder_time 为 HH:MM
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                description TEXT,
+                project TEXT,
+                responsibility TEXT DEFAULT 'owner',
+                priority INTEGER,
+                urgency INTEGER,
+                importance INTEGER,
+                gtd_tag TEXT,
+                rule TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                reminder_time TEXT,
+                active INTEGER DEFAULT 1,
+                created_at TEXT
+            )
+        ''')
+        
+        # 被删除（跳过）的重复实例，展开时排除；不写入todos，不出现在任何任务查询和统计中
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recurrence_exceptions (
+                recurrence_id INTEGER NOT NULL,
+                occurrence_date TEXT NOT NULL,  -- YYYY-MM-DD
+                PRIMARY KEY (recurrence_id, occurrence_date)
+            ) WITHOUT ROWID
+        ''')
+        # 已写入todos的实例被删除时同样记入，之后不再展开
+        self.cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_recurrence_exceptions_delete AFTER DELETE ON todos
+            WHEN OLD.recurrence_id IS NOT NULL
+            BEGIN
+                INSERT OR IGNORE INTO recurrence_exceptions (recurrence_id, occurrence_date)
+                VALUES (OLD.recurrence_id, OLD.occurrence_date);
+            END
+        ''')
+        
+        # 按状态+优先级+截止日期的索引，首屏查询可直接按索引顺序取前N条
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_todos_status_priority_due
+            ON todos (status, priority, due_date)
+        ''')
+        
+        self.init_project_stats()
+        self.init_daily_rollup()
+        
+        # 项目记录表（注意事项、时间安排、总结），按项目+类型+时间倒序分页读取
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS project_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project TEXT NOT NULL,
+                kind TEXT NOT NULL,     -- note, schedule, summary
+                content TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_project_records_project_kind_created
+            ON project_records (project, kind, created_at)
+        ''')
+        
+        # AI调用统计表：每次调用一行（token用量、各提示词片段长度、首响应和总耗时、接口、费用）
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_call_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TEXT NOT NULL,
+                feature TEXT NOT NULL,
+                endpoint TEXT,
+                model TEXT,
+                stream INTEGER NOT NULL DEFAULT 0,
+                success INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                cache_hit_tokens INTEGER,
+                prompt_chars INTEGER,
+                segment_sizes TEXT,     -- JSON: 片段名 -> 字符数
+                segments_cached TEXT,   -- 使用了缓存的片段名，逗号分隔
+                ttft_ms REAL,
+                total_ms REAL,
+                attempts INTEGER,
+                cost REAL
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_call_metrics_created
+            ON ai_call_metrics (created_at)
+        ''')
+        
+        self.init_data_versions()
+        
         self.conn.commit()
     
+    def init_data_versions(self):
+        """创建数据版本表及维护触发器：每组一行，组内任一表写入时版本号加一"""
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        for group, tables in DATA_VERSION_GROUPS.items():
+            self.cursor.execute('INSERT OR IGNORE INTO data_versions (name) VALUES (?)', (group,))
+            for table in tables:
+                for event in ('INSERT', 'UPDATE', 'DELETE'):
+                    self.cursor.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS trg_data_version_{table}_{event.lower()}
+                        AFTER {event} ON {table}
+                        BEGIN
+                            UPDATE data_versions SET version = version + 1 WHERE name = '{group}';
+                        END
+                    ''')
+    
+    def init_project_stats(self):
+        """创建项目汇总表及维护触发器，首次创建时从todos回填"""
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='project_stats'")
+        needs_rebuild = self.cursor.fetchone() is None
+        
+        columns = ",\n".join(f"                {name} INTEGER NOT NULL DEFAULT 0" for name, _ in PROJECT_STATS_COLUMNS)
+        self.cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS project_stats (
+                project TEXT PRIMARY KEY,
+{columns}
+            )
+        ''')
+        
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_project_stats_insert AFTER INSERT ON todos
+            BEGIN{_project_stats_delta_sql('NEW', 1)}
+            END
+        ''')
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_project_stats_delete AFTER DELETE ON todos
+            BEGIN{_project_stats_delta_sql('OLD', -1)}
+            END
+        ''')
+        # 只有影响汇总的列变化时才触发
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_project_stats_update
+            AFTER UPDATE OF project, status, priority ON todos
+            BEGIN{_project_stats_delta_sql('OLD', -1)}{_project_stats_delta_sql('NEW', 1)}
+            END
+        ''')
+        
+        if needs_rebuild:
+            self.rebuild_project_stats(commit=False)
+    
+    def init_daily_rollup(self):
+        """创建每日汇总表及维护触发器，首次创建时回填历史数据"""
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='daily_rollup'")
+        needs_rebuild = self.cursor.fetchone() is None
+        
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_rollup (
+                day TEXT NOT NULL,              -- YYYY-MM-DD
+                project TEXT NOT NULL,          -- 归一化的项目名
+                created INTEGER NOT NULL DEFAULT 0,
+                completed INTEGER NOT NULL DEFAULT 0,
+                cycle_days REAL NOT NULL DEFAULT 0,   -- 当天完成任务的周期（天）之和
+                due INTEGER NOT NULL DEFAULT 0,
+                due_resolved INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, project)
+            ) WITHOUT ROWID
+        ''')
+        
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_daily_rollup_insert AFTER INSERT ON todos
+            BEGIN{_daily_rollup_delta_sql('NEW', 1)}
+            END
+        ''')
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_daily_rollup_delete AFTER DELETE ON todos
+            BEGIN{_daily_rollup_delta_sql('OLD', -1)}
+            END
+        ''')
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_daily_rollup_update
+            AFTER UPDATE OF project, status, created_at, completed_at, due_date ON todos
+            BEGIN{_daily_rollup_delta_sql('OLD', -1)}{_daily_rollup_delta_sql('NEW', 1)}
+            END
+        ''')
+        
+        if needs_rebuild:
+            self.rebuild_daily_rollup(commit=False)
+    
+    def rebuild_daily_rollup(self, commit=True):
+        """从todos全量重建每日汇总表（回填历史数据）"""
+        self.cursor.execute("DELETE FROM daily_rollup")
+        for names, select_sql in _daily_rollup_aggregate_sql():
+            updates = ", ".join(f"{name} = {name} + excluded.{name}" for name in names)
+            self.cursor.execute(f'''
+                INSERT INTO daily_rollup (day, project, {", ".join(names)})
+                SELECT * FROM ({select_sql}) WHERE true
+                ON CONFLICT(day, project) DO UPDATE SET {updates}
+            ''')
+        if commit:
+            self.conn.commit()
+        self.cursor.execute("SELECT COUNT(*) FROM daily_rollup")
+        return self.cursor.fetchone()[0]
+    
+    def verify_daily_rollup(self):
+        """校验每日汇总表与todos实际聚合是否一致，返回不一致的 [((日期, 项目), 汇总表行, 实际行)]"""
+        actual = {}
+        for names, select_sql in _daily_rollup_aggregate_sql():
+            self.cursor.execute(select_sql)
+            for row in self.cursor.fetchall():
+                values = actual.setdefault((row[0], row[1]), dict.fromkeys(DAILY_ROLLUP_COLUMNS, 0))
+                for name in names:
+                    values[name] += row[name]
+        
+        self.cursor.execute(f"SELECT day, project, {', '.join(DAILY_ROLLUP_COLUMNS)} FROM daily_rollup")
+        stored = {(row[0], row[1]): {name: row[name] for name in DAILY_ROLLUP_COLUMNS}
+                  for row in self.cursor.fetchall()}
+        
+        def normalize(values):
+            # 全零的行与不存在等价；周期天数为浮点累加，按小数位比较
+            if values is None or not any(values.values()):
+                return None
+            return tuple(round(values[name], 6) for name in DAILY_ROLLUP_COLUMNS)
+        
+        mismatches = []
+        for key in sorted(set(stored) | set(actual)):
+            if normalize(stored.get(key)) != normalize(actual.get(key)):
+                mismatches.append((key, normalize(stored.get(key)), normalize(actual.get(key))))
+        return mismatches
+    
+    def get_daily_trends(self, start_day, end_day, project=None):
+        """按天读取趋势数据（只查询每日汇总表），没有数据的日期补零
+        
+        返回每天的新建数、完成数、平均完成周期（天）和当天开始时的逾期积压数。
+        """
+        project_filter = "AND project = :project" if project else ""
+        self.cursor.execute(f'''
+            WITH RECURSIVE days(day) AS (
+                SELECT date(:start)
+                UNION ALL
+                SELECT date(day, '+1 day') FROM days WHERE day < date(:end)
+            ),
+            totals AS (
+                SELECT day, SUM(created) AS created, SUM(completed) AS completed,
+                       SUM(cycle_days) AS cycle_days, SUM(due) - SUM(due_resolved) AS overdue_delta
+                FROM daily_rollup
+                WHERE day BETWEEN date(:start) AND date(:end) {project_filter}
+                GROUP BY day
+            ),
+            base AS (
+                SELECT COALESCE(SUM(due) - SUM(due_resolved), 0) AS backlog
+                FROM daily_rollup WHERE day < date(:start) {project_filter}
+            )
+            SELECT days.day AS day,
+                   COALESCE(totals.created, 0) AS created,
+                   COALESCE(totals.completed, 0) AS completed,
+                   COALESCE(totals.cycle_days, 0) AS cycle_days,
+                   base.backlog + COALESCE(SUM(totals.overdue_delta) OVER (
+                       ORDER BY days.day ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                   ), 0) AS overdue
+            FROM days CROSS JOIN base LEFT JOIN totals ON totals.day = days.day
+            ORDER BY days.day
+        ''', {'start': start_day, 'end': end_day, 'project': project})
+        
+        trends = []
+        for row in self.cursor.fetchall():
+            completed = row['completed']
+            trends.append({
+                'day': row['day'],
+                'created': row['created'],
+                'completed': completed,
+                'cycle_days': row['cycle_days'],
+                'avg_cycle_days': row['cycle_days'] / completed if completed else None,
+                'overdue': row['overdue'],
+            })
+        return trends
+    
+    def get_weekly_trends(self, start_day, end_day, project=None):
+        """按周（周一开始）汇总趋势数据，逾期积压取每周第一天的值"""
+        weeks = []
+        for day in self.get_daily_trends(start_day, end_day, project):
+            day_date = datetime.strptime(day['day'], '%Y-%m-%d')
+            week_start = (day_date - timedelta(days=day_date.weekday())).strftime('%Y-%m-%d')
+            if not weeks or weeks[-1]['week'] != week_start:
+                weeks.append({'week': week_start, 'created': 0, 'completed': 0,
+                              'cycle_days': 0, 'overdue': day['overdue']})
+            week = weeks[-1]
+            week['created'] += day['created']
+            week['completed'] += day['completed']
+            week['cycle_days'] += day['cycle_days']
+        for week in weeks:
+            week['avg_cycle_days'] = week['cycle_days'] / week['completed'] if week['completed'] else None
+        return weeks
+    
+    def rebuild_project_stats(self, commit=True):
+        """从todos全量重建项目汇总表"""
+        names = ", ".join(name for name, _ in PROJECT_STATS_COLUMNS)
+        self.cursor.execute("DELETE FROM project_stats")
+        self.cursor.execute(f"INSERT INTO project_stats (project, {names}) {_project_stats_aggregate_sql()}")
+        if commit:
+            self.conn.commit()
+        return self.cursor.rowcount
+    
+    def verify_project_stats(self):
+        """校验项目汇总表与todos实际聚合是否一致，返回不一致的项目列表 [(项目, 汇总表行, 实际行)]"""
+        names = [name for name, _ in PROJECT_STATS_COLUMNS]
+        self.cursor.execute(f"SELECT project, {', '.join(names)} FROM project_stats")
+        stored = {row[0]: tuple(row[1:]) for row in self.cursor.fetchall()}
+        self.cursor.execute(_project_stats_aggregate_sql())
+        actual = {row[0]: tuple(row[1:]) for row in self.cursor.fetchall()}
+        
+        mismatches = []
+        for project in sorted(set(stored) | set(actual)):
+            if stored.get(project) != actual.get(project):
+                mismatches.append((project, stored.get(project), actual.get(project)))
+        return mismatches
+    
+    def get_project_stats(self, project=None):
+        """读取项目汇总：不传project时返回全部项目（按任务数降序），否则返回单个项目的行或None"""
+        if project is None:
+            query = query_builder.Query.select("project_stats").order_by("total DESC")
+            return self.execute_query(query).fetchall()
+        return self.execute_query(
+            query_builder.Query.select("project_stats").where_eq("project", project)
+        ).fetchone()
+    
     def add_todo(self, title, description, project, responsibility, priority, urgency, importance, 
                  gtd_tag, due_date, reminder_time):
         """添加新的待办事项"""
@@ -140,7 +615,8 @@ class DatabaseManager:
                 END,
                 priority ASC,
                 due_date ASC,
-                created_at DESC
+                created_at DESC,
+                id DESC
         ''')
         
         # 转换为字典列表以便于处理
@@ -154,8 +630,27 @@ class DatabaseManager:
         
         return todos
     
+    def get_pending_todos(self, limit=None):
+        """获取待处理的待办事项（按优先级、截止日期排序），limit限制返回条数"""
+        sql = '''
+            SELECT id, title, description, project, responsibility, priority, urgency, importance, 
+                   gtd_tag, due_date, reminder_time, status, created_at, completed_at
+            FROM todos 
+            WHERE status = 'pending'
+            ORDER BY priority ASC, due_date ASC
+        '''
+        if limit is not None:
+            self.cursor.execute(sql + ' LIMIT ?', (limit,))
+        else:
+            self.cursor.execute(sql)
+        
+        columns = [desc[0] for desc in self.cursor.description]
+        return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+    
     def get_todo_by_id(self, todo_id):
-        """根据ID获取待办事项"""
+        """根据ID获取待办事项（也接受尚未写入的重复实例ID）"""
+        if recurrence.is_occurrence_key(todo_id):
+            return self.get_occurrence(todo_id)
         self.cursor.execute('SELECT * FROM todos WHERE id = ?', (todo_id,))
         return self.cursor.fetchone()
     
@@ -164,7 +659,7 @@ class DatabaseManager:
         self.cursor.execute('''
             SELECT id, title, project, gtd_tag, priority, status FROM todos 
             WHERE due_date = ? 
-            ORDER BY priority, created_at
+            ORDER BY priority, created_at, id
         ''', (date_str,))
         return self.cursor.fetchall()
     
@@ -174,12 +669,13 @@ class DatabaseManager:
             SELECT id, title, project, due_date, status 
             FROM todos 
             WHERE priority = ? AND gtd_tag = ?
-            ORDER BY due_date ASC
+            ORDER BY due_date ASC, id
         ''', (priority, gtd_tag))
         return self.cursor.fetchall()
     
     def mark_todo_completed(self, todo_id):
         """标记待办事项为完成"""
+        todo_id = self.resolve_todo_id(todo_id)
         completed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         self.cursor.execute('''
             UPDATE todos SET status = 'completed', completed_at = ? WHERE id = ?
@@ -187,7 +683,9 @@ class DatabaseManager:
         self.conn.commit()
     
     def delete_todo(self, todo_id):
-        """删除待办事项"""
+        """删除待办事项；重复实例记入例外表，之后不再展开"""
+        if recurrence.is_occurrence_key(todo_id):
+            return self.delete_many([todo_id]) > 0
         try:
             self.cursor.execute('DELETE FROM todos WHERE id = ?', (todo_id,))
             self.conn.commit()
@@ -200,8 +698,8 @@ class DatabaseManager:
         """获取需要提醒的待办事项"""
         self.cursor.execute('''
             SELECT id, title, description FROM todos 
-            WHERE status = 'pending' AND reminder_time LIKE ?
-        ''', (f"{current_time}%",))
+            WHERE status = 'pending' AND reminder_minute = ?
+        ''', (date_index.to_minute(current_time),))
         return self.cursor.fetchall()
     
     def get_statistics(self):
@@ -239,27 +737,40 @@ class DatabaseManager:
     
     def get_project_statistics(self):
         """获取项目统计"""
+        # 直接读取触发器维护的项目汇总表
         self.cursor.execute('''
-            SELECT project, COUNT(*) as count FROM todos 
-            WHERE status = 'pending' AND project IS NOT NULL AND project != ''
-            GROUP BY project 
+            SELECT project, pending as count FROM project_stats 
+            WHERE pending > 0 AND project != ?
             ORDER BY count DESC
             LIMIT 10
-        ''')
+        ''', (UNCATEGORIZED_PROJECT,))
         return self.cursor.fetchall()
     
-    def get_upcoming_tasks(self, start_date, end_date):
-        """获取即将到期的任务"""
+    def get_upcoming_tasks(self, start_date, end_date, include_recurring=True):
+        """获取即将到期的任务：[(id, 标题, 项目, 截止日期, 截止天数)]，默认包含范围内的重复实例
+        
+        截止天数为 date_index 的整数日期，可直接交给 date_index.classify_due 计算剩余天数。
+        """
         self.cursor.execute('''
-            SELECT id, title, project, due_date FROM todos 
-            WHERE status = 'pending' AND due_date BETWEEN ? AND ?
-            ORDER BY due_date, priority
-        ''', (start_date, end_date))
-        return self.cursor.fetchall()
+            SELECT id, title, project, due_date, due_day FROM todos 
+            WHERE status = 'pending' AND due_day BETWEEN ? AND ?
+            ORDER BY due_day, priority, id
+        ''', (date_index.to_day(start_date), date_index.to_day(end_date)))
+        tasks = self.cursor.fetchall()
+        if include_recurring:
+            occurrences = self.get_occurrences(start_date, end_date)
+            if occurrences:
+                tasks = sorted(
+                    list(tasks) + [(item['id'], item['title'], item['project'], item['due_date'], item['due_day'])
+                                   for item in occurrences],
+                    key=lambda task: task[4]
+                )
+        return tasks
     
     def update_todo_status(self, todo_id, status):
         """更新待办事项状态"""
         try:
+            todo_id = self.resolve_todo_id(todo_id)
             if status == 'completed':
                 completed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 self.cursor.execute('''
@@ -276,8 +787,341 @@ class DatabaseManager:
             print(f"更新待办事项状态失败: {e}")
             return False
     
+    def resolve_todo_ids(self, todo_ids, commit=True):
+        """批量转换任务ID：重复实例一次性写入todos表，返回整数ID列表（无效的实例略去）"""
+        occurrences = [todo_id for todo_id in todo_ids if recurrence.is_occurrence_key(todo_id)]
+        materialized = self.materialize_occurrences(occurrences, commit=commit) if occurrences else {}
+        resolved = []
+        for todo_id in todo_ids:
+            if recurrence.is_occurrence_key(todo_id):
+                todo_id = materialized.get(todo_id)
+            if todo_id is not None:
+                resolved.append(int(todo_id))
+        return resolved
+    
+    def update_status_many(self, todo_ids, status):
+        """批量更新状态（一条语句，与写入重复实例在同一事务中），返回更新的行数"""
+        todo_ids = self.resolve_todo_ids(todo_ids, commit=False)
+        completed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S') if status == 'completed' else None
+        self.cursor.execute('''
+            UPDATE todos SET status = ?, completed_at = ?
+            WHERE id IN (SELECT value FROM json_each(?)) AND status != ?
+        ''', (status, completed_at, json.dumps(todo_ids), status))
+        self.conn.commit()
+        return self.cursor.rowcount
+    
+    def delete_many(self, todo_ids):
+        """批量删除（一条语句；重复实例记入例外表），返回处理的任务数"""
+        occurrences = [todo_id for todo_id in todo_ids if recurrence.is_occurrence_key(todo_id)]
+        materialized = self.get_materialized_ids(occurrences)
+        skipped = self.skip_occurrences([key for key in occurrences if key not in materialized], commit=False)
+        # 已写入todos的实例按任务删除，由触发器记入例外表
+        todo_ids = [int(todo_id) for todo_id in todo_ids if not recurrence.is_occurrence_key(todo_id)]
+        todo_ids += materialized.values()
+        self.cursor.execute(
+            'DELETE FROM todos WHERE id IN (SELECT value FROM json_each(?))', (json.dumps(todo_ids),)
+        )
+        self.conn.commit()
+        return self.cursor.rowcount + skipped
+    
+    def move_many(self, todo_ids, priority=None, gtd_tag=None, due_date=None):
+        """批量移动象限、改GTD标签或改期（一条语句，只修改给出的字段；与写入重复实例在同一事务中），返回更新的行数"""
+        assignments, params = [], []
+        if priority is not None:
+            importance, urgency = PRIORITY_FLAGS[priority]
+            assignments.append('priority = ?, importance = ?, urgency = ?')
+            params += [priority, importance, urgency]
+        if gtd_tag is not None:
+            assignments.append('gtd_tag = ?')
+            params.append(gtd_tag)
+        if due_date is not None:
+            assignments.append('due_date = ?')
+            params.append(due_date)
+        if not assignments:
+            return 0
+        
+        todo_ids = self.resolve_todo_ids(todo_ids, commit=False)
+        self.cursor.execute(f'''
+            UPDATE todos SET {', '.join(assignments)}
+            WHERE id IN (SELECT value FROM json_each(?))
+        ''', params + [json.dumps(todo_ids)])
+        self.conn.commit()
+        return self.cursor.rowcount
+    
+    def get_existing_todo_ids(self, todo_ids):
+        """一次查询给定ID中存在于todos表的部分，返回集合"""
+        self.cursor.execute(
+            'SELECT id FROM todos WHERE id IN (SELECT value FROM json_each(?))',
+            (json.dumps(list(todo_ids)),)
+        )
+        return {row[0] for row in self.cursor.fetchall()}
+    
+    def apply_todo_operations(self, operations):
+        """在一个事务中批量执行操作 [(操作, 任务ID, 修改字段)]，返回 {操作: 影响行数}
+        
+        操作需先经 ai_operations.normalize_operations 校验（修改字段名来自其白名单）。
+        
+        同类操作用 executemany 一次执行；修改操作按修改的字段分组。任一语句失败时整体回滚并抛出异常。
+        """
+        completed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        groups = {}
+        for op, todo_id, fields in operations:
+            if op == 'complete':
+                key = ('complete',)
+                params = (completed_at, todo_id)
+            elif op == 'delete':
+                key = ('delete',)
+                params = (todo_id,)
+            else:
+                if 'status' in fields:
+                    # 改为完成时记录完成时间，改回待处理时清除
+                    fields = dict(fields, completed_at=completed_at if fields['status'] == 'completed' else None)
+                if 'priority' in fields:
+                    # 重要性和紧急性随象限一起修改
+                    importance, urgency = PRIORITY_FLAGS[fields['priority']]
+                    fields = dict(fields, importance=importance, urgency=urgency)
+                names = tuple(sorted(fields))
+                key = ('update', names)
+                params = tuple(fields[name] for name in names) + (todo_id,)
+            groups.setdefault(key, []).append(params)
+        
+        counts = {}
+        try:
+            for key, rows in groups.items():
+                if key[0] == 'complete':
+                    sql = "UPDATE todos SET status = 'completed', completed_at = ? WHERE id = ? AND status != 'completed'"
+                elif key[0] == 'delete':
+                    sql = 'DELETE FROM todos WHERE id = ?'
+                else:
+                    sql = f"UPDATE todos SET {', '.join(f'{name} = ?' for name in key[1])} WHERE id = ?"
+                self.cursor.executemany(sql, rows)
+                counts[key[0]] = counts.get(key[0], 0) + self.cursor.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return counts
+    
+    def execute_query(self, query, params=()):
+        """执行参数化查询（Query对象或SQL文本），返回游标"""
+        return self.statement_cache.execute(self.cursor, query, params)
+    
+    def get_statement_cache_stats(self):
+        """获取预编译语句缓存的命中统计"""
+        return self.statement_cache.get_stats()
+    
+    def get_batch_writer(self):
+        """获取后台批量写入器（首次调用时创建）"""
+        if self.batch_writer is None:
+            self.batch_writer = BatchedWriter(self.db_name)
+        return self.batch_writer
+    
+    def add_project_record(self, project, kind, content, callback=None):
+        """追加项目记录（经批量写入器异步写入），返回记录时间"""
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.get_batch_writer().submit('''
+            INSERT INTO project_records (project, kind, content, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (project, kind, content, created_at), callback)
+        return created_at
+    
+    def get_project_records(self, project, kind, before=None, limit=20):
+        """按时间倒序分页读取项目记录
+        
+        before为上一页最后一条记录的 (created_at, id)，按键集分页，翻页代价与页码无关。
+        """
+        query = query_builder.Query.select(
+            "project_records", "id", "content", "created_at"
+        ).where_eq("project", project).where_eq("kind", kind)
+        if before is not None:
+            query.where("(created_at, id) < (?, ?)", *before)
+        query.order_by("created_at DESC", "id DESC").limit(limit)
+        return self.execute_query(query).fetchall()
+    
+    # AI调用统计
+    def record_ai_call(self, record, callback=None):
+        """保存一次AI调用的统计（经批量写入器异步写入），record见 ai_call_metrics.build_record"""
+        segment_sizes, segments_cached = ai_call_metrics.encode_segments(record)
+        self.get_batch_writer().submit('''
+            INSERT INTO ai_call_metrics (created_at, feature, endpoint, model, stream, success, error,
+                                         prompt_tokens, completion_tokens, cache_hit_tokens, prompt_chars,
+                                         segment_sizes, segments_cached, ttft_ms, total_ms, attempts, cost)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), record['feature'], record['endpoint'],
+              record['model'], int(record['stream']), int(record['success']), record['error'],
+              record['prompt_tokens'], record['completion_tokens'], record['cache_hit_tokens'],
+              record['prompt_chars'], segment_sizes, segments_cached, record['ttft_ms'],
+              record['total_ms'], record['attempts'], record.get('cost')), callback)
+    
+    def get_ai_call_summary(self, since=None):
+        """AI调用汇总：总计、按功能、按接口，以及各提示词片段的平均长度
+        
+        since为 'YYYY-MM-DD HH:MM:SS'，只统计此后的调用；None时统计全部。
+        """
+        where = "WHERE created_at >= :since" if since else ""
+        params = {'since': since}
+        self.cursor.execute(f'''
+            SELECT COUNT(*) AS calls, COALESCE(SUM(1 - success), 0) AS failures,
+                   SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,
+                   SUM(cache_hit_tokens) AS cache_hit_tokens, SUM(cost) AS cost
+            FROM ai_call_metrics {where}
+        ''', params)
+        total = self.cursor.fetchone()
+        
+        grouped = {}
+        for column in ('feature', 'endpoint'):
+            self.cursor.execute(f'''
+                SELECT {column}, COUNT(*) AS calls, SUM(1 - success) AS failures,
+                       AVG(prompt_tokens) AS avg_prompt_tokens, AVG(completion_tokens) AS avg_completion_tokens,
+                       AVG(ttft_ms) AS avg_ttft_ms, AVG(total_ms) AS avg_total_ms, SUM(cost) AS cost
+                FROM ai_call_metrics {where}
+                GROUP BY {column}
+                ORDER BY calls DESC
+            ''', params)
+            grouped[column] = self.cursor.fetchall()
+        
+        self.cursor.execute(f'''
+            SELECT segment.key AS name, AVG(segment.value) AS avg_size
+            FROM ai_call_metrics, json_each(ai_call_metrics.segment_sizes) AS segment
+            {where}
+            GROUP BY segment.key
+            ORDER BY avg_size DESC
+        ''', params)
+        segments = self.cursor.fetchall()
+        
+        return {'total': total, 'by_feature': grouped['feature'], 'by_endpoint': grouped['endpoint'],
+                'segments': segments}
+    
+    def export_ai_call_metrics(self, path, since=None):
+        """把AI调用统计导出为CSV（UTF-8 BOM，便于Excel打开），返回导出的行数"""
+        where = "WHERE created_at >= ?" if since else ""
+        self.cursor.execute(f'''
+            SELECT {", ".join(ai_call_metrics.CSV_COLUMNS)} FROM ai_call_metrics {where} ORDER BY id
+        ''', (since,) if since else ())
+        count = 0
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(ai_call_metrics.CSV_COLUMNS)
+            for row in self.cursor:
+                writer.writerow(tuple(row))
+                count += 1
+        return count
+    
+    # 重复任务
+    def add_recurring_task(self, title, description, project, responsibility, priority, urgency, importance,
+                           gtd_tag, rule, start_date, reminder_time=None):
+        """添加重复任务模板，返回模板ID；rule为规则文本或RecurrenceRule"""
+        if not isinstance(rule, recurrence.RecurrenceRule):
+            rule = recurrence.RecurrenceRule.parse(rule)
+        start = recurrence.parse_date(start_date).strftime('%Y-%m-%d')
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.execute('''
+            INSERT INTO recurring_tasks (title, description, project, responsibility, priority, urgency,
+                                         importance, gtd_tag, rule, start_date, reminder_time, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (title, description, project, responsibility, priority, urgency, importance, gtd_tag,
+              str(rule), start, reminder_time, created_at))
+        self.conn.commit()
+        return self.cursor.lastrowid
+    
+    def get_recurring_tasks(self, active_only=True):
+        """获取重复任务模板"""
+        sql = 'SELECT * FROM recurring_tasks'
+        if active_only:
+            sql += ' WHERE active = 1'
+        self.cursor.execute(sql + ' ORDER BY id')
+        return self.cursor.fetchall()
+    
+    def stop_recurring_task(self, recurrence_id):
+        """停止重复任务：不再展开新的实例，已写入的实例保留"""
+        self.cursor.execute('UPDATE recurring_tasks SET active = 0 WHERE id = ?', (recurrence_id,))
+        self.conn.commit()
+        return self.cursor.rowcount > 0
+    
+    def get_occurrences(self, start_date, end_date):
+        """展开日期范围内尚未写入todos表的重复实例"""
+        return recurrence.expand_occurrences(self.conn, start_date, end_date)
+    
+    def get_occurrence(self, key):
+        """获取单个尚未写入的重复实例，不存在或已写入时返回None"""
+        return self.find_occurrences([key]).get(key)
+    
+    def find_occurrences(self, keys):
+        """批量获取尚未写入的重复实例：{实例ID: 实例}；只展开一次，覆盖全部实例的日期范围"""
+        dates = [recurrence.parse_occurrence_key(key)[1] for key in keys]
+        if not dates:
+            return {}
+        wanted = set(keys)
+        return {item['id']: item for item in self.get_occurrences(min(dates), max(dates)) if item['id'] in wanted}
+    
+    def get_materialized_ids(self, keys):
+        """已写入todos表的重复实例：{实例ID: 任务ID}"""
+        pairs = [recurrence.parse_occurrence_key(key) for key in keys]
+        if not pairs:
+            return {}
+        self.cursor.execute('''
+            SELECT recurrence_id, occurrence_date, id FROM todos
+            WHERE (recurrence_id, occurrence_date) IN (
+                SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+            )
+        ''', (json.dumps(pairs),))
+        return {recurrence.occurrence_key(recurrence_id, occurrence_date): todo_id
+                for recurrence_id, occurrence_date, todo_id in self.cursor.fetchall()}
+    
+    def skip_occurrences(self, keys, commit=True):
+        """跳过尚未写入的重复实例（删除时调用）：记入例外表，之后不再展开，返回跳过的实例数"""
+        valid = list(self.find_occurrences(keys))
+        self.cursor.executemany('''
+            INSERT OR IGNORE INTO recurrence_exceptions (recurrence_id, occurrence_date) VALUES (?, ?)
+        ''', [recurrence.parse_occurrence_key(key) for key in valid])
+        if commit:
+            self.conn.commit()
+        return len(valid)
+    
+    def materialize_occurrence(self, key, status='pending'):
+        """把重复实例写入todos表（实例被完成或修改时调用），返回任务ID；实例无效时返回None"""
+        return self.materialize_occurrences([key], status).get(key)
+    
+    def materialize_occurrences(self, keys, status='pending', commit=True):
+        """批量把重复实例写入todos表（一次展开、一条executemany），返回 {实例ID: 任务ID}；无效的实例不在结果中
+        
+        commit为False时不提交，由调用方在同一事务中继续写入后提交。
+        """
+        materialized = self.get_materialized_ids(keys)
+        occurrences = self.find_occurrences([key for key in dict.fromkeys(keys) if key not in materialized])
+        if not occurrences:
+            return materialized
+        
+        fields = recurrence.TEMPLATE_FIELDS + ('due_date', 'reminder_time', 'recurrence_id', 'occurrence_date')
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.executemany(f'''
+            INSERT INTO todos ({", ".join(fields)}, status, created_at)
+            VALUES ({", ".join("?" for _ in range(len(fields) + 2))})
+        ''', [[occurrence[field] for field in fields] + [status, created_at] for occurrence in occurrences.values()])
+        if commit:
+            self.conn.commit()
+        materialized.update(self.get_materialized_ids(list(occurrences)))
+        return materialized
+    
+    def resolve_todo_id(self, todo_id):
+        """重复实例ID转换为todos表中的任务ID（必要时写入），普通ID原样返回"""
+        if recurrence.is_occurrence_key(todo_id):
+            return self.materialize_occurrence(todo_id)
+        return todo_id
+    
+    def get_data_version(self, group):
+        """获取某组数据的版本号：任何连接写入该组的表时由触发器递增，写入其他表不受影响"""
+        row = self.conn.execute('SELECT version FROM data_versions WHERE name = ?', (group,)).fetchone()
+        return row[0] if row else 0
+    
+    def get_schema_version(self):
+        """获取数据库模式版本（建表、改表后变化）"""
+        return self.conn.execute('PRAGMA schema_version').fetchone()[0]
+    
     def close(self):
         """关闭数据库连接"""
+        if self.batch_writer:
+            self.batch_writer.close()
         if self.conn:
             self.conn.close()
     
@@ -462,4 +1306,54 @@ class DatabaseManager:
         recent_conversations = self.get_recent_conversations(5)
         context['recent_context'] = [{"input": c[0], "action": c[2]} for c in recent_conversations]
         
-        return context 
\ No newline at end of file
+        return context
+
+
+perf_metrics.register_class(DatabaseManager, "db", exclude=(
+    "open_readonly", "init_database", "init_project_stats", "init_daily_rollup", "init_data_versions", "close"
+))
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="数据库维护工具")
+    parser.add_argument('db_path', nargs='?', default='./todo_database.db', help="数据库文件路径")
+    parser.add_argument('--rebuild-project-stats', action='store_true', help="从todos全量重建项目汇总表")
+    parser.add_argument('--verify-project-stats', action='store_true', help="校验项目汇总表与todos是否一致")
+    parser.add_argument('--rebuild-daily-rollup', action='store_true', help="从todos全量重建每日汇总表")
+    parser.add_argument('--verify-daily-rollup', action='store_true', help="校验每日汇总表与todos是否一致")
+    args = parser.parse_args()
+    
+    rebuilds = [
+        (args.rebuild_project_stats, lambda db: db.rebuild_project_stats(), "项目汇总表已重建，共 {} 个项目"),
+        (args.rebuild_daily_rollup, lambda db: db.rebuild_daily_rollup(), "每日汇总表已重建，共 {} 行"),
+    ]
+    checks = [
+        (args.verify_project_stats, lambda db: db.verify_project_stats(), "项目汇总表"),
+        (args.verify_daily_rollup, lambda db: db.verify_daily_rollup(), "每日汇总表"),
+    ]
+    # 未指定任何操作时校验全部汇总表
+    verify_all = not any(flag for flag, _, _ in rebuilds + checks)
+    
+    db = DatabaseManager(args.db_path)
+    failed = False
+    try:
+        for flag, rebuild, message in rebuilds:
+            if flag:
+                print(message.format(rebuild(db)))
+        for flag, verify, name in checks:
+            if not (flag or verify_all):
+                continue
+            mismatches = verify(db)
+            if mismatches:
+                failed = True
+                print(f"{name}有 {len(mismatches)} 处不一致:")
+                for key, stored, actual in mismatches:
+                    print(f"  {key}: 汇总表={stored} 实际={actual}")
+            else:
+                print(f"{name}校验通过")
+    finally:
+        db.close()
+    if failed:
+        raise SystemExit(1)
@@ -6,14 +6,17 @@ import threading
 import time
 import sqlite3
 from datetime import datetime
-from plyer import notification
+from notification_dispatcher import NotificationDispatcher, PlyerBackend
+import recurrence
+import date_index
 
 class ReminderService:
-    def __init__(self, database_manager):
-        """初始化提醒服务"""
+    def __init__(self, database_manager, dispatcher=None):
+        """初始化提醒服务，dispatcher为通知分发器（默认只发送系统通知）"""
         self.db_name = database_manager.db_name
         self.running = False
         self.reminder_thread = None
+        self.dispatcher = dispatcher or NotificationDispatcher([PlyerBackend()])
     
     def start_reminder_thread(self):
         """启动提醒线程"""
@@ -45,6 +48,11 @@ class ReminderService:
         """停止提醒线程"""
         self.running = False
     
+    def close(self):
+        """停止提醒线程并发出尚未发送的通知"""
+        self.stop_reminder_thread()
+        self.dispatcher.close()
+    
     def check_reminders(self, cursor):
         """检查并发送提醒"""
         now = datetime.now()
@@ -53,10 +61,13 @@ class ReminderService:
         # 查询需要提醒的待办事项
         cursor.execute('''
             SELECT id, title, description FROM todos 
-            WHERE status = 'pending' AND reminder_time LIKE ?
-        ''', (f"{current_time}%",))
+            WHERE status = 'pending' AND reminder_minute = ?
+        ''', (date_index.to_minute(now),))
         todos = cursor.fetchall()
         
+        # 重复任务只展开今天的实例
+        todos += recurrence.get_due_reminders(cursor.connection, current_time)
+        
         for todo in todos:
             todo_id, title, description = todo
             try:
@@ -65,15 +76,6 @@ class ReminderService:
                 print(f"发送通知失败: {e}")
     
     def send_notification(self, title, description):
-        """发送系统通知"""
-        try:
-            message = f"{description[:50]}..." if description and len(description) > 50 else (description or "")
-            notification.notify(
-                title=f"待办事项提醒: {title}",
-                message=message,
-                timeout=10
-            )
-        except Exception as e:
-            print(f"通知发送失败: {e}")
-            # 如果系统通知失败，可以在这里添加其他提醒方式
-            pass 
\ No newline at end of file
+        """提交通知到分发器（不等待发送完成）"""
+        message = f"{description[:50]}..." if description and len(description) > 50 else (description or "")
+        self.dispatcher.notify(f"待办事项提醒: {title}", message)
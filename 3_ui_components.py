@@ -7,12 +7,22 @@ from tkinter import ttk, messagebox, BOTH, LEFT, RIGHT, X, Y, W, E, N, S
 import ttkbootstrap as ttk_bs
 from ttkbootstrap.constants import *
 from datetime import datetime, timedelta
+import recurrence
+import task_store as task_store_module
+import title_trie
 
 class UIComponents:
-    def __init__(self, database_manager, role_manager=None):
-        """初始化UI组件"""
+    def __init__(self, database_manager, role_manager=None, task_store=None, data_loader=None):
+        """初始化UI组件，task_store为共享的任务内存存储（待办事项的修改经它直写数据库）
+        
+        data_loader: 后台数据读取器，标题补全索引在后台建立；为None时首次输入时同步建立
+        """
         self.db_manager = database_manager
         self.role_manager = role_manager
+        self.task_store = task_store or task_store_module.TaskStore(database_manager)
+        self.data_loader = data_loader
+        self.title_trie = None
+        self._title_trie_loading = False
         self.priority_names = {1: "重要且紧急", 2: "重要不紧急", 3: "不重要但紧急", 4: "不重要不紧急"}
         self.gtd_names = {
             "next-action": "下一步行动",
@@ -66,6 +76,17 @@ class UIComponents:
         title_entry.pack(fill=X, pady=(2, 0))
         add_frame.title_entry = title_entry
         
+        # 选中的补全候选来自模板时记录模板名，添加时更新模板使用次数
+        add_frame.selected_template = None
+        save_template_var = tk.BooleanVar(value=False)
+        add_frame.save_template_var = save_template_var
+        ttk_bs.Checkbutton(
+            title_frame,
+            text="保存为模板（输入标题时带出项目、优先级和GTD标签）",
+            variable=save_template_var,
+            bootstyle="secondary"
+        ).pack(anchor=W, pady=(2, 0))
+        
         # 项目输入
         project_frame = ttk_bs.Frame(add_frame)
         project_frame.pack(fill=X, pady=(0, 8))
@@ -224,6 +245,21 @@ class UIComponents:
         due_date_entry.pack(fill=X, pady=(2, 0))
         add_frame.due_date_entry = due_date_entry
         
+        # 重复设置：选择后保存为重复任务模板，以截止日期为起始日
+        repeat_frame = ttk_bs.Frame(add_frame)
+        repeat_frame.pack(fill=X, pady=(0, 8))
+        
+        ttk_bs.Label(repeat_frame, text="重复:", font=("Microsoft YaHei", 10)).pack(side=LEFT)
+        repeat_combo = ttk_bs.Combobox(
+            repeat_frame,
+            values=list(recurrence.RULE_PRESETS),
+            state="readonly",
+            width=12
+        )
+        repeat_combo.set("不重复")
+        repeat_combo.pack(side=LEFT, padx=(5, 0))
+        add_frame.repeat_combo = repeat_combo
+        
         # 提醒设置
         reminder_frame = ttk_bs.LabelFrame(add_frame, text="提醒设置", padding=3)
         reminder_frame.pack(fill=X, pady=(0, 8))
@@ -279,8 +315,141 @@ class UIComponents:
         )
         tip_label.pack(pady=(10, 0))
         
+        # 标题输入时的自动补全（需在项目、优先级、GTD标签控件创建之后）
+        self.attach_title_autocomplete(add_frame)
+        
         return add_frame
     
+    def get_title_trie(self):
+        """标题补全索引；尚未建立时开始建立（有后台读取器时在后台建立，建好之前返回None）"""
+        if self.title_trie is not None or self._title_trie_loading:
+            return self.title_trie
+        if self.data_loader is None:
+            self.title_trie = title_trie.load_trie(self.db_manager)
+            return self.title_trie
+        
+        def on_loaded(trie):
+            self.title_trie = trie
+            self._title_trie_loading = False
+        
+        def on_error(error):
+            self._title_trie_loading = False
+            print(f"建立标题补全索引失败: {error}")
+        
+        self._title_trie_loading = True
+        self.data_loader.submit("title_trie.load", title_trie.load_trie, on_loaded, on_error)
+        return None
+    
+    def attach_title_autocomplete(self, add_frame):
+        """为添加面板的标题输入框加上补全下拉列表：方向键下移入列表，回车或单击选中，Esc关闭"""
+        title_entry = add_frame.title_entry
+        listbox = tk.Listbox(add_frame, height=6, font=("Microsoft YaHei", 9), activestyle="dotbox")
+        state = {'suggestions': [], 'pending': None}
+        
+        def hide(event=None):
+            state['suggestions'] = []
+            listbox.place_forget()
+        
+        def refresh():
+            state['pending'] = None
+            trie = self.get_title_trie()
+            text = title_entry.get()
+            suggestions = trie.suggest(text) if trie is not None and text.strip() else []
+            # 只剩与输入完全相同的一项时不再提示
+            if len(suggestions) == 1 and suggestions[0].title == text.strip():
+                suggestions = []
+            if not suggestions:
+                hide()
+                return
+            state['suggestions'] = suggestions
+            listbox.delete(0, tk.END)
+            for suggestion in suggestions:
+                listbox.insert(tk.END, f"{suggestion.title}  · 模板" if suggestion.template else suggestion.title)
+            listbox.configure(height=len(suggestions))
+            # 覆盖在输入框下方的控件之上，不改变面板布局
+            listbox.place(in_=title_entry, relx=0, rely=1, relwidth=1)
+            listbox.lift()
+        
+        def on_key(event):
+            if event.keysym in ("Down", "Up", "Return", "Escape", "Tab"):
+                return
+            # 选中模板后又修改了标题，不再算作使用该模板
+            add_frame.selected_template = None
+            # 连续输入时合并为一次查询
+            if state['pending'] is not None:
+                title_entry.after_cancel(state['pending'])
+            state['pending'] = title_entry.after(60, refresh)
+        
+        def focus_list(event):
+            if state['suggestions']:
+                listbox.focus_set()
+                listbox.selection_clear(0, tk.END)
+                listbox.selection_set(0)
+                listbox.activate(0)
+                return "break"
+        
+        def choose(event=None):
+            selection = listbox.curselection()
+            if selection and state['suggestions']:
+                self.apply_title_suggestion(add_frame, state['suggestions'][selection[0]])
+            hide()
+            title_entry.focus_set()
+            title_entry.icursor(tk.END)
+            return "break"
+        
+        def close_unless_focused():
+            try:
+                focused = title_entry.focus_get()
+            except KeyError:
+                focused = None
+            if focused not in (title_entry, listbox):
+                hide()
+        
+        def on_focus_out(event):
+            # 点击列表时输入框先失去焦点，稍后再判断是否关闭
+            title_entry.after(150, close_unless_focused)
+        
+        title_entry.bind("<KeyRelease>", on_key, add="+")
+        title_entry.bind("<Down>", focus_list, add="+")
+        title_entry.bind("<Escape>", hide, add="+")
+        title_entry.bind("<FocusIn>", lambda event: self.get_title_trie(), add="+")
+        title_entry.bind("<FocusOut>", on_focus_out, add="+")
+        listbox.bind("<Return>", choose)
+        listbox.bind("<ButtonRelease-1>", choose)
+        listbox.bind("<Escape>", lambda event: (hide(), title_entry.focus_set()))
+        listbox.bind("<FocusOut>", on_focus_out)
+        add_frame.title_listbox = listbox
+    
+    def apply_title_suggestion(self, add_frame, suggestion):
+        """填入选中的标题，并按模板（或最近一条同名任务）预填项目、优先级和GTD标签"""
+        add_frame.title_entry.delete(0, tk.END)
+        add_frame.title_entry.insert(0, suggestion.title)
+        add_frame.selected_template = suggestion.template
+        
+        if suggestion.project:
+            project_names = {project_id: name for name, project_id in add_frame.project_combo.project_mapping.items()}
+            project_name = project_names.get(suggestion.project)
+            if project_name:
+                add_frame.project_combo.set(project_name)
+        if suggestion.priority in (1, 2, 3, 4):
+            add_frame.priority_var.set(suggestion.priority)
+        if suggestion.gtd_tag in self.gtd_names:
+            add_frame.gtd_var.set(suggestion.gtd_tag)
+    
+    def record_title_use(self, title, project, priority, gtd_tag, template=None, save_template=False):
+        """添加任务后更新模板使用统计和补全索引；save_template时以标题为名保存模板（已存在时只计使用）"""
+        try:
+            if save_template and template is None:
+                template = title
+                if not any(row[0] == title for row in self.db_manager.get_task_templates()):
+                    self.db_manager.save_task_template(template, title, project, priority, gtd_tag)
+            if template is not None:
+                self.db_manager.update_template_usage(template)
+            if self.title_trie is not None:
+                self.title_trie.add(title, project=project, priority=priority, gtd_tag=gtd_tag, template=template)
+        except Exception as e:
+            print(f"更新标题补全失败: {e}")
+    
     def handle_add_todo(self, add_frame, on_add_callback):
         """处理添加待办事项"""
         title = add_frame.title_entry.get().strip()
@@ -328,18 +497,36 @@ class UIComponents:
         else:  # 不重要不紧急
             importance, urgency = 0, 0
         
+        repeat_rule = recurrence.RULE_PRESETS.get(add_frame.repeat_combo.get())
+        
         try:
-            # 添加到数据库
-            todo_id = self.db_manager.add_todo(
-                title, description, project_id, responsibility_id, priority, urgency, importance, 
-                gtd_tag, due_date, reminder_time
-            )
+            if repeat_rule:
+                # 重复任务只保存模板，各次实例在视图需要时按日期范围展开
+                self.db_manager.add_recurring_task(
+                    title, description, project_id, responsibility_id, priority, urgency, importance,
+                    gtd_tag, repeat_rule, due_date, f"{reminder_hour}:{reminder_minute}"
+                )
+                add_frame.repeat_combo.set("不重复")
+            else:
+                # 写入数据库并加入任务存储
+                todo_id = self.task_store.add_todo(
+                    title, description, project_id, responsibility_id, priority, urgency, importance,
+                    gtd_tag, due_date, reminder_time
+                )
+            
+            # 更新补全索引和模板使用统计
+            self.record_title_use(title, project_id, priority, gtd_tag, add_frame.selected_template,
+                                  add_frame.save_template_var.get())
+            add_frame.selected_template = None
+            add_frame.save_template_var.set(False)
             
             # 显示成功消息
-            messagebox.showinfo("成功", f"待办事项添加成功！\n标题: {title}\n项目: {project_name}\n责任级别: {responsibility_name}")
+            repeat_text = f"\n重复: {recurrence.RecurrenceRule.parse(repeat_rule).describe()}" if repeat_rule else ""
+            messagebox.showinfo("成功", f"待办事项添加成功！\n标题: {title}\n项目: {project_name}\n责任级别: {responsibility_name}{repeat_text}")
             
             # 清空输入框但保持默认选择
             add_frame.title_entry.delete(0, tk.END)
+            add_frame.title_listbox.place_forget()
             add_frame.desc_text.delete("1.0", tk.END)
             
             # 重置为默认值
@@ -381,9 +568,12 @@ class UIComponents:
         detail_window.transient(parent)
         detail_window.grab_set()
         
-        # 解包待办事项数据
-        (id_, title, description, project, priority, urgency, importance, gtd_tag, 
-         due_date, reminder_time, status, created_at, completed_at) = todo
+        # 按列名读取待办事项数据（重复实例为字典，尚未写入数据库）
+        title, description, project = todo['title'], todo['description'], todo['project']
+        priority, gtd_tag, status = todo['priority'], todo['gtd_tag'], todo['status']
+        due_date, reminder_time, created_at = todo['due_date'], todo['reminder_time'], todo['created_at']
+        if recurrence.is_occurrence_key(todo_id):
+            created_at = "重复任务（完成或删除后记录）"
         
         # 创建详情内容
         main_frame = ttk_bs.Frame(detail_window, padding=20)
@@ -449,7 +639,7 @@ class UIComponents:
     
     def mark_todo_completed(self, todo_id, window, on_update_callback):
         """标记待办事项为完成"""
-        self.db_manager.mark_todo_completed(todo_id)
+        self.task_store.mark_todo_completed(todo_id)
         window.destroy()
         messagebox.showinfo("成功", "待办事项已标记为完成！")
         if on_update_callback:
@@ -458,12 +648,101 @@ class UIComponents:
     def delete_todo(self, todo_id, window, on_update_callback):
         """删除待办事项"""
         if messagebox.askyesno("确认删除", "确定要删除这个待办事项吗？"):
-            self.db_manager.delete_todo(todo_id)
+            self.task_store.delete_todo(todo_id)
             window.destroy()
             messagebox.showinfo("成功", "待办事项已删除！")
             if on_update_callback:
                 on_update_callback()
     
+    def get_selected_todo_ids(self, tree):
+        """树形视图中所选行的任务ID（标签中的ID可能被Tk转成整数或字符串）"""
+        todo_ids = []
+        for item in tree.selection():
+            tags = tree.item(item, 'tags')
+            if not tags:
+                continue
+            todo_id = tags[0]
+            if isinstance(todo_id, str) and todo_id.isdigit():
+                todo_id = int(todo_id)
+            todo_ids.append(todo_id)
+        return todo_ids
+    
+    def show_bulk_menu(self, event, tree, on_changed):
+        """右键菜单：对所选任务批量完成、删除、移动象限、改GTD标签或改期"""
+        # 右键点在未选中的行上时改为选中该行
+        row = tree.identify_row(event.y)
+        if row and row not in tree.selection():
+            tree.selection_set(row)
+        todo_ids = self.get_selected_todo_ids(tree)
+        if not todo_ids:
+            return
+        
+        count = len(todo_ids)
+        menu = tk.Menu(tree, tearoff=0)
+        menu.add_command(label=f"完成所选 ({count})",
+                         command=lambda: self.bulk_action('complete', todo_ids, on_changed=on_changed))
+        menu.add_command(label=f"删除所选 ({count})",
+                         command=lambda: self.bulk_action('delete', todo_ids, on_changed=on_changed))
+        menu.add_separator()
+        
+        priority_menu = tk.Menu(menu, tearoff=0)
+        for priority, name in self.priority_names.items():
+            priority_menu.add_command(
+                label=name, command=lambda p=priority: self.bulk_action('priority', todo_ids, p, on_changed)
+            )
+        menu.add_cascade(label="移动到象限", menu=priority_menu)
+        
+        gtd_menu = tk.Menu(menu, tearoff=0)
+        for gtd_tag, name in self.gtd_names.items():
+            gtd_menu.add_command(
+                label=name, command=lambda g=gtd_tag: self.bulk_action('gtd_tag', todo_ids, g, on_changed)
+            )
+        menu.add_cascade(label="GTD标签", menu=gtd_menu)
+        
+        today = datetime.now().date()
+        due_menu = tk.Menu(menu, tearoff=0)
+        for label, days in (("今天", 0), ("明天", 1), ("下周", 7)):
+            due_date = (today + timedelta(days=days)).strftime('%Y-%m-%d')
+            due_menu.add_command(
+                label=f"{label} ({due_date})",
+                command=lambda d=due_date: self.bulk_action('due_date', todo_ids, d, on_changed)
+            )
+        menu.add_cascade(label="改期", menu=due_menu)
+        
+        try:
+            menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            menu.grab_release()
+    
+    def bulk_delete_selected(self, tree, on_changed):
+        """删除键：批量删除所选任务"""
+        todo_ids = self.get_selected_todo_ids(tree)
+        if todo_ids:
+            self.bulk_action('delete', todo_ids, on_changed=on_changed)
+    
+    def bulk_action(self, action, todo_ids, value=None, on_changed=None):
+        """对一组任务执行批量操作（每个操作一条语句），完成后调用一次on_changed(todo_ids)"""
+        if action == 'delete' and not messagebox.askyesno("确认删除", f"确定要删除所选的 {len(todo_ids)} 个待办事项吗？"):
+            return
+        
+        try:
+            if action == 'complete':
+                self.task_store.update_status_many(todo_ids, 'completed')
+            elif action == 'delete':
+                self.task_store.delete_many(todo_ids)
+            elif action in ('priority', 'gtd_tag', 'due_date'):
+                self.task_store.move_many(todo_ids, **{action: value})
+            else:
+                print(f"未知的批量操作: {action}")
+                return
+        except Exception as e:
+            print(f"批量操作失败: {e}")
+            messagebox.showerror("错误", f"批量操作失败: {e}")
+            return
+        
+        if on_changed:
+            on_changed(todo_ids)
+    
     def create_summary_panel(self, parent):
         """创建汇总面板"""
         # 创建水平布局的容器
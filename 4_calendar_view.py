@@ -8,11 +8,16 @@ import ttkbootstrap as ttk_bs
 from ttkbootstrap.constants import *
 from datetime import datetime, timedelta
 import calendar
+import perf_metrics
+import async_data
+import task_store as task_store_module
 
 class CalendarView:
-    def __init__(self, database_manager, ui_components):
-        """初始化日历视图"""
+    def __init__(self, database_manager, ui_components, data_loader=None, task_store=None):
+        """初始化日历视图，data_loader为后台数据读取器（默认同步读取），task_store为共享的任务内存存储"""
         self.db_manager = database_manager
+        self.data_loader = data_loader or async_data.InlineDataLoader(database_manager)
+        self.task_store = task_store or task_store_module.TaskStore(database_manager)
         self.ui_components = ui_components
         self.current_date = datetime.now()
         self.calendar_cells = {}
@@ -158,6 +163,18 @@ class CalendarView:
         else:
             last_day = first_day.replace(month=first_day.month+1) - timedelta(days=1)
         
+        # 普通任务来自任务存储；重复实例在后台展开，切换月份后旧月份的结果会被丢弃
+        first_str, last_str = first_day.strftime('%Y-%m-%d'), last_day.strftime('%Y-%m-%d')
+        self.data_loader.submit(
+            "calendar.month",
+            lambda db: db.get_occurrences(first_str, last_str),
+            lambda occurrences: self.render_month(
+                first_day, last_day, self.get_month_tasks(first_day, last_day, occurrences)
+            )
+        )
+    
+    def render_month(self, first_day, last_day, month_tasks):
+        """按读取到的当月任务绘制日历格子"""
         # 获取第一天是星期几（0=周一，6=周日）
         first_weekday = first_day.weekday()
         
@@ -187,7 +204,8 @@ class CalendarView:
                     cell_info['frame'].config(bootstyle="light")
                 
                 # 加载当天的任务
-                self.load_day_tasks(current_date, cell_info['tasks_frame'])
+                self.load_day_tasks(current_date, cell_info['tasks_frame'],
+                                    month_tasks.get(current_date.strftime('%Y-%m-%d'), []))
             
             # 移动到下一天
             current_date += timedelta(days=1)
@@ -196,12 +214,35 @@ class CalendarView:
                 day = 0
                 week += 1
     
-    def load_day_tasks(self, date, tasks_frame):
-        """加载指定日期的任务"""
+    def get_month_tasks(self, first_day, last_day, occurrences=None):
+        """获取一个月内每天的任务：{日期字符串: 任务列表}，occurrences为None时查询当月的重复实例"""
+        month_tasks = {}
+        current_date = first_day
+        while current_date <= last_day:
+            date_str = current_date.strftime('%Y-%m-%d')
+            month_tasks[date_str] = self.task_store.get_todos_by_date(date_str)
+            current_date += timedelta(days=1)
+        
+        # 重复任务只展开本月范围内的实例
+        if occurrences is None:
+            occurrences = self.db_manager.get_occurrences(first_day.strftime('%Y-%m-%d'), last_day.strftime('%Y-%m-%d'))
+        for occurrence in occurrences:
+            month_tasks.setdefault(occurrence['due_date'], []).append(self.occurrence_row(occurrence))
+        return month_tasks
+    
+    def occurrence_row(self, occurrence):
+        """重复实例转换为与 get_todos_by_date 相同格式的行"""
+        return (occurrence['id'], occurrence['title'], occurrence['project'], occurrence['gtd_tag'],
+                occurrence['priority'], occurrence['status'])
+    
+    def load_day_tasks(self, date, tasks_frame, tasks=None):
+        """加载指定日期的任务，tasks为None时从任务存储和重复实例读取"""
         date_str = date.strftime('%Y-%m-%d')
         
         # 查询当天的任务
-        tasks = self.db_manager.get_todos_by_date(date_str)
+        if tasks is None:
+            tasks = self.task_store.get_todos_by_date(date_str)
+            tasks += [self.occurrence_row(item) for item in self.db_manager.get_occurrences(date_str, date_str)]
         
         # 显示任务
         for i, (todo_id, title, project, gtd_tag, priority, status) in enumerate(tasks):
@@ -290,8 +331,9 @@ class CalendarView:
         tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
-        # 查询并显示任务
-        tasks = self.db_manager.get_todos_by_date(date_str)
+        # 查询并显示任务（含当天的重复实例）
+        tasks = self.task_store.get_todos_by_date(date_str)
+        tasks += [self.occurrence_row(item) for item in self.db_manager.get_occurrences(date_str, date_str)]
         
         priority_names = {1: "重要紧急", 2: "重要不紧急", 3: "不重要紧急", 4: "不重要不紧急"}
         gtd_names = {
@@ -329,4 +371,7 @@ class CalendarView:
             text="关闭",
             command=detail_window.destroy,
             bootstyle="secondary"
-        ).pack(pady=20) 
\ No newline at end of file
+        ).pack(pady=20)
+
+
+perf_metrics.register_class(CalendarView, "view.calendar", ["update_calendar", "render_month", "get_month_tasks"])
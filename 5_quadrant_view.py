@@ -6,13 +6,18 @@ import tkinter as tk
 from tkinter import ttk, messagebox, BOTH, LEFT, RIGHT, X, Y, W, E, N, S
 import ttkbootstrap as ttk_bs
 from ttkbootstrap.constants import *
+import perf_metrics
+import task_store as task_store_module
 
 class QuadrantView:
-    def __init__(self, database_manager, ui_components):
-        """初始化四象限视图"""
+    def __init__(self, database_manager, ui_components, task_store=None):
+        """初始化四象限视图，task_store为共享的任务内存存储（默认单独创建）"""
         self.db_manager = database_manager
+        self.task_store = task_store or task_store_module.TaskStore(database_manager)
         self.ui_components = ui_components
         self.integrated_trees = {}
+        # 批量操作后通知主窗口刷新其他依赖任务数据的面板（即将到期、汇总、日历）
+        self.on_tasks_changed = None
         
     def create_integrated_view_panel(self, parent):
         """创建右侧四象限+GTD整合视图面板"""
@@ -73,7 +78,8 @@ class QuadrantView:
                     gtd_frame,
                     columns=("status", "title", "project", "due_date"),
                     show="headings",
-                    height=8
+                    height=8,
+                    selectmode="extended"
                 )
                 
                 tree.heading("status", text="状态")
@@ -96,8 +102,15 @@ class QuadrantView:
                 # 绑定双击事件
                 tree.bind("<Double-1>", lambda e, t=tree: self.on_todo_double_click(e, t))
                 
+                # 多选后右键批量操作，删除键批量删除
+                tree_key = (priority, gtd_tag)
+                tree.bind("<Button-3>", lambda e, t=tree, k=tree_key: self.ui_components.show_bulk_menu(
+                    e, t, lambda todo_ids, k=k: self.update_quadrants(k, todo_ids)))
+                tree.bind("<Delete>", lambda e, t=tree, k=tree_key: self.ui_components.bulk_delete_selected(
+                    t, lambda todo_ids, k=k: self.update_quadrants(k, todo_ids)))
+                
                 # 存储树形视图引用
-                self.integrated_trees[(priority, gtd_tag)] = tree
+                self.integrated_trees[tree_key] = tree
         
         # 配置网格权重
         grid_frame.grid_columnconfigure(0, weight=1)
@@ -107,57 +120,85 @@ class QuadrantView:
         
         return view_frame
     
-    def refresh_integrated_view(self):
-        """刷新四象限+GTD整合视图"""
+    def build_integrated_rows(self, todos):
+        """按 (优先级, GTD标签) 分组整理显示行：{键: [(显示值, 标签)]}"""
+        rows = {}
+        for todo in todos:
+            try:
+                # 安全地从字典或任务记录中获取需要的字段
+                if isinstance(todo, (dict, task_store_module.TaskRecord)):
+                    todo_id = todo.get('id', '')
+                    title = todo.get('title', '')
+                    project = todo.get('project', '') or ''
+                    due_date = todo.get('due_date', '') or ''
+                    status = todo.get('status', '')
+                    priority = todo.get('priority', 4)
+                    gtd_tag = todo.get('gtd_tag', 'inbox')
+                else:
+                    # 如果是其他格式，跳过这个条目
+                    print(f"警告：数据格式不符合预期: {type(todo)}")
+                    continue
+                
+                # 显示状态图标
+                status_icon = "✓" if status == "completed" else "○"
+                rows.setdefault((priority, gtd_tag), []).append(
+                    ((status_icon, title, project, due_date), (todo_id,))
+                )
+                
+            except Exception as e:
+                print(f"处理待办事项时出错: {e}")
+                continue
+        return rows
+    
+    def refresh_integrated_view(self, todos=None):
+        """刷新四象限+GTD整合视图，todos为None时读取任务存储中的全部待办事项"""
+        if todos is None:
+            todos = self.task_store.get_all_todos()
+        self.render_integrated_view(todos)
+    
+    def render_integrated_view(self, todos):
+        """按待办事项列表重绘四象限+GTD整合视图"""
         try:
             # 清空所有树形视图
             for (priority, gtd_tag), tree in self.integrated_trees.items():
                 for item in tree.get_children():
                     tree.delete(item)
             
-            # 获取所有待办事项
-            todos = self.db_manager.get_all_todos()
-            
             # 按四象限和GTD标签分类显示
-            for todo in todos:
-                try:
-                    # 安全地从字典中获取需要的字段
-                    if isinstance(todo, dict):
-                        todo_id = todo.get('id', '')
-                        title = todo.get('title', '')
-                        project = todo.get('project', '') or ''
-                        due_date = todo.get('due_date', '') or ''
-                        status = todo.get('status', '')
-                        priority = todo.get('priority', 4)
-                        gtd_tag = todo.get('gtd_tag', 'inbox')
-                    else:
-                        # 如果是其他格式，跳过这个条目
-                        print(f"警告：数据格式不符合预期: {type(todo)}")
-                        continue
-                    
-                    # 确定树形视图
-                    tree_key = (priority, gtd_tag)
-                    if tree_key in self.integrated_trees:
-                        tree = self.integrated_trees[tree_key]
-                        
-                        # 显示状态图标
-                        status_icon = "✓" if status == "completed" else "○"
-                        
-                        # 插入项目
-                        tree.insert("", "end", values=(status_icon, title, project, due_date), tags=(todo_id,))
-                        
-                        # 设置已完成任务的样式
-                        if status == "completed":
-                            item = tree.get_children()[-1]
-                            tree.set(item, "status", "✓")
-                            
-                except Exception as e:
-                    print(f"处理待办事项时出错: {e}")
+            for tree_key, rows in self.build_integrated_rows(todos).items():
+                tree = self.integrated_trees.get(tree_key)
+                if tree is None:
                     continue
+                for values, tags in rows:
+                    tree.insert("", "end", values=values, tags=tags)
                     
         except Exception as e:
             print(f"刷新四象限视图时出错: {e}")
     
+    def update_quadrants(self, source_key, todo_ids):
+        """批量操作后的局部刷新：只重绘来源象限和这些任务现在所在的象限，再通知其他面板刷新"""
+        try:
+            keys = {source_key}
+            for todo_id in todo_ids:
+                record = self.task_store.get_todo(todo_id)
+                if record is not None:
+                    keys.add((record.priority, record.gtd_tag))
+            
+            for key in keys:
+                tree = self.integrated_trees.get(key)
+                if tree is None:
+                    continue
+                tree.delete(*tree.get_children())
+                rows = self.build_integrated_rows(self.task_store.get_quadrant_records(*key)).get(key, [])
+                for values, tags in rows:
+                    tree.insert("", "end", values=values, tags=tags)
+                    
+        except Exception as e:
+            print(f"局部刷新四象限视图时出错: {e}")
+        
+        if self.on_tasks_changed:
+            self.on_tasks_changed()
+    
     def on_todo_double_click(self, event, tree):
         """处理待办事项双击事件"""
         selection = tree.selection()
@@ -168,4 +209,7 @@ class QuadrantView:
         todo_id = item['tags'][0] if item['tags'] else None
         
         if todo_id:
-            self.ui_components.create_todo_detail_window(None, todo_id, self.refresh_integrated_view) 
\ No newline at end of file
+            self.ui_components.create_todo_detail_window(None, todo_id, self.refresh_integrated_view)
+
+
+perf_metrics.register_class(QuadrantView, "view.quadrant", ["refresh_integrated_view", "render_integrated_view", "build_integrated_rows", "update_quadrants"])
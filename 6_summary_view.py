@@ -7,15 +7,35 @@ from tkinter import ttk, messagebox, BOTH, LEFT, RIGHT, X, Y, W, E, N, S
 import ttkbootstrap as ttk_bs
 from ttkbootstrap.constants import *
 from datetime import datetime, timedelta
+import perf_metrics
+import async_data
+import date_index
+import task_store as task_store_module
+
+# 趋势分析范围：名称 -> (粒度, 数量)
+TREND_RANGES = {
+    "近7天": ("day", 7),
+    "近30天": ("day", 30),
+    "近12周": ("week", 12),
+    "近52周": ("week", 52),
+}
+ALL_PROJECTS = "全部项目"
 
 class SummaryView:
-    def __init__(self, database_manager, ui_components):
-        """初始化统计汇总视图"""
+    def __init__(self, database_manager, ui_components, data_loader=None, task_store=None):
+        """初始化统计汇总视图，data_loader为后台数据读取器（默认同步读取），task_store为共享的任务内存存储"""
         self.db_manager = database_manager
+        self.data_loader = data_loader or async_data.InlineDataLoader(database_manager)
+        self.task_store = task_store or task_store_module.TaskStore(database_manager)
         self.ui_components = ui_components
         self.full_summary_labels = {}
         self.project_stats_frame = None
         self.upcoming_tree = None
+        self.trend_tree = None
+        self.trend_summary_label = None
+        self.trend_range_var = None
+        self.trend_project_var = None
+        self.trend_project_combo = None
         
     def create_summary_tab(self, parent):
         """创建汇总标签页"""
@@ -171,7 +191,8 @@ class SummaryView:
             recent_frame,
             columns=("title", "project", "due_date", "days_left"),
             show="headings",
-            height=8
+            height=8,
+            selectmode="extended"
         )
         
         self.upcoming_tree.heading("title", text="标题")
@@ -193,10 +214,151 @@ class SummaryView:
         # 绑定双击事件
         self.upcoming_tree.bind("<Double-1>", lambda e: self.on_todo_double_click(e, self.upcoming_tree))
         
+        # 多选后右键批量操作，删除键批量删除；完成后只重绘即将到期列表
+        self.upcoming_tree.bind("<Button-3>", lambda e: self.ui_components.show_bulk_menu(
+            e, self.upcoming_tree, lambda todo_ids: self.refresh_upcoming_tasks()))
+        self.upcoming_tree.bind("<Delete>", lambda e: self.ui_components.bulk_delete_selected(
+            self.upcoming_tree, lambda todo_ids: self.refresh_upcoming_tasks()))
+        
+        # 趋势分析（读取每日汇总表）
+        self.create_trend_panel(scrollable_frame)
+        
         # 配置滚动
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
     
+    def create_trend_panel(self, parent):
+        """创建趋势分析面板"""
+        trend_frame = ttk_bs.LabelFrame(
+            parent, 
+            text="趋势分析", 
+            padding=20,
+            bootstyle="info"
+        )
+        trend_frame.pack(fill=X, padx=20, pady=(0, 20))
+        
+        # 范围和项目选择
+        control_frame = ttk_bs.Frame(trend_frame)
+        control_frame.pack(fill=X, pady=(0, 10))
+        
+        ttk_bs.Label(control_frame, text="范围:", font=("Microsoft YaHei", 10)).pack(side=LEFT)
+        self.trend_range_var = tk.StringVar(value="近30天")
+        range_combo = ttk_bs.Combobox(
+            control_frame,
+            textvariable=self.trend_range_var,
+            values=list(TREND_RANGES),
+            state="readonly",
+            width=8
+        )
+        range_combo.pack(side=LEFT, padx=(5, 15))
+        range_combo.bind("<<ComboboxSelected>>", lambda e: self.refresh_trends())
+        
+        ttk_bs.Label(control_frame, text="项目:", font=("Microsoft YaHei", 10)).pack(side=LEFT)
+        self.trend_project_var = tk.StringVar(value=ALL_PROJECTS)
+        self.trend_project_combo = ttk_bs.Combobox(
+            control_frame,
+            textvariable=self.trend_project_var,
+            values=[ALL_PROJECTS],
+            state="readonly",
+            width=15
+        )
+        self.trend_project_combo.pack(side=LEFT, padx=(5, 0))
+        self.trend_project_combo.bind("<<ComboboxSelected>>", lambda e: self.refresh_trends())
+        
+        self.trend_summary_label = ttk_bs.Label(
+            trend_frame,
+            text="",
+            font=("Microsoft YaHei", 11, "bold"),
+            bootstyle="info"
+        )
+        self.trend_summary_label.pack(anchor=W, pady=(0, 10))
+        
+        self.trend_tree = ttk_bs.Treeview(
+            trend_frame,
+            columns=("period", "created", "completed", "cycle", "overdue"),
+            show="headings",
+            height=8
+        )
+        
+        self.trend_tree.heading("period", text="日期")
+        self.trend_tree.heading("created", text="新建")
+        self.trend_tree.heading("completed", text="完成")
+        self.trend_tree.heading("cycle", text="平均周期(天)")
+        self.trend_tree.heading("overdue", text="逾期积压")
+        
+        self.trend_tree.column("period", width=110)
+        for column in ("created", "completed", "cycle", "overdue"):
+            self.trend_tree.column(column, width=90, anchor="center")
+        
+        scrollbar_trend = ttk_bs.Scrollbar(trend_frame, orient="vertical", command=self.trend_tree.yview)
+        self.trend_tree.configure(yscrollcommand=scrollbar_trend.set)
+        
+        self.trend_tree.pack(side="left", fill="both", expand=True)
+        scrollbar_trend.pack(side="right", fill="y")
+    
+    def get_trend_data(self, range_name, project=None, db=None):
+        """按范围读取趋势数据，返回 (周期名称, 行列表)，db默认为主数据库连接"""
+        db = db or self.db_manager
+        unit, count = TREND_RANGES.get(range_name, ("day", 30))
+        today = datetime.now().date()
+        if unit == "week":
+            start = today - timedelta(days=today.weekday() + 7 * (count - 1))
+            rows = db.get_weekly_trends(start.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d'), project)
+            return "week", rows
+        start = today - timedelta(days=count - 1)
+        rows = db.get_daily_trends(start.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d'), project)
+        return "day", rows
+    
+    def load_trends(self, db, range_name, project):
+        """读取项目选项和趋势数据；所选项目已不存在时改为全部项目"""
+        projects = [row['project'] for row in db.get_project_stats()]
+        if project != ALL_PROJECTS and project not in projects:
+            project = ALL_PROJECTS
+        unit, rows = self.get_trend_data(range_name, None if project == ALL_PROJECTS else project, db)
+        return projects, project, unit, rows
+    
+    def refresh_trends(self):
+        """刷新趋势分析"""
+        if not self.trend_tree:
+            return
+        
+        range_name = self.trend_range_var.get()
+        project = self.trend_project_var.get()
+        self.data_loader.submit(
+            "summary.trends",
+            lambda db: self.load_trends(db, range_name, project),
+            self.render_trends
+        )
+    
+    def render_trends(self, trend_data):
+        """显示趋势分析数据"""
+        projects, project, unit, rows = trend_data
+        
+        # 更新项目选项
+        self.trend_project_combo.configure(values=[ALL_PROJECTS] + projects)
+        if self.trend_project_var.get() != project:
+            self.trend_project_var.set(project)
+        
+        for item in self.trend_tree.get_children():
+            self.trend_tree.delete(item)
+        
+        self.trend_tree.heading("period", text="周起始" if unit == "week" else "日期")
+        # 最近的日期在最上面
+        for row in reversed(rows):
+            cycle = f"{row['avg_cycle_days']:.1f}" if row['avg_cycle_days'] is not None else "-"
+            self.trend_tree.insert("", "end", values=(
+                row[unit], row['created'], row['completed'], cycle, row['overdue']
+            ))
+        
+        created = sum(row['created'] for row in rows)
+        completed = sum(row['completed'] for row in rows)
+        cycle_days = sum(row['cycle_days'] for row in rows)
+        avg_cycle = f"{cycle_days / completed:.1f}天" if completed else "-"
+        current_overdue = rows[-1]['overdue'] if rows else 0
+        self.trend_summary_label.config(
+            text=f"新建 {created}  完成 {completed}  平均周期 {avg_cycle}  逾期积压 {current_overdue}"
+        )
+    
     def on_todo_double_click(self, event, tree):
         """处理待办事项双击事件"""
         selection = tree.selection()
@@ -209,10 +371,20 @@ class SummaryView:
         if todo_id:
             self.ui_components.create_todo_detail_window(None, todo_id, self.refresh_full_summary)
     
+    def load_full_summary(self, db):
+        """读取完整汇总所需的项目统计（待办事项统计和即将到期任务来自任务存储）"""
+        return {'projects': db.get_project_statistics()}
+    
     def refresh_full_summary(self):
         """刷新完整汇总信息"""
-        # 获取统计信息
-        stats = self.db_manager.get_statistics()
+        self.data_loader.submit("summary.full", self.load_full_summary, self.render_full_summary)
+        
+        # 刷新趋势分析
+        self.refresh_trends()
+    
+    def render_full_summary(self, data):
+        """显示完整汇总信息"""
+        stats = self.task_store.get_statistics()
         
         # 更新四象限统计
         quadrant_names = ["重要紧急", "重要不紧急", "不重要紧急", "不重要不紧急"]
@@ -237,13 +409,13 @@ class SummaryView:
         self.full_summary_labels["completed"].config(text=f"已完成: {completed}")
         
         # 刷新项目统计
-        self.refresh_project_stats()
+        self.refresh_project_stats(data['projects'])
         
         # 刷新即将到期任务
         self.refresh_upcoming_tasks()
     
-    def refresh_project_stats(self):
-        """刷新项目统计"""
+    def refresh_project_stats(self, projects=None):
+        """刷新项目统计，projects为None时查询数据库"""
         if not self.project_stats_frame:
             return
             
@@ -252,7 +424,8 @@ class SummaryView:
             widget.destroy()
         
         # 获取项目统计
-        projects = self.db_manager.get_project_statistics()
+        if projects is None:
+            projects = self.db_manager.get_project_statistics()
         
         if not projects:
             ttk_bs.Label(
@@ -283,8 +456,8 @@ class SummaryView:
                 bootstyle="info"
             ).pack(side=RIGHT)
     
-    def refresh_upcoming_tasks(self):
-        """刷新即将到期的任务"""
+    def refresh_upcoming_tasks(self, todos=None):
+        """刷新即将到期的任务，todos为None时从任务存储读取"""
         if not self.upcoming_tree:
             return
             
@@ -296,39 +469,40 @@ class SummaryView:
         today = datetime.now().date()
         week_later = today + timedelta(days=7)
         
-        todos = self.db_manager.get_upcoming_tasks(
-            today.strftime('%Y-%m-%d'), 
-            week_later.strftime('%Y-%m-%d')
-        )
+        if todos is None:
+            todos = self.task_store.get_upcoming_tasks(
+                today.strftime('%Y-%m-%d'), 
+                week_later.strftime('%Y-%m-%d')
+            )
         
-        for todo in todos:
-            todo_id, title, project, due_date_str = todo
-            try:
-                due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
-                days_left = (due_date - today).days
-                
-                if days_left < 0:
-                    days_text = f"已过期 {abs(days_left)} 天"
-                    tag = "overdue"
-                elif days_left == 0:
-                    days_text = "今天到期"
-                    tag = "today"
-                elif days_left <= 3:
-                    days_text = f"{days_left} 天"
-                    tag = "urgent"
-                else:
-                    days_text = f"{days_left} 天"
-                    tag = "normal"
-                
-                item = self.upcoming_tree.insert("", "end", values=(title, project or "无", due_date_str, days_text), tags=(todo_id,))
-                
-                # 根据紧急程度设置颜色
-                if tag == "overdue":
-                    self.upcoming_tree.set(item, "days_left", f"⚠️ {days_text}")
-                elif tag == "today":
-                    self.upcoming_tree.set(item, "days_left", f"🔥 {days_text}")
-                elif tag == "urgent":
-                    self.upcoming_tree.set(item, "days_left", f"⏰ {days_text}")
-                    
-            except:
-                continue 
\ No newline at end of file
+        # 剩余天数和到期分类按整数日期整批计算
+        due_classes = date_index.classify_due([todo[4] for todo in todos], today)
+        marks = {
+            date_index.DUE_OVERDUE: "⚠️ ",
+            date_index.DUE_TODAY: "🔥 ",
+            date_index.DUE_URGENT: "⏰ ",
+        }
+        for todo, (days_left, due_class) in zip(todos, due_classes):
+            todo_id, title, project, due_date_str, _ = todo
+            if due_class is None:
+                continue
+            
+            if due_class == date_index.DUE_OVERDUE:
+                days_text = f"已过期 {abs(days_left)} 天"
+            elif due_class == date_index.DUE_TODAY:
+                days_text = "今天到期"
+            else:
+                days_text = f"{days_left} 天"
+            
+            # 根据紧急程度加上标记
+            self.upcoming_tree.insert(
+                "", "end",
+                values=(title, project or "无", due_date_str, marks.get(due_class, "") + days_text),
+                tags=(todo_id,)
+            )
+
+
+perf_metrics.register_class(SummaryView, "view.summary", [
+    "refresh_full_summary", "refresh_project_stats", "refresh_upcoming_tasks", "refresh_trends",
+    "load_full_summary", "render_full_summary", "load_trends", "render_trends"
+])
@@ -7,11 +7,18 @@ from tkinter import ttk, messagebox, BOTH, LEFT, RIGHT, X, Y, W, E, N, S, TOP, B
 import ttkbootstrap as ttk_bs
 from ttkbootstrap.constants import *
 from datetime import datetime, timedelta
+from query_builder import Query
+import perf_metrics
+import async_data
+
+# 项目记录每页条数
+RECORDS_PAGE_SIZE = 20
 
 class ProjectView:
-    def __init__(self, database_manager, ui_components):
-        """初始化项目汇总视图"""
+    def __init__(self, database_manager, ui_components, data_loader=None):
+        """初始化项目汇总视图，data_loader为后台数据读取器（默认同步读取）"""
         self.db_manager = database_manager
+        self.data_loader = data_loader or async_data.InlineDataLoader(database_manager)
         self.ui_components = ui_components
         self.project_tree = None
         self.selected_project = None
@@ -22,6 +29,10 @@ class ProjectView:
         self.schedule_text = None
         self.summary_text = None
         
+        # 项目记录分页状态：类型 -> 已加载最后一条的 (created_at, id)
+        self.record_cursors = {}
+        self.load_more_buttons = {}
+        
     def create_project_tab(self, parent):
         """创建项目汇总标签页"""
         project_tab = ttk_bs.Frame(parent)
@@ -301,6 +312,13 @@ class ProjectView:
         )
         self.notes_text.pack(fill=X)
         
+        self.load_more_buttons["note"] = ttk_bs.Button(
+            notes_frame,
+            text="加载更多",
+            bootstyle="warning-link",
+            command=lambda: self.load_more_records("note")
+        )
+        
         # 3. 时间安排区域
         schedule_frame = ttk_bs.LabelFrame(
             scrollable_frame, 
@@ -340,6 +358,13 @@ class ProjectView:
         )
         self.schedule_text.pack(fill=X)
         
+        self.load_more_buttons["schedule"] = ttk_bs.Button(
+            schedule_frame,
+            text="加载更多",
+            bootstyle="info-link",
+            command=lambda: self.load_more_records("schedule")
+        )
+        
         # 4. 项目总结区域
         summary_frame = ttk_bs.LabelFrame(
             scrollable_frame, 
@@ -379,86 +404,68 @@ class ProjectView:
         )
         self.summary_text.pack(fill=X)
         
+        self.load_more_buttons["summary"] = ttk_bs.Button(
+            summary_frame,
+            text="加载更多",
+            bootstyle="primary-link",
+            command=lambda: self.load_more_records("summary")
+        )
+        
         # 配置滚动
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
     
-    def get_project_statistics(self):
-        """获取项目统计数据"""
-        filter_condition = ""
-        filter_value = self.filter_var.get() if self.filter_var else "全部项目"
+    def get_project_statistics(self, filter_value=None, db=None):
+        """获取项目统计数据（读取触发器维护的项目汇总表），db默认为主数据库连接"""
+        db = db or self.db_manager
+        if filter_value is None:
+            filter_value = self.filter_var.get() if self.filter_var else "全部项目"
+        
+        query = Query.select(
+            "project_stats",
+            "project as project_name",
+            "total as total_tasks",
+            "completed as completed_tasks",
+            "pending as pending_tasks"
+        )
         
         if filter_value == "活跃项目":
-            filter_condition = "HAVING pending_tasks > 0"
+            query.where("pending > 0")
         elif filter_value == "已完成项目":
-            filter_condition = "HAVING pending_tasks = 0 AND total_tasks > 0"
+            query.where("pending = 0").where("total > 0")
         elif filter_value == "待开始项目":
-            filter_condition = "HAVING total_tasks = 0"
-        
-        query = f'''
-            SELECT 
-                COALESCE(project, '未分类') as project_name,
-                COUNT(*) as total_tasks,
-                SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed_tasks,
-                SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END) as pending_tasks
-            FROM todos 
-            GROUP BY COALESCE(project, '未分类')
-            {filter_condition}
-            ORDER BY total_tasks DESC
-        '''
-        
-        self.db_manager.cursor.execute(query)
-        return self.db_manager.cursor.fetchall()
-    
-    def get_project_progress_data(self, project_name):
-        """获取项目进度数据"""
-        if project_name == "未分类":
-            base_query = "WHERE project IS NULL OR project = ''"
-        else:
-            base_query = f"WHERE project = '{project_name}'"
+            query.where("total = 0")
         
-        # 总体进度
-        self.db_manager.cursor.execute(f'''
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed
-            FROM todos {base_query}
-        ''')
-        total_data = self.db_manager.cursor.fetchone()
-        
-        # 重要任务进度 (priority 1, 2)
-        self.db_manager.cursor.execute(f'''
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed
-            FROM todos {base_query} AND priority IN (1, 2)
-        ''')
-        important_data = self.db_manager.cursor.fetchone()
-        
-        # 紧急任务进度 (priority 1, 3)
-        self.db_manager.cursor.execute(f'''
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed
-            FROM todos {base_query} AND priority IN (1, 3)
-        ''')
-        urgent_data = self.db_manager.cursor.fetchone()
+        query.order_by("total DESC")
+        return db.execute_query(query).fetchall()
+    
+    def get_project_progress_data(self, project_name, db=None):
+        """获取项目进度数据（项目汇总表中的一行），db默认为主数据库连接"""
+        stats = (db or self.db_manager).get_project_stats(project_name)
+        if stats is None:
+            return {'total': (0, 0), 'important': (0, 0), 'urgent': (0, 0)}
         
         return {
-            'total': total_data,
-            'important': important_data,
-            'urgent': urgent_data
+            'total': (stats['total'], stats['completed']),
+            'important': (stats['important_total'], stats['important_completed']),
+            'urgent': (stats['urgent_total'], stats['urgent_completed'])
         }
     
     def refresh_project_view(self):
-        """刷新项目视图"""
+        """刷新项目视图（项目统计在后台读取）"""
+        filter_value = self.filter_var.get() if self.filter_var else "全部项目"
+        self.data_loader.submit(
+            "project.list",
+            lambda db: self.get_project_statistics(filter_value, db),
+            self.render_project_view
+        )
+    
+    def render_project_view(self, project_stats):
+        """按项目统计重绘项目列表"""
         # 清空项目树
         for item in self.project_tree.get_children():
             self.project_tree.delete(item)
         
-        # 获取项目统计
-        project_stats = self.get_project_statistics()
-        
         total_projects = len(project_stats)
         active_projects = sum(1 for stats in project_stats if stats[3] > 0)
         
@@ -490,8 +497,9 @@ class ProjectView:
         self.project_tree.tag_configure("active", background="#fff3cd", foreground="#856404")
         self.project_tree.tag_configure("empty", background="#f8d7da", foreground="#721c24")
         
-        # 重置选中项目
+        # 重置选中项目，尚未返回的项目详情作废
         self.selected_project = None
+        self.data_loader.invalidate("project.details")
         self.selected_project_label.config(text="请选择一个项目")
         self.clear_project_details()
     
@@ -512,10 +520,25 @@ class ProjectView:
         self.load_project_details(project_name)
     
     def load_project_details(self, project_name):
-        """加载项目详情"""
+        """加载项目详情：进度和每类最新一页记录在后台读取，切换项目后旧结果被丢弃"""
+        for kind in self.get_record_text_widgets():
+            self.data_loader.invalidate(f"project.records.{kind}")
+        
+        def load(db):
+            records = {
+                kind: db.get_project_records(project_name, kind, limit=RECORDS_PAGE_SIZE)
+                for kind in self.get_record_text_widgets()
+            }
+            return self.get_project_progress_data(project_name, db), records
+        
+        self.data_loader.submit(
+            "project.details", load,
+            lambda data: self.render_project_details(project_name, *data)
+        )
+    
+    def render_project_details(self, project_name, progress_data, records):
+        """显示项目进度和项目记录"""
         # 更新进度条
-        progress_data = self.get_project_progress_data(project_name)
-        
         # 总体进度
         total, completed = progress_data['total']
         total_percent = (completed / total * 100) if total > 0 else 0
@@ -534,36 +557,64 @@ class ProjectView:
         self.progress_bars["urgent"]["value"] = urgent_percent
         self.progress_bars["urgent_label"].config(text=f"{urgent_percent:.1f}% ({urgent_completed}/{urgent_total})")
         
-        # 加载项目记录（注意事项、时间安排、总结）
-        self.load_project_records(project_name)
+        # 显示项目记录（注意事项、时间安排、总结）
+        self.record_cursors = {}
+        for kind, text_widget in self.get_record_text_widgets().items():
+            text_widget.delete(1.0, tk.END)
+            self.append_records(kind, records.get(kind, []))
+    
+    def get_record_text_widgets(self):
+        """项目记录类型与文本框的对应关系"""
+        return {
+            "note": self.notes_text,
+            "schedule": self.schedule_text,
+            "summary": self.summary_text
+        }
+    
+    def format_record(self, created_at, content):
+        """项目记录的显示文本"""
+        return f"[{created_at[:16]}] {content}\n"
     
-    def load_project_records(self, project_name):
-        """加载项目记录"""
-        # 这里可以从数据库加载项目的注意事项、时间安排和总结
-        # 暂时显示示例内容
+    def load_more_records(self, kind, project_name=None):
+        """在后台读取下一页（更早的）项目记录并追加到文本框末尾"""
+        project_name = project_name or self.selected_project
+        if not project_name:
+            return
         
-        # 清空文本框
-        self.notes_text.delete(1.0, tk.END)
-        self.schedule_text.delete(1.0, tk.END)
-        self.summary_text.delete(1.0, tk.END)
-        
-        # 示例内容
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
-        
-        self.notes_text.insert(tk.END, f"[{current_time}] 项目 '{project_name}' 的注意事项:\n")
-        self.notes_text.insert(tk.END, "• 关注重要任务的优先级\n")
-        self.notes_text.insert(tk.END, "• 及时跟进紧急任务的进展\n")
-        self.notes_text.insert(tk.END, "• 定期回顾项目整体进度\n\n")
-        
-        self.schedule_text.insert(tk.END, f"[{current_time}] 项目 '{project_name}' 的时间安排:\n")
-        self.schedule_text.insert(tk.END, "• 项目启动阶段已完成\n")
-        self.schedule_text.insert(tk.END, "• 当前处于执行阶段\n")
-        self.schedule_text.insert(tk.END, "• 预计完成时间待确定\n\n")
-        
-        self.summary_text.insert(tk.END, f"[{current_time}] 项目 '{project_name}' 的总结感受:\n")
-        self.summary_text.insert(tk.END, "• 项目进展顺利，团队配合良好\n")
-        self.summary_text.insert(tk.END, "• 需要加强时间管理和优先级控制\n")
-        self.summary_text.insert(tk.END, "• 持续关注项目质量和进度平衡\n\n")
+        before = self.record_cursors.get(kind)
+        self.data_loader.submit(
+            f"project.records.{kind}",
+            lambda db: db.get_project_records(project_name, kind, before=before, limit=RECORDS_PAGE_SIZE),
+            lambda records: self.append_records(kind, records)
+        )
+    
+    def append_records(self, kind, records):
+        """把一页项目记录追加到文本框末尾并更新分页状态"""
+        text_widget = self.get_record_text_widgets()[kind]
+        text_widget.insert(tk.END, "".join(
+            self.format_record(record['created_at'], record['content']) for record in records
+        ))
+        if records:
+            self.record_cursors[kind] = (records[-1]['created_at'], records[-1]['id'])
+        
+        # 不足一页说明已经到底
+        button = self.load_more_buttons.get(kind)
+        if button is not None:
+            if len(records) < RECORDS_PAGE_SIZE:
+                button.pack_forget()
+            else:
+                button.pack(anchor=E, pady=(5, 0))
+    
+    def save_project_record(self, kind, content):
+        """保存项目记录：立即显示在最上方，写入交给后台批量写入器"""
+        project_name = self.selected_project
+        
+        def on_saved(success, result):
+            if not success:
+                print(f"保存项目记录失败: {result}")
+        
+        created_at = self.db_manager.add_project_record(project_name, kind, content, on_saved)
+        self.get_record_text_widgets()[kind].insert(1.0, self.format_record(created_at, content))
     
     def clear_project_details(self):
         """清空项目详情"""
@@ -580,6 +631,10 @@ class ProjectView:
             self.schedule_text.delete(1.0, tk.END)
         if self.summary_text:
             self.summary_text.delete(1.0, tk.END)
+        
+        self.record_cursors = {}
+        for button in self.load_more_buttons.values():
+            button.pack_forget()
     
     def add_note(self):
         """添加注意事项"""
@@ -637,9 +692,7 @@ class ProjectView:
         def save_note():
             content = text_input.get(1.0, tk.END).strip()
             if content:
-                current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
-                note_text = f"[{current_time}] {content}\n"
-                self.notes_text.insert(tk.END, note_text)
+                self.save_project_record("note", content)
                 dialog.destroy()
                 messagebox.showinfo("成功", "注意事项已添加")
             else:
@@ -725,9 +778,7 @@ class ProjectView:
         def save_schedule():
             content = text_input.get(1.0, tk.END).strip()
             if content:
-                current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
-                schedule_text = f"[{current_time}] {content}\n"
-                self.schedule_text.insert(tk.END, schedule_text)
+                self.save_project_record("schedule", content)
                 dialog.destroy()
                 messagebox.showinfo("成功", "时间安排已添加")
             else:
@@ -813,9 +864,7 @@ class ProjectView:
         def save_summary():
             content = text_input.get(1.0, tk.END).strip()
             if content:
-                current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
-                summary_text = f"[{current_time}] {content}\n"
-                self.summary_text.insert(tk.END, summary_text)
+                self.save_project_record("summary", content)
                 dialog.destroy()
                 messagebox.showinfo("成功", "项目总结已添加")
             else:
@@ -843,4 +892,10 @@ class ProjectView:
         
         # 绑定回车键保存
         dialog.bind('<Return>', lambda e: save_summary())
-        dialog.bind('<Escape>', lambda e: cancel()) 
\ No newline at end of file
+        dialog.bind('<Escape>', lambda e: cancel())
+
+
+perf_metrics.register_class(ProjectView, "view.project", [
+    "refresh_project_view", "render_project_view", "load_project_details", "render_project_details",
+    "load_more_records", "append_records"
+])
@@ -6,62 +6,61 @@ import re
 import importlib
 from datetime import datetime
 
-# 动态导入拆分的模块
-try:
-    from ai_core import AICore
-    from task_parser import TaskParser
-    from ai_ui import AIUserInterface
-    from sql_handler import SQLHandler
-except ImportError:
-    # 如果直接导入失败，尝试动态导入
-    import importlib.util
-    
-    def load_module(module_name, file_path):
-        spec = importlib.util.spec_from_file_location(module_name, file_path)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        return module
-    
-    # 动态加载模块
-    ai_core_module = load_module("ai_core", "ai_core.py")
-    AICore = ai_core_module.AICore
-    
-    task_parser_module = load_module("task_parser", "task_parser.py")
-    TaskParser = task_parser_module.TaskParser
-    
-    ai_ui_module = load_module("ai_ui", "ai_ui.py")
-    AIUserInterface = ai_ui_module.AIUserInterface
-    
-    sql_handler_module = load_module("sql_handler", "sql_handler.py")
-    SQLHandler = sql_handler_module.SQLHandler
+import module_registry
+
+# 通过模块注册表加载拆分的模块，每个文件只执行一次
+AICore = module_registry.load_module("ai_core", "ai_core.py").AICore
+TaskParser = module_registry.load_module("task_parser", "task_parser.py").TaskParser
+AIUserInterface = module_registry.load_module("ai_ui", "ai_ui.py").AIUserInterface
+SQLHandler = module_registry.load_module("sql_handler", "sql_handler.py").SQLHandler
+AIRequestExecutor = module_registry.load_module("ai_executor", "ai_executor.py").AIRequestExecutor
+prompt_pipeline = module_registry.load_module("prompt_pipeline", "prompt_pipeline.py")
+ai_operations = module_registry.load_module("ai_operations", "ai_operations.py")
+import ai_call_metrics
 
 
 class AIAssistant:
     """AI助手主类 - 重构版"""
     
-    def __init__(self, database_manager, ui_components, config_manager=None, role_manager=None):
-        """初始化AI助手"""
+    def __init__(self, database_manager, ui_components, config_manager=None, role_manager=None,
+                 task_store=None, on_todos_changed=None):
+        """初始化AI助手
+        
+        task_store: 任务内存存储（批量操作经它直写数据库），on_todos_changed: 待办事项被修改后刷新界面的回调
+        """
         self.database_manager = database_manager
         self.ui_components = ui_components
         self.config_manager = config_manager
         self.role_manager = role_manager
+        self.task_store = task_store
+        self.on_todos_changed = on_todos_changed
         
         # 初始化各个模块
         self.ai_core = AICore(config_manager)
+        # 每次AI调用的token用量、耗时和费用写入 ai_call_metrics 表
+        self.ai_core.call_listener = self._record_call_metrics
         self.task_parser = TaskParser(role_manager)  # 传递角色管理器
         self.ui = AIUserInterface(self)
         
+        # AI请求执行器：固定工作线程 + 按会话排序的请求队列
+        max_workers = config_manager.get('ai_assistant.max_workers', 2) if config_manager else 2
+        request_deadline = config_manager.get('ai_assistant.request_deadline', 90) if config_manager else 90
+        self.request_executor = AIRequestExecutor(max_workers=max_workers, default_deadline=request_deadline)
+        
         # 初始化SQL处理器（如果启用MCP）
         self.sql_handler = None
         if config_manager and config_manager.is_mcp_enabled():
             # 传递数据库路径而不是database_manager对象
             db_path = config_manager.get_database_path()
-            self.sql_handler = SQLHandler(db_path)
+            self.sql_handler = SQLHandler(db_path, config_manager)
         
         # AI记忆相关属性
         self.current_session_id = self._generate_session_id()
         self.conversation_count = 0
         
+        # 提示词组装流水线：各片段按版本缓存，未变化的片段不重复构建
+        self.prompt_pipeline = self._create_prompt_pipeline()
+        
         # 构建系统提示词
         self.system_prompt = self._build_system_prompt()
 
@@ -74,11 +73,29 @@ class AIAssistant:
         """创建AI助手面板"""
         return self.ui.create_ai_panel(parent)
     
-    def process_user_input(self, user_input):
+    def submit_user_input(self, user_input, on_done=None):
+        """将用户输入提交到请求执行器，同一会话内按提交顺序处理"""
+        return self.request_executor.submit(
+            lambda token: self.process_user_input(user_input, cancel_token=token),
+            session_id=self.current_session_id,
+            on_done=on_done
+        )
+    
+    def cancel_requests(self):
+        """取消当前会话中正在执行和排队中的请求"""
+        return self.request_executor.cancel_session(self.current_session_id)
+    
+    def shutdown(self):
+        """关闭AI助手，取消所有未完成的请求"""
+        self.request_executor.shutdown()
+        if self.sql_handler:
+            self.sql_handler.close()
+    
+    def process_user_input(self, user_input, cancel_token=None):
         """处理用户输入的接口方法"""
-        return self.process_ai_response(user_input)
+        return self.process_ai_response(user_input, cancel_token)
     
-    def process_ai_response(self, user_input):
+    def process_ai_response(self, user_input, cancel_token=None):
         """处理AI响应的主要逻辑"""
         try:
             # 增加对话计数
@@ -93,20 +110,37 @@ class AIAssistant:
                     self._save_conversation(user_input, query_result, "sql_query")
                     return
         
-            # 获取待办事项上下文
-            todo_context = self.get_todo_context()
+            # 构建完整的系统提示词（基础、角色、待办事项、个性化信息）
+            prompt_segments = {}
+            full_system_prompt = self.prompt_pipeline.build(sizes=prompt_segments)
             
-            # 获取AI记忆上下文
-            memory_context = self._get_memory_context()
+            # 操作类型只取决于用户输入，先确定是否需要把回复流式显示到对话区
+            intent = self.detect_user_intent(user_input)
+            stream_state = {'message': None}
             
-            # 构建完整的系统提示词
-            full_system_prompt = f"{self.system_prompt}\n\n当前待办事项数据:\n{todo_context}\n\n用户个性化信息:\n{memory_context}"
+            def on_chunk(content):
+                # 收到首个分片时才创建消息，失败时不会留下空消息头
+                if stream_state['message'] is None:
+                    stream_state['message'] = self.ui.add_streaming_message("AI助手", "assistant")
+                self.ui.update_streaming_message(stream_state['message'], content)
             
-            # 调用AI API
-            success, ai_response = self.ai_core.call_deepseek_api(
-                user_input, 
-                full_system_prompt
-            )
+            # 流式调用AI API
+            try:
+                success, ai_response = self.ai_core.call_deepseek_api_stream(
+                    user_input,
+                    full_system_prompt,
+                    on_chunk=on_chunk if intent == "chat" else None,
+                    cancel_token=cancel_token,
+                    metadata={'feature': intent, 'segments': prompt_segments}
+                )
+            finally:
+                if stream_state['message'] is not None:
+                    self.ui.finish_streaming_message(stream_state['message'])
+            
+            # 已取消或超时的请求不再执行任何操作，也不写入对话记录
+            if cancel_token is not None and cancel_token.cancelled:
+                self.add_message("系统", ai_response, "warning")
+                return
             
             if success:
                 # 解析AI响应，确定操作类型
@@ -124,8 +158,9 @@ class AIAssistant:
                     # 保存对话历史
                     self._save_conversation(user_input, ai_response, action)
                 else:
-                    # 直接显示AI响应
-                    self.add_message("AI助手", ai_response, "assistant")
+                    # 回复已流式显示；没有任何分片（空回复）时补充显示
+                    if stream_state['message'] is None:
+                        self.add_message("AI助手", ai_response, "assistant")
                     # 保存对话历史
                     self._save_conversation(user_input, ai_response, "general")
             else:
@@ -171,7 +206,10 @@ class AIAssistant:
 
     def parse_ai_response(self, ai_response, user_input):
         """解析AI响应，确定操作类型"""
-        response_lower = ai_response.lower()
+        return self.detect_user_intent(user_input)
+    
+    def detect_user_intent(self, user_input):
+        """根据用户输入判断操作意图"""
         input_lower = user_input.lower()
         
         # 检测添加任务的意图
@@ -200,14 +238,50 @@ class AIAssistant:
         """显示操作确认"""
         self.ui.show_operation_confirmation(action, ai_response, user_input)
 
-    def execute_operation(self, action, user_input):
-        """执行操作"""
-        if action == "delete_task":
-            self.execute_delete_operation(user_input)
-        elif action == "complete_task":
-            self.execute_complete_operation(user_input)
-        elif action == "update_task":
-            self.execute_update_operation(user_input)
+    def execute_operation(self, action, user_input, ai_response=None):
+        """执行操作：优先使用AI回复中的操作列表，没有时按用户输入中的任务ID生成"""
+        try:
+            operations = ai_operations.parse_operations(ai_response)
+        except ai_operations.OperationError as e:
+            self.add_message("系统", f"AI返回的操作列表无效: {e}", "error")
+            return
+        
+        if operations is None:
+            if action == "update_task":
+                self.add_message("系统", "未找到可执行的修改操作，请说明要修改的任务ID和内容", "warning")
+                return
+            operations = ai_operations.operations_from_ids(action, self.task_parser.extract_task_ids(user_input))
+        
+        if not operations:
+            self.add_message("系统", "未找到要操作的任务ID", "warning")
+            return
+        
+        # 批量操作在主线程执行（与界面共用数据库连接和任务存储），完成后只刷新一次界面
+        self.ui.run_on_ui_thread(lambda: self.apply_operations(operations))
+    
+    def apply_operations(self, operations):
+        """校验任务ID后在一个事务中执行全部操作，返回 (是否成功, 各操作影响行数)"""
+        try:
+            existing = self.database_manager.get_existing_todo_ids([todo_id for _, todo_id, _ in operations])
+            valid = [operation for operation in operations if operation[1] in existing]
+            missing = sorted({todo_id for _, todo_id, _ in operations} - existing)
+            
+            counts = {}
+            if valid:
+                counts = (self.task_store or self.database_manager).apply_todo_operations(valid)
+            
+            self.add_message("系统", ai_operations.format_summary(counts, missing), "success" if counts else "warning")
+            if valid:
+                self.notify_todos_changed()
+            return True, counts
+        except Exception as e:
+            self.add_message("系统", f"批量操作失败，已全部撤销: {str(e)}", "error")
+            return False, {}
+    
+    def notify_todos_changed(self):
+        """待办事项被修改后刷新界面（在主线程中执行）"""
+        if self.on_todos_changed:
+            self.ui.run_on_ui_thread(self.on_todos_changed)
 
     def execute_add_operation(self, user_input):
         """执行添加任务操作"""
@@ -250,8 +324,7 @@ class AIAssistant:
                 if success:
                     self.add_message("系统", f"任务 '{task_info['title']}' 添加成功！", "success")
                     # 刷新UI
-                    if hasattr(self.ui_components, 'refresh_todo_list'):
-                        self.ui_components.refresh_todo_list()
+                    self.notify_todos_changed()
                 else:
                     self.add_message("系统", "添加任务失败", "error")
                 
@@ -292,10 +365,7 @@ class AIAssistant:
                 self.add_message("系统", confirmation_msg, "success")
                 
                 # 刷新UI
-                if hasattr(self.ui_components, 'refresh_todo_list'):
-                    self.ui_components.refresh_todo_list()
-                if hasattr(self.ui_components.main_app, 'refresh_all_views'):
-                    self.ui_components.main_app.refresh_all_views()
+                self.notify_todos_changed()
             else:
                 self.add_message("系统", "添加任务失败", "error")
                 
@@ -316,56 +386,6 @@ class AIAssistant:
         """重新解析任务"""
         self.add_message("系统", "任务解析已取消。请重新描述您的任务需求，我会重新为您解析。", "info")
 
-    def execute_delete_operation(self, user_input):
-        """执行删除操作"""
-        try:
-            # 提取任务ID
-            task_ids = self.task_parser.extract_task_ids(user_input)
-            
-            if task_ids:
-                for task_id in task_ids:
-                    success = self.database_manager.delete_todo(task_id)
-                    if success:
-                        self.add_message("系统", f"任务 {task_id} 删除成功", "success")
-                    else:
-                        self.add_message("系统", f"删除任务 {task_id} 失败", "error")
-                
-                # 刷新UI
-                if hasattr(self.ui_components, 'refresh_todo_list'):
-                    self.ui_components.refresh_todo_list()
-            else:
-                self.add_message("系统", "未找到要删除的任务ID", "warning")
-                
-        except Exception as e:
-            self.add_message("系统", f"删除任务时出错: {str(e)}", "error")
-
-    def execute_complete_operation(self, user_input):
-        """执行完成操作"""
-        try:
-            # 提取任务ID
-            task_ids = self.task_parser.extract_task_ids(user_input)
-            
-            if task_ids:
-                for task_id in task_ids:
-                    success = self.database_manager.update_todo_status(task_id, 'completed')
-                    if success:
-                        self.add_message("系统", f"任务 {task_id} 标记为已完成", "success")
-                    else:
-                        self.add_message("系统", f"完成任务 {task_id} 失败", "error")
-                
-                # 刷新UI
-                if hasattr(self.ui_components, 'refresh_todo_list'):
-                    self.ui_components.refresh_todo_list()
-            else:
-                self.add_message("系统", "未找到要完成的任务ID", "warning")
-                
-        except Exception as e:
-            self.add_message("系统", f"完成任务时出错: {str(e)}", "error")
-
-    def execute_update_operation(self, user_input):
-        """执行更新操作"""
-        self.add_message("系统", "任务更新功能正在开发中", "info")
-    
     def reunderstand_request(self, user_input):
         """重新理解请求"""
         self.add_message("系统", "操作已取消。请重新描述您的需求，我会重新为您分析。", "info")
@@ -399,11 +419,44 @@ class AIAssistant:
 
     def refresh_context(self):
         """刷新上下文"""
+        self.prompt_pipeline.invalidate()
         self.system_prompt = self._build_system_prompt()
 
+    def _create_prompt_pipeline(self):
+        """创建提示词流水线"""
+        pipeline = prompt_pipeline.PromptPipeline()
+        db = self.database_manager
+        
+        pipeline.add_segment("base", self._build_base_prompt)
+        # 角色片段随角色管理器实例和用户配置文件的修改时间失效
+        role_file_version = prompt_pipeline.file_mtime_version(
+            lambda: getattr(self.role_manager, 'config_file', None)
+        )
+        pipeline.add_segment(
+            "role", self._build_role_prompt,
+            version=lambda: (id(self.role_manager), role_file_version())
+        )
+        pipeline.add_segment(
+            "todos", self.get_todo_context,
+            version=lambda: db.get_data_version('todos'), header="当前待办事项数据:\n"
+        )
+        pipeline.add_segment(
+            "memory", self._get_memory_context,
+            version=lambda: db.get_data_version('memory'), header="用户个性化信息:\n"
+        )
+        return pipeline
+
+    def get_prompt_stats(self):
+        """获取提示词各片段的构建统计"""
+        return self.prompt_pipeline.get_stats()
+
     def _build_system_prompt(self):
-        """构建系统提示词"""
-        base_prompt = """你是一个专业的待办事项AI助手，具有记忆和学习能力。
+        """构建系统提示词（基础部分+角色部分）"""
+        return self.prompt_pipeline.build(("base", "role"))
+
+    def _build_base_prompt(self):
+        """构建基础提示词"""
+        return """你是一个专业的待办事项AI助手，具有记忆和学习能力。
 
 核心能力：
 1. 智能理解用户的待办事项需求
@@ -418,6 +471,8 @@ class AIAssistant:
 - 完成任务：标记任务状态为完成
 - 查询任务：提供筛选和统计信息
 
+""" + ai_operations.PROMPT_FORMAT + """
+
 优先级分类（重要性+紧急性四象限）：
 1. 重要且紧急 - 立即处理
 2. 重要不紧急 - 计划处理  
@@ -448,25 +503,24 @@ GTD标签含义：
 - 基于历史互动模式调整回复风格
 - 主动关联相关的历史任务或项目"""
 
+    def _build_role_prompt(self):
+        """构建角色相关的提示词"""
         # 如果有角色管理器，添加角色相关的提示
         if self.role_manager:
             try:
                 current_role = self.role_manager.get_current_role()
                 if current_role:
-                    role_prompt = f"""
-
-当前用户角色设定：{current_role['name']}
+                    return f"""当前用户角色设定：{current_role['name']}
 角色描述：{current_role['description']}
 工作重点：{current_role['work_focus']}
 沟通风格：{current_role['communication_style']}
 时间偏好：{current_role['time_preference']}
 
 请根据用户的角色特点提供更适合的建议和服务。"""
-                    base_prompt += role_prompt
             except:
                 pass
         
-        return base_prompt
+        return ""
 
     def _get_memory_context(self):
         """获取AI记忆上下文"""
@@ -517,6 +571,18 @@ GTD标签含义：
         except Exception as e:
             print(f"保存对话历史失败: {e}")
 
+    def _record_call_metrics(self, record):
+        """估算费用并经批量写入器保存一次AI调用的统计（在请求线程中调用）"""
+        pricing = self.config_manager.get('ai_assistant.pricing', None) if self.config_manager else None
+        record['cost'] = ai_call_metrics.estimate_cost(
+            record['model'], record['prompt_tokens'], record['completion_tokens'],
+            record['cache_hit_tokens'], pricing
+        )
+        try:
+            self.database_manager.record_ai_call(record)
+        except Exception as e:
+            print(f"保存AI调用统计失败: {e}")
+
     def _classify_conversation_type(self, user_input, action_taken):
         """分类对话类型"""
         if action_taken in ['add_task', 'delete_task', 'complete_task', 'update_task']:
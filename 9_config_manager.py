@@ -2,9 +2,13 @@
 配置管理器模块
 负责应用程序配置的读取、写入和管理
 """
+import atexit
+import copy
 import json
 import os
 import shutil
+import tempfile
+import threading
 from datetime import datetime
 from pathlib import Path
 import tkinter as tk
@@ -21,7 +25,9 @@ class ConfigManager:
                 "path": "./todo_database.db",
                 "backup_path": "./backups/",
                 "auto_backup": True,
-                "backup_interval_hours": 24
+                "backup_interval_hours": 24,
+                "statement_cache_size": 128,
+                "reader_threads": 2
             },
             "ai_assistant": {
                 "api_key": "your_api_key_here",
@@ -29,7 +35,22 @@ class ConfigManager:
                 "model": "deepseek-chat",
                 "temperature": 0.7,
                 "max_tokens": 1000,
-                "offline_mode": True
+                "offline_mode": True,
+                "max_workers": 2,
+                "request_deadline": 90,
+                # 接口池：[{"name", "api_url", "model", "api_key"}]，按顺序使用并互相对冲；为空时只使用 api_url
+                "endpoints": [],
+                "endpoint_pool": {
+                    "hedge": True,
+                    "hedge_percentile": 95,
+                    "hedge_min_delay": 1.0,
+                    "hedge_max_delay": 15.0,
+                    "hedge_initial_delay": 5.0,
+                    "failure_threshold": 3,
+                    "reset_timeout": 30.0
+                },
+                # 每百万token价格（元），用于AI调用统计中的费用估算；为空时使用内置的DeepSeek价格
+                "pricing": {}
             },
             "ui": {
                 "theme": "default",
@@ -51,27 +72,67 @@ class ConfigManager:
                         "describe_table",
                         "append_insight"
                     ]
+                },
+                "sandbox": {
+                    "timeout": 2.0,
+                    "max_rows": 200,
+                    "max_bytes": 262144,
+                    "scan_row_threshold": 50000
                 }
             },
+            "notifications": {
+                # 默认只用系统通知；可加入 "toast"（应用内提示）、"log"（日志文件）
+                "backends": ["plyer"],
+                "rate_limit_per_minute": 6,
+                "digest_window": 2.0,
+                "digest_threshold": 3,
+                "log_path": "./notifications.log"
+            },
+            "performance": {
+                "enabled": False,
+                "buffer_size": 1024,
+                "watchdog_enabled": True,
+                "stall_threshold_ms": 500,
+                "stall_log": "ui_stalls.jsonl"
+            },
             "first_run": True,
             "version": "1.0.0"
         }
+        
+        # 点分隔路径的编译缓存：key_path -> 键元组
+        self._key_paths = {}
+        
+        # 写入合并：set只标记脏数据，后台定时器延迟落盘
+        self.flush_delay = 0.5
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._pending = {}
+        self._flush_timer = None
+        
+        # 热重载：按文件修改时间检测外部修改
+        self._listeners = []
+        self._file_signature = None
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
+        
         self.load_config()
+        atexit.register(self.close)
     
     def load_config(self):
         """加载配置文件"""
         try:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r', encoding='utf-8') as f:
-                    self.config = json.load(f)
+                    user_config = json.load(f)
                 # 合并默认配置，确保所有必要的键都存在
-                self.config = self._merge_config(self.default_config, self.config)
+                self.config = self._merge_config(copy.deepcopy(self.default_config), user_config)
+                self._file_signature = self._get_file_signature()
             else:
-                self.config = self.default_config.copy()
-                self.save_config()
+                self.config = copy.deepcopy(self.default_config)
+                self.flush()
         except Exception as e:
             print(f"加载配置文件失败: {e}")
-            self.config = self.default_config.copy()
+            self.config = copy.deepcopy(self.default_config)
     
     def _merge_config(self, default, user):
         """递归合并配置，确保所有默认键都存在"""
@@ -84,19 +145,63 @@ class ConfigManager:
         return result
     
     def save_config(self):
-        """保存配置文件"""
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            print(f"保存配置文件失败: {e}")
+        """保存配置文件（延迟合并写入，多次调用只落盘一次）"""
+        with self._lock:
+            self._dirty = True
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def flush(self):
+        """立即将配置写入文件：先写临时文件再原子替换，写入中途崩溃不会截断原文件"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            data = json.dumps(self.config, indent=4, ensure_ascii=False)
+            
+            config_dir = os.path.dirname(os.path.abspath(self.config_file))
+            try:
+                fd, temp_path = tempfile.mkstemp(prefix=".config_", suffix=".tmp", dir=config_dir)
+                try:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    # mkstemp创建的文件权限为0600，替换前恢复原文件的权限
+                    os.chmod(temp_path, self._get_file_mode())
+                    os.replace(temp_path, self.config_file)
+                except Exception:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+                self._dirty = False
+                self._pending = {}
+                # 记录自身写入后的文件状态，热重载时不会把它当作外部修改
+                self._file_signature = self._get_file_signature()
+            except Exception as e:
+                print(f"保存配置文件失败: {e}")
+    
+    def close(self):
+        """停止文件监视并写出未保存的修改"""
+        self.stop_watching()
+        if self._dirty:
+            self.flush()
+    
+    def _compile_key_path(self, key_path):
+        """将点分隔路径编译为键元组并缓存"""
+        keys = self._key_paths.get(key_path)
+        if keys is None:
+            keys = tuple(key_path.split('.'))
+            self._key_paths[key_path] = keys
+        return keys
     
     def get(self, key_path, default=None):
         """获取配置值，支持点分隔的路径"""
-        keys = key_path.split('.')
         value = self.config
         try:
-            for key in keys:
+            for key in self._compile_key_path(key_path):
                 value = value[key]
             return value
         except (KeyError, TypeError):
@@ -104,14 +209,130 @@ class ConfigManager:
     
     def set(self, key_path, value):
         """设置配置值，支持点分隔的路径"""
-        keys = key_path.split('.')
-        config = self.config
-        for key in keys[:-1]:
-            if key not in config:
-                config[key] = {}
-            config = config[key]
-        config[keys[-1]] = value
+        keys = self._compile_key_path(key_path)
+        with self._lock:
+            config = self.config
+            for key in keys[:-1]:
+                if key not in config:
+                    config[key] = {}
+                config = config[key]
+            old_value = config.get(keys[-1])
+            config[keys[-1]] = value
+            self._pending[key_path] = value
         self.save_config()
+        
+        if old_value != value:
+            self._notify_listeners([(key_path, old_value, value)])
+    
+    def add_listener(self, callback, prefix=None):
+        """注册配置变更回调 callback(key_path, old_value, new_value)
+
+        prefix不为空时只接收该路径（含子路径）下的变更。
+        回调可能在后台线程中执行，更新界面时需自行调度到主线程。
+        """
+        self._listeners.append((prefix, callback))
+    
+    def remove_listener(self, callback):
+        """移除配置变更回调"""
+        self._listeners = [(p, cb) for p, cb in self._listeners if cb != callback]
+    
+    def _notify_listeners(self, changes):
+        """通知变更回调"""
+        for key_path, old_value, new_value in changes:
+            for prefix, callback in list(self._listeners):
+                if prefix and key_path != prefix and not key_path.startswith(prefix + '.'):
+                    continue
+                try:
+                    callback(key_path, old_value, new_value)
+                except Exception as e:
+                    print(f"配置变更回调出错: {e}")
+    
+    def _diff_config(self, old, new, prefix=""):
+        """比较两份配置，返回 [(key_path, 旧值, 新值)]"""
+        changes = []
+        for key in set(old) | set(new):
+            path = f"{prefix}.{key}" if prefix else key
+            old_value = old.get(key)
+            new_value = new.get(key)
+            if isinstance(old_value, dict) and isinstance(new_value, dict):
+                changes.extend(self._diff_config(old_value, new_value, path))
+            elif old_value != new_value:
+                changes.append((path, old_value, new_value))
+        return changes
+    
+    def _get_file_mode(self):
+        """配置文件原有的权限位；文件不存在时按umask计算新建文件的默认权限"""
+        try:
+            return os.stat(self.config_file).st_mode & 0o7777
+        except OSError:
+            umask = os.umask(0)
+            os.umask(umask)
+            return 0o666 & ~umask
+    
+    def _get_file_signature(self):
+        """配置文件的修改时间和大小，文件不存在时返回None"""
+        try:
+            stat = os.stat(self.config_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+    
+    def start_watching(self, interval=1.0):
+        """启动后台线程监视配置文件，外部修改后自动重新加载"""
+        if self._watch_thread and self._watch_thread.is_alive():
+            return
+        self._watch_stop.clear()
+        
+        def watch():
+            while not self._watch_stop.wait(interval):
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    print(f"检查配置文件变更失败: {e}")
+        
+        self._watch_thread = threading.Thread(target=watch, name="config-watcher", daemon=True)
+        self._watch_thread.start()
+    
+    def stop_watching(self):
+        """停止配置文件监视"""
+        self._watch_stop.set()
+    
+    def reload_if_changed(self):
+        """配置文件被外部修改时重新加载并通知回调，返回是否重新加载"""
+        signature = self._get_file_signature()
+        if signature is None or signature == self._file_signature:
+            return False
+        
+        with self._lock:
+            try:
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    user_config = json.load(f)
+            except (OSError, ValueError) as e:
+                # 文件可能正在被编辑，保留当前配置，下次再试
+                print(f"重新加载配置文件失败: {e}")
+                return False
+            
+            old_config = self.config
+            new_config = self._merge_config(copy.deepcopy(self.default_config), user_config)
+            self.config = new_config
+            self._file_signature = signature
+            
+            # 尚未落盘的本地修改优先
+            pending = self._pending
+            self._pending = {}
+            for key_path, value in pending.items():
+                keys = self._compile_key_path(key_path)
+                config = self.config
+                for key in keys[:-1]:
+                    config = config.setdefault(key, {})
+                config[keys[-1]] = value
+                self._pending[key_path] = value
+            
+            changes = self._diff_config(old_config, self.config)
+        
+        if changes:
+            self._notify_listeners(changes)
+        return True
     
     def is_first_run(self):
         """检查是否是首次运行"""
@@ -152,6 +373,10 @@ class ConfigManager:
             if not os.path.exists(backup_dir):
                 os.makedirs(backup_dir)
             
+            # 先写出未保存的修改
+            if self._dirty:
+                self.flush()
+            
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_file = f"{backup_dir}/config_backup_{timestamp}.json"
             shutil.copy2(self.config_file, backup_file)
@@ -5,51 +5,28 @@ AI助手模块 - 重构版
 import re
 import importlib
 from datetime import datetime
+import module_registry
 
-# 动态导入拆分的模块
-try:
-    from ai_core import AICore
-    from task_parser import TaskParser
-    from ai_ui import AIUserInterface
-    from sql_handler import SQLHandler
-    # No need for DatabaseManager import as SQLHandler is now self-contained with db_name
-except ImportError:
-    # 如果直接导入失败，尝试动态导入
-    import importlib.util
-    
-    def load_module(module_name, file_path):
-        spec = importlib.util.spec_from_file_location(module_name, file_path)
-        if spec is None:
-            print(f"Error: Could not find spec for module {module_name} at {file_path}")
-            return None
-        module = importlib.util.module_from_spec(spec)
-        try:
-            spec.loader.exec_module(module)
-        except FileNotFoundError:
-            print(f"Error: File not found for module {module_name} at {file_path}")
-            return None
-        except Exception as e:
-            print(f"Error executing module {module_name}: {e}")
-            return None
-        return module
-    
-    # 动态加载模块
-    ai_core_module = load_module("ai_core", "ai_core.py")
-    AICore = ai_core_module.AICore if ai_core_module else None
-    
-    task_parser_module = load_module("task_parser", "task_parser.py")
-    TaskParser = task_parser_module.TaskParser if task_parser_module else None
-    
-    ai_ui_module = load_module("ai_ui", "ai_ui.py")
-    AIUserInterface = ai_ui_module.AIUserInterface if ai_ui_module else None
-    
-    sql_handler_module = load_module("sql_handler", "sql_handler.py")
-    SQLHandler = sql_handler_module.SQLHandler if sql_handler_module else None
+# 通过模块注册表加载拆分的模块，每个文件只执行一次
+def _load_class(module_name, class_name):
+    """加载模块中的类，失败时返回None"""
+    try:
+        return getattr(module_registry.load_module(module_name, f"{module_name}.py"), class_name)
+    except Exception as e:
+        print(f"Error loading module {module_name}: {e}")
+        return None
 
-    if not all([AICore, TaskParser, AIUserInterface, SQLHandler]):
-        print("FATAL: One or more core modules could not be loaded. Exiting.")
-        # In a real app, you might exit or raise an exception here
-        # For now, we'll let it proceed and potentially fail later if modules are None
+AICore = _load_class("ai_core", "AICore")
+TaskParser = _load_class("task_parser", "TaskParser")
+AIUserInterface = _load_class("ai_ui", "AIUserInterface")
+SQLHandler = _load_class("sql_handler", "SQLHandler")
+AIRequestExecutor = _load_class("ai_executor", "AIRequestExecutor")
+PromptPipeline = _load_class("prompt_pipeline", "PromptPipeline")
+
+if not all([AICore, TaskParser, AIUserInterface, SQLHandler, AIRequestExecutor, PromptPipeline]):
+    print("FATAL: One or more core modules could not be loaded. Exiting.")
+    # In a real app, you might exit or raise an exception here
+    # For now, we'll let it proceed and potentially fail later if modules are None
 
 class AIAssistant:
     """AI助手主类 - 集成SQL和UI"""
@@ -72,11 +49,25 @@ class AIAssistant:
             self.task_parser = None
         
         if SQLHandler:
-            self.sql_handler = SQLHandler(db_name=db_name) 
+            self.sql_handler = SQLHandler(db_name=db_name, config_manager=config_manager)
         else:
             print("Warning: SQLHandler not loaded, database interaction will fail.")
             self.sql_handler = None
             
+        # AI请求执行器：固定工作线程 + 按会话排序的请求队列
+        max_workers = config_manager.get('ai_assistant.max_workers', 2) if config_manager else 2
+        request_deadline = config_manager.get('ai_assistant.request_deadline', 90) if config_manager else 90
+        self.request_executor = AIRequestExecutor(max_workers=max_workers, default_deadline=request_deadline)
+        self.current_session_id = "default"
+            
+        # 提示词流水线：数据库指南片段只在数据库模式变化时重新生成
+        self.prompt_pipeline = PromptPipeline(separator="\n")
+        self.prompt_pipeline.add_segment("base", self._build_base_prompt)
+        self.prompt_pipeline.add_segment(
+            "schema", self._build_schema_prompt,
+            version=lambda: self.sql_handler.get_schema_version() if self.sql_handler else None
+        )
+
         # 构建系统提示词 - 之后会修改以包含DB schema
         self.system_prompt = self._build_system_prompt() 
 
@@ -89,7 +80,25 @@ class AIAssistant:
         
         self.ai_window = None # For tracking the AI assistant window instance, if UI uses it
 
-    def process_user_input(self, user_input):
+    def submit_user_input(self, user_input, on_done=None):
+        """将用户输入提交到请求执行器，同一会话内按提交顺序处理"""
+        return self.request_executor.submit(
+            lambda token: self.process_user_input(user_input, cancel_token=token),
+            session_id=self.current_session_id,
+            on_done=on_done
+        )
+
+    def cancel_requests(self):
+        """取消当前会话中正在执行和排队中的请求"""
+        return self.request_executor.cancel_session(self.current_session_id)
+
+    def shutdown(self):
+        """关闭AI助手，取消所有未完成的请求"""
+        self.request_executor.shutdown()
+        if self.sql_handler:
+            self.sql_handler.close()
+
+    def process_user_input(self, user_input, cancel_token=None):
         """处理用户输入并获取AI响应 (待后续扩展SQL和UI交互)"""
         # This method will be significantly expanded later
         # For now, keep it simple to ensure basic AI call works
@@ -100,13 +109,20 @@ class AIAssistant:
             return message
 
         try:
-            full_system_prompt = self.system_prompt 
+            full_system_prompt = self._build_system_prompt()
             
             success, ai_response_content = self.ai_core.call_deepseek_api(
                 user_input, 
-                full_system_prompt
+                full_system_prompt,
+                cancel_token=cancel_token
             )
             
+            # 已取消或超时的请求不再执行SQL
+            if cancel_token is not None and cancel_token.cancelled:
+                if self.ui: self.ui.add_message("系统", ai_response_content, "warning")
+                else: print(ai_response_content)
+                return ai_response_content
+            
             if success:
                 # 检查AI的响应是否包含 EXECUTE_SQL: 指令
                 sql_command_match = re.search(r"`EXECUTE_SQL:\s*(.+?)`", ai_response_content, re.IGNORECASE)
@@ -116,12 +132,8 @@ class AIAssistant:
                     if self.ui: self.ui.add_message("系统", f"AI建议执行SQL: {sql_to_execute}", "info")
                     else: print(f"AI建议执行SQL: {sql_to_execute}")
                     
-                    # 根据SQL类型调用不同的执行方法
-                    # (这是一个简化的判断，更复杂的场景可能需要更完善的SQL解析)
-                    if sql_to_execute.upper().startswith(("SELECT", "PRAGMA")):
-                        sql_success, result = self.sql_handler.execute_sql_query(sql_to_execute)
-                    else:
-                        sql_success, result = self.sql_handler.execute_write_query(sql_to_execute)
+                    # AI生成的SQL经沙箱执行：读走只读连接，写走串行事务通道
+                    sql_success, result = self.sql_handler.execute_ai_sql(sql_to_execute)
                     
                     if sql_success:
                         # 对结果进行格式化，使其更易读
@@ -152,13 +164,21 @@ class AIAssistant:
             return error_msg
 
     def _build_system_prompt(self):
-        """构建系统提示词 (后续会加入DB schema)"""
-        prompt_parts = [
+        """构建系统提示词（包含DB schema，按模式版本缓存）"""
+        self.system_prompt = self.prompt_pipeline.build()
+        return self.system_prompt
+
+    def _build_base_prompt(self):
+        """构建基础提示词"""
+        return "\n".join([
             "你是一个智能助手，可以帮助管理待办事项并与数据库交互。",
             "请直接与用户友好交互。",
             "如果用户只是聊天，请进行友好回应."
-        ]
-        
+        ])
+
+    def _build_schema_prompt(self):
+        """构建数据库交互指南"""
+        prompt_parts = []
         if self.sql_handler:
             mcp_prompt = self.sql_handler.get_mcp_schema_prompt()
             if mcp_prompt:
@@ -196,6 +216,8 @@ class AIAssistant:
                 formatted_lines.append("-" * (sum(len(str(h)) for h in headers) + 3 * (len(headers) -1)) ) # Separator line
                 for row_dict in result:
                     formatted_lines.append(" | ".join(str(row_dict.get(h, '')) for h in headers))
+                if getattr(result, 'truncated', False):
+                    formatted_lines.append(f"（{result.reason}）")
                 return "\n".join(formatted_lines)
             else: # 如果不是字典列表，就简单地逐行打印
                 for item in result:
@@ -226,7 +248,7 @@ if __name__ == '__main__':
     class DummyAICore:
         def __init__(self, config_manager):
             pass
-        def call_deepseek_api(self, user_input, system_prompt):
+        def call_deepseek_api(self, user_input, system_prompt, cancel_token=None):
             print(f"--- System Prompt Sent to AI ---")
             print(system_prompt)
             print(f"--- User Input Sent to AI ---")
@@ -0,0 +1,128 @@
+"""
+AI调用统计模块
+从接口响应的 usage 中读取token用量，按提示词片段记录长度，估算费用，
+生成写入 ai_call_metrics 表的调用记录和设置页中的汇总文本
+"""
+import json
+
+# 每百万token的价格（元）；input_cache_hit 为命中接口上下文缓存的输入token价格
+DEFAULT_PRICING = {
+    "deepseek-chat": {"input": 2.0, "input_cache_hit": 0.5, "output": 8.0},
+    "deepseek-reasoner": {"input": 4.0, "input_cache_hit": 1.0, "output": 16.0},
+}
+
+# ai_call_metrics 表中导出到CSV的列（按顺序）
+CSV_COLUMNS = [
+    "id", "created_at", "feature", "endpoint", "model", "stream", "success", "error",
+    "prompt_tokens", "completion_tokens", "cache_hit_tokens", "prompt_chars", "segment_sizes",
+    "segments_cached", "ttft_ms", "total_ms", "attempts", "cost",
+]
+
+
+def parse_usage(usage):
+    """返回 (输入token, 输出token, 命中缓存的输入token)，接口未返回用量时均为None
+
+    兼容 DeepSeek 的 prompt_cache_hit_tokens 和 OpenAI 的 prompt_tokens_details.cached_tokens。
+    """
+    if not usage:
+        return None, None, None
+    cache_hit = usage.get('prompt_cache_hit_tokens')
+    if cache_hit is None:
+        cache_hit = (usage.get('prompt_tokens_details') or {}).get('cached_tokens')
+    return usage.get('prompt_tokens'), usage.get('completion_tokens'), cache_hit
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cache_hit_tokens=None, pricing=None):
+    """按价格表估算一次调用的费用（元）；没有用量或模型不在价格表中时返回None"""
+    prices = (pricing or DEFAULT_PRICING).get(model)
+    if not prices or prompt_tokens is None or completion_tokens is None:
+        return None
+    cache_hit = min(cache_hit_tokens or 0, prompt_tokens)
+    input_cost = ((prompt_tokens - cache_hit) * prices.get('input', 0)
+                  + cache_hit * prices.get('input_cache_hit', prices.get('input', 0)))
+    return (input_cost + completion_tokens * prices.get('output', 0)) / 1_000_000
+
+
+def build_record(data, attempt, success, error, started_at, finished_at, metadata=None):
+    """生成一次调用的统计记录
+
+    data为请求数据，attempt为胜出（或最后失败）的接口尝试，可为None；
+    metadata: feature 为功能名，segments 为系统提示词各片段的 {'size', 'cached'}。
+    """
+    metadata = metadata or {}
+    messages = data.get('messages') or []
+    segments = metadata.get('segments') or {}
+
+    # 提示词按来源拆分长度（字符数）：系统提示词各片段、对话历史、当前输入
+    segment_sizes = {name: info.get('size', 0) for name, info in segments.items()}
+    history = [message for message in messages[:-1] if message.get('role') != 'system']
+    if not segments:
+        system = sum(len(message.get('content') or "") for message in messages if message.get('role') == 'system')
+        if system:
+            segment_sizes['system'] = system
+    segment_sizes['history'] = sum(len(message.get('content') or "") for message in history)
+    segment_sizes['user'] = len(messages[-1].get('content') or "") if messages else 0
+
+    usage = attempt.usage if attempt is not None else None
+    prompt_tokens, completion_tokens, cache_hit_tokens = parse_usage(usage)
+    first_response_at = attempt.first_response_at if attempt is not None else None
+    return {
+        'feature': metadata.get('feature') or 'chat',
+        'endpoint': attempt.endpoint.name if attempt is not None else None,
+        'model': attempt.endpoint.model if attempt is not None else None,
+        'stream': bool(data.get('stream')),
+        'success': bool(success),
+        'error': None if success else error,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'cache_hit_tokens': cache_hit_tokens,
+        'prompt_chars': sum(len(message.get('content') or "") for message in messages),
+        'segment_sizes': segment_sizes,
+        'segments_cached': [name for name, info in segments.items() if info.get('cached')],
+        'ttft_ms': (first_response_at - started_at) * 1000 if first_response_at is not None else None,
+        'total_ms': (finished_at - started_at) * 1000,
+        'attempts': len(attempt.race.attempts) if attempt is not None else 0,
+    }
+
+
+def encode_segments(record):
+    """segment_sizes 和 segments_cached 转成写入数据库的文本"""
+    return (json.dumps(record['segment_sizes'], ensure_ascii=False),
+            ",".join(record['segments_cached']))
+
+
+def _number(value, digits=0):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def format_summary(summary):
+    """DatabaseManager.get_ai_call_summary 结果的文本"""
+    total = summary['total']
+    if not total['calls']:
+        return "暂无AI调用记录"
+    lines = [
+        f"调用 {total['calls']} 次  失败 {total['failures']}  输入 {total['prompt_tokens'] or 0} tokens"
+        f"（命中缓存 {total['cache_hit_tokens'] or 0}）  输出 {total['completion_tokens'] or 0} tokens  "
+        f"费用 ¥{total['cost'] or 0:.4f}",
+        "",
+        f"{'功能':<14}{'次数':>6}{'平均输入':>10}{'平均输出':>8}{'首响应ms':>10}{'总耗时ms':>10}{'费用¥':>10}",
+    ]
+    for row in summary['by_feature']:
+        lines.append(
+            f"{row['feature']:<14}{row['calls']:>6}{_number(row['avg_prompt_tokens']):>10}"
+            f"{_number(row['avg_completion_tokens']):>8}{_number(row['avg_ttft_ms']):>10}"
+            f"{_number(row['avg_total_ms']):>10}{_number(row['cost'], 4):>10}"
+        )
+    lines.append("")
+    lines.append("按接口:")
+    for row in summary['by_endpoint']:
+        lines.append(
+            f"{row['endpoint'] or '-':<14}{row['calls']:>6} 次  失败 {row['failures']}  "
+            f"首响应 {_number(row['avg_ttft_ms'])} ms  总耗时 {_number(row['avg_total_ms'])} ms"
+        )
+    if summary['segments']:
+        lines.append("")
+        lines.append("提示词平均长度（字符）: " + "  ".join(
+            f"{row['name']} {row['avg_size']:.0f}" for row in summary['segments']
+        ))
+    return "\n".join(lines)
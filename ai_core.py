@@ -2,10 +2,18 @@
 AI核心功能模块
 包含API调用、缓存管理等核心功能
 """
-import requests
 import json
+import socket
 import threading
+import time
 from datetime import datetime
+import module_registry
+import perf_metrics
+import llm_endpoints
+import ai_call_metrics
+
+# requests在首次发起API请求时才导入
+requests = module_registry.lazy_import('requests')
 
 
 class KVCache:
@@ -32,6 +40,30 @@ class KVCache:
         self.cache = []
 
 
+class ResponseCloser:
+    """登记到取消令牌上的响应：先关闭底层套接字中断其他线程中阻塞的读取，再关闭响应"""
+    def __init__(self, response):
+        self.response = response
+
+    def _socket(self):
+        raw = self.response.raw
+        sock = getattr(getattr(raw, 'connection', None), 'sock', None)
+        if sock is None:
+            # 服务端声明关闭连接时，套接字只保留在 http.client 响应的文件对象里
+            fp = getattr(getattr(raw, '_fp', None), 'fp', None)
+            sock = getattr(getattr(fp, 'raw', None), '_sock', None)
+        return sock
+
+    def close(self):
+        sock = self._socket()
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.response.close()
+
+
 class AICore:
     """AI核心功能类"""
     
@@ -59,158 +91,280 @@ class AICore:
         
         # 初始化KV缓存
         self.kv_cache = KVCache()
+        
+        # 接口池：配置了多个接口时对冲和故障转移（未配置时只有api_url一个接口）
+        self.config_manager = config_manager
+        self.endpoint_pool = self._create_endpoint_pool()
+        
+        # 每次调用结束后以统计记录（ai_call_metrics.build_record）回调，在请求线程中执行
+        self.call_listener = None
+        
+        # 配置热更新：API地址、模型等修改后无需重启即可生效
+        if config_manager and hasattr(config_manager, 'add_listener'):
+            config_manager.add_listener(self._on_config_changed, 'ai_assistant')
+    
+    def _on_config_changed(self, key_path, old_value, new_value):
+        """响应配置变更"""
+        key = key_path.split('.', 1)[1] if '.' in key_path else key_path
+        if key == 'api_key':
+            self.update_api_key(new_value)
+        elif key in ('api_url', 'model', 'temperature', 'max_tokens'):
+            setattr(self, key, new_value)
+        
+        # 接口配置变化后重建接口池（各接口的统计和熔断状态随之重置）
+        if key in ('api_url', 'model') or key.split('.', 1)[0] in ('endpoints', 'endpoint_pool'):
+            self.endpoint_pool = self._create_endpoint_pool()
+    
+    def _create_endpoint_pool(self):
+        """按配置创建接口池"""
+        if self.config_manager:
+            get = self.config_manager.get
+        else:
+            get = lambda key_path, default=None: default
+        return llm_endpoints.EndpointPool.from_config(get, self.api_url, self.model)
+    
+    def _request_timeout(self, cancel_token, default):
+        """根据取消令牌的剩余时间计算本次请求的超时"""
+        if cancel_token is None:
+            return default
+        remaining = cancel_token.remaining(default)
+        return max(0.1, min(default, remaining))
+    
+    def _cancelled_result(self, cancel_token):
+        """请求被取消或超时时的返回值"""
+        if cancel_token.reason == "timeout":
+            return False, "请求超过截止时间，已中止"
+        return False, "请求已取消"
     
     def update_api_key(self, api_key):
         """更新API密钥"""
         self.api_key = api_key
         self.headers["Authorization"] = f"Bearer {api_key}"
     
-    def test_api_connection(self):
-        """测试API连接"""
+    def test_api_connection(self, cancel_token=None):
+        """测试API连接（配置了多个接口时逐个测试）"""
+        results = []
+        for endpoint in self.endpoint_pool.endpoints:
+            success, message = self._test_endpoint(endpoint, cancel_token)
+            if cancel_token is not None and cancel_token.cancelled:
+                return self._cancelled_result(cancel_token)
+            results.append((endpoint, success, message))
+        
+        if len(results) == 1:
+            return results[0][1], results[0][2]
+        connected = sum(1 for _, success, _ in results if success)
+        details = "\n".join(f"{endpoint.name}: {message}" for endpoint, _, message in results)
+        return connected > 0, f"{connected}/{len(results)} 个接口连接成功\n{details}"
+    
+    def _test_endpoint(self, endpoint, cancel_token=None):
+        """测试单个接口"""
         try:
             test_data = {
-                "model": self.model,
+                "model": endpoint.model,
                 "messages": [{"role": "user", "content": "Hello"}],
                 "max_tokens": 10,
                 "temperature": 0.1
             }
             
             response = requests.post(
-                self.api_url,
-                headers=self.headers,
+                endpoint.api_url,
+                headers=self._endpoint_headers(endpoint),
                 json=test_data,
-                timeout=10
+                timeout=self._request_timeout(cancel_token, 10)
             )
             
+            if cancel_token is not None and cancel_token.cancelled:
+                return self._cancelled_result(cancel_token)
+            
             if response.status_code == 200:
                 return True, "API连接成功"
             else:
                 return False, f"API连接失败: {response.status_code}"
                 
         except Exception as e:
+            if cancel_token is not None and cancel_token.cancelled:
+                return self._cancelled_result(cancel_token)
             return False, f"连接错误: {str(e)}"
     
-    def call_deepseek_api(self, user_input, system_prompt="", temperature=None, max_tokens=None):
-        """调用DeepSeek API"""
+    def _endpoint_headers(self, endpoint):
+        """接口的请求头：接口单独配置了密钥时使用它，否则使用全局密钥"""
+        if not endpoint.api_key:
+            return self.headers
+        return dict(self.headers, Authorization=f"Bearer {endpoint.api_key}")
+    
+    def _build_request(self, user_input, system_prompt, temperature, max_tokens, stream):
+        """构建请求数据（模型由各接口填入）"""
+        # 构建消息
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        
+        # 添加历史对话
+        messages.extend(self.kv_cache.get_context())
+        
+        # 添加当前用户输入
+        messages.append({"role": "user", "content": user_input})
+        
+        data = {
+            "messages": messages,
+            "temperature": temperature or self.temperature,
+            "max_tokens": max_tokens or self.max_tokens,
+            "stream": stream
+        }
+        if stream:
+            # 流式响应默认不带token用量，要求在最后一个分片中返回
+            data["stream_options"] = {"include_usage": True}
+        return data
+    
+    def _error_message(self, response):
+        """非200响应的错误信息"""
+        error_msg = f"API调用失败: {response.status_code}"
+        if response.text:
+            try:
+                error_data = response.json()
+                if 'error' in error_data:
+                    error_msg += f" - {error_data['error'].get('message', '')}"
+            except:
+                pass
+        return error_msg
+    
+    def _send_chat_request(self, attempt, data, on_chunk=None):
+        """向接口池中的一个接口发出请求，返回 (是否成功, 回复或错误信息)
+        
+        开始输出前调用 attempt.claim()：对冲请求中已有其他接口先返回时放弃本次结果。
+        """
+        endpoint, token = attempt.endpoint, attempt.token
+        closer = None
         try:
-            # 构建消息
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            
-            # 添加历史对话
-            messages.extend(self.kv_cache.get_context())
-            
-            # 添加当前用户输入
-            messages.append({"role": "user", "content": user_input})
-            
-            # 准备请求数据
-            data = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature or self.temperature,
-                "max_tokens": max_tokens or self.max_tokens,
-                "stream": False
-            }
-            
-            # 发送请求
             response = requests.post(
-                self.api_url,
-                headers=self.headers,
-                json=data,
-                timeout=30
+                endpoint.api_url,
+                headers=self._endpoint_headers(endpoint),
+                json=dict(data, model=endpoint.model),
+                timeout=self._request_timeout(token, 30),
+                stream=data["stream"]
             )
             
-            if response.status_code == 200:
+            closer = ResponseCloser(response)
+            token.register(closer)
+            if token.cancelled:
+                return self._cancelled_result(token)
+            
+            if response.status_code != 200:
+                return False, self._error_message(response)
+            
+            if not data["stream"]:
                 result = response.json()
+                attempt.usage = result.get('usage')
                 ai_response = result['choices'][0]['message']['content']
-                
-                # 更新缓存
-                self.kv_cache.update_cache(user_input, ai_response)
-                
+                if not attempt.claim():
+                    return self._cancelled_result(token)
                 return True, ai_response
-            else:
-                error_msg = f"API调用失败: {response.status_code}"
-                if response.text:
-                    try:
-                        error_data = response.json()
-                        if 'error' in error_data:
-                            error_msg += f" - {error_data['error'].get('message', '')}"
-                    except:
-                        pass
-                return False, error_msg
+            
+            full_response = ""
+            claimed = False
+            for line in response.iter_lines():
+                if token.cancelled:
+                    break
+                if line:
+                    line = line.decode('utf-8')
+                    if line.startswith('data: '):
+                        data_str = line[6:]
+                        if data_str.strip() == '[DONE]':
+                            break
+                        try:
+                            chunk_data = json.loads(data_str)
+                            if chunk_data.get('usage'):
+                                attempt.usage = chunk_data['usage']
+                            if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
+                                delta = chunk_data['choices'][0].get('delta', {})
+                                if 'content' in delta:
+                                    # 首个分片到达时确定胜出的接口，落败的请求不输出任何内容
+                                    if not claimed:
+                                        if not attempt.claim():
+                                            break
+                                        claimed = True
+                                    content = delta['content']
+                                    full_response += content
+                                    if on_chunk:
+                                        on_chunk(content)
+                        except json.JSONDecodeError:
+                            continue
+            
+            if token.cancelled or not (claimed or attempt.claim()):
+                return self._cancelled_result(token)
+            return True, full_response
                 
         except requests.exceptions.Timeout:
+            if token.cancelled:
+                return self._cancelled_result(token)
             return False, "请求超时，请检查网络连接"
         except requests.exceptions.ConnectionError:
+            if token.cancelled:
+                return self._cancelled_result(token)
             return False, "网络连接错误，请检查网络设置"
         except Exception as e:
+            if token.cancelled:
+                return self._cancelled_result(token)
             return False, f"API调用异常: {str(e)}"
+        finally:
+            if closer is not None:
+                token.unregister(closer)
     
-    def call_deepseek_api_stream(self, user_input, system_prompt="", on_chunk=None, temperature=None, max_tokens=None):
-        """流式调用DeepSeek API"""
+    def _call_endpoints(self, user_input, data, on_chunk, cancel_token, metadata=None):
+        """经接口池发出请求（对冲、故障转移、熔断），成功后更新对话缓存"""
+        started_at = time.monotonic()
+        success, result, attempt = self.endpoint_pool.call(
+            lambda attempt: self._send_chat_request(attempt, data, on_chunk), cancel_token
+        )
+        
+        cancelled = cancel_token is not None and cancel_token.cancelled
+        if cancelled:
+            success, result = self._cancelled_result(cancel_token)
+        self._notify_call(data, attempt, success, result, started_at, metadata)
+        
+        # 已取消的请求不写入对话缓存
+        if cancelled:
+            return success, result
+        
+        # 更新缓存
+        if success and result:
+            self.kv_cache.update_cache(user_input, result)
+        return success, result
+    
+    def _notify_call(self, data, attempt, success, result, started_at, metadata):
+        """把本次调用的统计记录交给call_listener"""
+        if self.call_listener is None:
+            return
         try:
-            # 构建消息
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            
-            # 添加历史对话
-            messages.extend(self.kv_cache.get_context())
-            
-            # 添加当前用户输入
-            messages.append({"role": "user", "content": user_input})
-            
-            # 准备请求数据
-            data = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature or self.temperature,
-                "max_tokens": max_tokens or self.max_tokens,
-                "stream": True
-            }
-            
-            # 发送流式请求
-            response = requests.post(
-                self.api_url,
-                headers=self.headers,
-                json=data,
-                timeout=30,
-                stream=True
+            record = ai_call_metrics.build_record(
+                data, attempt, success, result, started_at, time.monotonic(), metadata
             )
-            
-            if response.status_code == 200:
-                full_response = ""
-                for line in response.iter_lines():
-                    if line:
-                        line = line.decode('utf-8')
-                        if line.startswith('data: '):
-                            data_str = line[6:]
-                            if data_str.strip() == '[DONE]':
-                                break
-                            try:
-                                chunk_data = json.loads(data_str)
-                                if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
-                                    delta = chunk_data['choices'][0].get('delta', {})
-                                    if 'content' in delta:
-                                        content = delta['content']
-                                        full_response += content
-                                        if on_chunk:
-                                            on_chunk(content)
-                            except json.JSONDecodeError:
-                                continue
-                
-                # 更新缓存
-                if full_response:
-                    self.kv_cache.update_cache(user_input, full_response)
-                
-                return True, full_response
-            else:
-                error_msg = f"API调用失败: {response.status_code}"
-                return False, error_msg
-                
+            self.call_listener(record)
         except Exception as e:
-            return False, f"流式API调用异常: {str(e)}"
+            print(f"记录AI调用统计失败: {e}")
+    
+    def call_deepseek_api(self, user_input, system_prompt="", temperature=None, max_tokens=None, cancel_token=None,
+                          metadata=None):
+        """调用DeepSeek API
+        
+        metadata用于调用统计：feature 为功能名，segments 为系统提示词各片段的 {'size', 'cached'}。
+        """
+        data = self._build_request(user_input, system_prompt, temperature, max_tokens, stream=False)
+        return self._call_endpoints(user_input, data, None, cancel_token, metadata)
+    
+    def call_deepseek_api_stream(self, user_input, system_prompt="", on_chunk=None, temperature=None, max_tokens=None,
+                                 cancel_token=None, metadata=None):
+        """流式调用DeepSeek API
+        
+        传入cancel_token时，取消或到达截止时间会关闭响应连接，中断阻塞中的读取。
+        配置了多个接口时，只有最先返回首个分片的接口的内容会传给on_chunk。
+        """
+        data = self._build_request(user_input, system_prompt, temperature, max_tokens, stream=True)
+        return self._call_endpoints(user_input, data, on_chunk, cancel_token, metadata)
+    
+    def get_endpoint_stats(self):
+        """各接口的延迟和健康统计"""
+        return self.endpoint_pool.get_stats()
     
     def clear_cache(self):
         """清空对话缓存"""
@@ -218,4 +372,7 @@ class AICore:
     
     def get_cache_context(self):
         """获取缓存上下文"""
-        return self.kv_cache.get_context() 
\ No newline at end of file
+        return self.kv_cache.get_context()
+
+
+perf_metrics.register_class(AICore, "ai", ["call_deepseek_api", "call_deepseek_api_stream", "test_api_connection"])
@@ -0,0 +1,327 @@
+"""
+AI请求执行器模块
+固定大小的工作线程池 + 按会话排序的请求队列，支持取消与整体截止时间
+"""
+import itertools
+import threading
+import time
+from collections import deque
+
+
+class RequestCancelled(Exception):
+    """请求被取消或超过截止时间"""
+
+    def __init__(self, reason="cancelled"):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """请求取消令牌
+
+    工作函数通过令牌检查是否被取消、查询剩余时间，并登记正在使用的
+    网络资源（如流式响应对象）；取消时会关闭这些资源以中断阻塞的读取。
+    """
+
+    def __init__(self, deadline=None):
+        """初始化取消令牌，deadline为time.monotonic()时间点"""
+        self.deadline = deadline
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._resources = []
+
+    @property
+    def cancelled(self):
+        """是否已取消（包括超时）"""
+        return self._event.is_set()
+
+    def cancel(self, reason="cancelled"):
+        """取消请求并关闭已登记的资源"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            resources = list(self._resources)
+            self._resources = []
+
+        for resource in resources:
+            try:
+                resource.close()
+            except Exception as e:
+                print(f"关闭请求资源时出错: {e}")
+
+    def remaining(self, default=None):
+        """剩余可用时间（秒），没有截止时间时返回default"""
+        if self.deadline is None:
+            return default
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """已取消或已超时则抛出RequestCancelled"""
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("timeout")
+        if self._event.is_set():
+            raise RequestCancelled(self.reason)
+
+    def register(self, resource):
+        """登记需要在取消时关闭的资源"""
+        with self._lock:
+            if not self._event.is_set():
+                self._resources.append(resource)
+                return
+        # 已取消：立即关闭
+        try:
+            resource.close()
+        except Exception:
+            pass
+
+    def unregister(self, resource):
+        """移除已登记的资源"""
+        with self._lock:
+            if resource in self._resources:
+                self._resources.remove(resource)
+
+
+class AIRequest:
+    """已提交的AI请求句柄"""
+
+    def __init__(self, request_id, session_id, func, token, on_done=None):
+        self.request_id = request_id
+        self.session_id = session_id
+        self.func = func
+        self.token = token
+        self.on_done = on_done
+
+        self.status = "queued"  # queued, running, done, failed, cancelled, timeout
+        self.result = None
+        self.error = None
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self._done_event = threading.Event()
+
+    @property
+    def queue_wait(self):
+        """排队等待时间（秒）"""
+        end = self.started_at or self.finished_at or time.monotonic()
+        return end - self.queued_at
+
+    @property
+    def service_time(self):
+        """实际执行时间（秒），未开始时为0"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def done(self):
+        """请求是否已结束"""
+        return self._done_event.is_set()
+
+    def cancel(self, reason="cancelled"):
+        """取消该请求"""
+        self.token.cancel(reason)
+
+    def wait(self, timeout=None):
+        """等待请求结束"""
+        return self._done_event.wait(timeout)
+
+    def timing_text(self):
+        """排队/执行耗时的简短描述"""
+        return f"排队 {self.queue_wait * 1000:.0f}ms / 处理 {self.service_time:.2f}s"
+
+
+class AIRequestExecutor:
+    """AI请求执行器
+
+    - 固定数量的工作线程，避免每次点击都新建线程
+    - 同一会话内的请求严格按提交顺序逐个执行，不同会话可并行
+    - 每个请求有整体截止时间（含排队时间），到期自动取消
+    """
+
+    def __init__(self, max_workers=2, default_deadline=90.0, name="ai-request"):
+        """初始化执行器"""
+        self.max_workers = max(1, int(max_workers))
+        self.default_deadline = default_deadline
+        self.name = name
+
+        self._condition = threading.Condition()
+        self._sessions = {}          # session_id -> deque[AIRequest]
+        self._ready_sessions = deque()
+        self._active_sessions = set()
+        self._running = {}           # session_id -> AIRequest
+        self._ids = itertools.count(1)
+        self._shutdown = False
+        self._workers = []
+
+        # 统计信息
+        self._completed = 0
+        self._cancelled = 0
+        self._total_queue_wait = 0.0
+        self._total_service_time = 0.0
+
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"{name}-{i + 1}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, func, session_id="default", deadline=None, on_done=None):
+        """提交请求
+
+        func(token) 在工作线程中执行；on_done(request) 在请求结束后于工作线程中回调。
+        """
+        deadline = self.default_deadline if deadline is None else deadline
+        token = CancelToken(time.monotonic() + deadline if deadline else None)
+        request = AIRequest(next(self._ids), session_id, func, token, on_done)
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("AI请求执行器已关闭")
+            queue = self._sessions.setdefault(session_id, deque())
+            queue.append(request)
+            if session_id not in self._active_sessions and session_id not in self._ready_sessions:
+                self._ready_sessions.append(session_id)
+            self._condition.notify()
+
+        return request
+
+    def cancel_session(self, session_id, reason="cancelled"):
+        """取消会话中正在执行和排队中的全部请求，返回取消的数量"""
+        with self._condition:
+            requests = list(self._sessions.get(session_id, ()))
+            running = self._running.get(session_id)
+
+        if running is not None:
+            requests.append(running)
+        for request in requests:
+            request.cancel(reason)
+        return len(requests)
+
+    def pending_count(self, session_id=None):
+        """排队中+执行中的请求数"""
+        with self._condition:
+            if session_id is not None:
+                return len(self._sessions.get(session_id, ())) + (1 if session_id in self._running else 0)
+            return sum(len(q) for q in self._sessions.values()) + len(self._running)
+
+    def get_stats(self):
+        """获取执行统计（平均排队时间与执行时间）"""
+        with self._condition:
+            finished = self._completed + self._cancelled
+            return {
+                'workers': self.max_workers,
+                'pending': sum(len(q) for q in self._sessions.values()),
+                'running': len(self._running),
+                'completed': self._completed,
+                'cancelled': self._cancelled,
+                'avg_queue_wait': self._total_queue_wait / finished if finished else 0.0,
+                'avg_service_time': self._total_service_time / finished if finished else 0.0,
+            }
+
+    def shutdown(self, cancel_pending=True):
+        """关闭执行器"""
+        with self._condition:
+            self._shutdown = True
+            sessions = list(self._sessions.keys()) + list(self._running.keys())
+            self._condition.notify_all()
+
+        if cancel_pending:
+            for session_id in set(sessions):
+                self.cancel_session(session_id, "shutdown")
+
+    def _next_request(self):
+        """取出下一个可执行的请求（调用方需持有锁）"""
+        while self._ready_sessions:
+            session_id = self._ready_sessions.popleft()
+            queue = self._sessions.get(session_id)
+            if not queue:
+                self._sessions.pop(session_id, None)
+                continue
+            request = queue.popleft()
+            if not queue:
+                self._sessions.pop(session_id, None)
+            self._active_sessions.add(session_id)
+            self._running[session_id] = request
+            return request
+        return None
+
+    def _worker_loop(self):
+        """工作线程主循环"""
+        while True:
+            with self._condition:
+                request = self._next_request()
+                while request is None:
+                    if self._shutdown:
+                        return
+                    self._condition.wait()
+                    request = self._next_request()
+
+            self._run_request(request)
+
+            with self._condition:
+                session_id = request.session_id
+                self._active_sessions.discard(session_id)
+                self._running.pop(session_id, None)
+                if self._sessions.get(session_id):
+                    self._ready_sessions.append(session_id)
+                    self._condition.notify()
+
+                if request.status in ("cancelled", "timeout"):
+                    self._cancelled += 1
+                else:
+                    self._completed += 1
+                self._total_queue_wait += request.queue_wait
+                self._total_service_time += request.service_time
+
+            request._done_event.set()
+            if request.on_done:
+                try:
+                    request.on_done(request)
+                except Exception as e:
+                    print(f"AI请求回调出错: {e}")
+
+    def _run_request(self, request):
+        """执行单个请求"""
+        token = request.token
+
+        # 排队期间已被取消或已超时
+        try:
+            token.check()
+        except RequestCancelled as e:
+            request.status = "timeout" if e.reason == "timeout" else "cancelled"
+            request.finished_at = time.monotonic()
+            return
+
+        request.status = "running"
+        request.started_at = time.monotonic()
+
+        # 截止时间到达时主动取消，以中断阻塞中的网络读取
+        timer = None
+        remaining = token.remaining()
+        if remaining is not None:
+            timer = threading.Timer(remaining, token.cancel, args=("timeout",))
+            timer.daemon = True
+            timer.start()
+
+        try:
+            request.result = request.func(token)
+            if token.cancelled:
+                request.status = "timeout" if token.reason == "timeout" else "cancelled"
+            else:
+                request.status = "done"
+        except RequestCancelled as e:
+            request.status = "timeout" if e.reason == "timeout" else "cancelled"
+        except Exception as e:
+            request.error = e
+            if token.cancelled:
+                # 取消或超时时关闭资源导致的读取异常，按取消原因报告
+                request.status = "timeout" if token.reason == "timeout" else "cancelled"
+            else:
+                request.status = "failed"
+                print(f"AI请求执行失败: {e}")
+        finally:
+            if timer:
+                timer.cancel()
+            request.finished_at = time.monotonic()
@@ -0,0 +1,170 @@
+"""
+AI批量操作模块
+AI在回复中以JSON给出结构化的操作列表，这里负责解析和校验；
+校验通过的操作由 DatabaseManager.apply_todo_operations 在一个事务中批量执行
+"""
+import json
+import re
+from datetime import datetime
+
+# 支持的操作
+OP_COMPLETE = "complete"
+OP_DELETE = "delete"
+OP_UPDATE = "update"
+OPERATIONS = (OP_COMPLETE, OP_DELETE, OP_UPDATE)
+
+# 意图 -> 操作（AI回复中没有操作列表时，按用户输入中的任务ID生成）
+ACTION_OPERATIONS = {
+    "complete_task": OP_COMPLETE,
+    "delete_task": OP_DELETE,
+}
+
+# update 操作允许修改的字段及取值校验
+UPDATE_FIELDS = {
+    'title': lambda value: isinstance(value, str) and value.strip() != "",
+    'description': lambda value: value is None or isinstance(value, str),
+    'project': lambda value: value is None or isinstance(value, str),
+    'priority': lambda value: value in (1, 2, 3, 4),
+    'gtd_tag': lambda value: value in ('next-action', 'waiting-for', 'someday-maybe', 'inbox'),
+    'status': lambda value: value in ('pending', 'completed'),
+    'due_date': lambda value: value is None or _is_date(value, '%Y-%m-%d'),
+    'reminder_time': lambda value: value is None or _is_date(value, '%Y-%m-%d %H:%M'),
+}
+
+# 单次最多执行的操作数
+MAX_OPERATIONS = 5000
+
+OPERATION_NAMES = {OP_COMPLETE: "完成", OP_DELETE: "删除", OP_UPDATE: "修改"}
+
+# 提示词中的格式说明
+PROMPT_FORMAT = """批量操作格式：
+删除、完成或修改任务时，在回复末尾附上一个JSON代码块列出全部操作，只能使用上下文中出现的任务ID：
+```json
+{"operations": [
+  {"op": "complete", "ids": [12, 15]},
+  {"op": "delete", "id": 7},
+  {"op": "update", "id": 3, "fields": {"priority": 1, "due_date": "2026-01-31"}}
+]}
+```
+op 只能是 complete、delete、update；update 可修改的字段：""" + "、".join(UPDATE_FIELDS)
+
+_JSON_BLOCK_PATTERN = re.compile(r"```(?:json)?\s*(\{.*?\}|\[.*?\])\s*```", re.DOTALL)
+
+
+class OperationError(ValueError):
+    """操作列表格式错误"""
+
+
+def _is_date(value, fmt):
+    try:
+        datetime.strptime(value, fmt)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _is_operation_list(data):
+    """是否为操作列表：含 operations 键的对象，或每项都带 op 的数组"""
+    if isinstance(data, dict):
+        return 'operations' in data
+    return isinstance(data, list) and bool(data) and all(isinstance(item, dict) and 'op' in item for item in data)
+
+
+def _find_json(text):
+    """从回复中找出操作列表的JSON：优先代码块，其次整段回复或第一个 {"operations": ...} 对象
+
+    无法解析或不是操作列表的JSON（如回复中举例的其他数据）跳过，继续查找。
+    """
+    for match in _JSON_BLOCK_PATTERN.finditer(text):
+        try:
+            data = json.loads(match.group(1))
+        except ValueError:
+            continue
+        if _is_operation_list(data):
+            return data
+    try:
+        data = json.loads(text)
+        if _is_operation_list(data):
+            return data
+    except ValueError:
+        pass
+    start = text.find('{"operations"')
+    while start >= 0:
+        try:
+            return json.JSONDecoder().raw_decode(text, start)[0]
+        except ValueError:
+            start = text.find('{"operations"', start + 1)
+    return None
+
+
+def _as_id(value):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise OperationError(f"无效的任务ID: {value!r}")
+    try:
+        return int(value)
+    except ValueError:
+        raise OperationError(f"无效的任务ID: {value!r}")
+
+
+def normalize_operations(data):
+    """校验并展开操作列表：返回 [(操作, 任务ID, 修改字段)]，同一任务只保留最后一条操作"""
+    items = data.get('operations') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise OperationError("操作列表应为数组")
+
+    operations = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise OperationError(f"无效的操作: {item!r}")
+        op = item.get('op')
+        if op not in OPERATIONS:
+            raise OperationError(f"不支持的操作: {op!r}")
+        ids = item.get('ids', [item['id']] if 'id' in item else [])
+        if not isinstance(ids, list) or not ids:
+            raise OperationError(f"操作缺少任务ID: {item!r}")
+
+        fields = None
+        if op == OP_UPDATE:
+            fields = item.get('fields')
+            if not isinstance(fields, dict) or not fields:
+                raise OperationError(f"修改操作缺少字段: {item!r}")
+            for name, value in fields.items():
+                check = UPDATE_FIELDS.get(name)
+                if check is None:
+                    raise OperationError(f"不能修改的字段: {name}")
+                if not check(value):
+                    raise OperationError(f"字段 {name} 的值无效: {value!r}")
+
+        for todo_id in ids:
+            operations[_as_id(todo_id)] = (op, fields)
+
+    if len(operations) > MAX_OPERATIONS:
+        raise OperationError(f"操作过多（{len(operations)}），单次最多 {MAX_OPERATIONS} 个")
+    return [(op, todo_id, fields) for todo_id, (op, fields) in operations.items()]
+
+
+def parse_operations(text):
+    """从AI回复中解析操作列表；没有操作列表时返回None，格式错误时抛出 OperationError"""
+    data = _find_json(text or "")
+    if data is None:
+        return None
+    return normalize_operations(data)
+
+
+def operations_from_ids(action, task_ids):
+    """按意图和任务ID生成操作（AI回复中没有操作列表时使用）"""
+    op = ACTION_OPERATIONS.get(action)
+    if op is None:
+        return []
+    return [(op, int(todo_id), None) for todo_id in dict.fromkeys(task_ids)]
+
+
+def format_summary(counts, missing_ids=()):
+    """批量操作结果的汇总消息"""
+    parts = [f"{OPERATION_NAMES[op]} {counts[op]} 个" for op in OPERATIONS if counts.get(op)]
+    message = "已" + "，".join(parts) + "任务" if parts else "没有任务被修改"
+    if missing_ids:
+        shown = ", ".join(str(todo_id) for todo_id in sorted(missing_ids)[:10])
+        more = f" 等 {len(missing_ids)} 个" if len(missing_ids) > 10 else ""
+        message += f"\n以下任务ID不存在，已跳过: {shown}{more}"
+    return message
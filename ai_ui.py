@@ -7,6 +7,7 @@ from tkinter import ttk, messagebox, scrolledtext, BOTH, LEFT, RIGHT, X, Y, W, E
 import ttkbootstrap as ttk_bs
 from ttkbootstrap.constants import *
 import threading
+import time
 from datetime import datetime
 
 
@@ -21,6 +22,7 @@ class AIUserInterface:
         self.chat_display = None
         self.user_input = None
         self.send_button = None
+        self.cancel_button = None
         self.status_label = None
         self.api_key_entry = None
         self.test_button = None
@@ -164,6 +166,16 @@ class AIUserInterface:
         )
         self.send_button.pack(side=RIGHT)
         
+        self.cancel_button = ttk_bs.Button(
+            input_container,
+            text="取消",
+            command=self.cancel_requests,
+            bootstyle="danger-outline",
+            width=6,
+            state="disabled"
+        )
+        self.cancel_button.pack(side=RIGHT, padx=(0, 5))
+        
         # 绑定回车键
         self.user_input.bind('<Return>', lambda e: self.send_message())
         
@@ -213,49 +225,42 @@ class AIUserInterface:
             messagebox.showwarning("警告", "请输入有效的API Key")
     
     def test_api_connection(self):
-        """测试API连接"""
+        """测试API连接（经由请求执行器，使用独立会话）"""
         self.status_label.config(text="正在测试连接...", foreground="#ffc107")
         self.test_button.config(state="disabled")
         
-        def test_connection():
-            try:
-                success, message = self.ai_assistant.ai_core.test_api_connection()
-                
-                # 在主线程中更新UI - 使用更安全的方式
-                def update_ui():
-                    try:
-                        if success:
-                            self.add_message("系统", message, "success")
-                            self.status_label.config(text="连接正常", foreground="#28a745")
-                        else:
-                            self.add_message("系统", message, "error")
-                            self.status_label.config(text="连接失败", foreground="#dc3545")
-                        self.test_button.config(state="normal")
-                    except Exception as e:
-                        print(f"更新UI时出错: {e}")
-                
-                # 使用更安全的方式调度UI更新
+        def on_done(request):
+            # 在主线程中更新UI
+            def update_ui():
                 try:
-                    self.test_button.after(0, update_ui)
+                    if request.status == "done":
+                        success, message = request.result
+                    elif request.status == "failed":
+                        success, message = False, f"测试连接时出错: {request.error}"
+                    else:
+                        success, message = False, "连接测试已取消" if request.status == "cancelled" else "连接测试超时"
+                    
+                    if success:
+                        self.add_message("系统", f"{message}（{request.timing_text()}）", "success")
+                        self.status_label.config(text="连接正常", foreground="#28a745")
+                    else:
+                        self.add_message("系统", message, "error")
+                        self.status_label.config(text="连接失败", foreground="#dc3545")
+                    self.test_button.config(state="normal")
                 except Exception as e:
-                    print(f"调度UI更新时出错: {e}")
-                
+                    print(f"更新UI时出错: {e}")
+            
+            try:
+                self.test_button.after(0, update_ui)
             except Exception as e:
-                def update_error():
-                    try:
-                        self.add_message("系统", f"测试连接时出错: {str(e)}", "error")
-                        self.status_label.config(text="测试失败", foreground="#dc3545")
-                        self.test_button.config(state="normal")
-                    except Exception as ui_e:
-                        print(f"更新错误UI时出错: {ui_e}")
-                
-                try:
-                    self.test_button.after(0, update_error)
-                except Exception as e:
-                    print(f"调度错误UI更新时出错: {e}")
+                print(f"调度UI更新时出错: {e}")
         
-        # 在后台线程中测试连接
-        threading.Thread(target=test_connection, daemon=True).start()
+        self.ai_assistant.request_executor.submit(
+            lambda token: self.ai_assistant.ai_core.test_api_connection(cancel_token=token),
+            session_id="connection_test",
+            deadline=15,
+            on_done=on_done
+        )
     
     def clear_chat_history(self):
         """清空聊天历史"""
@@ -265,7 +270,7 @@ class AIUserInterface:
             self.add_message("系统", "聊天历史已清空", "info")
     
     def send_message(self):
-        """发送消息"""
+        """发送消息（同一会话内的消息按发送顺序排队处理）"""
         user_text = self.user_input.get().strip()
         if not user_text:
             return
@@ -276,29 +281,56 @@ class AIUserInterface:
         # 显示用户消息
         self.add_message("用户", user_text, "user")
         
-        # 更新状态
-        self.status_label.config(text="AI正在思考...", foreground="#ffc107")
-        self.send_button.config(state="disabled")
-        
-        # 在后台处理AI响应
-        def process_response():
+        def on_done(request):
             try:
-                self.ai_assistant.process_user_input(user_text)
-            finally:
-                # 恢复发送按钮
-                def restore_button():
-                    try:
-                        self.send_button.config(state="normal")
-                        self.status_label.config(text="就绪", foreground="#28a745")
-                    except Exception as e:
-                        print(f"恢复按钮状态时出错: {e}")
-                
-                try:
-                    self.send_button.after(0, restore_button)
-                except Exception as e:
-                    print(f"调度按钮恢复时出错: {e}")
+                self.send_button.after(0, lambda: self._on_request_done(request))
+            except Exception as e:
+                print(f"调度状态更新时出错: {e}")
         
-        threading.Thread(target=process_response, daemon=True).start()
+        self.ai_assistant.submit_user_input(user_text, on_done=on_done)
+        self._update_request_status()
+    
+    def cancel_requests(self):
+        """取消当前会话中正在执行和排队中的请求"""
+        count = self.ai_assistant.cancel_requests()
+        if count:
+            self.add_message("系统", f"已取消 {count} 个请求", "warning")
+        self._update_request_status()
+    
+    def _on_request_done(self, request):
+        """请求结束后更新状态栏（主线程）"""
+        try:
+            status_text = {
+                "done": "就绪",
+                "failed": "处理失败",
+                "cancelled": "已取消",
+                "timeout": "已超时",
+            }.get(request.status, "就绪")
+            self._update_request_status(f"{status_text}（{request.timing_text()}）")
+        except Exception as e:
+            print(f"恢复按钮状态时出错: {e}")
+    
+    def _update_request_status(self, idle_text="就绪"):
+        """根据排队中的请求数更新状态栏和取消按钮"""
+        pending = self.ai_assistant.request_executor.pending_count(self.ai_assistant.current_session_id)
+        if pending:
+            text = "AI正在思考..." if pending == 1 else f"AI正在思考...（另有 {pending - 1} 条排队）"
+            self.status_label.config(text=text, foreground="#ffc107")
+            self.cancel_button.config(state="normal")
+        else:
+            color = "#28a745" if idle_text.startswith("就绪") else "#dc3545"
+            self.status_label.config(text=idle_text, foreground=color)
+            self.cancel_button.config(state="disabled")
+    
+    def run_on_ui_thread(self, func):
+        """在Tk主线程中执行func；对话区尚未创建时直接执行"""
+        if self.chat_display is None:
+            func()
+            return
+        try:
+            self.chat_display.after(0, func)
+        except Exception as e:
+            print(f"调度UI更新时出错: {e}")
     
     def add_message(self, sender, message, style="secondary"):
         """添加消息到聊天显示区域"""
@@ -325,100 +357,45 @@ class AIUserInterface:
             print(f"调度UI更新时出错: {e}")
     
     def add_streaming_message(self, sender, style="secondary"):
-        """开始流式消息，返回消息标识符"""
-        def _add_streaming_message_main_thread():
+        """开始流式消息，返回流式渲染器"""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        
+        def _add_streaming_header_main_thread():
             try:
-                timestamp = datetime.now().strftime("%H:%M:%S")
-                
                 # 滚动到底部
                 self.chat_display.see(tk.END)
                 
                 # 插入消息头
                 self.chat_display.insert(tk.END, f"[{timestamp}] {sender}: ", style)
-                
-                # 记录消息开始位置
-                start_pos = self.chat_display.index(tk.END + "-1c")
-                
-                return {
-                    'sender': sender,
-                    'timestamp': timestamp,
-                    'start_pos': start_pos,
-                    'current_content': ''
-                }
             except Exception as e:
                 print(f"开始流式消息时出错: {e}")
-                return None
         
-        # 在主线程中执行并返回结果
+        # 消息头与后续分片都经由after调度，保证插入顺序
         try:
-            return self.chat_display.tk.call('after', 'idle', _add_streaming_message_main_thread)
+            self.chat_display.after(0, _add_streaming_header_main_thread)
         except Exception as e:
             print(f"调度流式消息时出错: {e}")
-            # 直接调用作为备选方案
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            return {
-                'sender': sender,
-                'timestamp': timestamp,
-                'start_pos': None,
-                'current_content': ''
-            }
+        
+        renderer = StreamingRenderer(self.chat_display)
+        renderer.sender = sender
+        renderer.timestamp = timestamp
+        return renderer
     
     def update_streaming_message(self, message_info, new_content, style=None):
-        """更新流式消息内容"""
+        """更新流式消息内容（分片先进入缓冲区，按帧合并写入）"""
         if not message_info:
             return
-            
-        def _update_streaming_message_main_thread():
-            try:
-                # 添加新内容到当前内容
-                message_info['current_content'] += new_content
-                
-                # 获取当前位置
-                current_pos = self.chat_display.index(tk.END + "-1c")
-                
-                # 插入新内容
-                if style:
-                    self.chat_display.insert(current_pos, new_content, style)
-                else:
-                    self.chat_display.insert(current_pos, new_content)
-                
-                # 自动滚动到底部
-                self.chat_display.see(tk.END)
-                
-                # 强制更新显示
-                self.chat_display.update_idletasks()
-                
-            except Exception as e:
-                print(f"更新流式消息出错: {e}")
         
-        # 在主线程中执行
-        try:
-            self.chat_display.after(0, _update_streaming_message_main_thread)
-        except Exception as e:
-            print(f"调度流式消息更新时出错: {e}")
+        if style:
+            message_info.style = style
+        message_info.feed(new_content)
     
     def finish_streaming_message(self, message_info):
         """完成流式消息"""
         if not message_info:
             return
-            
-        def _finish_streaming_message_main_thread():
-            try:
-                # 添加换行符结束消息
-                current_pos = self.chat_display.index(tk.END + "-1c")
-                self.chat_display.insert(current_pos, "\n\n")
-                
-                # 滚动到底部
-                self.chat_display.see(tk.END)
-                
-            except Exception as e:
-                print(f"完成流式消息出错: {e}")
         
-        # 在主线程中执行
-        try:
-            self.chat_display.after(0, _finish_streaming_message_main_thread)
-        except Exception as e:
-            print(f"调度流式消息完成时出错: {e}")
+        message_info.finish()
     
     def show_gtd_quadrant_confirmation(self, task_info, user_input):
         """显示GTD和四象限确认对话框"""
@@ -641,7 +618,7 @@ class AIUserInterface:
         )
         
         if result is True:  # 用户点击"是"
-            self.ai_assistant.execute_operation(action, user_input)
+            self.ai_assistant.execute_operation(action, user_input, ai_response)
         elif result is False:  # 用户点击"否" - 重新理解
             self.ai_assistant.reunderstand_request(user_input)
         # result is None 表示用户点击"取消"，不做任何操作
@@ -657,4 +634,116 @@ class AIUserInterface:
             'someday-maybe': '将来/也许',
             'inbox': '收件箱'
         }
-        return gtd_names.get(gtd_tag, gtd_tag) 
\ No newline at end of file
+        return gtd_names.get(gtd_tag, gtd_tag)
+
+
+class StreamingRenderer:
+    """流式消息渲染器
+    
+    后台线程通过feed()写入分片，分片先进入缓冲区；
+    UI线程最多每flush_interval_ms毫秒合并一次，以单次insert写入文本控件。
+    缓冲区超过max_buffered_chars时feed()会阻塞等待UI线程消费（背压）。
+    """
+    
+    def __init__(self, text_widget, style=None, flush_interval_ms=30, max_buffered_chars=4096,
+                 stall_timeout=2.0):
+        """初始化流式渲染器"""
+        self.text_widget = text_widget
+        self.style = style
+        self.flush_interval_ms = flush_interval_ms
+        self.max_buffered_chars = max_buffered_chars
+        self.stall_timeout = stall_timeout
+        
+        self.content = ''
+        self.flush_count = 0
+        self.chunk_count = 0
+        
+        self._buffer = []
+        self._buffered_chars = 0
+        self._condition = threading.Condition()
+        self._flush_scheduled = False
+        self._finishing = False
+        self._closed = False
+        self._last_progress = time.monotonic()
+    
+    def feed(self, chunk):
+        """写入一个分片（可在任意线程调用）"""
+        if not chunk:
+            return
+        
+        with self._condition:
+            if self._closed:
+                return
+            
+            # 背压：缓冲区过大时等待UI线程消费；UI长时间无响应则放弃等待，避免死锁
+            while (self._buffered_chars >= self.max_buffered_chars and not self._closed
+                   and time.monotonic() - self._last_progress < self.stall_timeout):
+                self._condition.wait(timeout=self.flush_interval_ms / 1000.0)
+            
+            self._buffer.append(chunk)
+            self._buffered_chars += len(chunk)
+            self.chunk_count += 1
+            need_schedule = not self._flush_scheduled
+            self._flush_scheduled = True
+        
+        if need_schedule:
+            self._schedule_flush(self.flush_interval_ms)
+    
+    def finish(self):
+        """结束流式消息：写出剩余缓冲并追加换行"""
+        with self._condition:
+            if self._closed or self._finishing:
+                return
+            self._finishing = True
+            need_schedule = not self._flush_scheduled
+            self._flush_scheduled = True
+        
+        if need_schedule:
+            self._schedule_flush(0)
+    
+    def close(self):
+        """关闭渲染器，丢弃未写出的内容并唤醒等待中的写入方"""
+        with self._condition:
+            self._closed = True
+            self._buffer = []
+            self._buffered_chars = 0
+            self._condition.notify_all()
+    
+    def _schedule_flush(self, delay_ms):
+        """调度一次UI线程刷新"""
+        try:
+            self.text_widget.after(delay_ms, self._flush)
+        except Exception as e:
+            print(f"调度流式消息更新时出错: {e}")
+            self.close()
+    
+    def _flush(self):
+        """在UI线程中合并写入缓冲区内容"""
+        with self._condition:
+            text = ''.join(self._buffer)
+            self._buffer = []
+            self._buffered_chars = 0
+            self._flush_scheduled = False
+            finishing = self._finishing and not self._closed
+            if finishing:
+                self._closed = True
+            self._last_progress = time.monotonic()
+            self._condition.notify_all()
+        
+        try:
+            if text:
+                self.content += text
+                if self.style:
+                    self.text_widget.insert(tk.END + "-1c", text, self.style)
+                else:
+                    self.text_widget.insert(tk.END + "-1c", text)
+                self.flush_count += 1
+            
+            if finishing:
+                self.text_widget.insert(tk.END + "-1c", "\n\n")
+            
+            if text or finishing:
+                self.text_widget.see(tk.END)
+        except Exception as e:
+            print(f"更新流式消息出错: {e}")
+            self.close()
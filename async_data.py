@@ -0,0 +1,188 @@
+"""
+后台数据读取模块
+视图的查询在工作线程池中执行，每个工作线程使用自己的只读连接；
+结果经线程安全队列交回，由Tk主线程通过 root.after 取出并调用回调。
+同一键的新请求会使旧请求作废，旧结果到达后直接丢弃（例如已经切换到其他月份）
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 默认工作线程数
+DEFAULT_WORKERS = 2
+# 有未完成请求时，主线程检查结果队列的间隔（毫秒）
+DELIVERY_INTERVAL_MS = 15
+
+# 请求在开始执行前已作废
+_STALE = object()
+
+
+def _print_error(key, error):
+    """默认的错误回调"""
+    print(f"后台查询失败 [{key}]: {error}")
+
+
+class AsyncDataLoader:
+    """后台数据读取器
+
+    用法：loader.submit("calendar.month", lambda db: db.get_todos_by_date(day), render)
+    func在工作线程中以只读数据库实例为参数执行，render在Tk主线程中以结果为参数执行。
+    """
+
+    def __init__(self, root, reader_factory, workers=DEFAULT_WORKERS):
+        """reader_factory: 在工作线程中调用，返回该线程专用的只读数据库实例"""
+        self.root = root
+        self.reader_factory = reader_factory
+
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="DataReader")
+        self._results = queue.Queue()
+
+        # 每个键的最新请求编号，以及尚未交付的Future（用于取消排队中的旧请求）
+        self._generations = {}
+        self._futures = {}
+        self._pending = 0
+        self._drain_scheduled = False
+        self._closed = False
+
+        # 统计信息
+        self.submitted = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _get_reader(self):
+        """当前工作线程的只读数据库实例（首次使用时打开）"""
+        reader = getattr(self._local, 'reader', None)
+        if reader is None:
+            reader = self._local.reader = self.reader_factory()
+            with self._readers_lock:
+                self._readers.append(reader)
+        return reader
+
+    def _run(self, key, generation, func):
+        """工作线程中执行查询；请求已作废时跳过"""
+        if self._generations.get(key) != generation:
+            return _STALE
+        return func(self._get_reader())
+
+    def submit(self, key, func, callback, error_callback=None):
+        """提交查询（需在Tk主线程中调用），返回Future
+
+        callback(结果) 与 error_callback(异常) 都在Tk主线程中调用；
+        同一key上更早的请求作废，其结果不再交付。
+        """
+        if self._closed:
+            raise RuntimeError("AsyncDataLoader已关闭")
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+        previous = self._futures.get(key)
+        if previous is not None:
+            previous.cancel()
+
+        future = self._executor.submit(self._run, key, generation, func)
+        self._futures[key] = future
+        self._pending += 1
+        self.submitted += 1
+        future.add_done_callback(
+            lambda done: self._results.put((key, generation, done, callback, error_callback))
+        )
+        self._schedule_drain()
+        return future
+
+    def invalidate(self, key):
+        """作废某个键上尚未交付的请求（例如界面已直接用其他数据刷新）"""
+        self._generations[key] = self._generations.get(key, 0) + 1
+        previous = self._futures.pop(key, None)
+        if previous is not None:
+            previous.cancel()
+
+    def _schedule_drain(self):
+        if not self._drain_scheduled and not self._closed:
+            self._drain_scheduled = True
+            self.root.after(DELIVERY_INTERVAL_MS, self._drain)
+
+    def _drain(self):
+        """Tk主线程：取出已完成的请求并调用回调"""
+        self._drain_scheduled = False
+        while True:
+            try:
+                key, generation, future, callback, error_callback = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+            if future.cancelled() or self._generations.get(key) != generation:
+                self.dropped += 1
+                continue
+            error = future.exception()
+            if error is None and future.result() is _STALE:
+                self.dropped += 1
+                continue
+            try:
+                if error is None:
+                    self.delivered += 1
+                    callback(future.result())
+                else:
+                    self.failed += 1
+                    (error_callback or (lambda e: _print_error(key, e)))(error)
+            except Exception as e:
+                print(f"处理查询结果时出错 [{key}]: {e}")
+
+        if self._pending > 0:
+            self._schedule_drain()
+
+    def get_stats(self):
+        """获取请求统计"""
+        return {
+            'submitted': self.submitted,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'pending': self._pending,
+        }
+
+    def close(self):
+        """停止工作线程并关闭只读连接"""
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._readers_lock:
+            for reader in self._readers:
+                try:
+                    reader.close()
+                except Exception as e:
+                    print(f"关闭只读连接失败: {e}")
+            self._readers.clear()
+
+
+class InlineDataLoader:
+    """同步执行的数据读取器：与AsyncDataLoader接口相同，直接在调用线程中使用给定的数据库实例
+
+    未接入后台读取时（如单独使用视图类、基准测试）作为默认值。
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def submit(self, key, func, callback, error_callback=None):
+        """立即执行查询并调用回调"""
+        try:
+            result = func(self.db_manager)
+        except Exception as e:
+            (error_callback or (lambda error: _print_error(key, error)))(e)
+            return None
+        callback(result)
+        return None
+
+    def invalidate(self, key):
+        """同步执行没有排队中的请求"""
+        pass
+
+    def close(self):
+        pass
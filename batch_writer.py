@@ -0,0 +1,167 @@
+"""
+批量写入模块
+写操作先进入队列，由后台线程在独立连接上合并成批，每批一个事务提交，
+调用方（通常是UI线程）不必等待磁盘同步
+"""
+import queue
+import sqlite3
+import threading
+import time
+
+# 队列中的控制项
+_STOP = object()
+
+
+class BatchedWriter:
+    """后台批量写入器"""
+
+    def __init__(self, db_path, flush_interval=0.2, max_batch=500):
+        """flush_interval: 收到第一条写入后最多再等待多久以合并后续写入（秒）"""
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # 统计信息
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_batch_time = 0.0
+
+    def _ensure_thread(self):
+        """首次写入时启动后台线程"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="BatchedWriter", daemon=True)
+                self._thread.start()
+
+    def submit(self, sql, params=(), callback=None):
+        """提交一条写入；callback(成功, lastrowid或错误信息) 在写入线程中调用"""
+        if self._closed:
+            raise RuntimeError("BatchedWriter已关闭")
+        self._ensure_thread()
+        self.submitted += 1
+        self._queue.put((sql, tuple(params), callback))
+
+    def flush(self, timeout=None):
+        """等待此前提交的写入全部提交到数据库，返回是否在超时前完成"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """写完队列中剩余的数据后停止后台线程"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def get_stats(self):
+        """获取写入统计"""
+        return {
+            'submitted': self.submitted,
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches,
+            'pending': self._queue.qsize(),
+            'last_batch_size': self.last_batch_size,
+            'last_batch_ms': self.last_batch_time * 1000,
+        }
+
+    def _collect_batch(self, first):
+        """以first为首，在flush_interval内合并后续写入；返回 (写入列表, 完成事件列表, 是否停止)"""
+        writes = []
+        events = []
+        stop = False
+        deadline = time.monotonic() + self.flush_interval
+        item = first
+        while True:
+            if item is _STOP:
+                stop = True
+                break
+            if isinstance(item, threading.Event):
+                # flush请求：立即写出当前批次
+                events.append(item)
+                break
+            writes.append(item)
+            if len(writes) >= self.max_batch:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return writes, events, stop
+
+    def _write_batch(self, conn, writes):
+        """在一个事务中写入整批；失败时回滚并逐条重试，避免一条坏数据拖累整批"""
+        start = time.perf_counter()
+        results = []
+        try:
+            conn.execute("BEGIN")
+            for sql, params, _ in writes:
+                results.append(conn.execute(sql, params).lastrowid)
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"批量写入失败，改为逐条写入: {e}")
+            results = []
+            for sql, params, _ in writes:
+                try:
+                    with conn:
+                        results.append(conn.execute(sql, params).lastrowid)
+                except Exception as item_error:
+                    results.append(item_error)
+
+        self.batches += 1
+        self.last_batch_size = len(writes)
+        self.last_batch_time = time.perf_counter() - start
+
+        for (sql, params, callback), result in zip(writes, results):
+            success = not isinstance(result, Exception)
+            if success:
+                self.written += 1
+            else:
+                self.failed += 1
+                print(f"写入失败: {result}")
+            if callback:
+                try:
+                    callback(success, result if success else str(result))
+                except Exception as e:
+                    print(f"写入回调出错: {e}")
+
+    def _run(self):
+        """后台线程主循环"""
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            while True:
+                writes, events, stop = self._collect_batch(self._queue.get())
+                if writes:
+                    self._write_batch(conn, writes)
+                for event in events:
+                    event.set()
+                if stop:
+                    break
+        finally:
+            conn.close()
+            # 关闭后仍在等待的flush不应永久阻塞
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    item.set()
@@ -0,0 +1,225 @@
+"""
+AI链路端到端基准测试
+在进程内启动接口桩服务（llm_stub.py），让 AIAssistant.process_ai_response 走完整流程
+（提示词组装、流式请求、解析回复、执行操作、保存对话），不创建界面；
+统计首字延迟、总耗时和应用自身开销（总耗时减去桩服务处理请求的时间），
+结果格式同 bench_suite.py，可用 compare.py 对比
+
+用法：
+    python benchmarks/bench_ai.py                                        # 1k任务，桩服务默认参数
+    python benchmarks/bench_ai.py --latency 0.5 --tokens-per-second 30 --runs 20
+    python benchmarks/bench_ai.py --error-rate 0.2                      # 注入错误，统计失败和离线回复
+    python benchmarks/bench_ai.py --replay cassette.jsonl               # 按录制的真实响应回放
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import module_registry
+import llm_stub
+from bench_suite import RESULTS_DIR, get_dataset, git_revision, summarize
+
+# 场景: (名称, 用户输入模板)；{id} 替换为一个待处理任务的ID
+SCENARIOS = [
+    ('chat', "帮我看看今天应该先做哪些事情"),
+    ('complete', "完成任务 ID:{id}"),
+    ('add', "添加任务：明天下午3点和客户开会，很重要"),
+]
+
+
+class HeadlessUI:
+    """无界面的AI助手界面：记录消息和首个流式分片到达的时间，需要确认的操作直接确认"""
+
+    def __init__(self, assistant):
+        self.assistant = assistant
+        self.task_info = None
+        self.reset()
+
+    def reset(self):
+        self.messages = []
+        self.first_chunk_at = None
+
+    def add_message(self, sender, message, style="secondary"):
+        self.messages.append((sender, message, style))
+
+    def add_streaming_message(self, sender, style="assistant"):
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        return []
+
+    def update_streaming_message(self, message, content):
+        message.append(content)
+
+    def finish_streaming_message(self, message):
+        self.messages.append(("AI助手", "".join(message), "assistant"))
+
+    def show_operation_confirmation(self, action, ai_response, user_input):
+        self.assistant.execute_operation(action, user_input, ai_response)
+
+    def show_task_confirmation(self, task_info, user_input):
+        self.task_info = task_info
+
+    def run_on_ui_thread(self, func):
+        func()
+
+
+def write_config(work_dir, db_path, api_url):
+    """写入指向桩服务的配置文件（关闭MCP，所有请求都走大模型接口）"""
+    config_path = os.path.join(work_dir, 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'database': {'path': db_path},
+            'ai_assistant': {'api_key': 'stub', 'api_url': api_url, 'offline_mode': False},
+            'mcp': {'enabled': False},
+        }, f, ensure_ascii=False, indent=2)
+    return config_path
+
+
+def run_scenario(assistant, server, template, todo_ids, runs):
+    """执行一个场景runs次（先预热一次），返回各项耗时样本和失败次数"""
+    samples = {'ttft': [], 'total': [], 'server': [], 'overhead': [], 'before_request': [], 'after_response': []}
+    errors = 0
+    for index in range(runs + 1):
+        user_input = template.format(id=todo_ids[index % len(todo_ids)])
+        assistant.ai_core.clear_cache()
+        assistant.ui.reset()
+        server.take_records()
+
+        start = time.perf_counter()
+        assistant.process_ai_response(user_input)
+        end = time.perf_counter()
+
+        records = server.take_records()
+        if index == 0:
+            continue
+        if len(records) != 1 or records[0]['status'] != 200 or records[0]['disconnected']:
+            errors += 1
+            continue
+        record = records[0]
+        served = record['done'] - record['received']
+        samples['total'].append((end - start) * 1000)
+        samples['server'].append(served * 1000)
+        samples['overhead'].append((end - start - served) * 1000)
+        samples['before_request'].append((record['received'] - start) * 1000)
+        samples['after_response'].append((end - record['done']) * 1000)
+        if assistant.ui.first_chunk_at is not None:
+            samples['ttft'].append((assistant.ui.first_chunk_at - start) * 1000)
+    return samples, errors
+
+
+def run_benchmark(size, seed, server, runs, only=None):
+    """在一份数据集副本上运行全部场景"""
+    database_module = module_registry.load_module('1_database', '1_database.py')
+    config_module = module_registry.load_module('9_config_manager', '9_config_manager.py')
+    assistant_module = module_registry.load_module('8_ai_assistant', '8_ai_assistant.py')
+
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix='bench_ai_')
+    db = assistant = None
+    try:
+        # 场景会完成任务、写入对话记录，在副本上运行
+        db_path = os.path.join(work_dir, 'todos.db')
+        shutil.copy(get_dataset(size, seed), db_path)
+        config = config_module.ConfigManager(write_config(work_dir, db_path, server.url))
+        db = database_module.DatabaseManager(db_path)
+        assistant = assistant_module.AIAssistant(db, None, config)
+        assistant.ui = HeadlessUI(assistant)
+        todo_ids = [todo['id'] for todo in db.get_pending_todos(runs + 1)] or [1]
+
+        for name, template in SCENARIOS:
+            if only and name not in only:
+                continue
+            samples, errors = run_scenario(assistant, server, template, todo_ids, runs)
+            for metric in ('ttft', 'total', 'overhead', 'before_request', 'after_response'):
+                if samples[metric]:
+                    results[f"ai_{name}_{metric}"] = summarize(samples[metric])
+            if errors:
+                results[f"ai_{name}_total"] = dict(results.get(f"ai_{name}_total", {}), errors=errors)
+            ttft = results.get(f"ai_{name}_ttft", {}).get('median_ms')
+            total = results.get(f"ai_{name}_total", {}).get('median_ms')
+            overhead = results.get(f"ai_{name}_overhead", {}).get('median_ms')
+            print(f"  {name:<10} 首字 {_format_ms(ttft):>9}  总耗时 {_format_ms(total):>9}  "
+                  f"应用开销 {_format_ms(overhead):>9}  失败 {errors}/{runs}")
+    finally:
+        if assistant is not None:
+            assistant.shutdown()
+        if db is not None:
+            db.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def _format_ms(value):
+    return f"{value:.1f}ms" if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI链路端到端基准测试（本地接口桩服务）")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000], help="数据规模")
+    parser.add_argument('--seed', type=int, default=42, help="数据生成随机种子")
+    parser.add_argument('--runs', type=int, default=10, help="每个场景的运行次数")
+    parser.add_argument('--only', nargs='+', choices=[name for name, _ in SCENARIOS], help="只运行这些场景")
+    parser.add_argument('--latency', type=float, default=0.2, help="桩服务首个token前的延迟（秒）")
+    parser.add_argument('--tokens-per-second', type=float, default=50.0, help="桩服务生成速度，0表示一次性输出")
+    parser.add_argument('--reply-tokens', type=int, help="桩服务回复的token数")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="桩服务返回错误的概率")
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help="桩服务流式输出中途断开的概率")
+    parser.add_argument('--replay', metavar='CASSETTE', help="按录制文件回放（忽略桩服务的延迟和速度参数）")
+    parser.add_argument('--output', help="结果JSON路径（默认 benchmarks/results/<时间>-<提交>-ai.json）")
+    args = parser.parse_args()
+
+    settings = llm_stub.StubSettings(
+        latency=args.latency, tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate, disconnect_rate=args.disconnect_rate, seed=args.seed,
+    )
+    if args.replay:
+        server = llm_stub.LLMStubServer(mode=llm_stub.MODE_REPLAY, settings=settings,
+                                        cassette=llm_stub.Cassette(args.replay).load())
+    else:
+        server = llm_stub.LLMStubServer(settings=settings)
+    server.start()
+
+    revision = git_revision()
+    report = {
+        'meta': {
+            'revision': revision,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'runs': args.runs,
+            'stub': dict(settings.as_dict(), mode=server.mode, replay=args.replay),
+        },
+        'results': {},
+    }
+    try:
+        for size in args.sizes:
+            print(f"数据规模 {size}（接口桩服务 {server.mode}）:")
+            report['results'][str(size)] = run_benchmark(size, args.seed, server, args.runs, args.only)
+    finally:
+        server.stop()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{revision}-ai.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+
+
+if __name__ == '__main__':
+    main()
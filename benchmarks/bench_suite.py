@@ -0,0 +1,274 @@
+"""
+性能基准测试套件
+在不同数据规模下统计数据库查询、任务解析、SQL意图查询和各视图数据整理的耗时，
+结果保存为JSON，供 compare.py 在不同提交之间对比
+
+用法：
+    python benchmarks/bench_suite.py                      # 默认 1k/10k/100k/1M
+    python benchmarks/bench_suite.py --sizes 1000 10000   # 指定规模
+    python benchmarks/bench_suite.py --only db_ parser_   # 只运行名称前缀匹配的项目
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import module_registry
+from datagen import generate_database
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# 任务解析和SQL意图查询使用的输入样本
+PARSER_INPUTS = [
+    "明天下午3点提醒我开会",
+    "下周五之前完成季度报告，很重要",
+    "买牛奶",
+    "工作项目：整理会议纪要，优先级高，后天截止",
+    "每周一早上9点复习英语单词",
+    "紧急！今天修复登录页面的bug",
+]
+# 标题补全的输入样本（前缀、标题中间的词、不存在的标题）
+TRIE_INPUTS = ["整", "整理", "整理会议", "周报", "会议纪要初", "代码评审", "不存在的标题"]
+QUERY_INPUTS = [
+    "查询 待处理 重要紧急 任务",
+    "查看 今天 工作 任务",
+    "统计 项目 数量",
+    "显示 逾期 任务",
+    "搜索 收件箱",
+]
+
+
+def measure(func, min_runs=3, max_runs=50, min_time=0.5):
+    """重复执行func，返回耗时统计（毫秒）；先预热一次"""
+    func()
+    samples = []
+    total = 0.0
+    while len(samples) < max_runs and (len(samples) < min_runs or total < min_time):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed * 1000)
+        total += elapsed
+    return summarize(samples)
+
+
+def summarize(samples):
+    """耗时样本（毫秒）的统计"""
+    samples = sorted(samples)
+    return {
+        'runs': len(samples),
+        'min_ms': samples[0],
+        'median_ms': statistics.median(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'max_ms': samples[-1],
+    }
+
+
+def _load_view(module_name, class_name, db):
+    """加载视图类（依赖ttkbootstrap），不可用时返回None"""
+    try:
+        module = module_registry.load_module(module_name, f"{module_name}.py")
+    except ImportError as e:
+        print(f"  跳过 {module_name}: {e}")
+        return None
+    return getattr(module, class_name)(db, None)
+
+
+def build_benchmarks(db, db_path):
+    """构建基准测试项目：[(名称, 函数)]"""
+    today = datetime.now().date()
+    today_str = today.strftime('%Y-%m-%d')
+    week_later = (today + timedelta(days=7)).strftime('%Y-%m-%d')
+    now_str = datetime.now().strftime('%Y-%m-%d %H:%M')
+    sample_id = db.conn.execute("SELECT MAX(id) / 2 FROM todos").fetchone()[0] or 1
+    sample_project = db.conn.execute(
+        "SELECT project FROM project_stats ORDER BY total DESC LIMIT 1"
+    ).fetchone()
+    sample_project = sample_project[0] if sample_project else '未分类'
+
+    benches = [
+        # DatabaseManager 查询方法
+        ('db_get_all_todos', lambda: db.get_all_todos()),
+        ('db_get_pending_todos_200', lambda: db.get_pending_todos(200)),
+        ('db_get_pending_todos_all', lambda: db.get_pending_todos()),
+        ('db_get_todo_by_id', lambda: db.get_todo_by_id(sample_id)),
+        ('db_get_todos_by_date', lambda: db.get_todos_by_date(today_str)),
+        ('db_get_todos_by_priority_and_gtd', lambda: db.get_todos_by_priority_and_gtd(1, 'next-action')),
+        ('db_get_pending_reminders', lambda: db.get_pending_reminders(now_str)),
+        ('db_get_statistics', lambda: db.get_statistics()),
+        ('db_get_project_statistics', lambda: db.get_project_statistics()),
+        ('db_get_upcoming_tasks', lambda: db.get_upcoming_tasks(today_str, week_later)),
+        ('db_get_project_stats', lambda: db.get_project_stats()),
+        ('db_get_daily_trends_365', lambda: db.get_daily_trends(
+            (today - timedelta(days=364)).strftime('%Y-%m-%d'), today_str)),
+        ('db_get_project_records', lambda: db.get_project_records(sample_project, 'note')),
+    ]
+
+    # 任务内存存储：加载（含建立索引）和加载后的读取
+    task_store = module_registry.load_module('task_store', 'task_store.py')
+    store = task_store.TaskStore(db)
+    benches += [
+        ('store_load', lambda: task_store.load_index(db)),
+        ('store_get_pending_todos_200', lambda: store.get_pending_todos(200)),
+        ('store_get_todos_by_date', lambda: store.get_todos_by_date(today_str)),
+        ('store_get_upcoming_tasks', lambda: store.get_upcoming_tasks(today_str, week_later)),
+        ('store_get_statistics', lambda: store.get_statistics()),
+    ]
+
+    # 标题补全索引：从历史标题和模板建立，以及逐字输入时的查询
+    title_trie = module_registry.load_module('title_trie', 'title_trie.py')
+    trie = title_trie.load_trie(db)
+    benches += [
+        ('trie_load', lambda: title_trie.load_trie(db)),
+        ('trie_suggest', lambda: [trie.suggest(text) for text in TRIE_INPUTS]),
+    ]
+
+    # 重复规则展开（远离起始日的多年范围）
+    recurrence = module_registry.load_module('recurrence', 'recurrence.py')
+    rules = [recurrence.RecurrenceRule.parse(text) for text in recurrence.RULE_PRESETS.values() if text]
+    rule_start = today - timedelta(days=3650)
+    benches.append(('recurrence_expand_5y', lambda: [
+        rule.between(rule_start, today, today + timedelta(days=5 * 365)) for rule in rules
+    ]))
+    
+    # 任务解析
+    task_parser_module = module_registry.load_module('task_parser', 'task_parser.py')
+    parser = task_parser_module.TaskParser()
+    benches.append(('parser_parse_task_from_input',
+                    lambda: [parser.parse_task_from_input(text) for text in PARSER_INPUTS]))
+
+    # SQL意图查询
+    sql_handler_module = module_registry.load_module('sql_handler', 'sql_handler.py')
+    sql_handler = sql_handler_module.SQLHandler(db_path)
+    benches.append(('sql_handle_query_request',
+                    lambda: [sql_handler.handle_query_request(text) for text in QUERY_INPUTS]))
+
+    # 视图数据整理（不创建控件）
+    quadrant_view = _load_view('5_quadrant_view', 'QuadrantView', db)
+    if quadrant_view:
+        benches.append(('view_quadrant_rows',
+                        lambda: quadrant_view.build_integrated_rows(quadrant_view.task_store.get_all_todos())))
+
+    calendar_view = _load_view('4_calendar_view', 'CalendarView', db)
+    if calendar_view:
+        first_day = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        last_day = (first_day + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        benches.append(('view_calendar_month',
+                        lambda: calendar_view.get_month_tasks(first_day, last_day)))
+
+    project_view = _load_view('7_project_view', 'ProjectView', db)
+    if project_view:
+        benches.append(('view_project_statistics', lambda: project_view.get_project_statistics()))
+        benches.append(('view_project_progress',
+                        lambda: project_view.get_project_progress_data(sample_project)))
+
+    summary_view = _load_view('6_summary_view', 'SummaryView', db)
+    if summary_view:
+        benches.append(('view_summary_data', lambda: (
+            db.get_statistics(),
+            db.get_project_statistics(),
+            db.get_upcoming_tasks(today_str, week_later),
+        )))
+        benches.append(('view_summary_trends_30d', lambda: summary_view.get_trend_data("近30天")))
+        benches.append(('view_summary_trends_52w', lambda: summary_view.get_trend_data("近52周")))
+
+    return benches, [sql_handler]
+
+
+def get_dataset(size, seed, regenerate=False):
+    """获取指定规模的数据集（按规模、种子和日期缓存）"""
+    anchor = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    path = os.path.join(DATA_DIR, f"todos_{size}_{seed}_{anchor.strftime('%Y%m%d')}.db")
+    if regenerate or not os.path.exists(path):
+        print(f"  生成 {size} 条数据...")
+        elapsed = generate_database(path, size, seed=seed, anchor=anchor)
+        print(f"  生成完成（{elapsed:.1f} 秒）")
+    return path
+
+
+def run_size(size, seed, only=None, regenerate=False):
+    """在一个数据规模上运行全部基准测试"""
+    database_module = module_registry.load_module('1_database', '1_database.py')
+    db_path = get_dataset(size, seed, regenerate)
+    db = database_module.DatabaseManager(db_path)
+    results = {}
+    try:
+        benches, closeables = build_benchmarks(db, db_path)
+        for name, func in benches:
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            try:
+                results[name] = measure(func)
+                print(f"  {name:<36}{results[name]['median_ms']:>12.2f} ms")
+            except Exception as e:
+                results[name] = {'error': str(e)}
+                print(f"  {name:<36}{'失败':>12}  {e}")
+        for item in closeables:
+            item.close()
+    finally:
+        db.close()
+    return results
+
+
+def git_revision():
+    """当前提交（工作区有改动时加 -dirty）"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=APP_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return revision + ('-dirty' if dirty else '')
+    except Exception:
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="待办事项性能基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="数据规模")
+    parser.add_argument('--seed', type=int, default=42, help="数据生成随机种子")
+    parser.add_argument('--only', nargs='+', help="只运行名称以这些前缀开头的项目")
+    parser.add_argument('--regenerate', action='store_true', help="重新生成数据集")
+    parser.add_argument('--output', help="结果JSON路径（默认 benchmarks/results/<时间>-<提交>.json）")
+    args = parser.parse_args()
+
+    revision = git_revision()
+    report = {
+        'meta': {
+            'revision': revision,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+        },
+        'results': {},
+    }
+
+    for size in args.sizes:
+        print(f"数据规模 {size}:")
+        report['results'][str(size)] = run_size(size, args.seed, args.only, args.regenerate)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{revision}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+基准测试结果对比
+比较两次 bench_suite.py 的JSON结果，按中位数耗时列出变化，超过阈值的变慢项视为回归
+
+用法：
+    python benchmarks/compare.py benchmarks/results/旧.json benchmarks/results/新.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    """读取结果文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(base, current, threshold=0.2, min_ms=0.05):
+    """对比两份结果，返回 (行列表, 回归列表)
+
+    耗时都低于min_ms的项目计时噪声太大，不判定回归。
+    """
+    rows = []
+    regressions = []
+    for size, benches in current['results'].items():
+        base_benches = base['results'].get(size, {})
+        for name, stats in benches.items():
+            old = base_benches.get(name)
+            if 'error' in stats or not old or 'error' in old:
+                rows.append((size, name, old.get('median_ms') if old else None, stats.get('median_ms'), None))
+                continue
+            ratio = stats['median_ms'] / old['median_ms'] if old['median_ms'] else None
+            rows.append((size, name, old['median_ms'], stats['median_ms'], ratio))
+            if ratio and ratio > 1 + threshold and max(old['median_ms'], stats['median_ms']) >= min_ms:
+                regressions.append((size, name, old['median_ms'], stats['median_ms'], ratio))
+    return rows, regressions
+
+
+def _format_ms(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次基准测试结果")
+    parser.add_argument('base', help="基准结果JSON")
+    parser.add_argument('current', help="当前结果JSON")
+    parser.add_argument('--threshold', type=float, default=0.2, help="回归阈值（0.2表示变慢20%%）")
+    args = parser.parse_args()
+
+    base = load_results(args.base)
+    current = load_results(args.current)
+    rows, regressions = compare(base, current, args.threshold)
+
+    print(f"基准: {base['meta'].get('revision')}  当前: {current['meta'].get('revision')}")
+    print(f"{'规模':>8}  {'项目':<36}{'基准ms':>12}{'当前ms':>12}{'变化':>10}")
+    for size, name, old, new, ratio in rows:
+        change = f"{(ratio - 1) * 100:+.1f}%" if ratio else "-"
+        print(f"{size:>8}  {name:<36}{_format_ms(old):>12}{_format_ms(new):>12}{change:>10}")
+
+    if regressions:
+        print(f"\n{len(regressions)} 项变慢超过 {args.threshold * 100:.0f}%:")
+        for size, name, old, new, ratio in regressions:
+            print(f"  [{size}] {name}: {old:.2f} ms -> {new:.2f} ms ({(ratio - 1) * 100:+.1f}%)")
+        sys.exit(1)
+    print("\n没有发现性能回归")
+
+
+if __name__ == '__main__':
+    main()
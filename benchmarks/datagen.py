@@ -0,0 +1,158 @@
+"""
+合成数据生成器
+按固定随机种子生成可复现的待办事项数据集，用于性能基准测试
+
+用法：
+    python benchmarks/datagen.py --count 100000 --output benchmarks/data/todos_100k.db
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import module_registry
+
+# 默认分布（权重），None表示未分类
+DEFAULT_PROJECTS = {'工作': 40, '学习': 20, '生活': 15, '个人': 10, '健身': 5, None: 10}
+DEFAULT_PRIORITIES = {1: 15, 2: 35, 3: 20, 4: 30}
+DEFAULT_GTD_TAGS = {'next-action': 40, 'waiting-for': 15, 'someday-maybe': 15, 'inbox': 30}
+DEFAULT_STATUSES = {'pending': 55, 'completed': 40, 'cancelled': 5}
+
+# 中文标题素材：动作 + 对象 + 可选补充
+TITLE_VERBS = ['完成', '整理', '准备', '复习', '提交', '联系', '购买', '修复', '设计', '安排',
+               '检查', '预约', '回复', '更新', '阅读', '讨论', '规划', '学习', '清理', '跟进']
+TITLE_OBJECTS = ['季度报告', '会议纪要', '项目方案', '英语单词', '体检', '生日礼物', '登录页面', '家庭聚餐',
+                 '读书笔记', '预算表', '客户邮件', '周报', '数据库迁移', '旅行行程', '房租', '年度计划',
+                 '团队分享', '健身计划', '代码评审', '产品需求']
+TITLE_SUFFIXES = ['', '', '', '（紧急）', '初稿', '第二版', '并发给领导', '相关资料', '的细节', '下周之前']
+
+INSERT_SQL = '''
+    INSERT INTO todos (title, description, project, responsibility, priority, urgency, importance,
+                       gtd_tag, due_date, reminder_time, status, created_at, completed_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def _weighted_picker(rng, weights):
+    """返回按权重抽样的函数"""
+    values = list(weights)
+    cumulative = []
+    total = 0
+    for value in values:
+        total += weights[value]
+        cumulative.append(total)
+
+    def pick():
+        point = rng.random() * total
+        for value, bound in zip(values, cumulative):
+            if point < bound:
+                return value
+        return values[-1]
+    return pick
+
+
+def generate_rows(count, seed=42, anchor=None, spread_days=365, due_ratio=0.7,
+                  projects=None, priorities=None, gtd_tags=None, statuses=None):
+    """生成待办事项行（与INSERT_SQL的列顺序一致）
+
+    anchor: 数据的时间锚点（默认今天），创建时间分布在锚点之前spread_days天内，
+    截止日期分布在创建时间前后。
+    """
+    rng = random.Random(seed)
+    anchor = anchor or datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    pick_project = _weighted_picker(rng, projects or DEFAULT_PROJECTS)
+    pick_priority = _weighted_picker(rng, priorities or DEFAULT_PRIORITIES)
+    pick_gtd = _weighted_picker(rng, gtd_tags or DEFAULT_GTD_TAGS)
+    pick_status = _weighted_picker(rng, statuses or DEFAULT_STATUSES)
+
+    for _ in range(count):
+        title = rng.choice(TITLE_VERBS) + rng.choice(TITLE_OBJECTS) + rng.choice(TITLE_SUFFIXES)
+        priority = pick_priority()
+        status = pick_status()
+        created = anchor - timedelta(seconds=rng.randint(0, spread_days * 86400))
+
+        due_date = None
+        reminder_time = None
+        if rng.random() < due_ratio:
+            due = created + timedelta(days=rng.randint(-3, 30))
+            due_date = due.strftime('%Y-%m-%d')
+            if rng.random() < 0.3:
+                reminder_time = (due - timedelta(hours=rng.randint(1, 24))).strftime('%Y-%m-%d %H:%M')
+
+        completed_at = None
+        if status == 'completed':
+            completed = created + timedelta(seconds=rng.randint(600, 45 * 86400))
+            completed_at = min(completed, anchor).strftime('%Y-%m-%d %H:%M:%S')
+
+        yield (
+            title,
+            f"{title}的详细说明" if rng.random() < 0.4 else "",
+            pick_project(),
+            rng.choice(['owner', 'owner', 'participant', 'follower']),
+            priority,
+            1 if priority in (1, 3) else 0,
+            1 if priority in (1, 2) else 0,
+            pick_gtd(),
+            due_date,
+            reminder_time,
+            status,
+            created.strftime('%Y-%m-%d %H:%M:%S'),
+            completed_at,
+        )
+
+
+def generate_database(db_path, count, seed=42, anchor=None, chunk_size=10000, **distribution):
+    """创建数据库并写入count条合成数据，返回耗时（秒）"""
+    database_module = module_registry.load_module('1_database', '1_database.py')
+
+    directory = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    start = time.perf_counter()
+    db = database_module.DatabaseManager(db_path)
+    try:
+        rows = generate_rows(count, seed=seed, anchor=anchor, **distribution)
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                db.conn.executemany(INSERT_SQL, chunk)
+                db.conn.commit()
+                chunk = []
+        if chunk:
+            db.conn.executemany(INSERT_SQL, chunk)
+            db.conn.commit()
+        db.conn.execute("ANALYZE")
+        db.conn.commit()
+    finally:
+        db.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成待办事项数据集")
+    parser.add_argument('--count', type=int, default=10000, help="任务数量")
+    parser.add_argument('--seed', type=int, default=42, help="随机种子")
+    parser.add_argument('--spread-days', type=int, default=365, help="创建时间分布的天数")
+    parser.add_argument('--anchor', help="时间锚点 YYYY-MM-DD（默认今天）")
+    parser.add_argument('--output', default=None, help="输出数据库路径")
+    args = parser.parse_args()
+
+    anchor = datetime.strptime(args.anchor, '%Y-%m-%d').replace(hour=12) if args.anchor else None
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                                         f'todos_{args.count}_{args.seed}.db')
+    elapsed = generate_database(output, args.count, seed=args.seed, anchor=anchor,
+                                spread_days=args.spread_days)
+    print(f"已生成 {args.count} 条任务: {output}（{elapsed:.1f} 秒）")
+
+
+if __name__ == '__main__':
+    main()
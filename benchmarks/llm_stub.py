@@ -0,0 +1,437 @@
+"""
+本地大模型接口桩服务
+兼容 OpenAI/DeepSeek 的 chat/completions 接口：支持SSE流式输出、可配置的首字延迟和生成速度、错误注入；
+录制模式把请求转发到真实接口并保存请求/响应，回放模式按录制结果（含原始分片间隔）应答，
+供无外网的机器离线测试AI链路性能
+
+用法：
+    python benchmarks/llm_stub.py --port 8765 --latency 0.3 --tokens-per-second 40
+    python benchmarks/llm_stub.py --port 8765 --error-rate 0.1 --disconnect-rate 0.05
+    python benchmarks/llm_stub.py --record cassette.jsonl --upstream https://api.deepseek.com/v1/chat/completions --api-key sk-...
+    python benchmarks/llm_stub.py --replay cassette.jsonl
+然后把 config.json 中 ai_assistant.api_url 改为 http://127.0.0.1:8765/v1/chat/completions
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODE_STUB = 'stub'
+MODE_RECORD = 'record'
+MODE_REPLAY = 'replay'
+
+DEFAULT_REPLY = (
+    "好的，我查看了你当前的待办事项。今天有几项重要且紧急的任务，建议先处理截止日期最近的工作，"
+    "再把剩余时间留给下一步行动清单中的任务。需要的话我可以帮你调整优先级或安排提醒。"
+)
+
+# 近似的token切分：英文单词/数字、连续空白或单个字符（中文约一字一token）
+_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+|\s+|.", re.DOTALL)
+
+
+def split_tokens(text):
+    """把文本切成近似的token"""
+    return _TOKEN_PATTERN.findall(text or "")
+
+
+def request_key(body):
+    """请求的精确匹配键：模型、全部消息和是否流式"""
+    data = {name: body.get(name) for name in ('model', 'messages', 'stream')}
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def last_user_message(body):
+    """请求中最后一条用户消息（系统提示词含当前时间和待办数据，回放时按它做宽松匹配）"""
+    for message in reversed(body.get('messages') or []):
+        if isinstance(message, dict) and message.get('role') == 'user':
+            return message.get('content')
+    return None
+
+
+def estimate_usage(body, completion_tokens):
+    """按近似token数估算用量"""
+    prompt = "".join(str(message.get('content', '')) for message in body.get('messages') or []
+                     if isinstance(message, dict))
+    prompt_tokens = len(split_tokens(prompt))
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+    }
+
+
+class Cassette:
+    """录制的调用记录（JSONL，每行一次调用）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.by_key = {}
+        self.by_user = {}
+        self.count = 0
+
+    def load(self):
+        """读取已有的录制文件"""
+        if not os.path.exists(self.path):
+            return self
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    self._index(json.loads(line))
+        return self
+
+    def _index(self, entry):
+        self.by_key[entry['key']] = entry
+        if entry.get('user') is not None:
+            self.by_user.setdefault(entry['user'], entry)
+        self.count += 1
+
+    def append(self, entry):
+        """追加一次调用并立即写入文件"""
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._index(entry)
+
+    def find(self, body):
+        """查找请求对应的录制：先精确匹配，再按最后一条用户消息匹配"""
+        entry = self.by_key.get(request_key(body))
+        if entry is None:
+            entry = self.by_user.get(last_user_message(body))
+        return entry
+
+
+class StubSettings:
+    """桩服务模式下的应答参数"""
+
+    def __init__(self, latency=0.2, tokens_per_second=50.0, reply=DEFAULT_REPLY, reply_tokens=None,
+                 error_rate=0.0, error_status=500, disconnect_rate=0.0, seed=None):
+        """latency: 首个token前的延迟（秒）；tokens_per_second为0时一次性输出；
+        reply_tokens: 回复的token数（重复reply凑足，默认为reply本身的长度）；
+        error_rate: 直接返回error_status的概率；disconnect_rate: 流式输出中途断开的概率"""
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply = reply
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.disconnect_rate = disconnect_rate
+        self.seed = seed
+
+    def tokens(self):
+        """本次回复的token列表"""
+        tokens = split_tokens(self.reply)
+        if self.reply_tokens:
+            tokens = (tokens * (self.reply_tokens // max(len(tokens), 1) + 1))[:self.reply_tokens]
+        return tokens
+
+    def offsets(self, count):
+        """各token相对收到请求的输出时间（秒）"""
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        return [self.latency + index * interval for index in range(count)]
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class LLMStubServer(ThreadingHTTPServer):
+    """接口桩服务：每次调用的计时记录在 records 中（time.perf_counter 时间，与同进程的客户端可直接比较）"""
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), mode=MODE_STUB, settings=None, cassette=None,
+                 upstream=None, api_key=None):
+        if mode in (MODE_RECORD, MODE_REPLAY) and cassette is None:
+            raise ValueError(f"{mode} 模式需要录制文件")
+        if mode == MODE_RECORD and not upstream:
+            raise ValueError("record 模式需要真实接口地址")
+        super().__init__(address, _StubHandler)
+        self.mode = mode
+        self.settings = settings or StubSettings()
+        self.cassette = cassette
+        self.upstream = upstream
+        self.api_key = api_key
+        self.random = random.Random(self.settings.seed)
+        self.records = []
+        self._records_lock = threading.Lock()
+        self._sequence = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self):
+        """在后台线程中运行"""
+        self._thread = threading.Thread(target=self.serve_forever, name="llm-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务并关闭端口"""
+        self.shutdown()
+        self.server_close()
+
+    def next_id(self):
+        with self._records_lock:
+            self._sequence += 1
+            return f"chatcmpl-stub-{self._sequence}"
+
+    def chance(self, rate):
+        with self._records_lock:
+            return rate > 0 and self.random.random() < rate
+
+    def add_record(self, record):
+        with self._records_lock:
+            self.records.append(record)
+
+    def take_records(self):
+        """取出并清空已完成调用的计时记录"""
+        with self._records_lock:
+            records, self.records = self.records, []
+        return records
+
+
+class _ClientGone(Exception):
+    """客户端已断开"""
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        record = {'path': self.path, 'received': time.perf_counter(), 'first_byte': None, 'done': None,
+                  'status': None, 'stream': False, 'tokens': 0, 'disconnected': False}
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._send_error(record, 400, "请求体不是有效的JSON")
+                return
+            record['stream'] = bool(body.get('stream'))
+            if self.server.mode == MODE_RECORD:
+                self._proxy(body, record)
+            else:
+                self._respond(body, record)
+        except (_ClientGone, BrokenPipeError, ConnectionResetError):
+            record['disconnected'] = True
+        finally:
+            record['done'] = time.perf_counter()
+            self.server.add_record(record)
+
+    # ---- 输出 ----
+
+    def _write(self, record, data):
+        try:
+            self.wfile.write(data)
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            raise _ClientGone()
+        if record['first_byte'] is None:
+            record['first_byte'] = time.perf_counter()
+
+    def _send_json(self, record, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        record['status'] = status
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self._write(record, data)
+
+    def _send_error(self, record, status, message):
+        self._send_json(record, status, {'error': {'message': message, 'type': 'stub_error', 'code': status}})
+
+    def _start_stream(self, record):
+        # 不给出长度，以关闭连接标记结束
+        record['status'] = 200
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+    def _sse(self, record, payload):
+        data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+        self._write(record, f"data: {data}\n\n".encode('utf-8'))
+
+    # ---- 桩服务和回放 ----
+
+    def _respond(self, body, record):
+        server = self.server
+        if server.mode == MODE_REPLAY:
+            entry = server.cassette.find(body)
+            if entry is None:
+                self._send_error(record, 404, "录制文件中没有匹配的请求")
+                return
+            if entry['status'] != 200:
+                self._send_json(record, entry['status'], entry.get('error') or {})
+                return
+            tokens, offsets, usage = entry['chunks'], entry['offsets'], entry.get('usage')
+        else:
+            settings = server.settings
+            if server.chance(settings.error_rate):
+                self._send_error(record, settings.error_status, "注入的错误")
+                return
+            tokens = settings.tokens()
+            offsets = settings.offsets(len(tokens))
+            usage = None
+
+        usage = usage or estimate_usage(body, len(tokens))
+        model = body.get('model', 'stub')
+        completion_id = server.next_id()
+        start = record['received']
+
+        if not body.get('stream'):
+            if offsets:
+                self._sleep_until(start + offsets[-1])
+            record['tokens'] = len(tokens)
+            self._send_json(record, 200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': "".join(tokens)},
+                             'finish_reason': 'stop'}],
+                'usage': usage,
+            })
+            return
+
+        # 中途断开的位置（只在桩服务模式下注入）
+        cut = None
+        if server.mode == MODE_STUB and tokens and server.chance(server.settings.disconnect_rate):
+            cut = server.random.randrange(len(tokens))
+
+        self._start_stream(record)
+        for index, (token, offset) in enumerate(zip(tokens, offsets)):
+            if index == cut:
+                record['disconnected'] = True
+                return
+            self._sleep_until(start + offset)
+            self._sse(record, self._chunk(completion_id, model, {'content': token}))
+            record['tokens'] += 1
+        final = self._chunk(completion_id, model, {}, finish_reason='stop')
+        final['usage'] = usage
+        self._sse(record, final)
+        self._sse(record, "[DONE]")
+
+    @staticmethod
+    def _chunk(completion_id, model, delta, finish_reason=None):
+        return {
+            'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+        }
+
+    @staticmethod
+    def _sleep_until(deadline):
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    # ---- 录制 ----
+
+    def _proxy(self, body, record):
+        """转发到真实接口，原样返回给客户端，同时把分片内容和时间写入录制文件"""
+        server = self.server
+        authorization = f"Bearer {server.api_key}" if server.api_key else self.headers.get('Authorization', '')
+        request = urllib.request.Request(
+            server.upstream, data=json.dumps(body).encode('utf-8'), method='POST',
+            headers={'Content-Type': 'application/json', 'Authorization': authorization},
+        )
+        entry = {'key': request_key(body), 'user': last_user_message(body), 'request': body,
+                 'status': 200, 'stream': bool(body.get('stream')), 'chunks': [], 'offsets': [], 'usage': None}
+        start = record['received']
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                if entry['stream']:
+                    self._start_stream(record)
+                    for raw in response:
+                        line = raw.decode('utf-8').strip()
+                        if not line.startswith('data: '):
+                            continue
+                        data = line[6:]
+                        if data != '[DONE]':
+                            self._capture_chunk(entry, json.loads(data), time.perf_counter() - start)
+                        self._sse(record, data)
+                        record['tokens'] = len(entry['chunks'])
+                else:
+                    payload = json.loads(response.read())
+                    entry['chunks'] = split_tokens(payload['choices'][0]['message'].get('content', ''))
+                    entry['offsets'] = [time.perf_counter() - start] * len(entry['chunks'])
+                    entry['usage'] = payload.get('usage')
+                    record['tokens'] = len(entry['chunks'])
+                    self._send_json(record, 200, payload)
+        except urllib.error.HTTPError as e:
+            try:
+                error = json.loads(e.read() or b'{}')
+            except ValueError:
+                error = {'error': {'message': str(e)}}
+            entry.update(status=e.code, error=error)
+            self._send_json(record, e.code, error)
+        except (urllib.error.URLError, OSError) as e:
+            # 连不上真实接口时不写入录制文件
+            self._send_error(record, 502, f"无法连接真实接口: {e}")
+            return
+        server.cassette.append(entry)
+
+    @staticmethod
+    def _capture_chunk(entry, chunk, offset):
+        choices = chunk.get('choices') or []
+        content = choices[0].get('delta', {}).get('content') if choices else None
+        if content:
+            entry['chunks'].append(content)
+            entry['offsets'].append(offset)
+        if chunk.get('usage'):
+            entry['usage'] = chunk['usage']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地大模型接口桩服务")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址")
+    parser.add_argument('--port', type=int, default=8765, help="监听端口")
+    parser.add_argument('--latency', type=float, default=0.2, help="首个token前的延迟（秒）")
+    parser.add_argument('--tokens-per-second', type=float, default=50.0, help="生成速度，0表示一次性输出")
+    parser.add_argument('--reply', default=DEFAULT_REPLY, help="回复内容")
+    parser.add_argument('--reply-tokens', type=int, help="回复的token数（重复回复内容凑足）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回错误状态码的概率")
+    parser.add_argument('--error-status', type=int, default=500, help="注入错误时的状态码（如429、500、503）")
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help="流式输出中途断开的概率")
+    parser.add_argument('--seed', type=int, help="错误注入的随机种子")
+    parser.add_argument('--record', metavar='CASSETTE', help="录制模式：转发到 --upstream 并追加写入录制文件")
+    parser.add_argument('--replay', metavar='CASSETTE', help="回放模式：按录制文件应答")
+    parser.add_argument('--upstream', help="录制模式下的真实接口地址")
+    parser.add_argument('--api-key', help="录制模式下访问真实接口的密钥（默认使用客户端请求中的密钥）")
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency, args.tokens_per_second, args.reply, args.reply_tokens,
+                            args.error_rate, args.error_status, args.disconnect_rate, args.seed)
+    mode, cassette = MODE_STUB, None
+    if args.record:
+        mode, cassette = MODE_RECORD, Cassette(args.record).load()
+    elif args.replay:
+        mode, cassette = MODE_REPLAY, Cassette(args.replay).load()
+
+    server = LLMStubServer((args.host, args.port), mode, settings, cassette, args.upstream, args.api_key)
+    print(f"接口桩服务（{mode}）: {server.url}")
+    if cassette is not None:
+        print(f"录制文件: {cassette.path}（已有 {cassette.count} 条）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
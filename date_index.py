@@ -0,0 +1,81 @@
+"""
+日期整数编码模块
+todos表的日期列另有整数形式的生成列（天数/分钟数/秒数，均以1970-01-01为起点，不做时区换算），
+范围查询和排序直接比较整数；本模块提供与SQL一致的Python换算，以及整批计算剩余天数和到期分类
+"""
+from datetime import date, datetime
+
+EPOCH_DATE = date(1970, 1, 1)
+EPOCH = datetime(1970, 1, 1)
+
+# 生成列：(列名, 表达式)，与下面的Python换算保持一致；无法解析的日期为NULL
+TODO_DATE_COLUMNS = [
+    ('due_day', "CAST(strftime('%s', due_date) AS INTEGER) / 86400"),
+    ('reminder_minute', "CAST(strftime('%s', reminder_time) AS INTEGER) / 60"),
+    ('created_ts', "CAST(strftime('%s', created_at) AS INTEGER)"),
+    ('completed_ts', "CAST(strftime('%s', completed_at) AS INTEGER)"),
+]
+
+# 剩余天数不超过该值视为临近到期
+URGENT_DAYS = 3
+
+# 到期分类
+DUE_OVERDUE = "overdue"
+DUE_TODAY = "today"
+DUE_URGENT = "urgent"
+DUE_NORMAL = "normal"
+
+
+def _parse(value, formats):
+    if isinstance(value, str):
+        text = value.strip()
+        for fmt in formats:
+            try:
+                return datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+    return None
+
+
+def to_day(value):
+    """日期转换为天数（date/datetime/YYYY-MM-DD开头的字符串），无法解析时返回None"""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return (value - EPOCH_DATE).days
+    parsed = _parse(value[:10] if isinstance(value, str) else value, ('%Y-%m-%d',))
+    return (parsed.date() - EPOCH_DATE).days if parsed else None
+
+
+def from_day(day):
+    """天数转换为日期"""
+    return date.fromordinal(EPOCH_DATE.toordinal() + day)
+
+
+def to_minute(value):
+    """时间转换为分钟数（datetime或 YYYY-MM-DD HH:MM[:SS] 字符串），无法解析时返回None"""
+    if not isinstance(value, datetime):
+        value = _parse(value, ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'))
+        if value is None:
+            return None
+    return int((value.replace(second=0, microsecond=0) - EPOCH).total_seconds()) // 60
+
+
+def classify_due(due_days, today=None, urgent_days=URGENT_DAYS):
+    """整批计算剩余天数和到期分类：返回与due_days等长的 [(剩余天数, 分类)]，日期无效时为 (None, None)"""
+    today_day = to_day(today or date.today())
+    result = []
+    for due_day in due_days:
+        if due_day is None:
+            result.append((None, None))
+            continue
+        days_left = due_day - today_day
+        if days_left < 0:
+            result.append((days_left, DUE_OVERDUE))
+        elif days_left == 0:
+            result.append((days_left, DUE_TODAY))
+        elif days_left <= urgent_days:
+            result.append((days_left, DUE_URGENT))
+        else:
+            result.append((days_left, DUE_NORMAL))
+    return result
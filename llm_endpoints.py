@@ -0,0 +1,358 @@
+"""
+大模型接口池模块
+配置多个兼容 OpenAI/DeepSeek 的接口，请求按配置顺序发往可用的接口：
+- 对冲：首选接口超过其近期p95响应时间仍未开始返回时，向下一个接口发出相同请求，先返回的生效，另一个被取消
+- 故障转移：接口返回错误时立即改用下一个接口
+- 熔断：接口连续失败达到阈值后暂停使用，冷却后放行一个试探请求，成功即恢复
+"""
+import queue
+import threading
+import time
+
+import module_registry
+import perf_metrics
+
+CancelToken = module_registry.load_module("ai_executor", "ai_executor.py").CancelToken
+
+# 熔断器状态
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+# 接口池参数（ai_assistant.endpoint_pool）的默认值
+DEFAULT_POOL_SETTINGS = {
+    "hedge": True,
+    "hedge_percentile": 95,
+    "hedge_min_delay": 1.0,       # 对冲延迟的下限（秒）
+    "hedge_max_delay": 15.0,      # 对冲延迟的上限（秒）
+    "hedge_initial_delay": 5.0,   # 样本不足时的对冲延迟（秒）
+    "hedge_min_samples": 5,
+    "failure_threshold": 3,       # 连续失败多少次后熔断
+    "reset_timeout": 30.0,        # 熔断后多久放行试探请求（秒）
+}
+
+# 对冲请求落败被取消时的原因
+HEDGE_LOST = "hedge_lost"
+
+
+class CircuitBreaker:
+    """单个接口的熔断器"""
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """当前状态：熔断冷却结束后为半开"""
+        if self.opened_at is None:
+            return BREAKER_CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return BREAKER_HALF_OPEN
+        return BREAKER_OPEN
+
+    def acquire(self):
+        """是否允许发出请求；半开时只放行一个试探请求"""
+        with self._lock:
+            state = self.state
+            if state == BREAKER_CLOSED:
+                return True
+            if state == BREAKER_HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._probing:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """请求被取消（不计成败）时归还试探名额"""
+        with self._lock:
+            self._probing = False
+
+
+class Endpoint:
+    """一个接口及其统计"""
+
+    def __init__(self, name, api_url, model, api_key=None, failure_threshold=3, reset_timeout=30.0):
+        """api_key为None时使用AICore的全局密钥"""
+        self.name = name
+        self.api_url = api_url
+        self.model = model
+        self.api_key = api_key
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        # 开始返回（流式为首个分片，非流式为完整响应）和完整请求的耗时
+        self.first_response = perf_metrics.SpanStats(f"llm.{name}.first_response")
+        self.total = perf_metrics.SpanStats(f"llm.{name}.total")
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.hedges = 0
+        self.wins = 0
+        self.last_error = None
+
+    def record_result(self, success, elapsed, error=None):
+        if success:
+            self.successes += 1
+            self.total.add(elapsed * 1000)
+            self.breaker.record_success()
+        else:
+            self.failures += 1
+            self.last_error = error
+            self.total.add(elapsed * 1000, error=True)
+            self.breaker.record_failure()
+
+    def record_cancelled(self):
+        self.cancelled += 1
+        self.breaker.release()
+
+    def get_stats(self):
+        """接口统计"""
+        first = self.first_response.summary()
+        total = self.total.summary()
+        return {
+            'name': self.name,
+            'api_url': self.api_url,
+            'model': self.model,
+            'state': self.breaker.state,
+            'trips': self.breaker.trips,
+            'requests': self.requests,
+            'successes': self.successes,
+            'failures': self.failures,
+            'cancelled': self.cancelled,
+            'hedges': self.hedges,
+            'wins': self.wins,
+            'first_response_p50_ms': first['p50_ms'],
+            'first_response_p95_ms': first['p95_ms'],
+            'total_p50_ms': total['p50_ms'],
+            'total_p95_ms': total['p95_ms'],
+            'last_error': self.last_error,
+        }
+
+
+class Attempt:
+    """一次发往某个接口的请求
+
+    请求函数在开始向调用方输出结果前调用 claim()：返回True表示本请求胜出（其余请求随即被取消），
+    返回False表示已有其他请求胜出，应丢弃结果并尽快结束。
+    请求函数可把响应中的 usage（token用量）存到 attempt.usage。
+    """
+
+    def __init__(self, race, endpoint, token, hedged):
+        self.race = race
+        self.endpoint = endpoint
+        self.token = token
+        self.hedged = hedged
+        self.started_at = time.monotonic()
+        self.first_response_at = None
+        self.usage = None
+
+    def claim(self):
+        return self.race.claim(self)
+
+
+class _Race:
+    """同一请求的各次尝试之间的胜出判定"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.winner = None
+        self.attempts = []
+
+    def claim(self, attempt):
+        with self.lock:
+            if self.winner is None and not attempt.token.cancelled:
+                self.winner = attempt
+                others = [other for other in self.attempts if other is not attempt]
+            else:
+                return self.winner is attempt
+        attempt.first_response_at = time.monotonic()
+        attempt.endpoint.first_response.add((attempt.first_response_at - attempt.started_at) * 1000)
+        for other in others:
+            other.token.cancel(HEDGE_LOST)
+        return True
+
+
+class _ParentLink:
+    """登记到调用方取消令牌上：调用方取消时一并取消各次尝试"""
+
+    def __init__(self, race):
+        self.race = race
+
+    def close(self):
+        for attempt in list(self.race.attempts):
+            attempt.token.cancel("cancelled")
+
+
+class EndpointPool:
+    """接口池"""
+
+    def __init__(self, endpoints, hedge=True, hedge_percentile=95, hedge_min_delay=1.0, hedge_max_delay=15.0,
+                 hedge_initial_delay=5.0, hedge_min_samples=5):
+        if not endpoints:
+            raise ValueError("接口池至少需要一个接口")
+        self.endpoints = list(endpoints)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.hedge_initial_delay = hedge_initial_delay
+        self.hedge_min_samples = hedge_min_samples
+
+    @classmethod
+    def from_config(cls, get, api_url, model):
+        """按配置创建：get为 ConfigManager.get；未配置 ai_assistant.endpoints 时只有 api_url/model 一个接口"""
+        settings = dict(DEFAULT_POOL_SETTINGS)
+        configured = get('ai_assistant.endpoint_pool', None) or {}
+        settings.update((key, value) for key, value in configured.items() if key in DEFAULT_POOL_SETTINGS)
+        breaker = {'failure_threshold': settings.pop('failure_threshold'),
+                   'reset_timeout': settings.pop('reset_timeout')}
+        endpoints = []
+        for index, item in enumerate(get('ai_assistant.endpoints', None) or []):
+            if not item.get('api_url') or item.get('enabled', True) is False:
+                continue
+            endpoints.append(Endpoint(
+                item.get('name') or f"endpoint{index + 1}", item['api_url'], item.get('model') or model,
+                item.get('api_key'), **breaker
+            ))
+        if not endpoints:
+            endpoints.append(Endpoint("default", api_url, model, None, **breaker))
+        return cls(endpoints, **settings)
+
+    def hedge_delay(self, endpoint):
+        """向下一个接口发出对冲请求前等待的时间：该接口开始返回耗时的p95，限制在上下限之间"""
+        stats = endpoint.first_response
+        if len(stats.samples) < self.hedge_min_samples:
+            delay = self.hedge_initial_delay
+        else:
+            delay = stats.percentile(self.hedge_percentile) / 1000
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, delay))
+
+    def call(self, request, cancel_token=None):
+        """发出请求，返回 (是否成功, 结果, 胜出或最后失败的尝试)
+
+        request(attempt) 在独立线程中执行并返回 (是否成功, 结果)，须使用 attempt.endpoint 的地址和模型，
+        以 attempt.token 作为取消令牌，并在输出结果前调用 attempt.claim()。
+        没有发出任何请求（全部熔断或已取消）时返回的尝试为None。
+        """
+        race = _Race()
+        results = queue.Queue()
+        candidates = iter(self.endpoints)
+        link = _ParentLink(race)
+        if cancel_token is not None:
+            cancel_token.register(link)
+
+        def launch(hedged):
+            for endpoint in candidates:
+                if endpoint.breaker.acquire():
+                    break
+            else:
+                return None
+            deadline = cancel_token.deadline if cancel_token is not None else None
+            attempt = Attempt(race, endpoint, CancelToken(deadline), hedged)
+            with race.lock:
+                race.attempts.append(attempt)
+            endpoint.requests += 1
+            if hedged:
+                endpoint.hedges += 1
+            threading.Thread(target=self._run, args=(request, attempt, results),
+                             name=f"llm-{endpoint.name}", daemon=True).start()
+            return attempt
+
+        try:
+            current = launch(False)
+            if current is None:
+                return False, "所有大模型接口均处于熔断状态，请稍后重试", None
+            running = 1
+            last_error = None
+            last_attempt = current
+            hedge_at = current.started_at + self.hedge_delay(current.endpoint)
+
+            while running:
+                if cancel_token is not None and cancel_token.cancelled:
+                    link.close()
+                    return False, "请求已取消", race.winner or last_attempt
+                can_hedge = self.hedge and race.winner is None and hedge_at != float('inf')
+                wait = min(0.5, hedge_at - time.monotonic()) if can_hedge else 0.5
+                try:
+                    attempt, success, result = results.get(timeout=max(0.0, wait))
+                except queue.Empty:
+                    if can_hedge and time.monotonic() >= hedge_at:
+                        # 开始返回前已超过p95：向下一个接口发出对冲请求
+                        hedged = launch(True)
+                        if hedged is None:
+                            # 没有其他可用接口，之后只等待已发出的请求
+                            hedge_at = float('inf')
+                        else:
+                            running += 1
+                            hedge_at = hedged.started_at + self.hedge_delay(hedged.endpoint)
+                    continue
+
+                running -= 1
+                if success and attempt.claim():
+                    attempt.endpoint.wins += 1
+                    return True, result, attempt
+                if attempt.token.cancelled:
+                    continue
+                last_error = result
+                last_attempt = attempt
+                if race.winner is attempt:
+                    # 已开始输出后失败，不能再换接口
+                    return False, result, attempt
+                if race.winner is None:
+                    # 故障转移：立即改用下一个接口
+                    failover = launch(False)
+                    if failover is not None:
+                        running += 1
+                        hedge_at = failover.started_at + self.hedge_delay(failover.endpoint)
+            return False, last_error or "大模型接口请求失败", last_attempt
+        finally:
+            if cancel_token is not None:
+                cancel_token.unregister(link)
+
+    @staticmethod
+    def _run(request, attempt, results):
+        """在工作线程中执行一次尝试并记录统计"""
+        try:
+            success, result = request(attempt)
+        except Exception as e:
+            success, result = False, f"请求异常: {e}"
+        elapsed = time.monotonic() - attempt.started_at
+        if attempt.token.cancelled:
+            attempt.endpoint.record_cancelled()
+        else:
+            attempt.endpoint.record_result(success, elapsed, None if success else result)
+        results.put((attempt, success, result))
+
+    def get_stats(self):
+        """各接口的统计"""
+        return [endpoint.get_stats() for endpoint in self.endpoints]
+
+    def format_stats(self):
+        """各接口统计的文本"""
+        lines = []
+        for stats in self.get_stats():
+            lines.append(
+                f"{stats['name']:<12}{stats['state']:<10}请求 {stats['requests']}  成功 {stats['successes']}  "
+                f"失败 {stats['failures']}  取消 {stats['cancelled']}  对冲 {stats['hedges']}  胜出 {stats['wins']}  "
+                f"首响应 p50 {stats['first_response_p50_ms']:.0f} ms / p95 {stats['first_response_p95_ms']:.0f} ms"
+            )
+        return "\n".join(lines)
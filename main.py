@@ -2,48 +2,58 @@
 智能待办事项管理器 - 主应用程序
 整合所有功能模块的主入口
 """
+import startup_profiler
+import module_registry
+import perf_metrics
+import ui_watchdog
+import async_data
+import date_index
+import task_store
+import notification_dispatcher
+import ai_call_metrics
 import tkinter as tk
 from tkinter import ttk, messagebox, BOTH, LEFT, RIGHT, X, Y, W, E, N, S, TOP
-import ttkbootstrap as ttk_bs
+ttk_bs = module_registry.load_module('ttkbootstrap')
 from ttkbootstrap.constants import *
-import importlib
 import os
 
-# 动态导入各个功能模块
-database_module = importlib.import_module('1_database')
-reminder_module = importlib.import_module('2_reminder_service')
-ui_module = importlib.import_module('3_ui_components')
-calendar_module = importlib.import_module('4_calendar_view')
-quadrant_module = importlib.import_module('5_quadrant_view')
-summary_module = importlib.import_module('6_summary_view')
-project_module = importlib.import_module('7_project_view')
+# 各个功能模块延迟加载：首次使用时才导入，且每个文件只执行一次
+database_module = module_registry.lazy_import('1_database', '1_database.py')
+reminder_module = module_registry.lazy_import('2_reminder_service', '2_reminder_service.py')
+ui_module = module_registry.lazy_import('3_ui_components', '3_ui_components.py')
+calendar_module = module_registry.lazy_import('4_calendar_view', '4_calendar_view.py')
+quadrant_module = module_registry.lazy_import('5_quadrant_view', '5_quadrant_view.py')
+summary_module = module_registry.lazy_import('6_summary_view', '6_summary_view.py')
+project_module = module_registry.lazy_import('7_project_view', '7_project_view.py')
 
-# 导入新的AI功能模块
-ai_assistant_module = importlib.import_module('8_ai_assistant')
-config_module = importlib.import_module('9_config_manager')
+# AI功能模块
+ai_assistant_module = module_registry.lazy_import('8_ai_assistant', '8_ai_assistant.py')
+config_module = module_registry.lazy_import('9_config_manager', '9_config_manager.py')
 
-# 导入角色管理模块
-role_module = importlib.import_module('role_manager')
+# 角色管理模块
+role_module = module_registry.lazy_import('role_manager', 'role_manager.py')
 
-DatabaseManager = database_module.DatabaseManager
-ReminderService = reminder_module.ReminderService
-UIComponents = ui_module.UIComponents
-CalendarView = calendar_module.CalendarView
-QuadrantView = quadrant_module.QuadrantView
-SummaryView = summary_module.SummaryView
-ProjectView = project_module.ProjectView
-AIAssistant = ai_assistant_module.AIAssistant
-ConfigManager = config_module.ConfigManager
-RoleManager = role_module.RoleManager
+# 首屏最多绘制的待处理任务数，完整列表在空闲时加载
+FIRST_PAINT_TODO_LIMIT = 200
 
 class TodoApp:
-    def __init__(self):
+    def __init__(self, profiler=None):
         """初始化主应用程序"""
-        # 初始化配置管理器
-        self.config_manager = ConfigManager()
+        # 启动耗时分析（--profile-startup），未启用时为空操作
+        self.profiler = profiler or startup_profiler.StartupProfiler(enabled=False)
+        
+        # 初始化配置管理器，并监视配置文件的外部修改
+        with self.profiler.component("ConfigManager"):
+            self.config_manager = config_module.ConfigManager()
+            self.config_manager.start_watching()
+        
+        # 性能埋点（设置页可随时开关），关闭时无额外开销
+        if self.config_manager.get('performance.enabled', False):
+            perf_metrics.enable(self.config_manager.get('performance.buffer_size', perf_metrics.DEFAULT_BUFFER_SIZE))
         
         # 初始化角色管理器
-        self.role_manager = RoleManager()
+        with self.profiler.component("RoleManager"):
+            self.role_manager = role_module.RoleManager()
         
         # 显示首次运行对话框（如果是第一次运行）
         if self.config_manager.is_first_run():
@@ -51,7 +61,8 @@ class TodoApp:
             self.config_manager.set_first_run_complete()
         
         # 创建主窗口 - 紫色主题
-        self.root = ttk_bs.Window(themename="vapor")
+        with self.profiler.component("主窗口"):
+            self.root = ttk_bs.Window(themename="vapor")
         self.root.title("智能待办事项管理器")
         
         # 从配置获取窗口大小
@@ -64,29 +75,84 @@ class TodoApp:
         
         # 初始化各个管理器
         db_path = self.config_manager.get_database_path()
-        self.db_manager = DatabaseManager(db_path)
-        self.reminder_service = ReminderService(self.db_manager)
-        self.ui_components = UIComponents(self.db_manager, self.role_manager)  # 传递角色管理器
-        self.calendar_view = CalendarView(self.db_manager, self.ui_components)
-        self.quadrant_view = QuadrantView(self.db_manager, self.ui_components)
-        self.summary_view = SummaryView(self.db_manager, self.ui_components)
-        self.project_view = ProjectView(self.db_manager, self.ui_components)
+        with self.profiler.component("DatabaseManager"):
+            self.db_manager = database_module.DatabaseManager(
+                db_path, self.config_manager.get('database.statement_cache_size', 128)
+            )
+        # 视图查询在后台只读连接上执行，结果经 root.after 交回主线程
+        self.data_loader = async_data.AsyncDataLoader(
+            self.root,
+            lambda: database_module.DatabaseManager.open_readonly(
+                db_path, self.config_manager.get('database.statement_cache_size', 128)
+            ),
+            self.config_manager.get('database.reader_threads', async_data.DEFAULT_WORKERS)
+        )
+        # 待办事项读入内存后由各视图共享，修改经任务存储直写数据库
+        self.task_store = task_store.TaskStore(self.db_manager)
+        with self.profiler.component("ReminderService"):
+            self.reminder_service = reminder_module.ReminderService(
+                self.db_manager, self.create_notification_dispatcher()
+            )
+        with self.profiler.component("UIComponents"):
+            self.ui_components = ui_module.UIComponents(
+                self.db_manager, self.role_manager, self.task_store, self.data_loader
+            )  # 传递角色管理器
+        with self.profiler.component("CalendarView"):
+            self.calendar_view = calendar_module.CalendarView(
+                self.db_manager, self.ui_components, self.data_loader, self.task_store
+            )
+        with self.profiler.component("QuadrantView"):
+            self.quadrant_view = quadrant_module.QuadrantView(self.db_manager, self.ui_components, self.task_store)
+            self.quadrant_view.on_tasks_changed = self.refresh_task_panels
+        with self.profiler.component("SummaryView"):
+            self.summary_view = summary_module.SummaryView(
+                self.db_manager, self.ui_components, self.data_loader, self.task_store
+            )
+        with self.profiler.component("ProjectView"):
+            self.project_view = project_module.ProjectView(self.db_manager, self.ui_components, self.data_loader)
         
         # 初始化AI助手，传递角色管理器
-        self.ai_assistant = AIAssistant(self.db_manager, self.ui_components, self.config_manager, self.role_manager)
+        with self.profiler.component("AIAssistant"):
+            self.ai_assistant = ai_assistant_module.AIAssistant(
+                self.db_manager, self.ui_components, self.config_manager, self.role_manager,
+                task_store=self.task_store, on_todos_changed=self.refresh_all_views
+            )
         
         # 创建界面
-        self.create_widgets()
+        with self.profiler.component("创建界面"):
+            self.create_widgets()
         
         # 启动提醒服务
-        self.reminder_service.start_reminder_thread()
+        with self.profiler.component("启动提醒服务"):
+            self.reminder_service.start_reminder_thread()
+        
+        # 首屏数据：主视图先用有限条数的待处理任务绘制，完整数据在空闲时加载
+        with self.profiler.component("首屏数据"):
+            self.load_first_paint_data()
+        self.root.after_idle(self.profiler.mark_first_paint)
+        self.root.after_idle(self.load_deferred_data)
         
-        # 加载数据
-        self.refresh_all_views()
+        # 界面卡顿监视：首次绘制后开始，避免把启动加载计为卡顿
+        self.ui_watchdog = None
+        if self.config_manager.get('performance.watchdog_enabled', True):
+            self.root.after_idle(self.start_ui_watchdog)
         
         # 检查用户角色配置（在主窗口创建后）
         self.root.after(500, self.check_role_configuration)
     
+    def create_notification_dispatcher(self):
+        """按配置创建通知分发器"""
+        config = self.config_manager.get('notifications', {})
+        backends = notification_dispatcher.create_backends(
+            config.get('backends', ["plyer"]), self.root, config.get('log_path')
+        )
+        return notification_dispatcher.NotificationDispatcher(
+            backends,
+            rate_limit=config.get('rate_limit_per_minute', notification_dispatcher.DEFAULT_RATE_LIMIT),
+            digest_window=config.get('digest_window', notification_dispatcher.DEFAULT_DIGEST_WINDOW),
+            digest_threshold=config.get('digest_threshold', notification_dispatcher.DEFAULT_DIGEST_THRESHOLD)
+        )
+    
     def setup_gradient_background(self):
         """设置紫色渐变背景"""
         style = ttk_bs.Style()
@@ -115,19 +181,67 @@ class TodoApp:
         self.notebook = ttk_bs.Notebook(main_frame)
         self.notebook.pack(fill=BOTH, expand=True)
         
-        # 创建各个标签页
-        self.create_main_view_tab()
-        self.create_calendar_tab()
-        self.create_project_tab()
-        self.create_ai_assistant_tab()  # 新增AI助手标签页
-        self.create_summary_tab()
-        self.create_settings_tab()  # 新增设置标签页
+        # 各标签页先放置空白框架，首次切换到该标签页时才构建内容
+        self.tab_frames = {}
+        self.tab_builders = {}
+        self.built_tabs = set()
+        self.add_lazy_tab("主视图", self.create_main_view_tab)
+        self.add_lazy_tab("日历视图", self.create_calendar_tab)
+        self.add_lazy_tab("项目汇总", self.create_project_tab)
+        self.add_lazy_tab("AI助手", self.create_ai_assistant_tab)  # 新增AI助手标签页
+        self.add_lazy_tab("统计汇总", self.create_summary_tab)
+        self.add_lazy_tab("设置", self.create_settings_tab)  # 新增设置标签页
+        
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        
+        # 主视图是默认标签页，立即构建
+        self.ensure_tab_built("主视图")
     
-    def create_main_view_tab(self):
+    def add_lazy_tab(self, text, builder):
+        """添加延迟构建的标签页"""
+        tab_frame = ttk_bs.Frame(self.notebook)
+        self.notebook.add(tab_frame, text=text)
+        self.tab_frames[text] = tab_frame
+        self.tab_builders[text] = builder
+    
+    def ensure_tab_built(self, text):
+        """确保标签页已构建，本次新构建时返回True"""
+        if text in self.built_tabs or text not in self.tab_builders:
+            return False
+        self.built_tabs.add(text)
+        with self.profiler.component(f"标签页:{text}"):
+            self.tab_builders[text](self.tab_frames[text])
+        return True
+    
+    def on_tab_changed(self, event=None):
+        """切换标签页时构建尚未创建的标签页"""
+        try:
+            text = self.notebook.tab(self.notebook.select(), "text")
+        except tk.TclError:
+            return
+        self.ensure_tab_built(text)
+    
+    def rebuild_settings_tab(self):
+        """重新创建设置标签页内容（尚未构建时不处理）"""
+        if "设置" not in self.built_tabs:
+            return
+        settings_tab = self.tab_frames["设置"]
+        for widget in settings_tab.winfo_children():
+            widget.destroy()
+        self.create_settings_content(settings_tab)
+    
+    def load_first_paint_data(self):
+        """加载首屏数据：仅按优先级取前若干条待处理任务，耗时与数据库规模无关"""
+        todos = self.db_manager.get_pending_todos(limit=FIRST_PAINT_TODO_LIMIT)
+        self.quadrant_view.refresh_integrated_view(todos)
+    
+    def load_deferred_data(self):
+        """空闲时加载完整数据"""
+        with self.profiler.component("空闲加载数据"):
+            self.refresh_all_views()
+    
+    def create_main_view_tab(self, main_tab):
         """创建主视图标签页"""
-        main_tab = ttk_bs.Frame(self.notebook)
-        self.notebook.add(main_tab, text="主视图")
-        
         # 创建主要内容区域
         content_frame = ttk_bs.Frame(main_tab, style='Gradient.TFrame')
         content_frame.pack(fill=BOTH, expand=True, padx=10, pady=10)
@@ -280,8 +394,9 @@ class TodoApp:
         )
         self.upcoming_text.pack(fill=BOTH, expand=True, pady=(2, 0))
         
-        # 初始化即将到期任务显示
-        self.refresh_upcoming_reminders()
+        # 即将到期任务在空闲时随完整数据一起加载
+        self.upcoming_text.insert(tk.END, "正在加载...")
+        self.upcoming_text.config(state=tk.DISABLED)
     
     def toggle_reminder_service(self):
         """切换提醒服务状态"""
@@ -325,12 +440,15 @@ class TodoApp:
             days = int(filter_days)
             end_date = today + timedelta(days=days)
         
-        upcoming_tasks = self.db_manager.get_upcoming_tasks(
-            today.strftime('%Y-%m-%d'),
-            end_date.strftime('%Y-%m-%d')
+        upcoming_tasks = self.task_store.get_upcoming_tasks(
+            today.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
         )
-        
-        # 清空文本框
+        self.render_upcoming_reminders(upcoming_tasks, filter_days, today)
+    
+    def render_upcoming_reminders(self, upcoming_tasks, filter_days, today):
+        """显示即将到期的提醒"""
+        # 清空文本框（文本框平时为只读状态）
+        self.upcoming_text.config(state=tk.NORMAL)
         self.upcoming_text.delete(1.0, tk.END)
         
         if not upcoming_tasks:
@@ -339,71 +457,66 @@ class TodoApp:
             else:
                 self.upcoming_text.insert(tk.END, f"暂无{filter_days}天内到期的任务")
         else:
-            # 计算剩余天数并显示
-            for task in upcoming_tasks[:5]:  # 只显示前5个
-                task_id, title, project, due_date = task
+            # 按整数日期整批计算剩余天数并显示（只显示前5个）
+            shown = upcoming_tasks[:5]
+            due_classes = date_index.classify_due([task[4] for task in shown], today)
+            status_colors = {
+                date_index.DUE_OVERDUE: "🔴",
+                date_index.DUE_TODAY: "🟡",
+                date_index.DUE_URGENT: "🟠",
+                date_index.DUE_NORMAL: "🟢",
+            }
+            for task, (days_left, due_class) in zip(shown, due_classes):
+                task_id, title, project, due_date, _ = task
+                project_text = f"[{project}] " if project else ""
                 
-                # 计算剩余天数
-                try:
-                    due_date_obj = datetime.strptime(due_date, '%Y-%m-%d').date()
-                    days_left = (due_date_obj - today).days
-                    
-                    if days_left < 0:
-                        days_text = f"已逾期{abs(days_left)}天"
-                        status_color = "🔴"
-                    elif days_left == 0:
-                        days_text = "今天到期"
-                        status_color = "🟡"
-                    elif days_left <= 3:
-                        days_text = f"还有{days_left}天"
-                        status_color = "🟠"
-                    else:
-                        days_text = f"还有{days_left}天"
-                        status_color = "🟢"
-                    
-                    project_text = f"[{project}] " if project else ""
-                    self.upcoming_text.insert(
-                        tk.END, 
-                        f"{status_color} {project_text}{title} ({days_text})\n"
-                    )
-                except ValueError:
+                if due_class is None:
                     # 如果日期格式有问题，显示原始日期
-                    project_text = f"[{project}] " if project else ""
                     self.upcoming_text.insert(
                         tk.END, 
                         f"• {project_text}{title} ({due_date})\n"
                     )
+                    continue
+                
+                if due_class == date_index.DUE_OVERDUE:
+                    days_text = f"已逾期{abs(days_left)}天"
+                elif due_class == date_index.DUE_TODAY:
+                    days_text = "今天到期"
+                else:
+                    days_text = f"还有{days_left}天"
+                
+                self.upcoming_text.insert(
+                    tk.END, 
+                    f"{status_colors[due_class]} {project_text}{title} ({days_text})\n"
+                )
         
         self.upcoming_text.config(state=tk.DISABLED)
     
-    def create_calendar_tab(self):
-        """创建日历标签页"""
-        calendar_tab = self.calendar_view.create_calendar_tab(self.notebook)
-        self.notebook.add(calendar_tab, text="日历视图")
+    def create_calendar_tab(self, parent):
+        """创建日历标签页（构建时即加载当月数据）"""
+        calendar_tab = self.calendar_view.create_calendar_tab(parent)
+        calendar_tab.pack(fill=BOTH, expand=True)
     
-    def create_project_tab(self):
-        """创建项目汇总标签页"""
-        project_tab = self.project_view.create_project_tab(self.notebook)
-        self.notebook.add(project_tab, text="项目汇总")
+    def create_project_tab(self, parent):
+        """创建项目汇总标签页（构建时即加载项目数据）"""
+        project_tab = self.project_view.create_project_tab(parent)
+        project_tab.pack(fill=BOTH, expand=True)
     
-    def create_ai_assistant_tab(self):
+    def create_ai_assistant_tab(self, ai_tab):
         """创建AI助手标签页"""
-        ai_tab = ttk_bs.Frame(self.notebook)
-        self.notebook.add(ai_tab, text="AI助手")
-        
         # 创建AI助手面板
         self.ai_assistant.create_ai_panel(ai_tab)
     
-    def create_summary_tab(self):
+    def create_summary_tab(self, parent):
         """创建汇总标签页"""
-        summary_tab = self.summary_view.create_summary_tab(self.notebook)
-        self.notebook.add(summary_tab, text="统计汇总")
+        summary_tab = self.summary_view.create_summary_tab(parent)
+        summary_tab.pack(fill=BOTH, expand=True)
+        
+        # 先显示框架，统计数据在空闲时填充
+        self.root.after_idle(self.summary_view.refresh_full_summary)
     
-    def create_settings_tab(self):
+    def create_settings_tab(self, settings_tab):
         """创建设置标签页"""
-        settings_tab = ttk_bs.Frame(self.notebook)
-        self.notebook.add(settings_tab, text="设置")
-        
         # 创建设置内容
         self.create_settings_content(settings_tab)
     
@@ -502,6 +615,44 @@ class TodoApp:
         ttk.Button(db_buttons_frame, text="刷新状态", command=self.show_database_info).pack(side="left", padx=(0, 10))
         ttk.Button(db_buttons_frame, text="创建备份", command=self.create_database_backup).pack(side="left", padx=(0, 10))
 
+        # 性能监控部分
+        perf_frame = ttk.LabelFrame(scrollable_frame, text="性能监控", padding=20)
+        perf_frame.pack(fill="x", padx=20, pady=10)
+        
+        self.perf_enabled_var = tk.BooleanVar(value=perf_metrics.is_enabled())
+        ttk.Checkbutton(perf_frame, text="启用性能埋点（数据库、视图刷新、AI调用、任务解析）",
+                        variable=self.perf_enabled_var,
+                        command=self.toggle_performance_metrics).pack(anchor="w")
+        
+        self.perf_report_text = tk.Text(perf_frame, height=12, width=100, state='disabled',
+                                        bg='#1e1e1e', fg='white', font=('Consolas', 9))
+        self.perf_report_text.pack(fill="x", pady=5)
+        
+        perf_buttons_frame = ttk.Frame(perf_frame)
+        perf_buttons_frame.pack(fill="x", pady=5)
+        
+        ttk.Button(perf_buttons_frame, text="刷新", command=self.refresh_performance_report).pack(side="left", padx=(0, 10))
+        ttk.Button(perf_buttons_frame, text="清空数据", command=self.reset_performance_metrics).pack(side="left", padx=(0, 10))
+        ttk.Button(perf_buttons_frame, text="导出JSONL", command=self.export_performance_metrics).pack(side="left")
+        
+        self.refresh_performance_report()
+        
+        # AI调用统计部分
+        ai_calls_frame = ttk.LabelFrame(scrollable_frame, text="AI调用统计（近30天）", padding=20)
+        ai_calls_frame.pack(fill="x", padx=20, pady=10)
+        
+        self.ai_calls_text = tk.Text(ai_calls_frame, height=12, width=100, state='disabled',
+                                     bg='#1e1e1e', fg='white', font=('Consolas', 9))
+        self.ai_calls_text.pack(fill="x", pady=5)
+        
+        ai_calls_buttons_frame = ttk.Frame(ai_calls_frame)
+        ai_calls_buttons_frame.pack(fill="x", pady=5)
+        
+        ttk.Button(ai_calls_buttons_frame, text="刷新", command=self.refresh_ai_call_summary).pack(side="left", padx=(0, 10))
+        ttk.Button(ai_calls_buttons_frame, text="导出CSV", command=self.export_ai_call_metrics).pack(side="left")
+        
+        self.refresh_ai_call_summary()
+
         # 角色配置部分（现有代码保持不变）
         role_frame = ttk.LabelFrame(scrollable_frame, text="用户角色配置", padding=20)
         role_frame.pack(fill="x", padx=20, pady=10)
@@ -556,7 +707,6 @@ class TodoApp:
     def show_database_info(self):
         """显示数据库信息"""
         try:
-            config_module = importlib.import_module('9_config_manager')
             config_module.show_database_info_dialog(self.config_manager, self.root)
         except Exception as e:
             messagebox.showerror("错误", f"显示数据库信息时出错：{str(e)}")
@@ -633,12 +783,27 @@ MCP功能: {'启用' if self.config_manager.is_mcp_enabled() else '禁用'}
             if api_key and api_key != "your_api_key_here":
                 self.ai_assistant.ai_core.update_api_key(api_key)
             
-            # 测试连接
-            success, message = self.ai_assistant.ai_core.test_api_connection()
-            if success:
-                messagebox.showinfo("连接成功", message)
-            else:
-                messagebox.showerror("连接失败", message)
+            # 在请求执行器中测试连接，避免阻塞界面
+            def on_done(request):
+                def show_result():
+                    if request.status == "done":
+                        success, message = request.result
+                    elif request.status == "failed":
+                        success, message = False, f"测试连接时出错：{request.error}"
+                    else:
+                        success, message = False, "连接测试超时" if request.status == "timeout" else "连接测试已取消"
+                    if success:
+                        messagebox.showinfo("连接成功", message)
+                    else:
+                        messagebox.showerror("连接失败", message)
+                self.root.after(0, show_result)
+            
+            self.ai_assistant.request_executor.submit(
+                lambda token: self.ai_assistant.ai_core.test_api_connection(cancel_token=token),
+                session_id="connection_test",
+                deadline=15,
+                on_done=on_done
+            )
         except Exception as e:
             messagebox.showerror("错误", f"测试连接时出错：{str(e)}")
     
@@ -739,6 +904,110 @@ MCP功能: {'启用' if self.config_manager.is_mcp_enabled() else '禁用'}
                 self.preferences_text.insert(1.0, error_msg)
                 self.preferences_text.config(state='disabled')
     
+    def start_ui_watchdog(self):
+        """启动界面卡顿监视"""
+        try:
+            self.ui_watchdog = ui_watchdog.UIWatchdog(
+                self.root,
+                threshold=self.config_manager.get('performance.stall_threshold_ms', 500) / 1000,
+                log_path=self.config_manager.get('performance.stall_log', 'ui_stalls.jsonl')
+            )
+            self.ui_watchdog.start()
+        except Exception as e:
+            self.ui_watchdog = None
+            print(f"启动界面卡顿监视失败: {e}")
+    
+    def toggle_performance_metrics(self):
+        """开关性能埋点"""
+        enabled = self.perf_enabled_var.get()
+        if enabled:
+            perf_metrics.enable(self.config_manager.get('performance.buffer_size', perf_metrics.DEFAULT_BUFFER_SIZE))
+        else:
+            perf_metrics.disable()
+        self.config_manager.set('performance.enabled', enabled)
+        self.refresh_performance_report()
+    
+    def refresh_performance_report(self):
+        """刷新性能统计显示"""
+        self.perf_report_text.config(state='normal')
+        self.perf_report_text.delete(1.0, tk.END)
+        self.perf_report_text.insert(tk.END, perf_metrics.format_report())
+        if getattr(self, 'ui_watchdog', None):
+            self.perf_report_text.insert(tk.END, "\n\n界面卡顿:\n" + self.ui_watchdog.format_report())
+        if hasattr(self, 'reminder_service'):
+            stats = self.reminder_service.dispatcher.get_stats()
+            self.perf_report_text.insert(tk.END, (
+                f"\n\n通知分发: 已发送 {stats['delivered']}/{stats['queued']}  汇总 {stats['digests']}  "
+                f"限流 {stats['rate_limited']}  失败 {stats['failed']}  "
+                f"延迟 p50 {stats['latency_p50_ms']:.0f} ms / p95 {stats['latency_p95_ms']:.0f} ms"
+            ))
+        if hasattr(self, 'task_store'):
+            stats = self.task_store.get_stats()
+            self.perf_report_text.insert(tk.END, f"\n\n任务存储: {stats['records']} 条  整体加载 {stats['loads']} 次")
+        if hasattr(self, 'ai_assistant'):
+            self.perf_report_text.insert(tk.END, "\n\n大模型接口:\n" + self.ai_assistant.ai_core.endpoint_pool.format_stats())
+        self.perf_report_text.config(state='disabled')
+    
+    def reset_performance_metrics(self):
+        """清空性能统计"""
+        perf_metrics.reset()
+        self.refresh_performance_report()
+    
+    def export_performance_metrics(self):
+        """导出性能数据为JSONL"""
+        try:
+            from tkinter import filedialog
+            from datetime import datetime
+            
+            filename = filedialog.asksaveasfilename(
+                title="导出性能数据",
+                defaultextension=".jsonl",
+                initialfile=f"perf_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                filetypes=[("JSONL文件", "*.jsonl"), ("所有文件", "*.*")]
+            )
+            if filename:
+                count = perf_metrics.dump_jsonl(filename)
+                messagebox.showinfo("导出成功", f"已导出 {count} 行性能数据到:\n{filename}")
+        except Exception as e:
+            messagebox.showerror("导出失败", f"导出性能数据时出错: {str(e)}")
+    
+    def _ai_call_since(self):
+        """AI调用统计的起始时间（近30天）"""
+        from datetime import datetime, timedelta
+        return (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+    
+    def refresh_ai_call_summary(self):
+        """刷新AI调用统计显示"""
+        # 等待批量写入器把已完成的调用写入数据库
+        self.db_manager.get_batch_writer().flush(1.0)
+        try:
+            report = ai_call_metrics.format_summary(self.db_manager.get_ai_call_summary(self._ai_call_since()))
+        except Exception as e:
+            report = f"读取AI调用统计失败: {str(e)}"
+        self.ai_calls_text.config(state='normal')
+        self.ai_calls_text.delete(1.0, tk.END)
+        self.ai_calls_text.insert(tk.END, report)
+        self.ai_calls_text.config(state='disabled')
+    
+    def export_ai_call_metrics(self):
+        """导出AI调用明细为CSV"""
+        try:
+            from tkinter import filedialog
+            from datetime import datetime
+            
+            filename = filedialog.asksaveasfilename(
+                title="导出AI调用统计",
+                defaultextension=".csv",
+                initialfile=f"ai_calls_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                filetypes=[("CSV文件", "*.csv"), ("所有文件", "*.*")]
+            )
+            if filename:
+                self.db_manager.get_batch_writer().flush(1.0)
+                count = self.db_manager.export_ai_call_metrics(filename)
+                messagebox.showinfo("导出成功", f"已导出 {count} 条AI调用记录到:\n{filename}")
+        except Exception as e:
+            messagebox.showerror("导出失败", f"导出AI调用统计时出错: {str(e)}")
+    
     def export_conversation_history(self):
         """导出对话历史"""
         try:
@@ -826,20 +1095,20 @@ MCP功能: {'启用' if self.config_manager.is_mcp_enabled() else '禁用'}
             messagebox.showerror("清除失败", f"清除学习数据时出错: {str(e)}")
     
     def refresh_all_views(self):
-        """刷新所有视图"""
+        """刷新所有视图（任务存储需要重新加载时先在后台加载）"""
+        self.task_store.load_async(self.data_loader, self._refresh_all_views_timed)
+    
+    def _refresh_all_views_timed(self):
+        with perf_metrics.span("ui.refresh_all_views"):
+            self._refresh_all_views()
+    
+    def _refresh_all_views(self):
+        """依次刷新各视图"""
         # 刷新四象限视图
         self.quadrant_view.refresh_integrated_view()
         
-        # 刷新简单汇总
-        self.refresh_summary()
-        
-        # 刷新即将到期的提醒
-        if hasattr(self, 'upcoming_text'):
-            self.refresh_upcoming_reminders()
-        
-        # 刷新日历视图
-        if hasattr(self.calendar_view, 'calendar_cells') and self.calendar_view.calendar_cells:
-            self.calendar_view.update_calendar()
+        # 刷新简单汇总、即将到期的提醒和日历
+        self.refresh_task_panels()
         
         # 刷新项目视图
         if hasattr(self.project_view, 'project_tree') and self.project_view.project_tree:
@@ -853,13 +1122,26 @@ MCP功能: {'启用' if self.config_manager.is_mcp_enabled() else '禁用'}
         if hasattr(self.ai_assistant, 'refresh_context'):
             self.ai_assistant.refresh_context()
     
+    def refresh_task_panels(self):
+        """刷新主窗口中依赖任务数据的面板（四象限局部刷新后也会调用）"""
+        # 刷新简单汇总
+        self.refresh_summary()
+        
+        # 刷新即将到期的提醒
+        if hasattr(self, 'upcoming_text'):
+            self.refresh_upcoming_reminders()
+        
+        # 刷新日历视图
+        if hasattr(self, 'calendar_view') and getattr(self.calendar_view, 'calendar_cells', None):
+            self.calendar_view.update_calendar()
+    
     def refresh_summary(self):
         """刷新简单汇总统计"""
         if not hasattr(self, 'summary_labels'):
             return
             
         # 获取统计信息
-        stats = self.db_manager.get_statistics()
+        stats = self.task_store.get_statistics()
         
         # 更新标签
         total = stats.get('total', 0)
@@ -880,14 +1162,7 @@ MCP功能: {'启用' if self.config_manager.is_mcp_enabled() else '禁用'}
                 self.ai_assistant.system_prompt = self.ai_assistant._build_system_prompt()
             
             # 重新创建设置标签页内容以显示更新的信息
-            for tab_id in range(self.notebook.index("end")):
-                if self.notebook.tab(tab_id, "text") == "设置":
-                    # 清空并重新创建设置标签页
-                    settings_tab = self.notebook.nametowidget(self.notebook.tabs()[tab_id])
-                    for widget in settings_tab.winfo_children():
-                        widget.destroy()
-                    self.create_settings_content(settings_tab)
-                    break
+            self.rebuild_settings_tab()
         except Exception as e:
             messagebox.showerror("错误", f"配置角色时出错：{str(e)}")
     
@@ -904,7 +1179,7 @@ MCP功能: {'启用' if self.config_manager.is_mcp_enabled() else '禁用'}
                     os.remove(self.role_manager.config_file)
                 
                 # 重新初始化角色管理器
-                self.role_manager = RoleManager()
+                self.role_manager = role_module.RoleManager()
                 
                 # 更新UI组件的角色管理器引用
                 self.ui_components.role_manager = self.role_manager
@@ -919,13 +1194,7 @@ MCP功能: {'启用' if self.config_manager.is_mcp_enabled() else '禁用'}
                 messagebox.showinfo("重置成功", "用户角色配置已重置！")
                 
                 # 重新创建设置标签页内容
-                for tab_id in range(self.notebook.index("end")):
-                    if self.notebook.tab(tab_id, "text") == "设置":
-                        settings_tab = self.notebook.nametowidget(self.notebook.tabs()[tab_id])
-                        for widget in settings_tab.winfo_children():
-                            widget.destroy()
-                        self.create_settings_content(settings_tab)
-                        break
+                self.rebuild_settings_tab()
         except Exception as e:
             messagebox.showerror("错误", f"重置角色时出错：{str(e)}")
     
@@ -972,13 +1241,7 @@ MCP功能: {'启用' if self.config_manager.is_mcp_enabled() else '禁用'}
                 messagebox.showinfo("提示", "角色配置提醒已重新启用。")
                 
                 # 重新创建设置标签页内容以更新显示
-                for tab_id in range(self.notebook.index("end")):
-                    if self.notebook.tab(tab_id, "text") == "设置":
-                        settings_tab = self.notebook.nametowidget(self.notebook.tabs()[tab_id])
-                        for widget in settings_tab.winfo_children():
-                            widget.destroy()
-                        self.create_settings_content(settings_tab)
-                        break
+                self.rebuild_settings_tab()
         except Exception as e:
             messagebox.showerror("错误", f"启用角色配置提醒时出错：{str(e)}")
     
@@ -987,6 +1250,21 @@ MCP功能: {'启用' if self.config_manager.is_mcp_enabled() else '禁用'}
         try:
             self.root.mainloop()
         finally:
+            # 停止界面卡顿监视
+            if getattr(self, 'ui_watchdog', None):
+                self.ui_watchdog.stop()
+            # 停止提醒检查并发出队列中的通知
+            if hasattr(self, 'reminder_service'):
+                self.reminder_service.close()
+            # 停止后台读取线程
+            if hasattr(self, 'data_loader'):
+                self.data_loader.close()
+            # 取消未完成的AI请求
+            if hasattr(self, 'ai_assistant'):
+                self.ai_assistant.shutdown()
+            # 写出尚未落盘的配置修改
+            if hasattr(self, 'config_manager'):
+                self.config_manager.close()
             # 确保数据库连接正确关闭
             if hasattr(self, 'db_manager'):
                 self.db_manager.close()
@@ -1050,6 +1328,27 @@ def launch_dual_windows():
     # 启动主窗口的事件循环
     main_app.run()
 
+def run_startup_profile(budget_ms=startup_profiler.STARTUP_BUDGET_MS):
+    """启动耗时分析模式：创建主窗口并完成首次绘制后输出报告并退出
+
+    返回值为进程退出码，超出预算时为1。
+    """
+    profiler = startup_profiler.StartupProfiler()
+    app = TodoApp(profiler=profiler)
+    try:
+        app.root.update_idletasks()
+        app.root.update()
+        profiler.mark_first_paint()
+        print(profiler.report(budget_ms))
+        ok, _ = profiler.check_budget(budget_ms)
+        return 0 if ok else 1
+    finally:
+        app.reminder_service.close()
+        app.ai_assistant.shutdown()
+        app.data_loader.close()
+        app.root.destroy()
+        app.db_manager.close()
+
 if __name__ == "__main__":
     import sys
     
@@ -1057,6 +1356,12 @@ if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "--dual":
         # 双窗口模式
         launch_dual_windows()
+    elif "--profile-startup" in sys.argv:
+        # 启动耗时分析模式，可用 --budget-ms 指定预算
+        budget_ms = startup_profiler.STARTUP_BUDGET_MS
+        if "--budget-ms" in sys.argv:
+            budget_ms = float(sys.argv[sys.argv.index("--budget-ms") + 1])
+        sys.exit(run_startup_profile(budget_ms))
     else:
         # 单窗口模式（默认）
         app = TodoApp()
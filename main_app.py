@@ -1,38 +1,23 @@
 import tkinter as tk
 import ttkbootstrap as ttk_bs # Assuming ai_ui.py uses ttkbootstrap
 from ttkbootstrap.constants import *
-import importlib.util # Added for dynamic import
 import os # Added to construct full path
+import module_registry
 
 # --- Helper function to dynamically load a module ---
 def load_module_dynamically(module_name, file_path):
-    """Dynamically loads a module from a given file path."""
-    # Construct an absolute path to be safe, especially if main_app.py might be run from different CWDs
-    # However, for simplicity, if they are in the same dir, relative path is fine.
-    # For robustness, let's assume file_path is relative to this script's directory or is absolute.
-    
-    # Check if the file exists
-    if not os.path.exists(file_path):
-        print(f"Error: Module file not found at {file_path}")
-        return None
-
+    """Loads a module through the shared module registry (each file is executed only once)."""
     try:
-        spec = importlib.util.spec_from_file_location(module_name, file_path)
-        if spec is None:
-            print(f"Error: Could not create spec for module {module_name} from {file_path}")
-            return None
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        return module
+        return module_registry.load_module(module_name, file_path)
     except Exception as e:
         print(f"Error loading module {module_name} from {file_path}: {e}")
         return None
 
 # --- Dynamically load AIAssistant ---
 AI_ASSISTANT_FILE_NAME = "ai_assistant.py"
-# We give it a module name that's valid, e.g., "ai_assistant_module"
+# Registered under its own module name so other importers share the same instance
 # The actual filename on disk is AI_ASSISTANT_FILE_NAME
-ai_assistant_loaded_module = load_module_dynamically("ai_assistant_module", AI_ASSISTANT_FILE_NAME)
+ai_assistant_loaded_module = load_module_dynamically("ai_assistant", AI_ASSISTANT_FILE_NAME)
 
 AIAssistant = None
 if ai_assistant_loaded_module:
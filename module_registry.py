@@ -0,0 +1,134 @@
+"""
+模块注册表
+统一加载应用模块（含数字开头的文件模块），保证每个文件只执行一次，
+并提供延迟加载代理和导入耗时统计
+"""
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+import time
+import types
+
+# 应用目录：按文件路径加载时以此为基准，而不是当前工作目录
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_lock = threading.RLock()
+_import_times = {}   # 模块名 -> 自身导入耗时（秒，不含嵌套导入）
+_load_order = []
+_timing_stack = []
+
+
+def load_module(module_name, file_name=None):
+    """加载模块并登记到sys.modules；已加载的模块直接返回
+
+    file_name为相对应用目录的文件名，用于无法按模块名直接导入的情况。
+    """
+    module = sys.modules.get(module_name)
+    if module is not None and not _is_initializing(module):
+        return module
+
+    # 其他线程正在导入时在锁上等待，不返回执行到一半的模块
+    with _lock:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+
+        start = time.perf_counter()
+        _timing_stack.append(0.0)
+        try:
+            module = _import(module_name, file_name)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = _timing_stack.pop()
+            if _timing_stack:
+                _timing_stack[-1] += elapsed
+            if module_name not in _import_times:
+                _load_order.append(module_name)
+            _import_times[module_name] = elapsed - nested
+        return module
+
+
+def _is_initializing(module):
+    """模块是否还在执行中（已登记到sys.modules但尚未导入完成）"""
+    spec = getattr(module, '__spec__', None)
+    return getattr(spec, '_initializing', False)
+
+
+def _import(module_name, file_name):
+    """按模块名导入，失败时按文件路径加载"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        # 仅在模块本身找不到时回退到文件路径；模块内部的导入错误直接抛出
+        if file_name is None or (e.name and e.name != module_name):
+            raise
+
+    file_path = file_name if os.path.isabs(file_name) else os.path.join(BASE_DIR, file_name)
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    if spec is None:
+        raise ImportError(f"无法加载模块 {module_name}: {file_path}", name=module_name)
+    module = importlib.util.module_from_spec(spec)
+    # 先登记再执行，避免循环导入时重复执行
+    sys.modules[module_name] = module
+    spec._initializing = True
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        sys.modules.pop(module_name, None)
+        raise
+    finally:
+        spec._initializing = False
+    return module
+
+
+class LazyModule(types.ModuleType):
+    """延迟加载的模块代理，首次访问属性时才真正导入"""
+
+    def __init__(self, module_name, file_name=None):
+        super().__init__(module_name)
+        self.__dict__['_lazy_file_name'] = file_name
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        """导入真实模块"""
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            module = load_module(self.__name__, self.__dict__['_lazy_file_name'])
+            self.__dict__['_lazy_module'] = module
+        return module
+
+    @property
+    def is_loaded(self):
+        """真实模块是否已导入"""
+        return self.__dict__['_lazy_module'] is not None or self.__name__ in sys.modules
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<LazyModule '{self.__name__}' ({state})>"
+
+
+def lazy_import(module_name, file_name=None):
+    """返回模块的延迟加载代理；模块已加载时直接返回模块本身"""
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    return LazyModule(module_name, file_name)
+
+
+def get_import_times():
+    """按加载顺序返回 [(模块名, 自身导入耗时秒)]"""
+    with _lock:
+        return [(name, _import_times[name]) for name in _load_order]
+
+
+def is_loaded(module_name):
+    """模块是否已经导入"""
+    return module_name in sys.modules
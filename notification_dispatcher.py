@@ -0,0 +1,309 @@
+"""
+通知分发模块
+提醒先进入队列，由独立的分发线程发送到各通知后端（系统通知、应用内提示、日志文件等）；
+短时间内到达的多条提醒合并为一条汇总通知，并按每分钟条数限流。
+发送慢或卡住的后端只会拖慢分发线程，不影响提醒检查
+"""
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import module_registry
+import perf_metrics
+
+# plyer在首次发送系统通知时才导入
+plyer = module_registry.lazy_import('plyer')
+
+DEFAULT_RATE_LIMIT = 6          # 每分钟最多发送的通知条数
+DEFAULT_DIGEST_WINDOW = 2.0     # 收到一条提醒后等待合并后续提醒的时间（秒）
+DEFAULT_DIGEST_THRESHOLD = 3    # 同一批达到该条数时合并为汇总通知
+DIGEST_PREVIEW = 5              # 汇总通知中列出的标题条数
+
+# 队列中的控制项
+_STOP = object()
+
+
+class Notification:
+    """一条待发送的通知"""
+
+    __slots__ = ('title', 'message', 'queued_at')
+
+    def __init__(self, title, message):
+        self.title = title
+        self.message = message
+        self.queued_at = time.monotonic()
+
+
+class PlyerBackend:
+    """系统通知（plyer）"""
+
+    name = "plyer"
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+
+    def send(self, title, message):
+        plyer.notification.notify(title=title, message=message, timeout=self.timeout)
+
+
+class ToastBackend:
+    """应用内提示：在主窗口右下角短暂显示的小窗口
+
+    send在分发线程中调用，只把通知放入队列并在需要时安排一次 root.after，
+    由Tk主线程取出显示；没有通知时不占用主循环。
+    """
+
+    name = "toast"
+
+    def __init__(self, root, duration_ms=5000, poll_ms=200):
+        """需在Tk主线程中创建"""
+        self.root = root
+        self.duration_ms = duration_ms
+        self.poll_ms = poll_ms
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._poll_scheduled = False
+
+    def send(self, title, message):
+        self._queue.put((title, message))
+        with self._lock:
+            if self._poll_scheduled:
+                return
+            self._poll_scheduled = True
+        try:
+            self.root.after(self.poll_ms, self._poll)
+        except Exception as e:
+            # 主窗口已销毁
+            with self._lock:
+                self._poll_scheduled = False
+            print(f"安排应用内提示失败: {e}")
+
+    def _poll(self):
+        """Tk主线程：显示队列中的通知"""
+        # 先清除标记：取队列期间新到的通知会再安排一次
+        with self._lock:
+            self._poll_scheduled = False
+        try:
+            while True:
+                title, message = self._queue.get_nowait()
+                self._show(title, message)
+        except queue.Empty:
+            pass
+        except Exception as e:
+            print(f"显示应用内提示失败: {e}")
+
+    def _show(self, title, message):
+        import tkinter as tk
+        toast = tk.Toplevel(self.root)
+        toast.overrideredirect(True)
+        toast.attributes('-topmost', True)
+        frame = tk.Frame(toast, bg='#2b2b40', padx=12, pady=8)
+        frame.pack(fill='both', expand=True)
+        tk.Label(frame, text=title, bg='#2b2b40', fg='white', font=("Microsoft YaHei", 10, "bold"),
+                 anchor='w', justify='left').pack(fill='x')
+        if message:
+            tk.Label(frame, text=message, bg='#2b2b40', fg='#dddddd', font=("Microsoft YaHei", 9),
+                     anchor='w', justify='left', wraplength=300).pack(fill='x')
+        toast.update_idletasks()
+        x = self.root.winfo_rootx() + self.root.winfo_width() - toast.winfo_width() - 20
+        y = self.root.winfo_rooty() + self.root.winfo_height() - toast.winfo_height() - 20
+        toast.geometry(f"+{max(x, 0)}+{max(y, 0)}")
+        toast.after(self.duration_ms, toast.destroy)
+
+
+class LogFileBackend:
+    """追加写入日志文件"""
+
+    name = "log"
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, title, message):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\t{title}\t{message}\n")
+
+
+class MemoryBackend:
+    """保存在内存中的替身后端，用于测试和基准；delay模拟慢速后端"""
+
+    name = "memory"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+
+    def send(self, title, message):
+        if self.delay:
+            time.sleep(self.delay)
+        self.sent.append((title, message))
+
+
+def create_backends(names, root=None, log_path=None):
+    """按名称创建通知后端，无法创建的后端跳过"""
+    backends = []
+    for name in names:
+        try:
+            if name == "plyer":
+                backends.append(PlyerBackend())
+            elif name == "toast" and root is not None:
+                backends.append(ToastBackend(root))
+            elif name == "log" and log_path:
+                backends.append(LogFileBackend(log_path))
+            elif name == "memory":
+                backends.append(MemoryBackend())
+        except Exception as e:
+            print(f"创建通知后端 {name} 失败: {e}")
+    return backends
+
+
+class NotificationDispatcher:
+    """通知分发器"""
+
+    def __init__(self, backends, rate_limit=DEFAULT_RATE_LIMIT, digest_window=DEFAULT_DIGEST_WINDOW,
+                 digest_threshold=DEFAULT_DIGEST_THRESHOLD):
+        """rate_limit: 每分钟最多发送条数（0表示不限）"""
+        self.backends = list(backends)
+        self.rate_limit = rate_limit
+        self.digest_window = digest_window
+        self.digest_threshold = digest_threshold
+
+        self._queue = queue.Queue()
+        self._sent_times = deque()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # 统计信息：从入队到发出的延迟（毫秒）
+        self.latency = perf_metrics.SpanStats("notify.latency")
+        self.queued = 0
+        self.delivered = 0
+        self.digests = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    def _ensure_thread(self):
+        """首次发送时启动分发线程"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="NotificationDispatcher", daemon=True)
+                self._thread.start()
+
+    def notify(self, title, message=""):
+        """提交一条通知，立即返回"""
+        if self._closed:
+            return
+        self._ensure_thread()
+        self.queued += 1
+        self._queue.put(Notification(title, message))
+
+    def close(self, timeout=5.0):
+        """发出队列中剩余的通知后停止分发线程"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def get_stats(self):
+        """获取分发统计"""
+        summary = self.latency.summary()
+        return {
+            'queued': self.queued,
+            'delivered': self.delivered,
+            'digests': self.digests,
+            'rate_limited': self.rate_limited,
+            'failed': self.failed,
+            'pending': self._queue.qsize(),
+            'latency_p50_ms': summary['p50_ms'],
+            'latency_p95_ms': summary['p95_ms'],
+            'latency_max_ms': summary['max_ms'],
+        }
+
+    def _available_slots(self, now):
+        """当前一分钟窗口内还可发送的条数"""
+        if not self.rate_limit:
+            return float('inf')
+        while self._sent_times and now - self._sent_times[0] >= 60:
+            self._sent_times.popleft()
+        return self.rate_limit - len(self._sent_times)
+
+    def _wait_time(self):
+        """距离下一个可用发送名额的秒数，0表示现在即可发送"""
+        now = time.monotonic()
+        if self._available_slots(now) > 0:
+            return 0
+        return max(0.0, self._sent_times[0] + 60 - now)
+
+    def _collect(self, pending, timeout):
+        """在timeout内继续收集通知；返回是否收到停止信号"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return False
+            if item is _STOP:
+                return True
+            pending.append(item)
+
+    def _run(self):
+        """分发线程主循环"""
+        pending = []
+        stop = False
+        while not stop:
+            if pending:
+                wait = self._wait_time()
+                if wait == 0:
+                    self._deliver_batch(pending)
+                    pending = []
+                    continue
+                # 超出限流：继续收集，等有名额时一并合并发送
+                self.rate_limited += 1
+                stop = self._collect(pending, wait)
+                continue
+
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            pending.append(item)
+            stop = self._collect(pending, self.digest_window)
+
+        if pending:
+            self._deliver_batch(pending, ignore_limit=True)
+
+    def _deliver_batch(self, pending, ignore_limit=False):
+        """发送一批通知：条数较多或名额不足时合并为一条汇总"""
+        slots = float('inf') if ignore_limit else self._available_slots(time.monotonic())
+        if len(pending) >= self.digest_threshold or len(pending) > slots:
+            titles = "\n".join(f"• {item.title}" for item in pending[:DIGEST_PREVIEW])
+            more = f"\n…等共 {len(pending)} 项" if len(pending) > DIGEST_PREVIEW else ""
+            self.digests += 1
+            self._send(f"{len(pending)} 个待办事项提醒", titles + more, pending)
+        else:
+            for item in pending:
+                self._send(item.title, item.message, [item])
+
+    def _send(self, title, message, items):
+        """发送到全部后端，并记录延迟"""
+        self._sent_times.append(time.monotonic())
+        for backend in self.backends:
+            try:
+                backend.send(title, message)
+            except Exception as e:
+                self.failed += 1
+                print(f"通知发送失败（{backend.name}）: {e}")
+
+        now = time.monotonic()
+        for item in items:
+            elapsed_ms = (now - item.queued_at) * 1000
+            self.latency.add(elapsed_ms)
+            if perf_metrics.is_enabled():
+                perf_metrics.record("notify.latency", elapsed_ms)
+        self.delivered += len(items)
@@ -0,0 +1,237 @@
+"""
+性能埋点模块
+对数据库方法、视图刷新、AI调用和任务解析计时，耗时保存在内存环形缓冲区中，
+可查看 p50/p95/p99 并导出为JSONL
+
+关闭时不产生额外开销：登记的类方法只在启用时才被替换为计时包装，关闭后恢复原方法；
+span() 关闭时直接返回共享的空上下文。
+"""
+import functools
+import json
+import math
+import threading
+import time
+from collections import deque
+
+# 每个埋点保留的最近耗时样本数
+DEFAULT_BUFFER_SIZE = 1024
+# 最近事件（用于导出明细）的保留条数
+DEFAULT_EVENT_BUFFER_SIZE = 5000
+
+_enabled = False
+_lock = threading.Lock()
+_buffer_size = DEFAULT_BUFFER_SIZE
+_stats = {}
+_events = deque(maxlen=DEFAULT_EVENT_BUFFER_SIZE)
+# 登记的类：[(类, 前缀, 方法名列表)]；启用时保存被替换的原方法
+_registered = []
+_originals = {}
+
+
+class SpanStats:
+    """单个埋点的统计：总次数、错误数和最近样本的环形缓冲区"""
+
+    def __init__(self, name, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = deque(maxlen=buffer_size)
+
+    def add(self, elapsed_ms, error=False):
+        """记录一次耗时"""
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+        if error:
+            self.errors += 1
+        self.samples.append(elapsed_ms)
+
+    def percentile(self, p, ordered=None):
+        """最近样本的百分位数（最近秩法）"""
+        ordered = ordered if ordered is not None else sorted(self.samples)
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self):
+        """统计摘要"""
+        ordered = sorted(self.samples)
+        return {
+            'name': self.name,
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(50, ordered),
+            'p95_ms': self.percentile(95, ordered),
+            'p99_ms': self.percentile(99, ordered),
+            'max_ms': self.max_ms,
+            'total_ms': self.total_ms,
+        }
+
+
+def record(name, elapsed_ms, error=False):
+    """记录一次耗时"""
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = SpanStats(name, _buffer_size)
+        stats.add(elapsed_ms, error)
+        _events.append((time.time(), name, elapsed_ms, error, threading.current_thread().name))
+
+
+class _Span:
+    """计时上下文"""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, (time.perf_counter() - self.start) * 1000, exc_type is not None)
+        return False
+
+
+class _NullSpan:
+    """关闭时使用的空上下文"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """计时上下文：with perf_metrics.span("ui.refresh_all_views"): ..."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def _wrap(func, name):
+    """生成计时包装函数"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        error = False
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            error = True
+            raise
+        finally:
+            record(name, (time.perf_counter() - start) * 1000, error)
+    wrapper.__perf_wrapped__ = func
+    return wrapper
+
+
+def _public_methods(cls):
+    """类自身定义的公开方法名"""
+    return [name for name, value in vars(cls).items()
+            if callable(value) and not name.startswith('_')]
+
+
+def _instrument(cls, prefix, names):
+    """把类的方法替换为计时包装"""
+    for name in names:
+        original = vars(cls).get(name)
+        if original is None or (cls, name) in _originals:
+            continue
+        _originals[(cls, name)] = original
+        setattr(cls, name, _wrap(original, f"{prefix}.{name}"))
+
+
+def register_class(cls, prefix, names=None, exclude=()):
+    """登记需要埋点的类方法（names为None时为类自身的全部公开方法），启用后生效"""
+    names = [name for name in (names if names is not None else _public_methods(cls)) if name not in exclude]
+    with _lock:
+        _registered.append((cls, prefix, names))
+        if _enabled:
+            _instrument(cls, prefix, names)
+    return cls
+
+
+def enable(buffer_size=None):
+    """启用埋点"""
+    global _enabled, _buffer_size
+    with _lock:
+        if buffer_size:
+            _buffer_size = buffer_size
+        for cls, prefix, names in _registered:
+            _instrument(cls, prefix, names)
+        _enabled = True
+
+
+def disable():
+    """关闭埋点并恢复原方法（已记录的数据保留）"""
+    global _enabled
+    with _lock:
+        _enabled = False
+        for (cls, name), original in _originals.items():
+            setattr(cls, name, original)
+        _originals.clear()
+
+
+def is_enabled():
+    """是否已启用"""
+    return _enabled
+
+
+def reset():
+    """清空已记录的数据"""
+    with _lock:
+        _stats.clear()
+        _events.clear()
+
+
+def snapshot():
+    """所有埋点的统计摘要，按总耗时降序"""
+    with _lock:
+        summaries = [stats.summary() for stats in _stats.values()]
+    summaries.sort(key=lambda item: item['total_ms'], reverse=True)
+    return summaries
+
+
+def format_report(limit=None):
+    """生成文本报告"""
+    summaries = snapshot()
+    if not summaries:
+        return "暂无性能数据" + ("" if _enabled else "（埋点未启用）")
+    lines = [f"{'埋点':<40}{'次数':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'最大':>10}{'错误':>6}"]
+    for item in summaries[:limit]:
+        lines.append(
+            f"{item['name']:<40}{item['count']:>8}{item['p50_ms']:>10.2f}{item['p95_ms']:>10.2f}"
+            f"{item['p99_ms']:>10.2f}{item['max_ms']:>10.2f}{item['errors']:>6}"
+        )
+    lines.append("（单位: 毫秒，百分位基于每个埋点最近的样本）")
+    return "\n".join(lines)
+
+
+def dump_jsonl(path):
+    """导出为JSONL：每条最近事件一行（type=event），每个埋点摘要一行（type=summary），返回行数"""
+    with _lock:
+        events = list(_events)
+    summaries = snapshot()
+    with open(path, 'w', encoding='utf-8') as f:
+        for timestamp, name, elapsed_ms, error, thread in events:
+            f.write(json.dumps({
+                'type': 'event', 'ts': timestamp, 'name': name,
+                'ms': round(elapsed_ms, 4), 'error': error, 'thread': thread
+            }, ensure_ascii=False) + "\n")
+        for item in summaries:
+            f.write(json.dumps(dict(item, type='summary'), ensure_ascii=False) + "\n")
+    return len(events) + len(summaries)
@@ -0,0 +1,127 @@
+"""
+提示词组装流水线模块
+系统提示词由若干命名片段组成，每个片段按版本号缓存，版本未变时直接复用
+"""
+import os
+import threading
+import time
+
+
+class PromptSegment:
+    """提示词片段
+
+    build() 生成片段文本；version() 返回当前数据版本（任意可比较的值），
+    与上次构建时的版本相同则直接使用缓存。version为None的片段只构建一次。
+    """
+
+    def __init__(self, name, build, version=None, header=""):
+        self.name = name
+        self.build = build
+        self.version = version
+        self.header = header
+
+        self._text = None
+        self._version = None
+        self._built = False
+        self.last_hit = False
+
+        # 统计信息
+        self.build_count = 0
+        self.hit_count = 0
+        self.total_build_time = 0.0
+        self.last_build_time = 0.0
+
+    def render(self):
+        """返回片段文本，版本变化时重新构建"""
+        current_version = self.version() if self.version else None
+        if self._built and current_version == self._version:
+            self.hit_count += 1
+            self.last_hit = True
+            return self._text
+
+        start = time.perf_counter()
+        text = self.build() or ""
+        self.last_build_time = time.perf_counter() - start
+        self.total_build_time += self.last_build_time
+        self.build_count += 1
+
+        self._text = f"{self.header}{text}" if text else ""
+        self._version = current_version
+        self._built = True
+        self.last_hit = False
+        return self._text
+
+    def invalidate(self):
+        """丢弃缓存，下次使用时重新构建"""
+        self._built = False
+
+
+class PromptPipeline:
+    """提示词组装流水线"""
+
+    def __init__(self, separator="\n\n"):
+        self.separator = separator
+        self.segments = []
+        self.last_build_time = 0.0
+        self._lock = threading.Lock()
+
+    def add_segment(self, name, build, version=None, header=""):
+        """按顺序添加片段"""
+        segment = PromptSegment(name, build, version, header)
+        self.segments.append(segment)
+        return segment
+
+    def build(self, names=None, sizes=None):
+        """组装提示词，names为None时使用全部片段
+
+        sizes为字典时填入各片段的 {'size': 字符数, 'cached': 是否使用了缓存}，用于调用统计。
+        """
+        start = time.perf_counter()
+        with self._lock:
+            parts = []
+            for segment in self.segments:
+                if names is not None and segment.name not in names:
+                    continue
+                try:
+                    text = segment.render()
+                except Exception as e:
+                    print(f"构建提示词片段 {segment.name} 失败: {e}")
+                    segment.invalidate()
+                    text = ""
+                if sizes is not None:
+                    sizes[segment.name] = {'size': len(text), 'cached': segment.last_hit}
+                if text:
+                    parts.append(text)
+        self.last_build_time = time.perf_counter() - start
+        return self.separator.join(parts)
+
+    def invalidate(self, name=None):
+        """使指定片段（默认全部）的缓存失效"""
+        with self._lock:
+            for segment in self.segments:
+                if name is None or segment.name == name:
+                    segment.invalidate()
+
+    def get_stats(self):
+        """获取各片段的构建统计"""
+        return {
+            segment.name: {
+                'builds': segment.build_count,
+                'hits': segment.hit_count,
+                'last_build_ms': segment.last_build_time * 1000,
+                'total_build_ms': segment.total_build_time * 1000,
+                'size': len(segment._text or ""),
+            }
+            for segment in self.segments
+        }
+
+
+def file_mtime_version(path_getter):
+    """以文件修改时间作为版本号，path_getter返回当前文件路径"""
+    def version():
+        path = path_getter()
+        try:
+            return path, os.stat(path).st_mtime_ns
+        except (OSError, TypeError):
+            return path, None
+    return version
@@ -0,0 +1,182 @@
+"""
+查询构建模块
+组合式构建参数化SQL，值通过占位符绑定而不拼接进语句文本；
+相同结构的查询生成相同的SQL文本，可以命中sqlite3连接上的预编译语句缓存
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# 每个连接缓存的预编译语句数量（sqlite3默认128），可通过 database.statement_cache_size 配置
+DEFAULT_STATEMENT_CACHE_SIZE = 128
+
+
+class Query:
+    """参数化SELECT查询构建器
+
+    用法：
+        sql, params = (Query("todos")
+                       .where_eq("project", project)
+                       .where_in("priority", (1, 2))
+                       .order_by("priority ASC")
+                       .build())
+    列名、表名等标识符来自代码本身；用户数据只能作为值传入。
+    """
+
+    def __init__(self, table, *columns):
+        self.table = table
+        self.columns = list(columns) or ["*"]
+        self._conditions = []   # [(SQL片段, 参数元组)]
+        self._group_by = []
+        self._having = []
+        self._order_by = []
+        self._limit = None
+        self._offset = None
+
+    @classmethod
+    def select(cls, table, *columns):
+        """创建SELECT查询"""
+        return cls(table, *columns)
+
+    # ---- 条件 ----
+
+    def where(self, condition, *params):
+        """添加条件片段（使用?占位符），多个条件之间为AND"""
+        self._conditions.append((condition, tuple(params)))
+        return self
+
+    def where_eq(self, column, value):
+        """column = ?，值为None时生成 IS NULL"""
+        if value is None:
+            return self.where(f"{column} IS NULL")
+        return self.where(f"{column} = ?", value)
+
+    def where_in(self, column, values):
+        """column IN (?, ?, ...)，空集合时条件恒为假"""
+        values = tuple(values)
+        if not values:
+            return self.where("0")
+        placeholders = ", ".join("?" for _ in values)
+        return self.where(f"{column} IN ({placeholders})", *values)
+
+    def where_any(self, *conditions):
+        """OR组合：每项为 (SQL片段, 参数...) 元组"""
+        parts = []
+        params = []
+        for condition in conditions:
+            parts.append(f"({condition[0]})")
+            params.extend(condition[1:])
+        return self.where(" OR ".join(parts), *params)
+
+    # ---- 分组、排序、分页 ----
+
+    def group_by(self, *columns):
+        """GROUP BY"""
+        self._group_by.extend(columns)
+        return self
+
+    def having(self, condition, *params):
+        """HAVING条件，多个之间为AND"""
+        self._having.append((condition, tuple(params)))
+        return self
+
+    def order_by(self, *terms):
+        """ORDER BY，如 order_by("priority ASC", "created_at DESC")"""
+        self._order_by.extend(terms)
+        return self
+
+    def limit(self, count, offset=None):
+        """LIMIT/OFFSET（同样以参数绑定）"""
+        self._limit = count
+        self._offset = offset
+        return self
+
+    # ---- 生成 ----
+
+    @staticmethod
+    def _join_conditions(conditions, params):
+        """用AND连接条件；多个条件时各自加括号，避免OR优先级问题"""
+        if len(conditions) == 1:
+            params.extend(conditions[0][1])
+            return conditions[0][0]
+        parts = []
+        for condition, condition_params in conditions:
+            parts.append(f"({condition})")
+            params.extend(condition_params)
+        return " AND ".join(parts)
+
+    def build(self):
+        """生成 (sql, params)"""
+        params = []
+        sql = f"SELECT {', '.join(self.columns)} FROM {self.table}"
+        if self._conditions:
+            sql += " WHERE " + self._join_conditions(self._conditions, params)
+        if self._group_by:
+            sql += " GROUP BY " + ", ".join(self._group_by)
+        if self._having:
+            sql += " HAVING " + self._join_conditions(self._having, params)
+        if self._order_by:
+            sql += " ORDER BY " + ", ".join(self._order_by)
+        if self._limit is not None:
+            sql += " LIMIT ?"
+            params.append(self._limit)
+            if self._offset is not None:
+                sql += " OFFSET ?"
+                params.append(self._offset)
+        return sql, tuple(params)
+
+    def __repr__(self):
+        sql, params = self.build()
+        return f"Query({sql!r}, {params!r})"
+
+
+class StatementCache:
+    """预编译语句缓存的统计
+
+    sqlite3按SQL文本在连接上缓存预编译语句（LRU，容量为cached_statements）。
+    这里用同样的LRU规则跟踪语句文本，统计命中和未命中次数。
+    """
+
+    def __init__(self, size=DEFAULT_STATEMENT_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, sql):
+        """记录一次语句执行"""
+        with self._lock:
+            if sql in self._statements:
+                self._statements.move_to_end(sql)
+                self.hits += 1
+                return True
+            self.misses += 1
+            self._statements[sql] = True
+            if len(self._statements) > self.size:
+                self._statements.popitem(last=False)
+            return False
+
+    def execute(self, executor, query, params=()):
+        """执行Query或SQL文本；executor为连接或游标，返回游标"""
+        if isinstance(query, Query):
+            query, params = query.build()
+        self.record(query)
+        return executor.execute(query, params)
+
+    def get_stats(self):
+        """获取缓存统计"""
+        total = self.hits + self.misses
+        return {
+            'size': self.size,
+            'entries': len(self._statements),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+def connect(db_path, statement_cache_size=DEFAULT_STATEMENT_CACHE_SIZE, **kwargs):
+    """打开连接并设置预编译语句缓存容量，返回 (连接, StatementCache)"""
+    conn = sqlite3.connect(db_path, cached_statements=statement_cache_size, **kwargs)
+    return conn, StatementCache(statement_cache_size)
@@ -0,0 +1,288 @@
+"""
+重复任务模块
+重复规则（类似RRULE：按天/周/月、间隔、星期几、截止日期/次数）保存在重复任务模板上，
+只在视图请求的日期范围内按需展开；某次重复被完成或修改时才写入todos表成为真实任务，
+被删除时记入例外表
+"""
+import calendar
+from datetime import date, datetime, timedelta
+
+import date_index
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY')
+WEEKDAY_CODES = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+# 界面上的预设规则：名称 -> 规则文本
+RULE_PRESETS = {
+    "不重复": None,
+    "每天": "FREQ=DAILY",
+    "每个工作日": "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR",
+    "每周": "FREQ=WEEKLY",
+    "每两周": "FREQ=WEEKLY;INTERVAL=2",
+    "每月": "FREQ=MONTHLY",
+}
+
+# 尚未写入todos表的重复实例的ID格式：R<模板ID>@<日期>
+OCCURRENCE_KEY_PREFIX = "R"
+
+# 模板中复制到实例上的任务字段
+TEMPLATE_FIELDS = ('title', 'description', 'project', 'responsibility', 'priority', 'urgency',
+                   'importance', 'gtd_tag')
+
+
+def parse_date(value):
+    """解析日期（date/datetime/常见的日期字符串），无法解析时抛出ValueError"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for fmt in ('%Y-%m-%d', '%Y%m%d', '%Y/%m/%d', '%m/%d/%y', '%m/%d/%Y'):
+        try:
+            return datetime.strptime(str(value).strip()[:10], fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"无法解析日期: {value}")
+
+
+class RecurrenceRule:
+    """重复规则"""
+
+    def __init__(self, freq, interval=1, byweekday=None, until=None, count=None):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"不支持的重复频率: {freq}")
+        if interval < 1:
+            raise ValueError("重复间隔必须大于0")
+        self.freq = freq
+        self.interval = interval
+        self.byweekday = sorted(set(byweekday)) if byweekday else None
+        self.until = until
+        self.count = count
+
+    @classmethod
+    def parse(cls, text):
+        """解析规则文本，如 FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR;UNTIL=20271231;COUNT=10"""
+        parts = {}
+        for item in text.upper().split(';'):
+            if '=' in item:
+                key, value = item.split('=', 1)
+                parts[key.strip()] = value.strip()
+        byweekday = None
+        if parts.get('BYDAY'):
+            try:
+                byweekday = [WEEKDAY_CODES.index(code) for code in parts['BYDAY'].split(',')]
+            except ValueError:
+                raise ValueError(f"无法解析星期: {parts['BYDAY']}")
+        return cls(
+            parts.get('FREQ', ''),
+            interval=int(parts.get('INTERVAL', 1)),
+            byweekday=byweekday,
+            until=parse_date(parts['UNTIL']) if parts.get('UNTIL') else None,
+            count=int(parts['COUNT']) if parts.get('COUNT') else None,
+        )
+
+    def __str__(self):
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.byweekday:
+            parts.append("BYDAY=" + ",".join(WEEKDAY_CODES[day] for day in self.byweekday))
+        if self.until:
+            parts.append(f"UNTIL={self.until.strftime('%Y%m%d')}")
+        if self.count:
+            parts.append(f"COUNT={self.count}")
+        return ";".join(parts)
+
+    def describe(self):
+        """中文描述"""
+        unit = {'DAILY': "天", 'WEEKLY': "周", 'MONTHLY': "月"}[self.freq]
+        text = f"每{self.interval if self.interval > 1 else ''}{unit}"
+        if self.byweekday:
+            text += "的" + "、".join("周" + "一二三四五六日"[day] for day in self.byweekday)
+        if self.until:
+            text += f"，至{self.until.strftime('%Y-%m-%d')}"
+        if self.count:
+            text += f"，共{self.count}次"
+        return text
+
+    def between(self, start_date, range_start, range_end):
+        """[range_start, range_end] 内的全部重复日期（按时间顺序）
+
+        直接计算出范围内的第一个周期，不从start_date逐个推算，耗时只与范围内的实例数有关。
+        """
+        range_start = max(range_start, start_date)
+        if self.until:
+            range_end = min(range_end, self.until)
+        if range_start > range_end:
+            return []
+        if self.freq == 'DAILY':
+            return self._between_daily(start_date, range_start, range_end)
+        if self.freq == 'WEEKLY':
+            return self._between_weekly(start_date, range_start, range_end)
+        return self._between_monthly(start_date, range_start, range_end)
+
+    def _within_count(self, index):
+        return self.count is None or index < self.count
+
+    def _between_daily(self, start_date, range_start, range_end):
+        step = self.interval
+        # 范围内第一个周期的序号（向上取整）
+        index = -(-(range_start - start_date).days // step)
+        result = []
+        current = start_date + timedelta(days=index * step)
+        while current <= range_end and self._within_count(index):
+            result.append(current)
+            index += 1
+            current += timedelta(days=step)
+        return result
+
+    def _between_weekly(self, start_date, range_start, range_end):
+        weekdays = self.byweekday or [start_date.weekday()]
+        first_week = start_date - timedelta(days=start_date.weekday())
+        # 第一周中不早于起始日的实例数，用于计算实例序号
+        first_week_count = sum(1 for day in weekdays if day >= start_date.weekday())
+        period_days = 7 * self.interval
+
+        period = max(0, (range_start - first_week).days // period_days)
+        result = []
+        while True:
+            week = first_week + timedelta(days=period * period_days)
+            if week > range_end:
+                break
+            for position, day in enumerate(weekdays):
+                current = week + timedelta(days=day)
+                if current < start_date:
+                    continue
+                index = (position - (len(weekdays) - first_week_count) if period == 0
+                         else first_week_count + (period - 1) * len(weekdays) + position)
+                if not self._within_count(index):
+                    return result
+                if range_start <= current <= range_end:
+                    result.append(current)
+            period += 1
+        return result
+
+    def _month_date(self, start_date, offset):
+        """起始月之后第offset个月的同一天，该月没有这一天时返回None"""
+        month_index = start_date.month - 1 + offset
+        year, month = start_date.year + month_index // 12, month_index % 12 + 1
+        if start_date.day > calendar.monthrange(year, month)[1]:
+            return None
+        return date(year, month, start_date.day)
+
+    def _between_monthly(self, start_date, range_start, range_end):
+        step = self.interval
+        months = (range_start.year - start_date.year) * 12 + range_start.month - start_date.month
+        period = max(0, months // step)
+        # 实例序号：只有有次数限制时才需要数出此前跳过的月份（如31日在小月不存在）
+        index = 0
+        if self.count is not None:
+            index = sum(1 for p in range(period) if self._month_date(start_date, p * step))
+        result = []
+        while True:
+            offset = period * step
+            month_index = start_date.month - 1 + offset
+            if date(start_date.year + month_index // 12, month_index % 12 + 1, 1) > range_end:
+                break
+            current = self._month_date(start_date, offset)
+            if current is not None:
+                if not self._within_count(index):
+                    break
+                if range_start <= current <= range_end:
+                    result.append(current)
+                index += 1
+            period += 1
+        return result
+
+
+def occurrence_key(recurrence_id, occurrence_date):
+    """尚未写入todos表的重复实例ID"""
+    return f"{OCCURRENCE_KEY_PREFIX}{recurrence_id}@{occurrence_date}"
+
+
+def is_occurrence_key(todo_id):
+    """是否为重复实例ID"""
+    return isinstance(todo_id, str) and todo_id.startswith(OCCURRENCE_KEY_PREFIX) and '@' in todo_id
+
+
+def parse_occurrence_key(key):
+    """解析重复实例ID，返回 (模板ID, 日期字符串)"""
+    recurrence_id, occurrence_date = key[len(OCCURRENCE_KEY_PREFIX):].split('@', 1)
+    return int(recurrence_id), occurrence_date
+
+
+def load_templates(conn):
+    """读取启用中的重复任务模板：[(模板行, 规则)]，规则无法解析的模板跳过"""
+    cursor = conn.execute('''
+        SELECT id, title, description, project, responsibility, priority, urgency, importance,
+               gtd_tag, rule, start_date, reminder_time
+        FROM recurring_tasks WHERE active = 1
+    ''')
+    columns = [desc[0] for desc in cursor.description]
+    templates = []
+    for row in cursor.fetchall():
+        template = dict(zip(columns, row))
+        try:
+            templates.append((template, RecurrenceRule.parse(template['rule'])))
+        except ValueError as e:
+            print(f"重复规则无效（模板 {template['id']}）: {e}")
+    return templates
+
+
+def expand_occurrences(conn, start, end):
+    """展开 [start, end] 内尚未写入todos表的重复实例，返回字典列表（按日期、优先级排序）
+
+    已完成或已修改的实例在todos表中有对应行，已删除的实例记在 recurrence_exceptions 表中，这里都跳过。
+    """
+    range_start, range_end = parse_date(start), parse_date(end)
+    templates = load_templates(conn)
+    if not templates:
+        return []
+
+    placeholders = ", ".join("?" for _ in templates)
+    params = [template['id'] for template, _ in templates] + [
+        range_start.strftime('%Y-%m-%d'), range_end.strftime('%Y-%m-%d')
+    ]
+    existing = set(tuple(row) for row in conn.execute(f'''
+        SELECT recurrence_id, occurrence_date FROM todos
+        WHERE recurrence_id IN ({placeholders}) AND occurrence_date BETWEEN ? AND ?
+        UNION ALL
+        SELECT recurrence_id, occurrence_date FROM recurrence_exceptions
+        WHERE recurrence_id IN ({placeholders}) AND occurrence_date BETWEEN ? AND ?
+    ''', params + params).fetchall())
+
+    occurrences = []
+    for template, rule in templates:
+        try:
+            start_date = parse_date(template['start_date'])
+        except ValueError as e:
+            print(f"重复任务起始日期无效（模板 {template['id']}）: {e}")
+            continue
+        for current in rule.between(start_date, range_start, range_end):
+            date_str = current.strftime('%Y-%m-%d')
+            if (template['id'], date_str) in existing:
+                continue
+            occurrence = {field: template[field] for field in TEMPLATE_FIELDS}
+            occurrence.update({
+                'id': occurrence_key(template['id'], date_str),
+                'recurrence_id': template['id'],
+                'occurrence_date': date_str,
+                'due_date': date_str,
+                'due_day': date_index.to_day(current),
+                'reminder_time': f"{date_str} {template['reminder_time']}" if template['reminder_time'] else None,
+                'status': 'pending',
+                'created_at': None,
+                'completed_at': None,
+            })
+            occurrences.append(occurrence)
+    occurrences.sort(key=lambda item: (item['due_date'], item['priority'] or 4))
+    return occurrences
+
+
+def get_due_reminders(conn, current_time):
+    """当前分钟（YYYY-MM-DD HH:MM）需要提醒的重复实例：[(实例ID, 标题, 描述)]"""
+    today = current_time[:10]
+    return [
+        (item['id'], item['title'], item['description'])
+        for item in expand_occurrences(conn, today, today)
+        if item['reminder_time'] and item['reminder_time'].startswith(current_time)
+    ]
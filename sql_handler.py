@@ -5,22 +5,35 @@ SQL处理模块
 import sqlite3
 import re
 from datetime import datetime
+from sql_sandbox import SQLSandbox
+import query_builder
+from query_builder import Query
 
 
 class SQLHandler:
     """SQL查询处理器"""
     
-    def __init__(self, db_name):
+    def __init__(self, db_name, config_manager=None):
         """初始化SQL处理器"""
         self.db_name = db_name # Store db_name
         self.sql_connection = None
+        self.statement_cache = None
+        self.statement_cache_size = (
+            config_manager.get('database.statement_cache_size', query_builder.DEFAULT_STATEMENT_CACHE_SIZE)
+            if config_manager else query_builder.DEFAULT_STATEMENT_CACHE_SIZE
+        )
         self.init_sql_connection()
+        
+        # AI生成的SQL走沙箱通道：只读连接 + 超时 + 行数/字节上限，写入串行事务
+        self.sandbox = SQLSandbox.from_config(db_name, config_manager)
     
     def init_sql_connection(self):
         """初始化SQLite连接"""
         try:
             # 设置check_same_thread=False以支持多线程访问
-            self.sql_connection = sqlite3.connect(self.db_name, check_same_thread=False)
+            self.sql_connection, self.statement_cache = query_builder.connect(
+                self.db_name, self.statement_cache_size, check_same_thread=False
+            )
             self.sql_connection.row_factory = sqlite3.Row  # 使结果可以按列名访问
             print(f"SQL连接初始化成功: {self.db_name}")
             return True
@@ -28,19 +41,21 @@ class SQLHandler:
             print(f"初始化SQL连接失败: {e}")
             return False
     
-    def execute_sql_query(self, query):
-        """执行SQL查询（只读）"""
+    def execute_sql_query(self, query, params=()):
+        """执行SQL查询（只读），query可以是SQL文本或Query对象"""
         try:
             if not self.sql_connection:
                 return False, "数据库连接未初始化"
             
+            if isinstance(query, Query):
+                query, params = query.build()
+            
             # 安全检查：只允许SELECT和PRAGMA查询
             query_upper = query.upper().strip()
             if not (query_upper.startswith('SELECT') or query_upper.startswith('PRAGMA')):
                 return False, "只允许执行SELECT和PRAGMA查询"
             
-            cursor = self.sql_connection.cursor()
-            cursor.execute(query)
+            cursor = self.statement_cache.execute(self.sql_connection.cursor(), query, params)
             results = cursor.fetchall()
             
             # 转换为字典列表
@@ -74,11 +89,24 @@ class SQLHandler:
         except Exception as e:
             return False, f"写入操作失败: {str(e)}"
     
+    def execute_ai_sql(self, query):
+        """执行AI生成的SQL语句（经沙箱限制）"""
+        return self.sandbox.execute(query)
+    
+    def close(self):
+        """关闭所有连接"""
+        self.sandbox.close()
+        if self.sql_connection:
+            self.sql_connection.close()
+            self.sql_connection = None
+    
     def get_table_schema(self, table_name):
         """获取表结构"""
         try:
-            query = f"PRAGMA table_info({table_name})"
-            success, results = self.execute_sql_query(query)
+            # 表值函数形式的PRAGMA支持参数绑定
+            success, results = self.execute_sql_query(
+                "SELECT * FROM pragma_table_info(?)", (table_name,)
+            )
             if success:
                 return True, results
             else:
@@ -89,7 +117,7 @@ class SQLHandler:
     def list_all_tables(self):
         """列出所有表"""
         try:
-            query = "SELECT name FROM sqlite_master WHERE type='table'"
+            query = Query.select("sqlite_master", "name").where_eq("type", "table")
             success, results = self.execute_sql_query(query)
             if success:
                 table_names = [row['name'] for row in results]
@@ -127,72 +155,64 @@ class SQLHandler:
             return f"处理查询请求时出错: {str(e)}"
     
     def _build_query_from_input(self, user_input_lower):
-        """根据用户输入构建SQL查询"""
-        base_query = "SELECT * FROM todos"
-        conditions = []
+        """根据用户输入构建参数化查询（返回Query对象）"""
+        # 统计查询
+        if '统计' in user_input_lower or '数量' in user_input_lower or 'count' in user_input_lower:
+            if '项目' in user_input_lower:
+                return Query.select("todos", "project", "COUNT(*) as count").group_by("project")
+            elif '优先级' in user_input_lower:
+                return Query.select("todos", "priority", "COUNT(*) as count").group_by("priority")
+            elif '状态' in user_input_lower:
+                return Query.select("todos", "status", "COUNT(*) as count").group_by("status")
+            else:
+                return Query.select("todos", "COUNT(*) as total_count")
+        
+        query = Query.select("todos")
         
         # 状态筛选
         if '待处理' in user_input_lower or '未完成' in user_input_lower:
-            conditions.append("status = 'pending'")
+            query.where_eq("status", "pending")
         elif '已完成' in user_input_lower or '完成' in user_input_lower:
-            conditions.append("status = 'completed'")
+            query.where_eq("status", "completed")
         
         # 优先级筛选
         if '重要紧急' in user_input_lower or '优先级1' in user_input_lower:
-            conditions.append("priority = 1")
+            query.where_eq("priority", 1)
         elif '重要不紧急' in user_input_lower or '优先级2' in user_input_lower:
-            conditions.append("priority = 2")
+            query.where_eq("priority", 2)
         elif '不重要紧急' in user_input_lower or '优先级3' in user_input_lower:
-            conditions.append("priority = 3")
+            query.where_eq("priority", 3)
         elif '不重要不紧急' in user_input_lower or '优先级4' in user_input_lower:
-            conditions.append("priority = 4")
+            query.where_eq("priority", 4)
         
         # GTD标签筛选
         if '下一步' in user_input_lower or 'next-action' in user_input_lower:
-            conditions.append("gtd_tag = 'next-action'")
+            query.where_eq("gtd_tag", "next-action")
         elif '等待' in user_input_lower or 'waiting' in user_input_lower:
-            conditions.append("gtd_tag = 'waiting-for'")
+            query.where_eq("gtd_tag", "waiting-for")
         elif '将来' in user_input_lower or 'someday' in user_input_lower:
-            conditions.append("gtd_tag = 'someday-maybe'")
+            query.where_eq("gtd_tag", "someday-maybe")
         elif '收件箱' in user_input_lower or 'inbox' in user_input_lower:
-            conditions.append("gtd_tag = 'inbox'")
+            query.where_eq("gtd_tag", "inbox")
         
         # 项目筛选
         projects = ['工作', '学习', '生活', '个人']
         for project in projects:
             if project in user_input_lower:
-                conditions.append(f"project = '{project}'")
+                query.where_eq("project", project)
                 break
         
         # 时间筛选
         if '今天' in user_input_lower:
-            today = datetime.now().strftime('%Y-%m-%d')
-            conditions.append(f"due_date = '{today}'")
+            query.where_eq("due_date", datetime.now().strftime('%Y-%m-%d'))
         elif '本周' in user_input_lower:
             # 简化处理，查询最近7天
-            conditions.append("due_date >= date('now', '-7 days')")
+            query.where("due_date >= date('now', '-7 days')")
         elif '过期' in user_input_lower or '逾期' in user_input_lower:
-            conditions.append("due_date < date('now') AND status = 'pending'")
-        
-        # 统计查询
-        if '统计' in user_input_lower or '数量' in user_input_lower or 'count' in user_input_lower:
-            if '项目' in user_input_lower:
-                return "SELECT project, COUNT(*) as count FROM todos GROUP BY project"
-            elif '优先级' in user_input_lower:
-                return "SELECT priority, COUNT(*) as count FROM todos GROUP BY priority"
-            elif '状态' in user_input_lower:
-                return "SELECT status, COUNT(*) as count FROM todos GROUP BY status"
-            else:
-                return "SELECT COUNT(*) as total_count FROM todos"
-        
-        # 构建完整查询
-        if conditions:
-            query = base_query + " WHERE " + " AND ".join(conditions)
-        else:
-            query = base_query
+            query.where("due_date < date('now')").where_eq("status", "pending")
         
         # 添加排序
-        query += " ORDER BY priority ASC, created_at DESC"
+        query.order_by("priority ASC", "created_at DESC")
         
         return query
     
@@ -278,6 +298,17 @@ class SQLHandler:
         except Exception as e:
             return f"获取任务概览失败: {str(e)}"
     
+    def get_statement_cache_stats(self):
+        """获取预编译语句缓存的命中统计"""
+        return self.statement_cache.get_stats() if self.statement_cache else {}
+    
+    def get_schema_version(self):
+        """获取数据库模式版本（PRAGMA schema_version），失败时返回None"""
+        try:
+            return self.sql_connection.execute("PRAGMA schema_version").fetchone()[0]
+        except Exception:
+            return None
+    
     def get_mcp_schema_prompt(self):
         """生成用于AI的数据库模式和操作说明提示。"""
         prompt_parts = []
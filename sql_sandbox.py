@@ -0,0 +1,255 @@
+"""
+SQL沙箱执行模块
+AI生成的SQL在独立连接上执行：读操作走只读连接并限制耗时、行数和结果大小，
+写操作走单独的串行事务通道，避免一条失控的查询拖住整个应用
+"""
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# 沙箱默认限制，可通过配置 mcp.sandbox.* 覆盖
+DEFAULT_SANDBOX_CONFIG = {
+    "timeout": 2.0,              # 单条语句最长执行时间（秒）
+    "max_rows": 200,             # 读查询最多返回的行数
+    "max_bytes": 256 * 1024,     # 读查询结果的最大字节数（按文本长度估算）
+    "scan_row_threshold": 50000, # 超过该行数的表禁止全表扫描
+    "fetch_batch": 50,           # 每次fetchmany的行数
+}
+
+READ_PREFIXES = ('SELECT', 'WITH', 'PRAGMA')
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+# 执行计划中的全表扫描，如 "SCAN todos"、"SCAN TABLE todos"（旧版本格式）
+_SCAN_PATTERN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+_WORD_PATTERN = re.compile(r'\w+')
+
+
+class QueryResult(list):
+    """读查询结果：行字典列表，附带截断信息"""
+
+    def __init__(self, rows=(), truncated=False, reason="", elapsed=0.0):
+        super().__init__(rows)
+        self.truncated = truncated
+        self.reason = reason
+        self.elapsed = elapsed
+
+
+class SQLSandbox:
+    """AI生成SQL的沙箱执行通道"""
+
+    def __init__(self, db_path, timeout=None, max_rows=None, max_bytes=None,
+                 scan_row_threshold=None, fetch_batch=None):
+        self.db_path = db_path
+        self.timeout = timeout or DEFAULT_SANDBOX_CONFIG["timeout"]
+        self.max_rows = max_rows or DEFAULT_SANDBOX_CONFIG["max_rows"]
+        self.max_bytes = max_bytes or DEFAULT_SANDBOX_CONFIG["max_bytes"]
+        self.scan_row_threshold = scan_row_threshold or DEFAULT_SANDBOX_CONFIG["scan_row_threshold"]
+        self.fetch_batch = fetch_batch or DEFAULT_SANDBOX_CONFIG["fetch_batch"]
+
+        self._read_conn = None
+        self._write_conn = None
+        self._read_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        # 表行数估算缓存：表名 -> (行数, 时间)
+        self._row_estimates = {}
+        self._row_estimate_ttl = 30.0
+
+    @classmethod
+    def from_config(cls, db_path, config_manager=None):
+        """按配置 mcp.sandbox.* 创建沙箱"""
+        options = dict(DEFAULT_SANDBOX_CONFIG)
+        if config_manager:
+            options.update(config_manager.get('mcp.sandbox', {}) or {})
+        return cls(db_path, **{key: options.get(key) for key in DEFAULT_SANDBOX_CONFIG})
+
+    # ---- 连接 ----
+
+    def _get_read_connection(self):
+        """只读连接（mode=ro），首次使用时打开"""
+        if self._read_conn is None:
+            uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA query_only = ON")
+            self._read_conn = conn
+        return self._read_conn
+
+    def _get_write_connection(self):
+        """写连接：手动管理事务，首次使用时打开"""
+        if self._write_conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   timeout=self.timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._write_conn = conn
+        return self._write_conn
+
+    def _set_deadline(self, conn, timeout):
+        """通过进度回调实现墙钟超时，超时后SQLite中断语句"""
+        deadline = time.monotonic() + timeout
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 1000)
+
+    def close(self):
+        """关闭沙箱连接"""
+        with self._read_lock:
+            if self._read_conn is not None:
+                self._read_conn.close()
+                self._read_conn = None
+        with self._write_lock:
+            if self._write_conn is not None:
+                self._write_conn.close()
+                self._write_conn = None
+
+    # ---- 语句检查 ----
+
+    def _normalize(self, sql):
+        """去掉首尾空白和结尾分号"""
+        return sql.strip().rstrip(';').strip()
+
+    def _estimate_rows(self, conn, table):
+        """估算表行数：MAX(rowid)只需查找B树末端，代价与表大小无关"""
+        cached = self._row_estimates.get(table)
+        if cached and time.monotonic() - cached[1] < self._row_estimate_ttl:
+            return cached[0]
+        try:
+            row = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()
+            estimate = row[0] or 0
+        except sqlite3.Error:
+            # 视图、WITHOUT ROWID表等无法估算
+            estimate = 0
+        self._row_estimates[table] = (estimate, time.monotonic())
+        return estimate
+
+    def _check_plan(self, conn, sql):
+        """用EXPLAIN QUERY PLAN检查是否对大表做全表扫描，返回 (是否通过, 说明)"""
+        tables = {row[0].lower(): row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table'"
+        )}
+        # 执行计划里显示的是别名，按 "表名 [AS] 别名" 还原真实表名
+        words = [word.lower() for word in _WORD_PATTERN.findall(sql)]
+        aliases = {}
+        for i, word in enumerate(words[:-1]):
+            if word in tables:
+                alias = words[i + 2] if words[i + 1] == 'as' and i + 2 < len(words) else words[i + 1]
+                aliases[alias] = tables[word]
+
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+            match = _SCAN_PATTERN.match(row[3])
+            # 带索引的扫描（USING ... INDEX）不算全表扫描
+            if not match or 'INDEX' in match.group(2):
+                continue
+            name = match.group(1).lower()
+            table = tables.get(name) or aliases.get(name)
+            if not table:
+                continue
+            estimate = self._estimate_rows(conn, table)
+            if estimate > self.scan_row_threshold:
+                return False, (f"查询需要全表扫描 {table}（约{estimate}行），"
+                               f"超过限制{self.scan_row_threshold}行，请添加筛选条件")
+        return True, ""
+
+    # ---- 读通道 ----
+
+    def execute_read(self, sql):
+        """在只读连接上执行查询，返回 (成功, QueryResult或错误信息)"""
+        sql = self._normalize(sql)
+        if not sql.upper().startswith(READ_PREFIXES):
+            return False, "只读通道只允许执行SELECT、WITH和PRAGMA查询"
+
+        with self._read_lock:
+            try:
+                conn = self._get_read_connection()
+            except Exception as e:
+                return False, f"打开只读连接失败: {str(e)}"
+
+            start = time.monotonic()
+            self._set_deadline(conn, self.timeout)
+            cursor = None
+            try:
+                if sql.upper().startswith('PRAGMA'):
+                    cursor = conn.execute(sql)
+                else:
+                    ok, message = self._check_plan(conn, sql)
+                    if not ok:
+                        return False, message
+                    # 外层LIMIT保证SQLite最多产生 max_rows+1 行；换行避免语句末尾的注释吞掉括号
+                    cursor = conn.execute(f"SELECT * FROM (\n{sql}\n) LIMIT ?", (self.max_rows + 1,))
+                return True, self._fetch_capped(cursor, start)
+            except sqlite3.OperationalError as e:
+                if 'interrupted' in str(e):
+                    return False, f"查询超过{self.timeout}秒未完成，已中止"
+                return False, f"查询执行失败: {str(e)}"
+            except Exception as e:
+                return False, f"查询执行失败: {str(e)}"
+            finally:
+                if cursor is not None:
+                    cursor.close()
+                conn.set_progress_handler(None, 0)
+
+    def _fetch_capped(self, cursor, start):
+        """分批读取结果，达到行数或字节上限时停止"""
+        rows = []
+        size = 0
+        truncated = False
+        reason = ""
+        while not truncated:
+            batch = cursor.fetchmany(self.fetch_batch)
+            if not batch:
+                break
+            for row in batch:
+                if len(rows) >= self.max_rows:
+                    truncated, reason = True, f"结果超过{self.max_rows}行，仅显示前{self.max_rows}行"
+                    break
+                record = dict(row)
+                size += sum(len(value) if isinstance(value, (str, bytes)) else 8
+                            for value in record.values())
+                if size > self.max_bytes:
+                    truncated, reason = True, f"结果超过{self.max_bytes // 1024}KB，已截断"
+                    break
+                rows.append(record)
+        return QueryResult(rows, truncated, reason, time.monotonic() - start)
+
+    # ---- 写通道 ----
+
+    def execute_write(self, sql, params=()):
+        """在独立写连接上串行执行单条写语句，整体在一个事务中完成"""
+        sql = self._normalize(sql)
+        if not sql.upper().startswith(WRITE_PREFIXES):
+            return False, "只允许执行INSERT、UPDATE、DELETE操作"
+
+        with self._write_lock:
+            try:
+                conn = self._get_write_connection()
+            except Exception as e:
+                return False, f"打开写连接失败: {str(e)}"
+
+            self._set_deadline(conn, self.timeout)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    cursor = conn.execute(sql, params)
+                    rowcount = cursor.rowcount
+                    conn.execute("COMMIT")
+                except Exception:
+                    # 中断时SQLite可能已自动回滚；先移除超时回调，保证回滚本身不被中断
+                    conn.set_progress_handler(None, 0)
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    raise
+                return True, f"操作成功，影响行数: {rowcount}"
+            except sqlite3.OperationalError as e:
+                if 'interrupted' in str(e):
+                    return False, f"写入超过{self.timeout}秒未完成，已回滚"
+                return False, f"写入操作失败: {str(e)}"
+            except Exception as e:
+                return False, f"写入操作失败: {str(e)}"
+            finally:
+                conn.set_progress_handler(None, 0)
+
+    def execute(self, sql):
+        """按语句类型分派到读通道或写通道"""
+        if self._normalize(sql).upper().startswith(READ_PREFIXES):
+            return self.execute_read(sql)
+        return self.execute_write(sql)
@@ -0,0 +1,72 @@
+"""
+启动耗时分析模块
+配合 main.py --profile-startup 使用，统计各组件的导入耗时和初始化耗时
+"""
+import time
+from contextlib import contextmanager
+
+import module_registry
+
+# 进程内最早的计时点（main.py 启动时即导入本模块）
+PROCESS_START = time.perf_counter()
+
+# 冷启动预算（毫秒）：从导入main.py到窗口首次绘制
+STARTUP_BUDGET_MS = 1500
+
+
+class StartupProfiler:
+    """启动耗时分析器"""
+
+    def __init__(self, enabled=True):
+        """初始化分析器，enabled为False时所有计时操作均为空操作"""
+        self.enabled = enabled
+        self.init_times = []       # [(组件名, 秒)]
+        self.first_paint_time = None
+
+    @contextmanager
+    def component(self, name):
+        """统计一个组件的初始化耗时"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.init_times.append((name, time.perf_counter() - start))
+
+    def mark_first_paint(self):
+        """记录窗口首次绘制完成的时间点"""
+        if self.enabled and self.first_paint_time is None:
+            self.first_paint_time = time.perf_counter()
+
+    def total_ms(self):
+        """进程启动到首次绘制（未绘制时到当前）的耗时，毫秒"""
+        end = self.first_paint_time or time.perf_counter()
+        return (end - PROCESS_START) * 1000
+
+    def check_budget(self, budget_ms=STARTUP_BUDGET_MS):
+        """检查启动耗时是否在预算内，返回 (是否达标, 实际耗时毫秒)"""
+        total = self.total_ms()
+        return total <= budget_ms, total
+
+    def report(self, budget_ms=STARTUP_BUDGET_MS):
+        """生成启动耗时报告文本"""
+        lines = ["启动耗时分析", "=" * 48, "模块导入（自身耗时，不含嵌套导入）:"]
+        import_times = module_registry.get_import_times()
+        for name, seconds in import_times:
+            lines.append(f"  {name:<28}{seconds * 1000:>10.1f} ms")
+        if not import_times:
+            lines.append("  （无）")
+
+        lines.append("组件初始化:")
+        for name, seconds in self.init_times:
+            lines.append(f"  {name:<28}{seconds * 1000:>10.1f} ms")
+        if not self.init_times:
+            lines.append("  （无）")
+
+        ok, total = self.check_budget(budget_ms)
+        lines.append("-" * 48)
+        lines.append(f"  {'首次绘制总耗时':<22}{total:>10.1f} ms")
+        lines.append(f"  {'预算':<26}{budget_ms:>10.1f} ms  {'达标' if ok else '超出预算'}")
+        return "\n".join(lines)
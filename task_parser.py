@@ -4,6 +4,7 @@
 """
 import re
 from datetime import datetime, timedelta
+import perf_metrics
 
 
 class TaskParser:
@@ -352,8 +353,7 @@ class TaskParser:
         id_patterns = [
             r'(?:任务|ID|id|编号)\s*[：:]\s*(\d+)',
             r'(?:删除|完成|修改)\s*(\d+)',
-            r'#(\d+)',
-            r'\b(\d+)\b'
+            r'#(\d+)'
         ]
         
         ids = []
@@ -388,4 +388,7 @@ class TaskParser:
             3: '不重要但紧急',
             4: '不重要且不紧急'
         }
-        return priority_names.get(priority, '未知优先级') 
\ No newline at end of file
+        return priority_names.get(priority, '未知优先级')
+
+
+perf_metrics.register_class(TaskParser, "parser", ["parse_task_from_input"])
@@ -0,0 +1,402 @@
+"""
+任务内存存储模块
+待办事项一次性读入内存，保存为紧凑的 __slots__ 记录，并按ID、截止日期、(优先级, GTD标签)、项目建立索引；
+各视图的列表读取直接由内存提供，修改先写入数据库再同步更新内存（直写）。
+其他连接（AI执行器等）写入后，下一次读取时按数据版本发现并重新加载
+"""
+import json
+import sys
+
+import date_index
+import perf_metrics
+import recurrence
+
+# 读入内存的列：不含描述（详情窗口按ID从数据库读取），日期时间除截止日期外只保留整数形式（见 date_index）
+RECORD_FIELDS = ('id', 'title', 'project', 'responsibility', 'priority', 'urgency', 'importance',
+                 'gtd_tag', 'due_date', 'due_day', 'reminder_minute', 'status', 'created_ts', 'completed_ts')
+
+LOAD_SQL = f"SELECT {', '.join(RECORD_FIELDS)} FROM todos"
+
+# 每条任务的内存预算（记录、字符串和索引合计，字节）
+MEMORY_BUDGET_PER_TASK = 600
+
+_STATUS_ORDER = {'pending': 1, 'completed': 2}
+
+
+# 截止天数的取值不多，各记录共享同一个整数对象
+_shared_days = {}
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _null_first(value):
+    """与SQLite升序排序一致：NULL排在最前"""
+    return (value is not None, value if value is not None else 0)
+
+
+def _display_order(record):
+    """列表显示顺序：待处理在前，再按优先级、截止日期、创建时间倒序"""
+    return (_STATUS_ORDER.get(record.status, 3), _null_first(record.priority),
+            _null_first(record.due_date), -(record.created_ts or 0), -record.id)
+
+
+class TaskRecord:
+    """一条待办事项（只读视图使用；字段同 RECORD_FIELDS）
+
+    支持 record['title'] 和 record.get('title') 的字典式读取，可直接替代 get_all_todos 返回的字典。
+    """
+
+    __slots__ = RECORD_FIELDS
+
+    @classmethod
+    def from_row(cls, row):
+        """从查询行（列顺序同 RECORD_FIELDS）创建；重复值多的字符串列驻留，共享同一个字符串对象"""
+        record = cls.__new__(cls)
+        (record.id, record.title, project, responsibility, record.priority, record.urgency,
+         record.importance, gtd_tag, due_date, due_day, record.reminder_minute, status,
+         record.created_ts, record.completed_ts) = row
+        record.project = _intern(project)
+        record.responsibility = _intern(responsibility)
+        record.gtd_tag = _intern(gtd_tag)
+        record.due_date = _intern(due_date)
+        record.due_day = _shared_days.setdefault(due_day, due_day)
+        record.status = _intern(status)
+        return record
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in RECORD_FIELDS}
+
+    def __repr__(self):
+        return f"TaskRecord(id={self.id!r}, title={self.title!r}, status={self.status!r})"
+
+
+class TaskIndex:
+    """一次加载的全部记录及索引；可在后台线程中建好后整体交给 TaskStore"""
+
+    def __init__(self, records=()):
+        self.by_id = {}
+        self.by_day = {}
+        self.by_quadrant = {}
+        self.by_project = {}
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        """加入一条记录（同ID的旧记录需先移除）"""
+        self.by_id[record.id] = record
+        if record.due_day is not None:
+            self.by_day.setdefault(record.due_day, set()).add(record.id)
+        self.by_quadrant.setdefault((record.priority, record.gtd_tag), set()).add(record.id)
+        self.by_project.setdefault(record.project, set()).add(record.id)
+
+    def remove(self, todo_id):
+        """移除一条记录，返回被移除的记录（不存在时为None）"""
+        record = self.by_id.pop(todo_id, None)
+        if record is None:
+            return None
+        for index, key in ((self.by_day, record.due_day),
+                           (self.by_quadrant, (record.priority, record.gtd_tag)),
+                           (self.by_project, record.project)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(todo_id)
+                if not ids:
+                    del index[key]
+        return record
+
+    def records(self, ids):
+        by_id = self.by_id
+        return [by_id[todo_id] for todo_id in ids]
+
+
+def load_index(db):
+    """从数据库读取全部待办事项并建立索引（db可以是后台线程的只读实例）"""
+    cursor = db.conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(LOAD_SQL)
+    return TaskIndex(TaskRecord.from_row(row) for row in cursor)
+
+
+def estimate_memory(index):
+    """估算索引占用的内存（字节）：记录、各自的字符串（驻留共享的只计一次）和索引容器"""
+    seen = set()
+    total = 0
+
+    def size(obj):
+        nonlocal total
+        if obj is None or id(obj) in seen:
+            return
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+
+    for record in index.by_id.values():
+        size(record)
+        for name in RECORD_FIELDS:
+            size(getattr(record, name))
+    for mapping in (index.by_id, index.by_day, index.by_quadrant, index.by_project):
+        size(mapping)
+        if mapping is not index.by_id:
+            for key, ids in mapping.items():
+                size(key)
+                size(ids)
+    return total
+
+
+class TaskStore:
+    """应用内共享的待办事项存储"""
+
+    def __init__(self, database_manager):
+        """创建时不加载，首次读取时（或 load_async 完成后）才读入数据"""
+        self.db_manager = database_manager
+        self.index = None
+        self.version = None
+        self.loads = 0
+        self._sorted_all = None
+
+    # ---- 加载与同步 ----
+
+    def is_stale(self):
+        """尚未加载，或数据库在本存储之外被修改过"""
+        return self.index is None or self.db_manager.get_data_version('todos') != self.version
+
+    def load(self):
+        """在当前线程中从主连接重新加载"""
+        version = self.db_manager.get_data_version('todos')
+        self.install(load_index(self.db_manager), version)
+
+    def install(self, index, version):
+        """换上新加载的索引，version为开始读取前的数据版本"""
+        self.index = index
+        self.version = version
+        self.loads += 1
+        self._sorted_all = None
+
+    def load_async(self, data_loader, callback):
+        """数据最新时直接调用callback，否则在后台读取并建立索引，完成后在主线程换上再调用callback"""
+        if not self.is_stale():
+            callback()
+            return
+        version = self.db_manager.get_data_version('todos')
+
+        def on_loaded(index):
+            self.install(index, version)
+            callback()
+
+        data_loader.submit("task_store.load", load_index, on_loaded)
+
+    def ensure_loaded(self):
+        """读取前调用：过期时同步重新加载"""
+        if self.is_stale():
+            self.load()
+        return self.index
+
+    def _fetch_records(self, todo_ids):
+        """一次查询读取给定ID的记录"""
+        cursor = self.db_manager.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"{LOAD_SQL} WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(todo_ids),))
+        return [TaskRecord.from_row(row) for row in cursor]
+
+    def _write_through(self, write, todo_ids=()):
+        """执行写入并同步内存中的对应记录；写入前内存已过期时改为下次读取时整体重新加载"""
+        stale = self.is_stale()
+        result = write()
+        if stale:
+            self.index = None
+            return result
+        todo_ids = [todo_id for todo_id in (todo_ids() if callable(todo_ids) else todo_ids) if todo_id is not None]
+        for todo_id in todo_ids:
+            self.index.remove(todo_id)
+        if todo_ids:
+            for record in self._fetch_records(todo_ids):
+                self.index.add(record)
+        self._sorted_all = None
+        self.version = self.db_manager.get_data_version('todos')
+        return result
+
+    # ---- 修改（先写数据库） ----
+
+    def add_todo(self, *args, **kwargs):
+        """添加待办事项，参数同 DatabaseManager.add_todo，返回新ID"""
+        new_ids = []
+
+        def write():
+            new_ids.append(self.db_manager.add_todo(*args, **kwargs))
+            return new_ids[0]
+
+        return self._write_through(write, lambda: new_ids)
+
+    def mark_todo_completed(self, todo_id):
+        """标记完成（重复实例先写入todos表）"""
+        resolved = []
+
+        def write():
+            resolved.append(self.db_manager.resolve_todo_id(todo_id))
+            self.db_manager.mark_todo_completed(resolved[0])
+
+        self._write_through(write, lambda: resolved)
+
+    def update_todo_status(self, todo_id, status):
+        """更新状态，返回是否成功"""
+        resolved = []
+
+        def write():
+            resolved.append(self.db_manager.resolve_todo_id(todo_id))
+            return self.db_manager.update_todo_status(resolved[0], status)
+
+        return self._write_through(write, lambda: resolved)
+
+    def delete_todo(self, todo_id):
+        """删除待办事项（重复实例记入例外表），返回是否成功"""
+        if recurrence.is_occurrence_key(todo_id):
+            return self.delete_many([todo_id]) > 0
+        return self._write_through(lambda: self.db_manager.delete_todo(todo_id), (todo_id,))
+
+    def _write_resolved(self, todo_ids, write):
+        """在写入回调中转换重复实例ID并执行write(整数ID列表)，写入的实例与修改在同一事务中提交"""
+        resolved = []
+
+        def write_all():
+            resolved.extend(self.db_manager.resolve_todo_ids(todo_ids, commit=False))
+            return write(resolved)
+
+        return self._write_through(write_all, lambda: resolved)
+
+    def update_status_many(self, todo_ids, status):
+        """批量更新状态（一条语句），返回更新的行数"""
+        return self._write_resolved(todo_ids, lambda ids: self.db_manager.update_status_many(ids, status))
+
+    def delete_many(self, todo_ids):
+        """批量删除（一条语句；重复实例记入例外表），返回处理的任务数"""
+        # 尚未写入的实例不在内存中；已写入的实例按任务ID从内存移除
+        occurrences = [todo_id for todo_id in todo_ids if recurrence.is_occurrence_key(todo_id)]
+        removed = [int(todo_id) for todo_id in todo_ids if not recurrence.is_occurrence_key(todo_id)]
+        removed += self.db_manager.get_materialized_ids(occurrences).values()
+        return self._write_through(lambda: self.db_manager.delete_many(todo_ids), removed)
+
+    def move_many(self, todo_ids, priority=None, gtd_tag=None, due_date=None):
+        """批量移动象限、改GTD标签或改期（参数同 DatabaseManager.move_many），返回更新的行数"""
+        return self._write_resolved(
+            todo_ids,
+            lambda ids: self.db_manager.move_many(ids, priority=priority, gtd_tag=gtd_tag, due_date=due_date)
+        )
+
+    def apply_todo_operations(self, operations):
+        """批量执行操作（参数和返回值同 DatabaseManager.apply_todo_operations），整批同步内存"""
+        return self._write_through(
+            lambda: self.db_manager.apply_todo_operations(operations),
+            [todo_id for _, todo_id, _ in operations]
+        )
+
+    # ---- 读取（与 DatabaseManager 同名方法的结果格式一致） ----
+
+    def get_todo(self, todo_id):
+        """按ID获取记录"""
+        return self.ensure_loaded().by_id.get(todo_id)
+
+    def get_all_todos(self):
+        """全部待办事项：待处理在前，再按优先级、截止日期、创建时间倒序（返回的列表为共享缓存，勿修改）"""
+        index = self.ensure_loaded()
+        if self._sorted_all is None:
+            self._sorted_all = sorted(index.by_id.values(), key=_display_order)
+        return self._sorted_all
+
+    def get_quadrant_records(self, priority, gtd_tag):
+        """指定象限和GTD标签的全部记录，顺序同 get_all_todos（供视图局部刷新）"""
+        index = self.ensure_loaded()
+        return sorted(index.records(index.by_quadrant.get((priority, gtd_tag), ())), key=_display_order)
+
+    def get_pending_todos(self, limit=None):
+        """待处理的待办事项（按优先级、截止日期排序）"""
+        todos = [record for record in self.get_all_todos() if record.status == 'pending']
+        return todos if limit is None else todos[:limit]
+
+    def get_todos_by_date(self, date_str):
+        """指定日期的待办事项：[(id, 标题, 项目, GTD标签, 优先级, 状态)]"""
+        index = self.ensure_loaded()
+        records = index.records(index.by_day.get(date_index.to_day(date_str), ()))
+        records.sort(key=lambda record: (_null_first(record.priority), record.created_ts or 0, record.id))
+        return [(record.id, record.title, record.project, record.gtd_tag, record.priority, record.status)
+                for record in records]
+
+    def get_todos_by_priority_and_gtd(self, priority, gtd_tag):
+        """指定象限和GTD标签的待办事项：[(id, 标题, 项目, 截止日期, 状态)]"""
+        index = self.ensure_loaded()
+        records = index.records(index.by_quadrant.get((priority, gtd_tag), ()))
+        records.sort(key=lambda record: (_null_first(record.due_date), record.id))
+        return [(record.id, record.title, record.project, record.due_date, record.status)
+                for record in records]
+
+    def get_todos_by_project(self, project):
+        """指定项目的全部记录（按截止日期排序）"""
+        index = self.ensure_loaded()
+        records = index.records(index.by_project.get(project, ()))
+        records.sort(key=lambda record: _null_first(record.due_day))
+        return records
+
+    def get_upcoming_tasks(self, start_date, end_date, include_recurring=True):
+        """即将到期的任务：[(id, 标题, 项目, 截止日期, 截止天数)]，默认包含范围内的重复实例"""
+        index = self.ensure_loaded()
+        start_day, end_day = date_index.to_day(start_date), date_index.to_day(end_date)
+        records = []
+        for day in range(start_day, end_day + 1):
+            ids = index.by_day.get(day)
+            if ids:
+                records.extend(record for record in index.records(ids) if record.status == 'pending')
+        records.sort(key=lambda record: (record.due_day, _null_first(record.priority), record.id))
+        tasks = [(record.id, record.title, record.project, record.due_date, record.due_day)
+                 for record in records]
+        if include_recurring:
+            occurrences = self.db_manager.get_occurrences(start_date, end_date)
+            if occurrences:
+                tasks = sorted(
+                    tasks + [(item['id'], item['title'], item['project'], item['due_date'], item['due_day'])
+                             for item in occurrences],
+                    key=lambda task: task[4]
+                )
+        return tasks
+
+    def get_statistics(self):
+        """统计信息，字段同 DatabaseManager.get_statistics"""
+        index = self.ensure_loaded()
+        stats = {'total': len(index.by_id), 'completed': 0, 'pending': 0}
+        for key in [f'quadrant_{i}' for i in range(1, 5)] + [
+                f'gtd_{tag}' for tag in ("next-action", "waiting-for", "someday-maybe", "inbox")]:
+            stats[key] = 0
+        for record in index.by_id.values():
+            if record.status == 'completed':
+                stats['completed'] += 1
+            elif record.status == 'pending':
+                stats['pending'] += 1
+                if f'quadrant_{record.priority}' in stats:
+                    stats[f'quadrant_{record.priority}'] += 1
+                if f'gtd_{record.gtd_tag}' in stats:
+                    stats[f'gtd_{record.gtd_tag}'] += 1
+        return stats
+
+    def get_stats(self):
+        """存储状态（不触发加载）：{'records': 条数, 'loads': 整体加载次数}"""
+        return {'records': len(self.index.by_id) if self.index is not None else 0, 'loads': self.loads}
+
+    def get_memory_stats(self):
+        """内存占用估算：{'records': 条数, 'bytes': 字节数, 'bytes_per_task': 每条字节数}"""
+        index = self.ensure_loaded()
+        total = estimate_memory(index)
+        count = len(index.by_id)
+        return {'records': count, 'bytes': total, 'bytes_per_task': total / count if count else 0.0}
+
+
+perf_metrics.register_class(TaskStore, "task_store", [
+    "load", "install", "get_all_todos", "get_todos_by_date", "get_upcoming_tasks", "get_statistics"
+])
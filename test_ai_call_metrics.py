@@ -0,0 +1,140 @@
+"""
+AI调用统计测试
+用本地接口桩服务验证每次调用的token用量、耗时和提示词片段长度写入 ai_call_metrics 表，
+统计写入不会使按数据版本缓存的提示词片段失效，
+以及汇总和CSV导出
+"""
+import csv
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("requests")
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(APP_DIR, "benchmarks"))
+
+import ai_call_metrics
+import llm_endpoints
+import llm_stub
+import module_registry
+import prompt_pipeline
+
+AICore = module_registry.load_module("ai_core", "ai_core.py").AICore
+database_module = module_registry.load_module("1_database", "1_database.py")
+
+
+@pytest.fixture
+def server():
+    server = llm_stub.LLMStubServer(settings=llm_stub.StubSettings(latency=0.02, tokens_per_second=0)).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = database_module.DatabaseManager(str(tmp_path / "todos.db"))
+    yield manager
+    manager.close()
+
+
+def _client(server, db):
+    core = AICore()
+    core.endpoint_pool = llm_endpoints.EndpointPool([llm_endpoints.Endpoint("stub", server.url, "deepseek-chat")])
+    records = []
+
+    def listener(record):
+        record['cost'] = ai_call_metrics.estimate_cost(
+            record['model'], record['prompt_tokens'], record['completion_tokens'], record['cache_hit_tokens']
+        )
+        records.append(record)
+        db.record_ai_call(record)
+
+    core.call_listener = listener
+    return core, records
+
+
+def test_calls_are_recorded(server, db, tmp_path):
+    """流式和非流式调用都记录用量、首响应耗时和各片段长度，汇总与导出的数据一致"""
+    core, records = _client(server, db)
+    pipeline = prompt_pipeline.PromptPipeline()
+    pipeline.add_segment("base", lambda: "你是待办助手")
+    # 与AI助手相同：任务和记忆片段按数据版本缓存
+    pipeline.add_segment("todos", lambda: "1. 写周报", version=lambda: db.get_data_version('todos'),
+                         header="当前待办事项数据:\n")
+    pipeline.add_segment("memory", lambda: "常用概念: 周报", version=lambda: db.get_data_version('memory'),
+                         header="用户个性化信息:\n")
+    segments = {}
+    system_prompt = pipeline.build(sizes=segments)
+
+    assert core.call_deepseek_api_stream("今天做什么", system_prompt,
+                                         metadata={'feature': 'chat', 'segments': segments})[0]
+    # 第二次调用带上了第一轮对话历史；上一次调用的统计已提交，但不影响任务和记忆的版本，片段仍使用缓存
+    assert db.get_batch_writer().flush(5)
+    assert db.conn.execute("SELECT COUNT(*) FROM ai_call_metrics").fetchone()[0] == 1
+    segments = {}
+    pipeline.build(sizes=segments)
+    assert segments['base'] == {'size': len("你是待办助手"), 'cached': True}
+    assert core.call_deepseek_api("完成任务 ID:1", system_prompt,
+                                  metadata={'feature': 'complete_task', 'segments': segments})[0]
+
+    stream_record, plain_record = records
+    assert stream_record['stream'] and not plain_record['stream']
+    assert stream_record['prompt_tokens'] > 0 and stream_record['completion_tokens'] > 0
+    assert stream_record['ttft_ms'] >= 20 and stream_record['total_ms'] >= stream_record['ttft_ms']
+    assert stream_record['segment_sizes'] == {'base': 6, 'todos': len("当前待办事项数据:\n1. 写周报"),
+                                              'memory': len("用户个性化信息:\n常用概念: 周报"),
+                                              'history': 0, 'user': len("今天做什么")}
+    assert plain_record['segment_sizes']['history'] == len("今天做什么") + len(llm_stub.DEFAULT_REPLY)
+    assert plain_record['segments_cached'] == ['base', 'todos', 'memory']
+    assert stream_record['endpoint'] == "stub" and stream_record['cost'] > 0
+
+    assert db.get_batch_writer().flush(5)
+    summary = db.get_ai_call_summary()
+    assert summary['total']['calls'] == 2 and summary['total']['failures'] == 0
+    assert summary['total']['prompt_tokens'] == stream_record['prompt_tokens'] + plain_record['prompt_tokens']
+    assert {row['feature'] for row in summary['by_feature']} == {'chat', 'complete_task'}
+    assert {row['name'] for row in summary['segments']} == {'base', 'todos', 'memory', 'history', 'user'}
+    assert "complete_task" in ai_call_metrics.format_summary(summary)
+
+    path = str(tmp_path / "ai_calls.csv")
+    assert db.export_ai_call_metrics(path) == 2
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == ai_call_metrics.CSV_COLUMNS
+    assert json.loads(rows[1]['segment_sizes']) == plain_record['segment_sizes']
+    assert int(rows[0]['completion_tokens']) == stream_record['completion_tokens']
+
+
+def test_failed_call_is_recorded(server, db):
+    """失败的调用也会记录，没有用量时token和费用为空"""
+    server.settings.error_rate = 1.0
+    server.settings.error_status = 503
+    core, records = _client(server, db)
+
+    success, message = core.call_deepseek_api("你好")
+
+    assert not success
+    record, = records
+    assert not record['success'] and "503" in record['error']
+    assert record['prompt_tokens'] is None and record['cost'] is None and record['ttft_ms'] is None
+    assert db.get_batch_writer().flush(5)
+    assert db.get_ai_call_summary()['total']['failures'] == 1
+
+
+def test_usage_and_cost():
+    """兼容两种缓存命中字段，命中缓存的输入token按缓存价格计费"""
+    assert ai_call_metrics.parse_usage(
+        {'prompt_tokens': 1000, 'completion_tokens': 100, 'prompt_cache_hit_tokens': 600}
+    ) == (1000, 100, 600)
+    assert ai_call_metrics.parse_usage(
+        {'prompt_tokens': 1000, 'completion_tokens': 100, 'prompt_tokens_details': {'cached_tokens': 200}}
+    ) == (1000, 100, 200)
+    assert ai_call_metrics.parse_usage(None) == (None, None, None)
+
+    pricing = {'m': {'input': 2.0, 'input_cache_hit': 0.5, 'output': 8.0}}
+    cost = ai_call_metrics.estimate_cost('m', 1_000_000, 1_000_000, 400_000, pricing)
+    assert cost == pytest.approx(0.6 * 2.0 + 0.4 * 0.5 + 8.0)
+    assert ai_call_metrics.estimate_cost('unknown', 10, 10, pricing=pricing) is None
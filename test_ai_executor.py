@@ -0,0 +1,132 @@
+"""
+AI请求执行器测试
+验证同一会话内的请求按提交顺序逐个执行、取消执行中的请求会关闭已登记的资源并在回调中报告取消、
+超过截止时间的请求报告超时，以及排队时间和执行时间分别统计
+"""
+import threading
+import time
+
+import pytest
+
+import ai_executor
+
+
+class FakeStream:
+    """模拟阻塞中的流式响应：close() 之后阻塞的读取才返回"""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+    def read(self, timeout=5):
+        assert self.closed.wait(timeout), "资源未被关闭"
+        raise ConnectionError("连接已关闭")
+
+
+@pytest.fixture
+def executor():
+    executor = ai_executor.AIRequestExecutor(max_workers=2, default_deadline=10.0)
+    yield executor
+    executor.shutdown()
+
+
+def _blocking_job(started=None):
+    """登记一个流并阻塞读取，直到被取消"""
+    def func(token):
+        stream = FakeStream()
+        token.register(stream)
+        if started is not None:
+            started.set()
+        stream.read()
+    return func
+
+
+def test_same_session_runs_in_fifo_order(executor):
+    """同一会话的请求即使有空闲工作线程也按提交顺序逐个执行，不会重叠"""
+    order, running = [], []
+
+    def job(index):
+        def func(token):
+            running.append(index)
+            assert len(running) == 1, running
+            time.sleep(0.02)
+            order.append(index)
+            running.remove(index)
+            return index
+        return func
+
+    requests = [executor.submit(job(index), session_id="chat") for index in range(4)]
+    for request in requests:
+        assert request.wait(5)
+    assert order == [0, 1, 2, 3]
+    assert [request.result for request in requests] == [0, 1, 2, 3]
+    assert all(request.status == "done" for request in requests)
+    assert executor.pending_count("chat") == 0
+
+
+def test_cancel_in_flight_reported_in_on_done(executor):
+    """取消会话时关闭执行中请求登记的流，on_done收到取消状态，排队中的请求也一并取消"""
+    started, finished = threading.Event(), threading.Event()
+    reported = []
+
+    def on_done(request):
+        reported.append((request.request_id, request.status))
+        finished.set()
+
+    running = executor.submit(_blocking_job(started), session_id="chat", on_done=on_done)
+    queued = executor.submit(lambda token: "不应执行", session_id="chat", on_done=on_done)
+    assert started.wait(5)
+
+    assert executor.cancel_session("chat") == 2
+    assert running.wait(5) and queued.wait(5)
+    assert running.status == "cancelled" and running.token.reason == "cancelled"
+    assert queued.status == "cancelled" and queued.result is None and queued.started_at is None
+    assert sorted(reported) == [(running.request_id, "cancelled"), (queued.request_id, "cancelled")]
+    assert executor.get_stats()['cancelled'] == 2
+
+
+def test_deadline_fires_when_job_overruns(executor):
+    """请求超过截止时间时由计时器取消，阻塞的读取被中断，状态为超时"""
+    started = threading.Event()
+    begin = time.monotonic()
+    request = executor.submit(_blocking_job(started), session_id="slow", deadline=0.1)
+
+    assert request.wait(5)
+    assert started.is_set()
+    assert request.status == "timeout" and request.token.reason == "timeout"
+    assert time.monotonic() - begin < 2.0
+
+    # 排队期间已超时的请求不会开始执行
+    expired = ai_executor.AIRequestExecutor(max_workers=1, default_deadline=10.0)
+    try:
+        release = threading.Event()
+        expired.submit(lambda token: release.wait(5), session_id="a")
+        late = expired.submit(lambda token: "不应执行", session_id="b", deadline=0.05)
+        time.sleep(0.1)
+        release.set()
+        assert late.wait(5)
+        assert late.status == "timeout" and late.started_at is None
+    finally:
+        expired.shutdown()
+
+
+def test_queue_wait_and_service_time_reported():
+    """单个工作线程时，后提交的请求排队时间约等于前一个请求的执行时间"""
+    executor = ai_executor.AIRequestExecutor(max_workers=1, default_deadline=10.0)
+    try:
+        first = executor.submit(lambda token: time.sleep(0.1), session_id="a")
+        second = executor.submit(lambda token: time.sleep(0.05), session_id="b")
+        assert first.wait(5) and second.wait(5)
+    finally:
+        executor.shutdown()
+
+    assert first.service_time >= 0.09 and first.queue_wait < 0.09
+    assert second.queue_wait >= 0.09 and second.service_time >= 0.04
+    assert "排队" in second.timing_text() and "处理" in second.timing_text()
+
+    stats = executor.get_stats()
+    assert (stats['completed'], stats['cancelled']) == (2, 0)
+    assert stats['avg_queue_wait'] == pytest.approx((first.queue_wait + second.queue_wait) / 2)
+    assert stats['avg_service_time'] == pytest.approx((first.service_time + second.service_time) / 2)
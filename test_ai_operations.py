@@ -0,0 +1,158 @@
+"""
+AI批量操作测试
+验证操作列表的解析和校验、同一任务以最后一条操作为准、任一语句失败时整体回滚，
+以及在合成数据上一次事务执行500个任务的操作
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(APP_DIR, "benchmarks"))
+
+import ai_operations
+import module_registry
+from datagen import generate_database
+
+database_module = module_registry.load_module("1_database", "1_database.py")
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "todos.db")
+    generate_database(path, 2000, seed=11, anchor=datetime.now())
+    manager = database_module.DatabaseManager(path)
+    yield manager
+    manager.close()
+
+
+def _row(db, todo_id):
+    return db.conn.execute(
+        "SELECT title, priority, importance, urgency, status, completed_at FROM todos WHERE id = ?", (todo_id,)
+    ).fetchone()
+
+
+@pytest.mark.parametrize("data, message", [
+    ({'operations': {'op': 'delete', 'id': 1}}, "数组"),
+    ({'operations': ["delete 1"]}, "无效的操作"),
+    ({'operations': [{'op': 'archive', 'id': 1}]}, "不支持的操作"),
+    ({'operations': [{'op': 'delete'}]}, "缺少任务ID"),
+    ({'operations': [{'op': 'delete', 'ids': []}]}, "缺少任务ID"),
+    ({'operations': [{'op': 'delete', 'id': "abc"}]}, "无效的任务ID"),
+    ({'operations': [{'op': 'delete', 'id': True}]}, "无效的任务ID"),
+    ({'operations': [{'op': 'update', 'id': 1}]}, "缺少字段"),
+    ({'operations': [{'op': 'update', 'id': 1, 'fields': {'created_at': "2026-01-01"}}]}, "不能修改的字段"),
+    ({'operations': [{'op': 'update', 'id': 1, 'fields': {'priority': 5}}]}, "priority"),
+    ({'operations': [{'op': 'update', 'id': 1, 'fields': {'due_date': "明天"}}]}, "due_date"),
+    ({'operations': [{'op': 'update', 'id': 1, 'fields': {'status': "cancelled"}}]}, "status"),
+])
+def test_validation_errors(data, message):
+    """格式错误、不支持的操作和字段、无效的值都抛出 OperationError"""
+    with pytest.raises(ai_operations.OperationError, match=message):
+        ai_operations.normalize_operations(data)
+
+
+def test_too_many_operations(monkeypatch):
+    monkeypatch.setattr(ai_operations, "MAX_OPERATIONS", 3)
+    with pytest.raises(ai_operations.OperationError, match="操作过多"):
+        ai_operations.normalize_operations([{'op': 'delete', 'ids': [1, 2, 3, 4]}])
+
+
+def test_parse_and_last_operation_wins():
+    """跳过回复中无关的JSON；同一任务出现多次时以最后一条为准，字符串ID转为整数"""
+    reply = (
+        "当前的任务如下：\n```json\n{\"id\": 3, \"title\": \"写周报\"}\n```\n"
+        "执行以下操作：\n```json\n"
+        "{\"operations\": [\n"
+        "  {\"op\": \"complete\", \"ids\": [3, \"5\", 7]},\n"
+        "  {\"op\": \"delete\", \"id\": 5},\n"
+        "  {\"op\": \"update\", \"id\": 3, \"fields\": {\"priority\": 2}}\n"
+        "]}\n```"
+    )
+    assert ai_operations.parse_operations(reply) == [
+        ('update', 3, {'priority': 2}),
+        ('delete', 5, None),
+        ('complete', 7, None),
+    ]
+    assert ai_operations.parse_operations('完成了 {"operations": [{"op": "delete", "id": 1}]} 好的') == \
+        [('delete', 1, None)]
+    assert ai_operations.parse_operations("```json\n{\"title\": \"写周报\"}\n```") is None
+    assert ai_operations.parse_operations("好的，已经记下了") is None
+
+
+def test_apply_operations(db):
+    """完成、删除、修改一次执行；修改优先级时重要性和紧急性同步，改为完成时记录完成时间"""
+    pending = [row[0] for row in db.conn.execute(
+        "SELECT id FROM todos WHERE status = 'pending' AND priority = 4 ORDER BY id LIMIT 4"
+    )]
+    operations = ai_operations.normalize_operations({'operations': [
+        {'op': 'complete', 'id': pending[0]},
+        {'op': 'delete', 'id': pending[1]},
+        {'op': 'update', 'id': pending[2], 'fields': {'priority': 1, 'title': "改过的标题"}},
+        {'op': 'update', 'id': pending[3], 'fields': {'status': "completed"}},
+    ]})
+
+    assert db.apply_todo_operations(operations) == {'complete': 1, 'delete': 1, 'update': 2}
+    assert _row(db, pending[0])['status'] == "completed" and _row(db, pending[0])['completed_at']
+    assert _row(db, pending[1]) is None
+    assert tuple(_row(db, pending[2]))[:4] == ("改过的标题", 1, 1, 1)
+    assert _row(db, pending[3])['completed_at'] is not None
+    assert db.verify_project_stats() == [] and db.verify_daily_rollup() == []
+
+
+def test_failed_statement_rolls_back(db):
+    """任一语句失败时整批回滚，之前已执行的同批语句也撤销"""
+    todo_ids = [row[0] for row in db.conn.execute("SELECT id FROM todos ORDER BY id LIMIT 3")]
+    before = db.get_statistics()
+    operations = [
+        ('delete', todo_ids[0], None),
+        ('complete', todo_ids[1], None),
+        # 未经校验的字段名：语句执行失败
+        ('update', todo_ids[2], {'no_such_column': 1}),
+    ]
+
+    with pytest.raises(Exception):
+        db.apply_todo_operations(operations)
+
+    assert _row(db, todo_ids[0]) is not None
+    assert db.get_statistics() == before
+    assert db.verify_project_stats() == []
+
+
+def test_batch_of_500(db):
+    """500个任务（含不存在的ID）在一个事务中执行，结果与逐条预期一致"""
+    rng = random.Random(5)
+    todo_ids = rng.sample([row[0] for row in db.conn.execute("SELECT id FROM todos")], 500)
+    missing = [100000 + i for i in range(20)]
+    items = [
+        {'op': 'complete', 'ids': todo_ids[:200] + missing},
+        {'op': 'delete', 'ids': todo_ids[200:350]},
+        {'op': 'update', 'ids': todo_ids[350:], 'fields': {'priority': 3, 'gtd_tag': "waiting-for"}},
+    ]
+    operations = ai_operations.normalize_operations({'operations': items})
+    existing = db.get_existing_todo_ids([todo_id for _, todo_id, _ in operations])
+    valid = [operation for operation in operations if operation[1] in existing]
+    assert len(valid) == 500 and existing.isdisjoint(missing)
+
+    already_completed = len(db.conn.execute(
+        f"SELECT id FROM todos WHERE status = 'completed' AND id IN ({', '.join('?' * 200)})", todo_ids[:200]
+    ).fetchall())
+    start = time.perf_counter()
+    counts = db.apply_todo_operations(valid)
+    elapsed = time.perf_counter() - start
+
+    assert counts == {'complete': 200 - already_completed, 'delete': 150, 'update': 150}
+    assert db.conn.execute(
+        f"SELECT COUNT(*) FROM todos WHERE status = 'completed' AND id IN ({', '.join('?' * 200)})", todo_ids[:200]
+    ).fetchone()[0] == 200
+    assert db.get_existing_todo_ids(todo_ids[200:350]) == set()
+    assert {tuple(row) for row in db.conn.execute(
+        f"SELECT priority, importance, urgency, gtd_tag FROM todos WHERE id IN ({', '.join('?' * 150)})",
+        todo_ids[350:]
+    )} == {(3, 0, 1, "waiting-for")}
+    assert db.verify_project_stats() == [] and db.verify_daily_rollup() == []
+    assert elapsed < 1.0, elapsed
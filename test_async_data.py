@@ -0,0 +1,121 @@
+"""
+后台数据读取测试
+用替身 root.after 在测试线程中模拟Tk主循环，验证同一键上被新请求取代或被作废的旧结果直接丢弃，
+只交付最新的结果，以及查询异常交给错误回调
+"""
+import threading
+import time
+
+import pytest
+
+import async_data
+
+
+class FakeRoot:
+    """只记录 after 回调，由测试调用 run_pending 执行（相当于Tk主循环）"""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, delay_ms, callback):
+        self.callbacks.append(callback)
+
+    def run_pending(self, loader, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while loader.get_stats()['pending'] > 0:
+            assert time.monotonic() < deadline, "等待超时"
+            callbacks, self.callbacks = self.callbacks, []
+            for callback in callbacks:
+                callback()
+            time.sleep(0.005)
+
+
+class FakeReader:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(params=[1, 2], ids=["queued", "running"])
+def workers(request):
+    """workers=1 时旧请求还在排队，workers=2 时旧请求已在执行"""
+    return request.param
+
+
+@pytest.fixture
+def loader(workers):
+    readers = []
+
+    def factory():
+        readers.append(FakeReader())
+        return readers[-1]
+
+    loader = async_data.AsyncDataLoader(FakeRoot(), factory, workers=workers)
+    yield loader
+    loader.close()
+    assert all(reader.closed for reader in readers)
+
+
+def _slow(release, value, started=None):
+    def func(reader):
+        if started is not None:
+            started.set()
+        release.wait(5)
+        return value
+    return func
+
+
+def test_newer_request_drops_stale_result(loader, workers):
+    """同一键提交两次：先提交的慢查询结果到达时已过期，只有第二次的回调被调用"""
+    release, blocker, started = threading.Event(), threading.Event(), threading.Event()
+    results = []
+    if workers == 1:
+        # 占住唯一的工作线程，使第一个请求排队
+        loader.submit("other", _slow(blocker, None), lambda result: None)
+
+    loader.submit("calendar", _slow(release, "旧月份", started), results.append)
+    if workers == 2:
+        assert started.wait(5)
+    loader.submit("calendar", lambda reader: "新月份", results.append)
+    blocker.set()
+    time.sleep(0.02)
+    release.set()
+    loader.root.run_pending(loader)
+
+    assert results == ["新月份"]
+    stats = loader.get_stats()
+    assert stats['dropped'] == 1 and stats['pending'] == 0
+    assert stats['delivered'] == stats['submitted'] - 1
+
+
+def test_invalidate_drops_pending_result(loader):
+    """作废后尚未交付的结果被丢弃，之后的新请求正常交付"""
+    release = threading.Event()
+    results = []
+
+    loader.submit("project", _slow(release, "作废前"), results.append)
+    loader.invalidate("project")
+    release.set()
+    loader.root.run_pending(loader)
+    assert results == [] and loader.dropped == 1
+
+    loader.submit("project", lambda reader: "作废后", results.append)
+    loader.root.run_pending(loader)
+    assert results == ["作废后"] and loader.delivered == 1
+
+
+def test_error_goes_to_error_callback(loader):
+    """查询异常在主线程交给错误回调，不影响其他键"""
+    errors, results = [], []
+
+    def fail(reader):
+        raise ValueError("查询失败")
+
+    loader.submit("summary", fail, results.append, errors.append)
+    loader.submit("quadrant", lambda reader: isinstance(reader, FakeReader), results.append)
+    loader.root.run_pending(loader)
+
+    assert [str(error) for error in errors] == ["查询失败"]
+    assert results == [True]
+    assert (loader.failed, loader.delivered, loader.dropped) == (1, 1, 0)
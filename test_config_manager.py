@@ -0,0 +1,153 @@
+"""
+配置管理器测试
+验证多次修改合并为一次延迟写入、通过临时文件原子替换且保留原文件权限、
+按修改时间热重载外部修改（未落盘的本地修改优先），以及按路径前缀过滤的变更回调
+"""
+import json
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+import module_registry
+
+config_module = module_registry.load_module("9_config_manager", "9_config_manager.py")
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"first_run": False, "ui": {"theme": "dark"}}), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def manager(config_path):
+    manager = config_module.ConfigManager(str(config_path))
+    manager.flush_delay = 0.05
+    yield manager
+    manager.close()
+
+
+def _read(path):
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write_external(path, data):
+    """模拟外部编辑：写入后把修改时间推后，保证与上次签名不同"""
+    path.write_text(json.dumps(data), encoding="utf-8")
+    later = time.time() + 5
+    os.utime(path, (later, later))
+
+
+def test_debounced_flush_writes_once(manager, config_path, monkeypatch):
+    """连续多次set只在延迟后落盘一次，且包含全部修改"""
+    flushes = []
+    original = manager.flush
+    monkeypatch.setattr(manager, "flush", lambda: (flushes.append(1), original()))
+
+    manager.set("ui.theme", "light")
+    manager.set("ai_assistant.model", "deepseek-reasoner")
+    manager.set("database.reader_threads", 4)
+    assert _read(config_path)["ui"]["theme"] == "dark"
+
+    deadline = time.monotonic() + 5
+    while not flushes:
+        assert time.monotonic() < deadline, "延迟写入没有执行"
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    assert len(flushes) == 1
+    saved = _read(config_path)
+    assert saved["ui"]["theme"] == "light"
+    assert saved["ai_assistant"]["model"] == "deepseek-reasoner"
+    assert saved["database"]["reader_threads"] == 4
+    assert not manager._dirty
+
+
+def test_flush_replaces_atomically(manager, config_path, monkeypatch):
+    """写入经临时文件替换，不留下临时文件；替换失败时原文件保持不变"""
+    manager.set("ui.theme", "light")
+    manager.flush()
+    assert _read(config_path)["ui"]["theme"] == "light"
+    assert [path.name for path in config_path.parent.iterdir()] == ["config.json"]
+
+    def fail_replace(src, dst):
+        raise OSError("磁盘已满")
+
+    monkeypatch.setattr(config_module.os, "replace", fail_replace)
+    manager.set("ui.theme", "blue")
+    manager.flush()
+    assert _read(config_path)["ui"]["theme"] == "light"
+    assert [path.name for path in config_path.parent.iterdir()] == ["config.json"]
+    assert manager._dirty
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows不支持POSIX权限位")
+def test_flush_preserves_file_mode(manager, config_path, tmp_path):
+    """替换后保留原文件权限；新建文件时按umask计算默认权限，而不是临时文件的0600"""
+    os.chmod(config_path, 0o640)
+    manager.set("ui.theme", "light")
+    manager.flush()
+    assert stat.S_IMODE(os.stat(config_path).st_mode) == 0o640
+
+    old_umask = os.umask(0o022)
+    try:
+        new_path = tmp_path / "new" / "config.json"
+        new_path.parent.mkdir()
+        created = config_module.ConfigManager(str(new_path))
+        created.close()
+    finally:
+        os.umask(old_umask)
+    assert stat.S_IMODE(os.stat(new_path).st_mode) == 0o644
+
+
+def test_hot_reload_on_mtime_change(manager, config_path):
+    """外部修改后重新加载并通知变更；尚未落盘的本地修改不被覆盖"""
+    changes = []
+    manager.add_listener(lambda *change: changes.append(change))
+    assert not manager.reload_if_changed()
+
+    manager.flush_delay = 60
+    manager.set("ai_assistant.model", "local-model")
+    changes.clear()
+    _write_external(config_path, {"first_run": False, "ui": {"theme": "solar"},
+                                  "ai_assistant": {"model": "external-model"}})
+
+    assert manager.reload_if_changed()
+    assert manager.get("ui.theme") == "solar"
+    assert manager.get("ai_assistant.model") == "local-model"
+    assert changes == [("ui.theme", "dark", "solar")]
+    # 签名未变时不再重复加载
+    assert not manager.reload_if_changed()
+
+    # 自身写入不会被当作外部修改
+    manager.flush()
+    assert not manager.reload_if_changed()
+    assert _read(config_path)["ai_assistant"]["model"] == "local-model"
+
+
+def test_prefix_listeners(manager):
+    """带前缀的回调只接收该路径及其子路径的变更"""
+    all_changes, ai_changes, model_changes = [], [], []
+    manager.add_listener(lambda *change: all_changes.append(change[0]))
+    manager.add_listener(lambda *change: ai_changes.append(change[0]), prefix="ai_assistant")
+    model_listener = lambda *change: model_changes.append(change)
+    manager.add_listener(model_listener, prefix="ai_assistant.model")
+
+    manager.set("ai_assistant.model", "m1")
+    manager.set("ai_assistant.endpoint_pool.hedge", False)
+    manager.set("ai_assistant_extra", 1)
+    manager.set("ui.theme", "light")
+    # 值未变化时不通知
+    manager.set("ui.theme", "light")
+
+    assert all_changes == ["ai_assistant.model", "ai_assistant.endpoint_pool.hedge", "ai_assistant_extra", "ui.theme"]
+    assert ai_changes == ["ai_assistant.model", "ai_assistant.endpoint_pool.hedge"]
+    assert model_changes == [("ai_assistant.model", "deepseek-chat", "m1")]
+
+    manager.remove_listener(model_listener)
+    manager.set("ai_assistant.model", "m2")
+    assert len(model_changes) == 1 and ai_changes[-1] == "ai_assistant.model"
@@ -0,0 +1,108 @@
+"""
+大模型接口池测试
+用本地接口桩服务验证对冲请求、故障转移和熔断
+"""
+import os
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(APP_DIR, "benchmarks"))
+
+import llm_endpoints
+import llm_stub
+import module_registry
+
+AICore = module_registry.load_module("ai_core", "ai_core.py").AICore
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(**settings):
+        server = llm_stub.LLMStubServer(settings=llm_stub.StubSettings(**settings)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def _client(servers, **pool_options):
+    core = AICore()
+    endpoints = [
+        llm_endpoints.Endpoint(f"stub{index}", server.url, "stub-model", failure_threshold=2, reset_timeout=0.3)
+        for index, server in enumerate(servers)
+    ]
+    options = dict(hedge_min_delay=0.1, hedge_initial_delay=0.1, hedge_min_samples=1)
+    options.update(pool_options)
+    core.endpoint_pool = llm_endpoints.EndpointPool(endpoints, **options)
+    return core
+
+
+def test_hedged_request_wins_on_fast_endpoint(start_server):
+    """首选接口超过对冲延迟仍未返回时，由第二个接口先返回，首选请求被取消"""
+    slow = start_server(latency=2.0, tokens_per_second=0, reply="慢接口")
+    fast = start_server(latency=0.01, tokens_per_second=0, reply="快接口")
+    core = _client([slow, fast])
+    chunks = []
+
+    start = time.monotonic()
+    success, reply = core.call_deepseek_api_stream("你好", on_chunk=chunks.append)
+
+    assert success and reply == "快接口"
+    assert "".join(chunks) == "快接口"
+    assert time.monotonic() - start < 1.5
+    slow_stats, fast_stats = core.get_endpoint_stats()
+    assert fast_stats['hedges'] == 1 and fast_stats['wins'] == 1
+    deadline = time.monotonic() + 3
+    while core.endpoint_pool.endpoints[0].cancelled == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert core.endpoint_pool.endpoints[0].cancelled == 1
+    assert slow_stats['failures'] == 0
+
+
+def test_no_hedge_when_primary_is_fast(start_server):
+    """首选接口在对冲延迟内返回时不发出对冲请求"""
+    primary = start_server(latency=0.01, tokens_per_second=0, reply="首选")
+    secondary = start_server(latency=0.01, tokens_per_second=0, reply="备用")
+    core = _client([primary, secondary], hedge_min_delay=1.0, hedge_initial_delay=1.0)
+
+    assert core.call_deepseek_api("你好") == (True, "首选")
+    assert len(secondary.take_records()) == 0
+
+
+def test_failover_and_circuit_breaker(start_server):
+    """接口出错时立即转移；连续失败后熔断不再请求，冷却后试探恢复"""
+    broken = start_server(latency=0, tokens_per_second=0, error_rate=1.0, error_status=503)
+    backup = start_server(latency=0, tokens_per_second=0, reply="备用")
+    core = _client([broken, backup], hedge=False)
+
+    for _ in range(3):
+        assert core.call_deepseek_api_stream("你好") == (True, "备用")
+    # 失败两次后熔断，第三次不再请求故障接口
+    assert len(broken.take_records()) == 2
+    assert core.get_endpoint_stats()[0]['state'] == llm_endpoints.BREAKER_OPEN
+
+    broken.settings.error_rate = 0.0
+    broken.settings.reply = "恢复"
+    time.sleep(0.35)
+    assert core.call_deepseek_api_stream("你好") == (True, "恢复")
+    assert core.get_endpoint_stats()[0]['state'] == llm_endpoints.BREAKER_CLOSED
+
+
+def test_all_endpoints_failing(start_server):
+    """全部接口失败时返回最后的错误"""
+    servers = [start_server(error_rate=1.0, error_status=500) for _ in range(2)]
+    core = _client(servers, hedge=False)
+
+    success, message = core.call_deepseek_api("你好")
+
+    assert not success
+    assert "500" in message
@@ -0,0 +1,86 @@
+"""
+接口桩服务测试
+验证 AICore 能从桩服务读取流式回复、注入的错误按失败返回，以及录制后可离线回放
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("requests")
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(APP_DIR, "benchmarks"))
+
+import llm_endpoints
+import llm_stub
+import module_registry
+
+AICore = module_registry.load_module("ai_core", "ai_core.py").AICore
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(**kwargs):
+        server = llm_stub.LLMStubServer(**kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def _client(server):
+    core = AICore()
+    core.endpoint_pool = llm_endpoints.EndpointPool([llm_endpoints.Endpoint("stub", server.url, "stub-model")])
+    return core
+
+
+def test_streaming_reply(start_server):
+    """流式回复按token分片输出，首个分片在设定的延迟之后"""
+    server = start_server(settings=llm_stub.StubSettings(latency=0.05, tokens_per_second=500))
+    chunks = []
+
+    success, reply = _client(server).call_deepseek_api_stream("你好", "系统提示", on_chunk=chunks.append)
+
+    assert success
+    assert reply == llm_stub.DEFAULT_REPLY
+    assert chunks == llm_stub.split_tokens(llm_stub.DEFAULT_REPLY)
+    record, = server.take_records()
+    assert record['status'] == 200 and record['tokens'] == len(chunks)
+    assert record['first_byte'] - record['received'] >= 0.05
+
+
+def test_error_injection(start_server):
+    """注入的错误状态码作为调用失败返回"""
+    server = start_server(settings=llm_stub.StubSettings(error_rate=1.0, error_status=503))
+
+    success, message = _client(server).call_deepseek_api("你好")
+
+    assert not success
+    assert "503" in message
+
+
+def test_record_then_replay(start_server, tmp_path):
+    """录制模式转发到真实接口并保存，回放时按最后一条用户消息匹配"""
+    upstream = start_server(settings=llm_stub.StubSettings(latency=0, tokens_per_second=0, reply="录制的回复"))
+    cassette_path = str(tmp_path / "cassette.jsonl")
+    recorder = start_server(mode=llm_stub.MODE_RECORD, cassette=llm_stub.Cassette(cassette_path),
+                            upstream=upstream.url)
+    success, recorded = _client(recorder).call_deepseek_api_stream("今天有什么任务", "提示词A")
+    assert success and recorded == "录制的回复"
+
+    cassette = llm_stub.Cassette(cassette_path).load()
+    assert cassette.count == 1
+    replay = start_server(mode=llm_stub.MODE_REPLAY, cassette=cassette)
+
+    # 系统提示词不同（含当前时间等）仍能匹配
+    success, replayed = _client(replay).call_deepseek_api_stream("今天有什么任务", "提示词B")
+    assert success and replayed == recorded
+
+    success, message = _client(replay).call_deepseek_api_stream("没有录制过的问题")
+    assert not success
+    assert "404" in message
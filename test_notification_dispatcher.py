@@ -0,0 +1,107 @@
+"""
+通知分发测试
+用内存后端验证同时到达的提醒合并为一条汇总、每分钟条数限流、从入队到发出的延迟记录，
+以及应用内提示只在有通知时才安排轮询
+"""
+import time
+
+import notification_dispatcher
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.005)
+
+
+def test_simultaneous_reminders_become_one_digest():
+    """同一分钟的多条提醒合并为一条汇总通知，每条提醒都记录延迟"""
+    backend = notification_dispatcher.MemoryBackend()
+    dispatcher = notification_dispatcher.NotificationDispatcher([backend], digest_window=0.05)
+    count = notification_dispatcher.DIGEST_PREVIEW + 3
+    for i in range(count):
+        dispatcher.notify(f"提醒{i}", "描述")
+
+    _wait_for(lambda: dispatcher.delivered == count)
+    dispatcher.close()
+
+    (title, message), = backend.sent
+    assert title == f"{count} 个待办事项提醒"
+    assert message.count("• ") == notification_dispatcher.DIGEST_PREVIEW and f"共 {count} 项" in message
+    stats = dispatcher.get_stats()
+    assert (stats['queued'], stats['delivered'], stats['digests'], stats['failed']) == (count, count, 1, 0)
+    # 延迟至少包含等待合并的时间
+    assert dispatcher.latency.count == count
+    assert 50 <= stats['latency_p50_ms'] <= stats['latency_max_ms'] < 5000
+
+
+def test_rate_limit_holds_notifications():
+    """超过每分钟条数后不再发送，剩余提醒留在分发线程中，关闭时一并发出"""
+    backend = notification_dispatcher.MemoryBackend()
+    dispatcher = notification_dispatcher.NotificationDispatcher([backend], rate_limit=2, digest_window=0.01)
+    for i in range(2):
+        dispatcher.notify(f"提醒{i}")
+        _wait_for(lambda: dispatcher.delivered == i + 1)
+
+    dispatcher.notify("提醒2")
+    dispatcher.notify("提醒3")
+    _wait_for(lambda: dispatcher.rate_limited >= 1)
+    time.sleep(0.05)
+    assert [title for title, _ in backend.sent] == ["提醒0", "提醒1"]
+    assert dispatcher.get_stats()['delivered'] == 2
+
+    dispatcher.close()
+    assert [title for title, _ in backend.sent] == ["提醒0", "提醒1", "提醒2", "提醒3"]
+    assert dispatcher.delivered == dispatcher.latency.count == 4
+    # 被限流的提醒延迟包含了等待名额的时间
+    assert min(list(dispatcher.latency.samples)[2:]) >= 50
+
+
+def test_slow_backend_does_not_block_notify():
+    """后端发送慢时 notify 仍立即返回，失败的后端不影响其他后端"""
+    class FailingBackend:
+        name = "failing"
+
+        def send(self, title, message):
+            raise RuntimeError("boom")
+
+    slow = notification_dispatcher.MemoryBackend(delay=0.2)
+    dispatcher = notification_dispatcher.NotificationDispatcher([FailingBackend(), slow], digest_window=0.01)
+    start = time.perf_counter()
+    dispatcher.notify("慢速提醒")
+    assert time.perf_counter() - start < 0.05
+
+    dispatcher.close()
+    assert slow.sent == [("慢速提醒", "")]
+    assert dispatcher.failed == 1 and dispatcher.latency.max_ms >= 200
+
+
+class FakeRoot:
+    """只记录 after 回调"""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, delay_ms, callback):
+        self.callbacks.append(callback)
+
+
+def test_toast_polls_only_when_queued(monkeypatch):
+    """应用内提示只在有通知入队时安排一次轮询，显示完不再重复安排"""
+    root = FakeRoot()
+    backend = notification_dispatcher.ToastBackend(root)
+    shown = []
+    monkeypatch.setattr(backend, "_show", lambda title, message: shown.append(title))
+    assert root.callbacks == []
+
+    backend.send("提醒1", "")
+    backend.send("提醒2", "")
+    assert len(root.callbacks) == 1
+    root.callbacks.pop()()
+    assert shown == ["提醒1", "提醒2"] and root.callbacks == []
+
+    backend.send("提醒3", "")
+    assert len(root.callbacks) == 1
+    root.callbacks.pop()()
+    assert shown[-1] == "提醒3" and root.callbacks == []
@@ -0,0 +1,97 @@
+"""
+性能埋点测试
+验证关闭埋点后恢复原方法（关闭时没有额外开销）、百分位数的计算，以及JSONL导出的行数
+"""
+import json
+from collections import deque
+
+import pytest
+
+import perf_metrics
+
+
+class Dummy:
+    def work(self, value):
+        return value * 2
+
+    def fail(self):
+        raise ValueError("失败")
+
+    def _private(self):
+        return "private"
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    """使用独立的登记表和数据，不影响已导入模块登记的类"""
+    monkeypatch.setattr(perf_metrics, "_registered", [])
+    monkeypatch.setattr(perf_metrics, "_originals", {})
+    monkeypatch.setattr(perf_metrics, "_stats", {})
+    monkeypatch.setattr(perf_metrics, "_buffer_size", perf_metrics.DEFAULT_BUFFER_SIZE)
+    monkeypatch.setattr(perf_metrics, "_events", deque(maxlen=perf_metrics.DEFAULT_EVENT_BUFFER_SIZE))
+    yield
+    perf_metrics.disable()
+
+
+def test_disable_restores_original_methods():
+    """启用时公开方法被替换为计时包装，关闭后恢复为原函数对象"""
+    work, fail, private = (vars(Dummy)[name] for name in ("work", "fail", "_private"))
+    perf_metrics.register_class(Dummy, "dummy")
+    assert Dummy.work is work
+
+    perf_metrics.enable()
+    assert Dummy.work is not work and Dummy.work.__perf_wrapped__ is work
+    assert Dummy._private is private
+    assert Dummy().work(21) == 42
+    with pytest.raises(ValueError):
+        Dummy().fail()
+    # 重复启用不会重复包装
+    perf_metrics.enable()
+    assert Dummy.work.__perf_wrapped__ is work
+
+    perf_metrics.disable()
+    assert Dummy.work is work and Dummy.fail is fail
+    assert perf_metrics.span("noop") is perf_metrics._NULL_SPAN
+    Dummy().work(1)
+
+    stats = {item['name']: item for item in perf_metrics.snapshot()}
+    assert stats['dummy.work']['count'] == 1
+    assert (stats['dummy.fail']['count'], stats['dummy.fail']['errors']) == (1, 1)
+
+
+def test_percentiles():
+    """最近秩法：1～100毫秒的样本 p50=50、p95=95、p99=99"""
+    stats = perf_metrics.SpanStats("sample")
+    for value in reversed(range(1, 101)):
+        stats.add(float(value))
+    summary = stats.summary()
+    assert (summary['p50_ms'], summary['p95_ms'], summary['p99_ms'], summary['max_ms']) == (50, 95, 99, 100)
+    assert summary['mean_ms'] == pytest.approx(50.5)
+
+    # 环形缓冲区只保留最近的样本，总次数和最大值按全部样本
+    small = perf_metrics.SpanStats("small", buffer_size=4)
+    for value in (1000.0, 1.0, 2.0, 3.0, 4.0):
+        small.add(value)
+    summary = small.summary()
+    assert (summary['count'], summary['p50_ms'], summary['p99_ms'], summary['max_ms']) == (5, 2, 4, 1000)
+    assert perf_metrics.SpanStats("empty").summary()['p95_ms'] == 0.0
+
+
+def test_dump_jsonl(tmp_path):
+    """每个事件一行、每个埋点摘要一行"""
+    perf_metrics.enable()
+    for _ in range(3):
+        with perf_metrics.span("a"):
+            pass
+    with pytest.raises(RuntimeError):
+        with perf_metrics.span("b"):
+            raise RuntimeError("失败")
+    perf_metrics.record("c", 1.5)
+
+    path = tmp_path / "perf.jsonl"
+    assert perf_metrics.dump_jsonl(str(path)) == 5 + 3
+    lines = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert len(lines) == 8
+    assert [line['name'] for line in lines if line['type'] == 'event'] == ["a", "a", "a", "b", "c"]
+    summaries = {line['name']: line for line in lines if line['type'] == 'summary'}
+    assert summaries['a']['count'] == 3 and summaries['b']['errors'] == 1
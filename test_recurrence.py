@@ -0,0 +1,202 @@
+"""
+重复任务测试
+验证规则展开与逐日推算一致（含间隔、星期几、次数和截止日期），
+删除重复实例后日历、四象限和统计中都不再出现，批量修改实例时一次写入，以及已写入todos表的实例在展开时跳过
+"""
+import calendar
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import module_registry
+import recurrence
+import task_store
+
+database_module = module_registry.load_module("1_database", "1_database.py")
+
+START = "2026-10-19"
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = database_module.DatabaseManager(str(tmp_path / "todos.db"))
+    yield manager
+    manager.close()
+
+
+def _reference(rule, start_date, range_start, range_end):
+    """逐日推算：从起始日起逐天判断是否命中规则，再按次数和截止日期截断"""
+    weekdays = rule.byweekday or [start_date.weekday()]
+    first_week = start_date - timedelta(days=start_date.weekday())
+    dates = []
+    current = start_date
+    while current <= range_end and (rule.count is None or len(dates) < rule.count):
+        if rule.freq == 'DAILY':
+            hit = (current - start_date).days % rule.interval == 0
+        elif rule.freq == 'WEEKLY':
+            hit = current.weekday() in weekdays and (current - first_week).days // 7 % rule.interval == 0
+        else:
+            months = (current.year - start_date.year) * 12 + current.month - start_date.month
+            hit = current.day == start_date.day and months % rule.interval == 0
+        if hit:
+            dates.append(current)
+        current += timedelta(days=1)
+    return [day for day in dates
+            if range_start <= day <= range_end and (rule.until is None or day <= rule.until)]
+
+
+def _random_rule(rng):
+    freq = rng.choice(recurrence.FREQUENCIES)
+    byweekday = None
+    if freq == 'WEEKLY' and rng.random() < 0.7:
+        byweekday = rng.sample(range(7), rng.randint(1, 7))
+    return recurrence.RecurrenceRule(
+        freq,
+        interval=rng.choice([1, 1, 2, 3, 4]),
+        byweekday=byweekday,
+        until=date(2025, 1, 1) + timedelta(days=rng.randrange(900)) if rng.random() < 0.3 else None,
+        count=rng.randint(1, 40) if rng.random() < 0.4 else None,
+    )
+
+
+def test_between_matches_reference():
+    """随机规则（含月末日期、次数和截止日期）在随机范围内的展开与逐日推算一致"""
+    rng = random.Random(42)
+    for _ in range(1500):
+        rule = recurrence.RecurrenceRule.parse(str(_random_rule(rng)))
+        # 起始日偏向月末，覆盖小月没有29～31日的情况
+        if rng.random() < 0.5:
+            year, month = rng.choice([2024, 2025]), rng.randint(1, 12)
+            day = min(rng.choice([28, 29, 30, 31]), calendar.monthrange(year, month)[1])
+            start_date = date(year, month, day)
+        else:
+            start_date = date(2024, 12, 1) + timedelta(days=rng.randrange(400))
+        range_start = start_date + timedelta(days=rng.randrange(-60, 500))
+        range_end = range_start + timedelta(days=rng.randrange(0, 400))
+        assert rule.between(start_date, range_start, range_end) == \
+            _reference(rule, start_date, range_start, range_end), (str(rule), start_date, range_start, range_end)
+
+
+@pytest.mark.parametrize("text, start, expected", [
+    # 31日在小月跳过，次数只计实际出现的月份
+    ("FREQ=MONTHLY;COUNT=4", "2025-01-31", ["2025-01-31", "2025-03-31", "2025-05-31", "2025-07-31"]),
+    # 起始日在周三：第一周只有周三、周五，次数从起始日数起
+    ("FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=4", "2025-01-01", ["2025-01-01", "2025-01-03", "2025-01-06", "2025-01-08"]),
+    # 隔周：起始日所在周的周二早于起始日，不计入，下一次在第三周
+    ("FREQ=WEEKLY;INTERVAL=2;BYDAY=TU;UNTIL=20250201", "2025-01-01", ["2025-01-14", "2025-01-28"]),
+    ("FREQ=DAILY;INTERVAL=3;COUNT=3", "2025-02-27", ["2025-02-27", "2025-03-02", "2025-03-05"]),
+])
+def test_between_examples(text, start, expected):
+    rule = recurrence.RecurrenceRule.parse(text)
+    start_date = recurrence.parse_date(start)
+    assert [day.strftime('%Y-%m-%d') for day in rule.between(start_date, start_date, date(2026, 12, 31))] == expected
+    # 从范围中间开始时，次数仍从起始日数起
+    later = rule.between(start_date, recurrence.parse_date(expected[1]), date(2026, 12, 31))
+    assert [day.strftime('%Y-%m-%d') for day in later] == expected[1:]
+
+
+def _add_daily(db, title="每日站会"):
+    return db.add_recurring_task(title, "", "工作", "owner", 1, 1, 1, "next-action", "FREQ=DAILY", START, "09:00")
+
+
+def _occurrence_ids(db, day):
+    return [item['id'] for item in db.get_occurrences(day, day)]
+
+
+def _assert_gone(reader, db, day, todo_ids):
+    """日历、四象限和统计中都没有给定的任务"""
+    assert not set(todo_ids) & {row[0] for row in reader.get_todos_by_date(day)}
+    assert not set(todo_ids) & {row[0] for row in reader.get_todos_by_priority_and_gtd(1, "next-action")}
+    assert reader.get_statistics()['total'] == db.get_statistics()['total'] == 0
+
+
+def test_deleted_occurrence_stays_deleted(db):
+    """删除尚未写入的实例：不写入todos，之后不再展开，各处读取和统计都不包含"""
+    recurrence_id = _add_daily(db)
+    key = f"R{recurrence_id}@2026-10-20"
+
+    assert db.delete_todo(key)
+    assert _occurrence_ids(db, "2026-10-20") == []
+    assert db.get_occurrence(key) is None
+    assert db.conn.execute("SELECT COUNT(*) FROM todos").fetchone()[0] == 0
+    _assert_gone(db, db, "2026-10-20", [key])
+    # 已删除的实例不能再完成或删除
+    assert db.materialize_occurrence(key) is None
+    assert not db.delete_todo(key)
+    # 其他日期的实例不受影响
+    assert _occurrence_ids(db, "2026-10-21") == [f"R{recurrence_id}@2026-10-21"]
+
+
+def test_deleted_materialized_occurrence_stays_deleted(db):
+    """已完成（写入todos）的实例被删除后，也不会以待处理实例重新展开"""
+    recurrence_id = _add_daily(db)
+    key = f"R{recurrence_id}@2026-10-20"
+    todo_id = db.resolve_todo_id(key)
+    db.mark_todo_completed(todo_id)
+    assert _occurrence_ids(db, "2026-10-20") == []
+
+    assert db.delete_todo(todo_id)
+    assert _occurrence_ids(db, "2026-10-20") == []
+    _assert_gone(db, db, "2026-10-20", [key, todo_id])
+
+
+def test_task_store_bulk_delete_occurrences(db):
+    """经内存存储批量删除实例（含已写入的实例），内存和数据库一致"""
+    recurrence_id = _add_daily(db)
+    store = task_store.TaskStore(db)
+    keys = [f"R{recurrence_id}@2026-10-{day}" for day in (20, 21, 22)]
+    todo_id = store.db_manager.resolve_todo_id(keys[2])
+    store.mark_todo_completed(todo_id)
+
+    assert store.delete_many(keys[:2] + [keys[2]]) == 3
+    assert store.get_todo(todo_id) is None
+    for day in ("2026-10-20", "2026-10-21", "2026-10-22"):
+        assert _occurrence_ids(db, day) == []
+        _assert_gone(store, db, day, keys + [todo_id])
+    assert store.delete_todo(f"R{recurrence_id}@2026-10-23")
+    assert _occurrence_ids(db, "2026-10-23") == []
+    assert store.loads == 1
+
+
+def test_task_store_bulk_update_occurrences(db, monkeypatch):
+    """经内存存储批量完成和移动实例：每批只展开一次、在同一事务中写入，内存同步且不整体重新加载"""
+    recurrence_id = _add_daily(db)
+    store = task_store.TaskStore(db)
+    store.get_statistics()
+    keys = [f"R{recurrence_id}@2026-10-{day}" for day in (20, 21, 22, 23)]
+    expansions = []
+    expand = recurrence.expand_occurrences
+    monkeypatch.setattr(recurrence, "expand_occurrences",
+                        lambda conn, start, end: expansions.append((start, end)) or expand(conn, start, end))
+
+    assert store.update_status_many(keys[:3] + [f"R{recurrence_id}@2026-10-18"], 'completed') == 3
+    assert expansions == [("2026-10-18", "2026-10-22")]
+    # 第一个已写入，其余两个一次写入
+    assert store.move_many(keys[2:] + [keys[0]], priority=2, gtd_tag="waiting-for") == 3
+    assert expansions[1:] == [("2026-10-23", "2026-10-23")]
+
+    materialized = db.get_materialized_ids(keys)
+    assert set(materialized) == set(keys)
+    assert [store.get_todo(materialized[key]).status for key in keys] == ['completed'] * 3 + ['pending']
+    assert [(store.get_todo(materialized[key]).priority, store.get_todo(materialized[key]).gtd_tag)
+            for key in keys] == [(2, "waiting-for"), (1, "next-action"), (2, "waiting-for"), (2, "waiting-for")]
+    assert store.loads == 1
+    assert _occurrence_ids(db, "2026-10-21") == [] and _occurrence_ids(db, "2026-10-24") == [f"R{recurrence_id}@2026-10-24"]
+
+
+def test_expand_skips_materialized(db):
+    """完成或修改过的实例以todos中的任务出现，展开时不再重复生成"""
+    recurrence_id = _add_daily(db)
+    done = db.resolve_todo_id(f"R{recurrence_id}@2026-10-20")
+    db.mark_todo_completed(done)
+    reopened = db.resolve_todo_id(f"R{recurrence_id}@2026-10-21")
+    db.update_todo_status(reopened, 'pending')
+
+    assert _occurrence_ids(db, "2026-10-20") == []
+    assert _occurrence_ids(db, "2026-10-21") == []
+    assert [item['occurrence_date'] for item in db.get_occurrences("2026-10-19", "2026-10-23")] == \
+        ["2026-10-19", "2026-10-22", "2026-10-23"]
+    assert [row[0] for row in db.get_todos_by_date("2026-10-20")] == [done]
+    # 再次展开或写入同一实例时返回已有的任务
+    assert db.resolve_todo_id(f"R{recurrence_id}@2026-10-21") == reopened
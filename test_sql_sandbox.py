@@ -0,0 +1,154 @@
+"""
+SQL沙箱测试
+验证只读通道拒绝写语句和多条语句、只读连接（mode=ro + query_only）无法写入、失控查询被进度回调中止、
+行数和字节上限截断结果、大表全表扫描在执行前被拒绝，以及写入失败或超时中止后整体回滚
+"""
+import sqlite3
+
+import pytest
+
+import sql_sandbox
+
+ROWS = 300
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "sandbox.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT UNIQUE, note TEXT);
+        CREATE TABLE copies (id INTEGER PRIMARY KEY, name TEXT);
+    """)
+    conn.executemany("INSERT INTO items (id, name, note) VALUES (?, ?, ?)",
+                     [(i, f"item{i}", "x" * 40) for i in range(1, ROWS + 1)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def sandbox(db_path):
+    sandbox = sql_sandbox.SQLSandbox(db_path, timeout=0.3)
+    yield sandbox
+    sandbox.close()
+
+
+def _count(db_path, table="items"):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM items",
+    "  update items SET name = 'x'",
+    "DROP TABLE items",
+    "SELECT 1; DELETE FROM items",
+    "SELECT * FROM items; DROP TABLE items;",
+    "WITH doomed AS (SELECT id FROM items) DELETE FROM items WHERE id IN doomed",
+    "PRAGMA user_version = 7",
+])
+def test_read_lane_rejects_writes(sandbox, db_path, sql):
+    """写语句、追加在查询后的第二条语句、以WITH开头的写语句都不能经只读通道执行"""
+    ok, message = sandbox.execute_read(sql)
+    assert not ok and isinstance(message, str)
+    assert _count(db_path) == ROWS
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    conn.close()
+
+
+def test_read_connection_is_readonly(sandbox, db_path):
+    """即使关闭query_only，mode=ro打开的连接仍无法写入"""
+    ok, result = sandbox.execute_read("PRAGMA query_only")
+    assert ok and list(result[0].values()) == [1]
+
+    conn = sandbox._get_read_connection()
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        conn.execute("INSERT INTO items (name) VALUES ('query_only')")
+    conn.execute("PRAGMA query_only = OFF")
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        conn.execute("INSERT INTO items (name) VALUES ('mode_ro')")
+    assert _count(db_path) == ROWS
+
+
+def test_runaway_cross_join_times_out(sandbox):
+    """三表笛卡尔积在超时后被中止，连接之后仍可正常查询"""
+    ok, message = sandbox.execute_read("SELECT COUNT(*) FROM items a, items b, items c")
+    assert not ok and "已中止" in message
+
+    ok, result = sandbox.execute_read("SELECT COUNT(*) AS total FROM items")
+    assert ok and result[0]['total'] == ROWS
+
+
+def test_row_and_byte_caps(db_path):
+    """超过行数或字节上限时截断结果并说明原因"""
+    sandbox = sql_sandbox.SQLSandbox(db_path, max_rows=10, max_bytes=500, fetch_batch=3)
+    try:
+        ok, result = sandbox.execute_read("SELECT id FROM items ORDER BY id")
+        assert ok and len(result) == 10 and [row['id'] for row in result[:3]] == [1, 2, 3]
+        assert result.truncated and "10行" in result.reason
+
+        ok, result = sandbox.execute_read("SELECT id FROM items WHERE id <= 10")
+        assert ok and len(result) == 10 and not result.truncated and result.reason == ""
+
+        # 每行约 8 + 5 + 40 字节，500字节内只能放下9行
+        ok, result = sandbox.execute_read("SELECT id, name, note FROM items ORDER BY id")
+        assert ok and result.truncated and "KB" in result.reason
+        assert 0 < len(result) < 10
+    finally:
+        sandbox.close()
+
+
+def test_full_scan_rejected_above_threshold(db_path):
+    """大表全表扫描在执行前被拒绝（含别名），走索引的查询和小表扫描照常执行"""
+    sandbox = sql_sandbox.SQLSandbox(db_path, scan_row_threshold=100)
+    try:
+        for sql in ("SELECT * FROM items WHERE note LIKE '%y%'",
+                    "SELECT i.id FROM items AS i WHERE i.note = 'x'",
+                    "select sum(length(note)) from items it"):
+            ok, message = sandbox.execute_read(sql)
+            assert not ok and "全表扫描 items" in message and "100" in message, sql
+
+        ok, result = sandbox.execute_read("SELECT name FROM items WHERE id = 5")
+        assert ok and result == [{'name': 'item5'}]
+        ok, result = sandbox.execute_read("SELECT id FROM items WHERE name = 'item7'")
+        assert ok and result == [{'id': 7}]
+        ok, result = sandbox.execute_read("SELECT * FROM copies")
+        assert ok and result == []
+    finally:
+        sandbox.close()
+
+
+def test_failed_write_rolls_back(sandbox, db_path):
+    """执行到一半违反约束的写入整体回滚，写连接不残留事务"""
+    ok, message = sandbox.execute_write("UPDATE items SET name = 'same' WHERE id <= 10")
+    assert not ok and "UNIQUE" in message
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM items WHERE name = 'same'").fetchone()[0] == 0
+    conn.close()
+    assert not sandbox._get_write_connection().in_transaction
+
+    ok, message = sandbox.execute_write("DELETE FROM items WHERE id = ?", (1,))
+    assert ok and "影响行数: 1" in message
+    assert _count(db_path) == ROWS - 1
+
+
+def test_interrupted_write_rolls_back(sandbox, db_path):
+    """超时中止的写入回滚，并释放写锁"""
+    ok, message = sandbox.execute_write(
+        "INSERT INTO copies (name) SELECT a.name FROM items a, items b, items c"
+    )
+    assert not ok and "已回滚" in message
+    assert _count(db_path, "copies") == 0
+    assert not sandbox._get_write_connection().in_transaction
+
+    # 其他连接可以立即写入
+    conn = sqlite3.connect(db_path, timeout=0)
+    conn.execute("INSERT INTO copies (name) VALUES ('after')")
+    conn.commit()
+    conn.close()
+    assert _count(db_path, "copies") == 1
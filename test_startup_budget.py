@@ -0,0 +1,79 @@
+"""
+启动耗时测试
+验证main.py导入时不会加载重型模块，并在可用显示环境下检查冷启动预算
+"""
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import startup_profiler
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 导入main.py需要ttkbootstrap
+needs_ttkbootstrap = pytest.mark.skipif(
+    importlib.util.find_spec("ttkbootstrap") is None, reason="需要安装ttkbootstrap"
+)
+
+
+def _run_python(args, cwd):
+    """在独立进程中运行，保证是冷启动"""
+    env = dict(os.environ, PYTHONPATH=APP_DIR)
+    return subprocess.run(
+        [sys.executable] + args, cwd=cwd, env=env,
+        capture_output=True, text=True, timeout=120
+    )
+
+
+def _has_display():
+    """当前环境能否创建Tk窗口"""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        root.destroy()
+        return True
+    except Exception:
+        return False
+
+
+@needs_ttkbootstrap
+def test_main_import_defers_heavy_modules(tmp_path):
+    """导入main.py时不应加载AI、网络、通知等模块"""
+    code = (
+        "import json, sys, main\n"
+        "names = ['requests', 'plyer', 'ai_core', 'ai_ui', '8_ai_assistant', '1_database']\n"
+        "print(json.dumps({name: name in sys.modules for name in names}))\n"
+    )
+    result = _run_python(["-c", code], str(tmp_path))
+    assert result.returncode == 0, result.stderr
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    assert not any(loaded.values()), loaded
+
+
+def test_modules_execute_once():
+    """通过注册表重复加载同一文件应返回同一模块对象"""
+    import module_registry
+    first = module_registry.load_module("task_parser", "task_parser.py")
+    second = module_registry.load_module("task_parser", "task_parser.py")
+    assert first is second
+
+
+@needs_ttkbootstrap
+@pytest.mark.skipif(not _has_display(), reason="需要图形显示环境")
+def test_profile_startup_within_budget(tmp_path):
+    """--profile-startup 模式应输出报告且首次绘制在预算内"""
+    # 预先写入配置，跳过首次运行对话框
+    config = {"first_run": False, "database": {"path": str(tmp_path / "todo_database.db")}}
+    (tmp_path / "config.json").write_text(json.dumps(config), encoding="utf-8")
+
+    result = _run_python(
+        [os.path.join(APP_DIR, "main.py"), "--profile-startup",
+         "--budget-ms", str(startup_profiler.STARTUP_BUDGET_MS)],
+        str(tmp_path)
+    )
+    assert "首次绘制总耗时" in result.stdout, result.stdout + result.stderr
+    assert result.returncode == 0, result.stdout
@@ -0,0 +1,152 @@
+"""
+任务内存存储测试
+验证内存读取与数据库查询结果一致、修改直写后内存同步、只有任务相关的表被写入时才重新加载，
+以及10万条任务的内存占用在预算内
+"""
+import os
+import sqlite3
+import sys
+from datetime import date, datetime, timedelta
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(APP_DIR, "benchmarks"))
+
+import ai_call_metrics
+import module_registry
+import task_store
+from datagen import generate_database
+
+database_module = module_registry.load_module("1_database", "1_database.py")
+
+ANCHOR = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "todos.db")
+    generate_database(path, 2000, seed=7, anchor=ANCHOR)
+    manager = database_module.DatabaseManager(path)
+    yield manager
+    manager.close()
+
+
+def _add(store, title, due_date, priority=1, gtd_tag="next-action"):
+    return store.add_todo(title, "", "工作", "owner", priority, 1, 1, gtd_tag, due_date, None)
+
+
+def test_reads_match_database(db):
+    """内存读取与 DatabaseManager 同名方法结果一致"""
+    store = task_store.TaskStore(db)
+    today = date.today()
+    start, end = today.strftime('%Y-%m-%d'), (today + timedelta(days=30)).strftime('%Y-%m-%d')
+
+    assert store.get_statistics() == db.get_statistics()
+    assert [record.id for record in store.get_all_todos()] == [todo['id'] for todo in db.get_all_todos()]
+    assert [tuple(row) for row in store.get_upcoming_tasks(start, end)] == \
+        [tuple(row) for row in db.get_upcoming_tasks(start, end)]
+    for offset in range(-3, 4):
+        day = (today + timedelta(days=offset)).strftime('%Y-%m-%d')
+        assert store.get_todos_by_date(day) == [tuple(row) for row in db.get_todos_by_date(day)]
+    assert store.get_todos_by_priority_and_gtd(1, "inbox") == \
+        [tuple(row) for row in db.get_todos_by_priority_and_gtd(1, "inbox")]
+
+
+def test_write_through_keeps_store_in_sync(db):
+    """经存储修改后内存直接更新，不整体重新加载"""
+    store = task_store.TaskStore(db)
+    store.get_statistics()
+    day = date.today().strftime('%Y-%m-%d')
+
+    todo_id = _add(store, "写入测试", day)
+    assert store.get_todo(todo_id).title == "写入测试"
+    assert todo_id in [row[0] for row in store.get_todos_by_date(day)]
+
+    store.mark_todo_completed(todo_id)
+    assert store.get_todo(todo_id).status == "completed"
+    assert store.get_todo(todo_id).completed_ts is not None
+
+    assert store.delete_todo(todo_id)
+    assert store.get_todo(todo_id) is None
+    assert todo_id not in [row[0] for row in store.get_todos_by_date(day)]
+
+    assert store.loads == 1
+    assert store.get_statistics() == db.get_statistics()
+
+
+def test_external_write_triggers_reload(db):
+    """其他连接写入后，下一次读取时重新加载"""
+    store = task_store.TaskStore(db)
+    total = store.get_statistics()['total']
+
+    conn = sqlite3.connect(db.db_name)
+    conn.execute("INSERT INTO todos (title, status, created_at) VALUES ('外部写入', 'pending', '2026-01-01 00:00:00')")
+    conn.commit()
+    conn.close()
+
+    assert store.get_statistics()['total'] == total + 1
+    assert store.loads == 2
+
+
+def test_unrelated_batched_write_keeps_store_fresh(db):
+    """批量写入器在独立连接上提交AI调用统计和项目记录后，内存存储和记忆版本不变；写入todos时才过期"""
+    store = task_store.TaskStore(db)
+    store.get_statistics()
+    todos_version, memory_version = db.get_data_version('todos'), db.get_data_version('memory')
+
+    record = ai_call_metrics.build_record(
+        {'messages': [{'role': 'user', 'content': '今天做什么'}]}, None, True, None, 0.0, 0.5, {'feature': 'chat'}
+    )
+    db.record_ai_call(record)
+    db.add_project_record("工作", "note", "注意事项")
+    assert db.get_batch_writer().flush(5)
+    assert db.conn.execute("SELECT COUNT(*) FROM ai_call_metrics").fetchone()[0] == 1
+
+    assert not store.is_stale()
+    store.get_statistics()
+    assert store.loads == 1
+    assert (db.get_data_version('todos'), db.get_data_version('memory')) == (todos_version, memory_version)
+
+    db.get_batch_writer().submit("UPDATE todos SET title = title || '!' WHERE id = (SELECT MIN(id) FROM todos)")
+    assert db.get_batch_writer().flush(5)
+    assert store.is_stale() and db.get_data_version('memory') == memory_version
+
+    db.save_user_preference("work_style", "focus", "上午")
+    assert db.get_data_version('memory') == memory_version + 1
+
+
+def test_memory_within_budget(tmp_path):
+    """10万条任务的内存占用（记录、字符串和索引）不超过预算"""
+    path = str(tmp_path / "todos_100k.db")
+    generate_database(path, 100000, seed=42, anchor=ANCHOR)
+    manager = database_module.DatabaseManager(path)
+    try:
+        stats = task_store.TaskStore(manager).get_memory_stats()
+    finally:
+        manager.close()
+    assert stats['records'] == 100000
+    assert stats['bytes_per_task'] <= task_store.MEMORY_BUDGET_PER_TASK, stats
+
+
+def test_bulk_actions_keep_store_in_sync(db):
+    """批量完成、移动和删除后内存与数据库一致，不整体重新加载"""
+    store = task_store.TaskStore(db)
+    day = date.today().strftime('%Y-%m-%d')
+    todo_ids = [_add(store, f"批量{i}", day, priority=4, gtd_tag="inbox") for i in range(5)]
+
+    assert store.move_many(todo_ids[:3], priority=1, gtd_tag="next-action") == 3
+    moved = [record.id for record in store.get_quadrant_records(1, "next-action")]
+    assert set(todo_ids[:3]) <= set(moved)
+    assert all(store.get_todo(todo_id).importance == 1 for todo_id in todo_ids[:3])
+
+    assert store.update_status_many(todo_ids, "completed") == 5
+    assert all(store.get_todo(todo_id).completed_ts is not None for todo_id in todo_ids)
+
+    assert store.delete_many(todo_ids[3:]) == 2
+    assert store.get_todo(todo_ids[3]) is None
+
+    assert store.loads == 1
+    assert store.get_statistics() == db.get_statistics()
+    assert store.get_todos_by_priority_and_gtd(1, "next-action") == \
+        [tuple(row) for row in db.get_todos_by_priority_and_gtd(1, "next-action")]
@@ -0,0 +1,128 @@
+"""
+标题补全索引测试
+验证前缀和中文二元组匹配的结果与逐条比较一致（含增量加入后）、模板默认值的合并，
+从数据库建立索引，以及大量标题下的查询耗时
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(APP_DIR, "benchmarks"))
+
+import module_registry
+import title_trie
+from datagen import generate_database
+
+database_module = module_registry.load_module("1_database", "1_database.py")
+
+VERBS = ["写", "整理", "准备", "修复", "检查", "联系", "提交", "更新", "安排", "复习", "review"]
+OBJECTS = ["周报", "会议纪要", "季度报告", "登录页面", "客户", "合同", "预算", "英语单词", "接口文档", " PR"]
+QUERIES = ["写", "写周", "整理会", "周报", "会议纪要", "纪要", "报告", "review", "re", "修复登录页面1", "客户2", "不存在"]
+
+
+def _titles(rng, count):
+    titles = set()
+    while len(titles) < count:
+        titles.add(f"{rng.choice(VERBS)}{rng.choice(OBJECTS)}{rng.randrange(count * 10)}")
+    return sorted(titles)
+
+
+def _items(rng, titles):
+    # 最近使用时间互不相同，排名没有并列
+    times = rng.sample(range(1_600_000_000, 1_700_000_000), len(titles))
+    return [(title, rng.randint(1, 30), last_used, "work", rng.randint(1, 4), "inbox", None)
+            for title, last_used in zip(titles, times)]
+
+
+def _expected(trie, text, limit=title_trie.SUGGESTION_LIMIT):
+    """逐条比较得到的候选：前缀匹配在前，其后是包含输入的标题，各自按得分排序"""
+    key = title_trie.normalize(text)
+    ranked = sorted(trie.entries, key=lambda entry: -entry.score)
+    prefix = [entry.title for entry in ranked if entry.key.startswith(key)][:limit]
+    if len(prefix) < limit and title_trie.bigrams(key):
+        prefix += [entry.title for entry in ranked
+                   if key in entry.key and not entry.key.startswith(key)][:limit - len(prefix)]
+    return prefix
+
+
+def test_matches_brute_force(monkeypatch):
+    """前缀（含预先保存候选的热门前缀）和中文二元组匹配与逐条比较一致，增量加入和再次使用后仍一致"""
+    monkeypatch.setattr(title_trie, "HEAVY_PREFIX", 8)
+    rng = random.Random(3)
+    titles = _titles(rng, 3000)
+    trie = title_trie.TitleTrie.build(_items(rng, titles))
+    for query in QUERIES:
+        assert [entry.title for entry in trie.suggest(query)] == _expected(trie, query), query
+
+    # 新标题和再次使用的旧标题，最近使用时间晚于建立时的全部条目
+    last_used = 1_800_000_000
+    for title in _titles(random.Random(4), 300) + rng.sample(titles, 300):
+        last_used += rng.randint(1, 1000)
+        trie.add(title, usage_count=rng.randint(1, 3), last_used=last_used)
+    for query in QUERIES:
+        assert [entry.title for entry in trie.suggest(query)] == _expected(trie, query), query
+
+
+def test_ranking_and_template_defaults():
+    """使用次数多、最近用过的在前；模板与同名历史标题合并，模板的默认值优先"""
+    trie = title_trie.TitleTrie.build([
+        ("写周报", 10, 1_700_000_000, "work", 2, "next-action", None),
+        ("写周报", 5, 1_690_000_000, "personal", 4, "inbox", None),
+        ("写日报", 1, 1_700_000_000, "work", 1, "inbox", None),
+        ("每周写周报", 1, 1_600_000_000, None, None, None, None),
+        (" 写周报 ", 2, 1_650_000_000, "study", 1, "waiting-for", "周报模板"),
+        ("Review PR", 3, 1_700_000_000, "work", 3, "inbox", None),
+    ])
+
+    weekly = trie.get("写周报")
+    assert weekly.usage_count == 17 and weekly.template == "周报模板"
+    assert weekly.defaults() == {'project': "study", 'priority': 1, 'gtd_tag': "waiting-for"}
+    assert [entry.title for entry in trie.suggest("写")] == ["写周报", "写日报"]
+    # 中文按二元组匹配标题中间的词，前缀匹配排在前面
+    assert [entry.title for entry in trie.suggest("周报")] == ["写周报", "每周写周报"]
+    assert [entry.title for entry in trie.suggest("review")] == ["Review PR"]
+    assert trie.suggest("PR") == [] and trie.suggest("  ") == []
+
+    trie.add("写日报", usage_count=30)
+    assert [entry.title for entry in trie.suggest("写")] == ["写日报", "写周报"]
+
+
+def test_load_from_database(tmp_path):
+    """从历史任务和任务模板建立索引，同名任务合并计数"""
+    path = str(tmp_path / "todos.db")
+    generate_database(path, 500, seed=5, anchor=datetime.now())
+    db = database_module.DatabaseManager(path)
+    try:
+        db.save_task_template("周会", "准备周会材料", "work", 2, "next-action")
+        db.update_template_usage("周会")
+
+        trie = title_trie.load_trie(db)
+
+        count, title = db.conn.execute(
+            "SELECT COUNT(*), title FROM todos GROUP BY title ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()
+        assert trie.get(title).usage_count == count
+        template = trie.suggest("准备周会")[0]
+        assert (template.title, template.template, template.usage_count) == ("准备周会材料", "周会", 1)
+        assert template.defaults() == {'project': "work", 'priority': 2, 'gtd_tag': "next-action"}
+    finally:
+        db.close()
+
+
+def test_lookup_latency_at_scale():
+    """20万个不同标题时，各类查询和增量加入都在10毫秒内"""
+    rng = random.Random(7)
+    trie = title_trie.TitleTrie.build(_items(rng, _titles(rng, 200_000)))
+
+    def timed(func):
+        start = time.perf_counter()
+        func()
+        return (time.perf_counter() - start) * 1000
+
+    for query in QUERIES:
+        trie.suggest(query)
+        assert min(timed(lambda: trie.suggest(query)) for _ in range(5)) < 10, query
+    assert min(timed(lambda: trie.add(f"新任务{rng.random()}")) for _ in range(5)) < 10
@@ -0,0 +1,116 @@
+"""
+界面卡顿监视测试
+用替身 root.after 由测试线程充当Tk主线程：阻塞心跳后验证卡顿开始时即写入临时记录、
+结束后原地更新为最终时长和位置、同一位置的卡顿汇总计数，以及停止监视时仍未结束的卡顿也会结算
+"""
+import json
+import time
+
+import pytest
+
+import ui_watchdog
+
+THRESHOLD = 0.1
+HEARTBEAT = 0.02
+
+
+class FakeRoot:
+    """只记录 after 回调，由测试调用 pump 执行（相当于Tk主循环）"""
+
+    def __init__(self):
+        self.callbacks = {}
+        self.next_id = 0
+
+    def after(self, delay_ms, callback):
+        self.next_id += 1
+        self.callbacks[self.next_id] = callback
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        self.callbacks.pop(after_id, None)
+
+    def pump(self, duration):
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            callbacks, self.callbacks = self.callbacks, {}
+            for callback in callbacks.values():
+                callback()
+            time.sleep(HEARTBEAT / 2)
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return tmp_path / "ui_stalls.jsonl"
+
+
+@pytest.fixture
+def watchdog(log_path):
+    watchdog = ui_watchdog.UIWatchdog(FakeRoot(), threshold=THRESHOLD, heartbeat_interval=HEARTBEAT,
+                                      sample_interval=0.01, log_path=str(log_path))
+    watchdog.start()
+    yield watchdog
+    watchdog.stop()
+
+
+def _records(log_path):
+    if not log_path.exists():
+        return []
+    return [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+
+
+def slow_refresh(log_path):
+    """卡顿位置一：阻塞超过阈值后（临时记录已写入）读取日志，再继续阻塞"""
+    time.sleep(THRESHOLD * 2.5)
+    provisional = _records(log_path)[-1]
+    time.sleep(THRESHOLD)
+    return provisional
+
+
+def slow_export(log_path):
+    """卡顿位置二"""
+    time.sleep(THRESHOLD * 2.5)
+    return _records(log_path)[-1]
+
+
+def test_stall_logged_while_blocked_then_updated(watchdog, log_path):
+    """卡顿开始后立即写入带栈的临时记录，结束后同一行更新为最终时长；同一位置汇总计数"""
+    watchdog.root.pump(0.1)
+    assert _records(log_path) == []
+
+    provisional = slow_refresh(log_path)
+    assert provisional['status'] == 'ongoing'
+    assert provisional['location'].startswith("slow_refresh (test_ui_watchdog.py:")
+    assert "slow_refresh" in provisional['stack'] and "test_stall_logged" in provisional['stack']
+    assert THRESHOLD * 1000 <= provisional['duration_ms'] < THRESHOLD * 2500
+
+    watchdog.root.pump(0.15)
+    records = _records(log_path)
+    assert len(records) == 1
+    assert records[0]['status'] == 'finished' and records[0]['location'] == provisional['location']
+    assert records[0]['duration_ms'] > provisional['duration_ms']
+
+    slow_refresh(log_path)
+    watchdog.root.pump(0.15)
+    assert slow_export(log_path)['status'] == 'ongoing'
+    watchdog.root.pump(0.15)
+
+    records = _records(log_path)
+    assert [record['status'] for record in records] == ['finished'] * 3
+    reports = {report['location'].split(' ')[0]: report for report in watchdog.get_reports()}
+    assert set(reports) == {"slow_refresh", "slow_export"}
+    assert reports["slow_refresh"]['count'] == 2 and reports["slow_export"]['count'] == 1
+    assert reports["slow_refresh"]['total_ms'] >= 2 * THRESHOLD * 1000
+    assert "slow_refresh" in watchdog.format_report()
+
+
+def test_stall_still_running_at_stop(watchdog, log_path):
+    """停止监视时卡顿仍未结束：临时记录更新为未结束状态并计入汇总"""
+    watchdog.root.pump(0.05)
+    assert slow_export(log_path)['status'] == 'ongoing'
+    watchdog.stop()
+
+    records = _records(log_path)
+    assert len(records) == 1
+    assert records[0]['status'] == 'unfinished'
+    assert records[0]['location'].startswith("slow_export (test_ui_watchdog.py:")
+    assert [report['count'] for report in watchdog.get_reports()] == [1]
@@ -0,0 +1,366 @@
+"""
+标题自动补全模块
+历史任务标题和任务模板读入内存，建立两种索引：
+- 前缀索引：全部键排序后按二分查找定位前缀范围（相当于压缩存储的前缀树），
+  匹配条目多的前缀预先保存得分最高的若干条，查询代价与标题总数无关
+- 字符二元组索引：中文标题按相邻两个字符匹配标题中间的词（输入"周报"可补全"写周报"）；
+  纯ASCII的部分（英文、数字）只按前缀匹配
+安装了 pypinyin 时，全拼和首字母也作为键加入前缀索引（输入"xzb"可补全"写周报"）。
+候选按使用次数和最近使用时间排序；选中模板时带出模板的项目、优先级和GTD标签
+"""
+import bisect
+import math
+from array import array
+from datetime import datetime
+from operator import add
+
+import date_index
+
+try:
+    import pypinyin
+except ImportError:  # 可选依赖：未安装时只按字符匹配
+    pypinyin = None
+
+# 每次补全返回的候选数
+SUGGESTION_LIMIT = 8
+# 匹配条目超过该数量的前缀（或二元组）预先保存得分最高的 TOP_K 条
+HEAVY_PREFIX = 64
+TOP_K = 16
+# 多个二元组的查询在最短的倒排列表中最多检查的条目数
+NGRAM_SCAN_LIMIT = 20000
+# 最近使用时间的半衰期：一个月前用过两次与刚用过一次得分相同
+RECENCY_HALF_LIFE = 30 * 86400
+# 模板的额外得分（相当于使用次数翻倍）
+TEMPLATE_BONUS = 1.0
+
+# 每个标题一行：使用次数、最近创建时间，以及最近一条任务的项目、优先级和GTD标签
+# （SQLite 对只含一个 MAX() 的聚合查询，裸列取自 MAX 所在的行）
+TITLES_SQL = '''
+    SELECT title, COUNT(*), MAX(created_ts), project, priority, gtd_tag
+    FROM todos WHERE title IS NOT NULL AND title != '' GROUP BY title
+'''
+TEMPLATES_SQL = '''
+    SELECT template_name, title_pattern, default_project, default_priority, default_gtd_tag, usage_count,
+           CAST(strftime('%s', COALESCE(updated_at, created_at)) AS INTEGER)
+    FROM task_templates
+'''
+
+
+def normalize(title):
+    """匹配用的键：去掉首尾空白并转为小写"""
+    return title.strip().lower()
+
+
+def bigrams(key):
+    """键中含中文等非ASCII字符的相邻二元组（去重）"""
+    return {gram for gram in map(add, key, key[1:]) if not gram.isascii()}
+
+
+def pinyin_keys(key):
+    """键的全拼和首字母（未安装 pypinyin 或不含中文时为空）"""
+    if pypinyin is None or key.isascii():
+        return ()
+    syllables = [syllable.lower() for syllable in pypinyin.lazy_pinyin(key, errors='ignore') if syllable.strip()]
+    if not syllables:
+        return ()
+    return tuple(dict.fromkeys(("".join(syllables), "".join(syllable[0] for syllable in syllables))))
+
+
+def now_ts():
+    """当前时间（秒，与 todos.created_ts 一致，不做时区换算）"""
+    return int((datetime.now() - date_index.EPOCH).total_seconds())
+
+
+class Suggestion:
+    """一个补全候选：标题及其使用统计和默认值（来自模板或最近一条同名任务）"""
+
+    __slots__ = ('title', 'key', 'usage_count', 'last_used', 'project', 'priority', 'gtd_tag', 'template', 'score')
+
+    def __init__(self, title, usage_count=0, last_used=None, project=None, priority=None, gtd_tag=None,
+                 template=None):
+        self.title = title
+        key = normalize(title)
+        # 中文标题转小写后不变，与标题共用同一个字符串
+        self.key = title if key == title else key
+        self.usage_count = usage_count or 0
+        self.last_used = last_used or 0
+        self.project = project
+        self.priority = priority
+        self.gtd_tag = gtd_tag
+        self.template = template
+        self.score = self._score()
+
+    def _score(self):
+        """使用次数按最近使用时间衰减后的对数：log2(次数 × 2^((最近使用 - 现在) / 半衰期))，省去各条目共同的"现在"
+
+        得分不随时间变化，只在再次使用时增加，预先保存的前缀候选因此不会过期。
+        """
+        bonus = TEMPLATE_BONUS if self.template else 0.0
+        return math.log2(1 + self.usage_count) + bonus + self.last_used / RECENCY_HALF_LIFE
+
+    def merge(self, usage_count=0, last_used=None, project=None, priority=None, gtd_tag=None, template=None):
+        """合并同一标题的另一次使用或模板；模板的默认值优先"""
+        self.usage_count += usage_count or 0
+        self.last_used = max(self.last_used, last_used or 0)
+        if template or not self.template:
+            self.project = project or self.project
+            self.priority = priority or self.priority
+            self.gtd_tag = gtd_tag or self.gtd_tag
+        self.template = template or self.template
+        self.score = self._score()
+
+    def defaults(self):
+        """选中后预填的字段"""
+        return {'project': self.project, 'priority': self.priority, 'gtd_tag': self.gtd_tag}
+
+    def __repr__(self):
+        return f"Suggestion(title={self.title!r}, usage_count={self.usage_count!r}, template={self.template!r})"
+
+
+class TitleTrie:
+    """标题补全索引
+
+    build() 整体建立（可在后台线程中执行），add() 增量加入或更新一条，suggest() 查询。
+    条目ID在建立时按得分从高到低分配，二元组倒排列表按ID递增，因此其中建立后没有再使用过的条目按得分排列；
+    建立后新加入或再次使用的条目另行记录在 _recent 中。
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.by_key = {}
+        self._keys = []           # 全部键（标题、全拼、首字母），有序
+        self._ids = array('i')    # 与 _keys 对应的条目ID
+        self._top = {}            # 热门前缀 -> 得分最高的条目ID（按得分降序）
+        self._grams = {}          # 二元组 -> 条目ID
+        self._gram_top = {}       # 热门二元组 -> 得分最高的条目ID
+        self._built = 0           # 建立时的条目数
+        self._recent = set()      # 建立后新加入或得分变化的条目ID
+
+    @classmethod
+    def build(cls, items):
+        """由 (标题, 使用次数, 最近使用时间, 项目, 优先级, GTD标签, 模板名) 建立；同一标题合并"""
+        merged = {}
+        for title, usage_count, last_used, project, priority, gtd_tag, template in items:
+            title = title.strip() if title else ""
+            if not title:
+                continue
+            entry = Suggestion(title, usage_count, last_used, project, priority, gtd_tag, template)
+            existing = merged.setdefault(entry.key, entry)
+            if existing is not entry:
+                existing.merge(usage_count, last_used, project, priority, gtd_tag, template)
+
+        trie = cls()
+        trie.entries = sorted(merged.values(), key=lambda entry: -entry.score)
+        trie.by_key = {entry.key: entry_id for entry_id, entry in enumerate(trie.entries)}
+
+        keys = []
+        ids = array('i')
+        grams = trie._grams
+        for entry_id, entry in enumerate(trie.entries):
+            keys.append(entry.key)
+            ids.append(entry_id)
+            for key in pinyin_keys(entry.key):
+                keys.append(key)
+                ids.append(entry_id)
+            for gram in bigrams(entry.key):
+                posting = grams.get(gram)
+                if posting is None:
+                    posting = grams[gram] = array('i')
+                posting.append(entry_id)
+        # 按键排序（同一键按ID）：对下标排序比对 (键, ID) 元组排序快
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        trie._keys = [keys[i] for i in order]
+        trie._ids = array('i', [ids[i] for i in order])
+        del keys, ids, order
+
+        trie._build_top(0, len(trie._keys), 0)
+        trie._built = len(trie.entries)
+        trie._gram_top = {gram: list(posting[:TOP_K]) for gram, posting in grams.items() if len(posting) > HEAVY_PREFIX}
+        return trie
+
+    def _build_top(self, lo, hi, depth):
+        """为 _keys[lo:hi]（共同前缀长度为depth）下匹配条目过多的子前缀保存候选，并继续向下"""
+        keys = self._keys
+        i = lo
+        while i < hi:
+            key = keys[i]
+            if len(key) <= depth:
+                i += 1
+                continue
+            prefix = key[:depth + 1]
+            j = bisect.bisect_left(keys, _prefix_end(prefix), i, hi)
+            if j - i > HEAVY_PREFIX:
+                # 建立时ID即得分名次，取最小的若干个ID
+                self._top[prefix] = _unique(sorted(self._ids[i:j]), TOP_K)
+                self._build_top(i, j, depth + 1)
+            i = j
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, title):
+        """按标题取条目，不存在时返回None"""
+        entry_id = self.by_key.get(normalize(title))
+        return None if entry_id is None else self.entries[entry_id]
+
+    def add(self, title, usage_count=1, last_used=None, project=None, priority=None, gtd_tag=None, template=None):
+        """增量加入一个标题（已存在时累加使用次数并更新最近使用时间），返回条目"""
+        if not title or not title.strip():
+            return None
+        if last_used is None:
+            last_used = now_ts()
+        key = normalize(title)
+        entry_id = self.by_key.get(key)
+        if entry_id is not None:
+            entry = self.entries[entry_id]
+            entry.merge(usage_count, last_used, project, priority, gtd_tag, template)
+            self._recent.add(entry_id)
+            # 得分只会增加：只需在已保存的候选中把它提前
+            for index_key in (key,) + pinyin_keys(key):
+                for depth in range(1, len(index_key) + 1):
+                    top = self._top.get(index_key[:depth])
+                    if top is None:
+                        break
+                    self._promote(top, entry_id)
+            for gram in bigrams(key):
+                top = self._gram_top.get(gram)
+                if top is not None:
+                    self._promote(top, entry_id)
+            return entry
+
+        entry = Suggestion(title.strip(), usage_count, last_used, project, priority, gtd_tag, template)
+        entry_id = len(self.entries)
+        self.entries.append(entry)
+        self.by_key[key] = entry_id
+        self._recent.add(entry_id)
+
+        for index_key in (key,) + pinyin_keys(key):
+            position = bisect.bisect_right(self._keys, index_key)
+            self._keys.insert(position, index_key)
+            self._ids.insert(position, entry_id)
+            for depth in range(1, len(index_key) + 1):
+                prefix = index_key[:depth]
+                top = self._top.get(prefix)
+                if top is not None:
+                    self._promote(top, entry_id)
+                    continue
+                lo, hi = self._prefix_range(prefix)
+                if hi - lo <= HEAVY_PREFIX:
+                    # 更长的前缀匹配的条目只会更少
+                    break
+                self._top[prefix] = self._rank(set(self._ids[lo:hi]), TOP_K)
+
+        for gram in bigrams(key):
+            posting = self._grams.get(gram)
+            if posting is None:
+                posting = self._grams[gram] = array('i')
+            posting.append(entry_id)
+            top = self._gram_top.get(gram)
+            if top is not None:
+                self._promote(top, entry_id)
+            elif len(posting) > HEAVY_PREFIX:
+                self._gram_top[gram] = self._rank(posting, TOP_K)
+        return entry
+
+    def _promote(self, top, entry_id):
+        """把得分增加（或新加入）的条目放到候选列表中的正确位置"""
+        if entry_id in top:
+            top.remove(entry_id)
+        score = self.entries[entry_id].score
+        position = 0
+        while position < len(top) and self.entries[top[position]].score >= score:
+            position += 1
+        if position < TOP_K:
+            top.insert(position, entry_id)
+            del top[TOP_K:]
+
+    def _rank(self, entry_ids, limit):
+        """按得分从高到低取前limit个条目ID"""
+        entries = self.entries
+        return sorted(set(entry_ids), key=lambda entry_id: (-entries[entry_id].score, entry_id))[:limit]
+
+    def _prefix_range(self, prefix):
+        """以prefix开头的键在 _keys 中的范围"""
+        lo = bisect.bisect_left(self._keys, prefix)
+        return lo, bisect.bisect_left(self._keys, _prefix_end(prefix), lo)
+
+    def suggest(self, text, limit=SUGGESTION_LIMIT):
+        """补全候选：先按前缀匹配，不足时按二元组匹配标题中间的部分，各自按得分排序"""
+        key = normalize(text)
+        if not key:
+            return []
+
+        top = self._top.get(key)
+        if top is not None:
+            ranked = top[:limit]
+        else:
+            lo, hi = self._prefix_range(key)
+            ranked = self._rank(self._ids[lo:hi], limit)
+        if len(ranked) < limit and len(key) >= 2:
+            seen = set(ranked)
+            ranked += [entry_id for entry_id in self._infix_matches(key, limit + len(ranked))
+                       if entry_id not in seen][:limit - len(ranked)]
+        return [self.entries[entry_id] for entry_id in ranked]
+
+    def _infix_matches(self, key, limit):
+        """标题中包含key的条目（按得分排序，最多limit个）"""
+        grams = bigrams(key)
+        if len(grams) == 1:
+            top = self._gram_top.get(next(iter(grams)))
+            if top is not None and len(top) >= limit:
+                return top[:limit]
+        postings = [self._grams.get(gram) for gram in grams]
+        if not postings or any(posting is None for posting in postings):
+            return []
+
+        # 建立后未再使用的条目在倒排列表中按得分排列，取到limit个匹配即可停止
+        entries, recent, built = self.entries, self._recent, self._built
+        matches = []
+        for scanned, entry_id in enumerate(min(postings, key=len)):
+            if entry_id >= built or scanned >= NGRAM_SCAN_LIMIT:
+                break
+            if entry_id not in recent and key in entries[entry_id].key:
+                matches.append(entry_id)
+                if len(matches) == limit:
+                    break
+        matches += [entry_id for entry_id in recent if key in entries[entry_id].key]
+        return self._rank(matches, limit)
+
+    def get_stats(self):
+        """索引规模"""
+        return {
+            'entries': len(self.entries),
+            'keys': len(self._keys),
+            'heavy_prefixes': len(self._top),
+            'bigrams': len(self._grams),
+            'pinyin': pypinyin is not None,
+        }
+
+
+def _prefix_end(prefix):
+    """比所有以prefix开头的字符串都大的最小字符串"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _unique(entry_ids, limit):
+    """有序ID去重后取前limit个（同一条目的多个键可能落在同一前缀下）"""
+    result = []
+    for entry_id in entry_ids:
+        if not result or result[-1] != entry_id:
+            result.append(entry_id)
+            if len(result) == limit:
+                break
+    return result
+
+
+def load_trie(db):
+    """从数据库读取历史标题和任务模板建立补全索引（db可以是后台线程的只读实例）"""
+    cursor = db.conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(TITLES_SQL)
+    items = [(title, count, last_used, project, priority, gtd_tag, None)
+             for title, count, last_used, project, priority, gtd_tag in cursor]
+    cursor.execute(TEMPLATES_SQL)
+    for name, pattern, project, priority, gtd_tag, usage_count, updated in cursor:
+        items.append((pattern or name, usage_count, updated, project, priority, gtd_tag, name))
+    return TitleTrie.build(items)
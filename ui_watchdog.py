@@ -0,0 +1,217 @@
+"""
+界面卡顿监视模块
+后台线程通过 after 心跳检测Tk主线程是否被阻塞，阻塞超过阈值时
+用 sys._current_frames() 采样主线程调用栈，按调用位置汇总成卡顿报告；
+卡顿开始时即写入日志，结束后更新为最终时长
+"""
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime
+
+import perf_metrics
+
+# 主线程阻塞超过该时长（秒）视为一次卡顿
+DEFAULT_STALL_THRESHOLD = 0.5
+# 心跳间隔（秒）
+DEFAULT_HEARTBEAT_INTERVAL = 0.1
+# 卡顿期间的栈采样间隔（秒）
+DEFAULT_SAMPLE_INTERVAL = 0.05
+# 汇总时保留的栈深度（从最内层起）
+STACK_DEPTH = 12
+
+
+class StallReport:
+    """同一调用位置的卡顿汇总"""
+
+    def __init__(self, signature, stack_text):
+        self.signature = signature
+        self.stack_text = stack_text
+        self.count = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_seen = None
+
+    def add(self, duration):
+        """记录一次卡顿"""
+        self.count += 1
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        self.last_seen = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def to_dict(self):
+        return {
+            'location': self.signature,
+            'count': self.count,
+            'total_ms': round(self.total_duration * 1000, 1),
+            'max_ms': round(self.max_duration * 1000, 1),
+            'last_seen': self.last_seen,
+            'stack': self.stack_text,
+        }
+
+
+class UIWatchdog:
+    """Tk主线程卡顿监视器"""
+
+    def __init__(self, root, threshold=DEFAULT_STALL_THRESHOLD, heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+                 sample_interval=DEFAULT_SAMPLE_INTERVAL, log_path=None):
+        """log_path为卡顿日志（JSONL）路径，None时只保存在内存中"""
+        self.root = root
+        self.threshold = threshold
+        self.heartbeat_interval = heartbeat_interval
+        self.sample_interval = sample_interval
+        self.log_path = log_path
+
+        self.ui_thread_id = None
+        self.reports = {}
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._running = False
+        self._thread = None
+        self._after_id = None
+
+    def start(self):
+        """开始监视（需在Tk主线程中调用）"""
+        if self._running:
+            return
+        self.ui_thread_id = threading.get_ident()
+        self._running = True
+        self._last_beat = time.monotonic()
+        self._beat()
+        self._thread = threading.Thread(target=self._monitor, name="UIWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监视；卡顿仍未结束时由监视线程按当前时长结算"""
+        self._running = False
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=max(1.0, self.sample_interval * 4))
+
+    def _beat(self):
+        """主线程心跳"""
+        self._last_beat = time.monotonic()
+        if self._running:
+            self._after_id = self.root.after(int(self.heartbeat_interval * 1000), self._beat)
+
+    def _sample_stack(self):
+        """采样主线程当前调用栈，返回最内层若干帧 [(文件名, 行号, 函数名)]"""
+        frame = sys._current_frames().get(self.ui_thread_id)
+        if frame is None:
+            return None
+        frames = traceback.extract_stack(frame)[-STACK_DEPTH:]
+        return tuple((os.path.basename(item.filename), item.lineno, item.name) for item in frames)
+
+    def _monitor(self):
+        """监视线程：心跳超时即开始采样并写入临时记录，心跳恢复后结算本次卡顿"""
+        samples = Counter()
+        stall_start = None
+        log_record = None
+        while self._running:
+            time.sleep(self.sample_interval)
+            # 心跳本应每heartbeat_interval到来一次，超出部分才是阻塞时间
+            blocked = time.monotonic() - self._last_beat - self.heartbeat_interval
+            if blocked > self.threshold:
+                if stall_start is None:
+                    stall_start = self._last_beat + self.heartbeat_interval
+                stack = self._sample_stack()
+                if stack:
+                    samples[stack] += 1
+                    if log_record is None:
+                        # 先写入临时记录，卡顿一直不结束（程序被强制结束）时日志中也能看到
+                        location, stack_text = self._summarize(samples)
+                        log_record = self._write_log(time.monotonic() - stall_start, location,
+                                                     stack_text, 'ongoing') or ()
+            elif stall_start is not None:
+                self._finish_stall(self._last_beat - stall_start, samples, log_record)
+                samples = Counter()
+                stall_start = None
+                log_record = None
+
+        if stall_start is not None:
+            # 停止监视时卡顿仍未结束
+            self._finish_stall(time.monotonic() - stall_start, samples, log_record, 'unfinished')
+
+    def _summarize(self, samples):
+        """以出现次数最多的栈作为卡顿位置，返回 (位置, 栈文本)"""
+        stack, _ = samples.most_common(1)[0]
+        # 以栈中最内层的应用代码（非tkinter/标准库）作为位置
+        location = next(
+            (f"{name} ({filename}:{lineno})" for filename, lineno, name in reversed(stack)
+             if not filename.startswith(('tkinter', '__init__', 'threading'))),
+            f"{stack[-1][2]} ({stack[-1][0]}:{stack[-1][1]})"
+        )
+        stack_text = "\n".join(f"  {filename}:{lineno} {name}" for filename, lineno, name in stack)
+        return location, stack_text
+
+    def _finish_stall(self, duration, samples, log_record=None, status='finished'):
+        """结算一次卡顿，并用最终时长和位置更新临时记录"""
+        if not samples:
+            return
+        location, stack_text = self._summarize(samples)
+
+        with self._lock:
+            report = self.reports.get(location)
+            if report is None:
+                report = self.reports[location] = StallReport(location, stack_text)
+            report.add(duration)
+        perf_metrics.record("ui.stall", duration * 1000)
+        print(f"界面卡顿 {duration * 1000:.0f} ms: {location}")
+        self._write_log(duration, location, stack_text, status, log_record or None)
+
+    def _write_log(self, duration, location, stack_text, status, replace=None):
+        """写入卡顿日志（JSONL），返回记录在文件中的 (起始位置, 结束位置)
+
+        replace为之前写入的临时记录位置；它仍是文件最后一行时原地替换，否则追加。
+        """
+        if not self.log_path:
+            return None
+        line = (json.dumps({
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'status': status,
+            'duration_ms': round(duration * 1000, 1),
+            'location': location,
+            'stack': stack_text,
+        }, ensure_ascii=False) + "\n").encode('utf-8')
+        try:
+            if replace is not None and os.path.getsize(self.log_path) == replace[1]:
+                with open(self.log_path, 'r+b') as f:
+                    f.seek(replace[0])
+                    f.truncate()
+                    f.write(line)
+                    return replace[0], replace[0] + len(line)
+            with open(self.log_path, 'ab') as f:
+                start = f.tell()
+                f.write(line)
+                return start, start + len(line)
+        except Exception as e:
+            print(f"写入卡顿日志失败: {e}")
+            return None
+
+    def get_reports(self):
+        """卡顿汇总，按总阻塞时间降序"""
+        with self._lock:
+            reports = [report.to_dict() for report in self.reports.values()]
+        reports.sort(key=lambda item: item['total_ms'], reverse=True)
+        return reports
+
+    def format_report(self, limit=10):
+        """生成文本报告"""
+        reports = self.get_reports()
+        if not reports:
+            return f"未检测到超过 {self.threshold * 1000:.0f} ms 的界面卡顿"
+        lines = []
+        for item in reports[:limit]:
+            lines.append(f"{item['location']}  次数 {item['count']}  累计 {item['total_ms']:.0f} ms  "
+                         f"最长 {item['max_ms']:.0f} ms  最近 {item['last_seen']}")
+            lines.append(item['stack'])
+        return "\n".join(lines)